@@ -1,4 +1,5 @@
 import hetu as ht
+from hetu.metrics import StreamingAUC
 
 import os.path as osp
 import numpy as np
@@ -42,6 +43,8 @@ def worker(args):
         test_loss = []
         test_acc = []
         test_auc = []
+        # auc over the whole validation set, for criteo case
+        streaming_auc = StreamingAUC()
         for it in localiter:
             loss_val, test_y_predicted, y_test_val = executor.run(
                 'validate', convert_to_numpy_ret_vals=True)
@@ -49,14 +52,17 @@ def worker(args):
                 correct_prediction = np.equal(
                     y_test_val,
                     test_y_predicted > 0.5).astype(np.float32)
+                streaming_auc.update(y_test_val, test_y_predicted)
             else:
                 correct_prediction = np.equal(
                     np.argmax(y_test_val, 1),
                     np.argmax(test_y_predicted, 1)).astype(np.float32)
+                test_auc.append(metrics.roc_auc_score(
+                    y_test_val, test_y_predicted))
             test_loss.append(loss_val[0])
             test_acc.append(correct_prediction)
-            test_auc.append(metrics.roc_auc_score(
-                y_test_val, test_y_predicted))
+        if streaming_auc.count > 0:
+            return np.mean(test_loss), np.mean(test_acc), streaming_auc.auc()
         return np.mean(test_loss), np.mean(test_acc), np.mean(test_auc)
 
     batch_size = 128
@@ -119,11 +125,11 @@ def worker(args):
     executor_log_path = osp.join(osp.dirname(osp.abspath(__file__)), 'logs')
     if args.comm is None:
         executor = ht.Executor(eval_nodes, ctx=ht.gpu(0), cstable_policy=args.cache,
-                               bsp=args.bsp, cache_bound=args.bound, seed=123, log_path=executor_log_path)
+                               bsp=args.bsp, cache_bound=args.bound, cache_shards=args.cache_shards, seed=123, log_path=executor_log_path)
     else:
         strategy = ht.dist.DataParallel(aggregate=args.comm)
         executor = ht.Executor(eval_nodes, dist_strategy=strategy, cstable_policy=args.cache,
-                               bsp=args.bsp, cache_bound=args.bound, seed=123, log_path=executor_log_path)
+                               bsp=args.bsp, cache_bound=args.bound, cache_shards=args.cache_shards, seed=123, log_path=executor_log_path)
 
     if args.all and dataset == 'criteo':
         print('Processing all data...')
@@ -186,6 +192,8 @@ if __name__ == '__main__':
                         help="bsp 0, asp -1, ssp > 0")
     parser.add_argument("--cache", default=None, help="cache policy")
     parser.add_argument("--bound", default=100, help="cache bound")
+    parser.add_argument("--cache-shards", type=int, default=1,
+                        help="number of cache shards")
     parser.add_argument("--nepoch", type=int, default=-1,
                         help="num of epochs, each train 1/10 data")
     args = parser.parse_args()
@@ -145,6 +145,11 @@ struct Meta {
     int priority;
     /** \brief server-side computation op for keys */
     PsfType psftype;
+    /** \brief the shared memory ring of the sender holding the data, empty
+     * if the data is sent in the message */
+    std::string shm_ring;
+    /** \brief (offset, size) of each data in the ring */
+    std::vector<uint64_t> shm_chunk;
 };
 /**
  * \brief messages that communicated amaong nodes.
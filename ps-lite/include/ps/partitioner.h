@@ -1,7 +1,10 @@
 #pragma once
 
+#include <string>
 #include <vector>
 
+#include "ps/internal/utils.h"
+
 namespace ps {
 
 class Partitioner {
@@ -25,6 +28,12 @@ public:
     virtual int queryServer(Key key) {
         return 0;
     }
+    /* Whether sparse rows are striped over the partitions: row r then lives
+     * in partition r % #parts at local offset r / #parts, instead of in the
+     * partition whose contiguous row range contains it. */
+    virtual bool stripeSparse() {
+        return false;
+    }
 };
 
 /* Naive partitioner, average partition into servers */
@@ -122,4 +131,34 @@ public:
     }
 };
 
+/*
+ * Hash partitioner, stripe the rows of sparse tables over servers by row id
+ * modulo #partitions. Frequency-sorted vocabularies put all the hot rows at the
+ * head of the table, which a contiguous split sends to a single server; striping
+ * spreads them evenly. Partition sizes are the same as AveragePartitioner.
+ */
+class HashPartitioner : public AveragePartitioner {
+public:
+    HashPartitioner(size_t part_num = 0) : AveragePartitioner(part_num) {
+    }
+
+    bool stripeSparse() {
+        return true;
+    }
+};
+
+/*
+ * Create the partitioner selected by the PS_PARTITIONER environment variable:
+ * "average" (default), "block" or "hash". All workers must use the same one.
+ */
+inline Partitioner *CreatePartitioner() {
+    std::string type = GetEnv("PS_PARTITIONER", std::string("average"));
+    if (type == "hash")
+        return new HashPartitioner();
+    if (type == "block")
+        return new BlockPartitioner();
+    CHECK_EQ(type, "average") << "unknown PS_PARTITIONER " << type;
+    return new AveragePartitioner();
+}
+
 } // namespace ps
@@ -0,0 +1,171 @@
+#pragma once
+
+#include "ps/internal/utils.h"
+#include "common/sarray.h"
+
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <cstring>
+
+namespace ps {
+
+/*
+ * Encodings of the float payloads of push/pull requests and responses. The
+ * encoded bytes are carried in an SArray<float> padded to whole floats, so
+ * that the request tuples keep their layout.
+ *   kCodecNone  raw float32
+ *   kCodecFP16  IEEE half precision, rounded to nearest even
+ *   kCodecBF16  upper 16 bits of float32, rounded to nearest even
+ *   kCodecInt8  symmetric int8 with one float32 scale (max|x| / 127) per row;
+ *               the scales of all rows come first, then the int8 values
+ * Rows are the rows of a sparse table; dense tensors are cut into rows of
+ * kDenseCodecWidth values, the last row may be shorter.
+ */
+enum Codec { kCodecNone = 0, kCodecFP16, kCodecBF16, kCodecInt8 };
+
+const size_t kDenseCodecWidth = 256;
+
+inline uint16_t floatToHalf(float f) {
+    uint32_t x;
+    std::memcpy(&x, &f, sizeof(x));
+    uint32_t sign = (x >> 16) & 0x8000;
+    uint32_t mant = x & 0x7fffff;
+    int exp = (x >> 23) & 0xff;
+    if (exp == 0xff) // inf or nan
+        return sign | 0x7c00 | (mant ? 0x200 : 0);
+    int e = exp - 127 + 15;
+    if (e >= 0x1f) // overflow
+        return sign | 0x7c00;
+    if (e <= 0) { // subnormal half
+        if (e < -10)
+            return sign;
+        mant |= 0x800000;
+        int shift = 14 - e;
+        uint32_t half = mant >> shift;
+        uint32_t rem = mant & ((1u << shift) - 1), mid = 1u << (shift - 1);
+        if (rem > mid || (rem == mid && (half & 1)))
+            ++half;
+        return sign | half;
+    }
+    uint32_t half = (e << 10) | (mant >> 13);
+    uint32_t rem = mant & 0x1fff;
+    // a carry into the exponent is still the right rounding
+    if (rem > 0x1000 || (rem == 0x1000 && (half & 1)))
+        ++half;
+    return sign | half;
+}
+
+inline float halfToFloat(uint16_t h) {
+    uint32_t sign = (uint32_t)(h & 0x8000) << 16;
+    uint32_t exp = (h >> 10) & 0x1f, mant = h & 0x3ff, x;
+    if (exp == 0x1f) {
+        x = sign | 0x7f800000 | (mant << 13);
+    } else if (exp) {
+        x = sign | ((exp + 112) << 23) | (mant << 13);
+    } else {
+        float f = mant * 5.9604644775390625e-8f; // 2^-24
+        return sign ? -f : f;
+    }
+    float f;
+    std::memcpy(&f, &x, sizeof(f));
+    return f;
+}
+
+inline uint16_t floatToBF16(float f) {
+    uint32_t x;
+    std::memcpy(&x, &f, sizeof(x));
+    if ((x & 0x7fffffff) > 0x7f800000) // keep nan a nan
+        return (x >> 16) | 0x40;
+    return (x + 0x7fff + ((x >> 16) & 1)) >> 16;
+}
+
+inline float bf16ToFloat(uint16_t h) {
+    uint32_t x = (uint32_t)h << 16;
+    float f;
+    std::memcpy(&f, &x, sizeof(f));
+    return f;
+}
+
+/* bytes of size values encoded in rows of width values */
+inline size_t codecBytes(int codec, size_t size, size_t width) {
+    switch (codec) {
+    case kCodecNone:
+        return size * sizeof(float);
+    case kCodecFP16:
+    case kCodecBF16:
+        return size * sizeof(uint16_t);
+    case kCodecInt8:
+        return (size + width - 1) / width * sizeof(float) + size;
+    default:
+        LOG(FATAL) << "unknown codec " << codec;
+    }
+    return 0;
+}
+
+/* encode size values, a new array even for kCodecNone */
+inline SArray<float> encodeValues(int codec, const float *vals, size_t size,
+                                  size_t width) {
+    SArray<float> data(
+        (codecBytes(codec, size, width) + sizeof(float) - 1) / sizeof(float));
+    if (codec == kCodecNone) {
+        std::copy(vals, vals + size, data.begin());
+    } else if (codec == kCodecFP16 || codec == kCodecBF16) {
+        uint16_t *dst = reinterpret_cast<uint16_t *>(data.data());
+        for (size_t i = 0; i < size; ++i)
+            dst[i] = codec == kCodecFP16 ? floatToHalf(vals[i])
+                                         : floatToBF16(vals[i]);
+    } else if (codec == kCodecInt8) {
+        size_t nrows = (size + width - 1) / width;
+        float *scales = data.data();
+        int8_t *dst = reinterpret_cast<int8_t *>(scales + nrows);
+        for (size_t r = 0; r < nrows; ++r) {
+            size_t begin = r * width, end = std::min(begin + width, size);
+            float amax = 0;
+            for (size_t i = begin; i < end; ++i)
+                amax = std::max(amax, std::fabs(vals[i]));
+            float scale = scales[r] = amax / 127;
+            for (size_t i = begin; i < end; ++i)
+                dst[i] = scale > 0 ? (int8_t)std::lrint(vals[i] / scale) : 0;
+        }
+    } else {
+        LOG(FATAL) << "unknown codec " << codec;
+    }
+    return data;
+}
+
+/* decode size values into out */
+inline void decodeValues(int codec, const SArray<float> &data, float *out,
+                         size_t size, size_t width) {
+    CHECK_EQ(data.size(), (codecBytes(codec, size, width) + sizeof(float) - 1)
+                              / sizeof(float))
+        << " encoded size mismatch of " << size << " values, codec " << codec;
+    if (codec == kCodecNone) {
+        std::copy(data.begin(), data.begin() + size, out);
+    } else if (codec == kCodecFP16 || codec == kCodecBF16) {
+        const uint16_t *src = reinterpret_cast<const uint16_t *>(data.data());
+        for (size_t i = 0; i < size; ++i)
+            out[i] = codec == kCodecFP16 ? halfToFloat(src[i])
+                                         : bf16ToFloat(src[i]);
+    } else if (codec == kCodecInt8) {
+        size_t nrows = (size + width - 1) / width;
+        const float *scales = data.data();
+        const int8_t *src = reinterpret_cast<const int8_t *>(scales + nrows);
+        for (size_t i = 0; i < size; ++i)
+            out[i] = src[i] * scales[i / width];
+    } else {
+        LOG(FATAL) << "unknown codec " << codec;
+    }
+}
+
+/* decoded array of size values, the array itself for kCodecNone */
+inline SArray<float> decodeValues(int codec, const SArray<float> &data,
+                                  size_t size, size_t width) {
+    if (codec == kCodecNone)
+        return data;
+    SArray<float> vals(size);
+    decodeValues(codec, data, vals.data(), size, width);
+    return vals;
+}
+
+} // namespace ps
@@ -1,32 +1,58 @@
 #pragma once
 
 #include "PSFunc.h"
+#include "codec.h"
 
 namespace ps {
 
+// the rows of a partition of a striped table into the whole table: local
+// row j of partition part is row j*nparts+part
+inline void stripedScatter(const SArray<float> &val, SArray<float> &tgt,
+                           size_t part, size_t nparts, size_t width) {
+    size_t nrows = val.size() / width;
+    if (nrows > 0)
+        CHECK_LT((nrows - 1) * nparts + part, tgt.size() / width);
+    for (size_t j = 0; j < nrows; ++j) {
+        std::copy(val.begin() + j * width, val.begin() + (j + 1) * width,
+                  tgt.begin() + (j * nparts + part) * width);
+    }
+}
+
 template <>
 struct PSFData<DensePull> {
     static constexpr PsfGroup group = PsfGroup::kParameterServer;
     static constexpr const char* name = "DensePull";
-    using Request = tuple<Key,   // key
-                          size_t // len
+    using Request = tuple<Key,    // key
+                          size_t, // len
+                          int     // codec of the response
                           >;
     using Response = tuple<SArray<float> // data
                            >;
-    static void _callback(const Response &response, SArray<float> tgt) {
-        auto val = get<0>(response);
+    static void _callback(const Response &response, SArray<float> tgt,
+                          int codec) {
+        auto val = decodeValues(codec, get<0>(response), tgt.size(),
+                                kDenseCodecWidth);
         CHECK_EQ(val.size(), tgt.size()) << val.size() << " " << tgt.size();
         std::copy(val.begin(), val.end(), tgt.begin());
     }
+    // tgt is the whole table for striped tables (see stripedScatter)
+    static void _stripedCallback(const Response &response, SArray<float> tgt,
+                                 size_t part, size_t nparts, size_t width,
+                                 int codec, size_t len) {
+        auto val = decodeValues(codec, get<0>(response), len, kDenseCodecWidth);
+        CHECK_EQ(val.size(), len) << val.size() << " " << len;
+        stripedScatter(val, tgt, part, nparts, width);
+    }
 };
 
 template <>
 struct PSFData<DensePush> {
     static constexpr PsfGroup group = PsfGroup::kParameterServer;
     static constexpr const char* name = "DensePush";
-    using Request = tuple<Key,          // key
-                          size_t,       // len
-                          SArray<float> // data
+    using Request = tuple<Key,           // key
+                          size_t,        // len
+                          SArray<float>, // data
+                          int            // codec of data and response
                           >;
     using Response = tuple<>;
     static void _callback(const Response &response) {
@@ -40,8 +66,10 @@ struct PSFData<DDPushPull> {
     using Request = PSFData<DensePush>::Request;
     using Response = PSFData<DensePull>::Response;
 
-    static void _callback(const Response &response, SArray<float> tgt) {
-        auto val = get<0>(response);
+    static void _callback(const Response &response, SArray<float> tgt,
+                          int codec) {
+        auto val = decodeValues(codec, get<0>(response), tgt.size(),
+                                kDenseCodecWidth);
         CHECK_EQ(val.size(), tgt.size()) << val.size() << " " << tgt.size();
         std::copy(val.begin(), val.end(), tgt.begin());
     }
@@ -48,7 +48,7 @@ struct PSFData<ParamSave> {
     static constexpr const char* name = "ParamSave";
     using Request = tuple<Key,
                           SArray<char>, // address
-                          bool          // different from load
+                          bool          // incremental, only changed rows
                           >;
     using Response = tuple<>;
     static void _callback(const Response &response) {
@@ -9,16 +9,18 @@ template <>
 struct PSFData<SparsePull> {
     static constexpr PsfGroup group = PsfGroup::kParameterServer;
     static constexpr const char* name = "SparsePull";
-    using Request = tuple<Key,           // key
-                          SArray<size_t> // offset
+    using Request = tuple<Key,            // key
+                          SArray<size_t>, // offset
+                          int             // codec of the response
                           >;
     using Response = tuple<SArray<float> // data
                            >;
     static void
     _callback(const Response &response, SArray<float> tgt,
               std::vector<std::pair<size_t, std::vector<size_t>>> mapping,
-              size_t offset, size_t width) {
-        auto val = get<0>(response);
+              size_t offset, size_t width, int codec) {
+        auto val = decodeValues(codec, get<0>(response),
+                                mapping.size() * width, width);
         CHECK_EQ(val.size(), mapping.size() * width)
             << val.size() << " " << mapping.size() << " " << width;
         for (size_t i = 0; i < mapping.size(); ++i) {
@@ -37,7 +39,8 @@ struct PSFData<SparsePush> {
     static constexpr const char* name = "SparsePush";
     using Request = tuple<Key,            // key
                           SArray<size_t>, // offset
-                          SArray<float>   // data
+                          SArray<float>,  // data
+                          int             // codec of data
                           >;
     using Response = tuple<>;
     static void _callback(const Response &response) {
@@ -51,15 +54,25 @@ struct PSFData<SDPushPull> {
     using Request = tuple<Key,            // key
                           SArray<size_t>, // offset
                           SArray<float>,  // data
-                          size_t          // len for densepull
+                          size_t,         // len for densepull
+                          int             // codec of data and response
                           >;
     using Response = PSFData<DensePull>::Response;
 
-    static void _callback(const Response &response, SArray<float> tgt) {
-        auto val = get<0>(response);
+    // the pulled rows are encoded in rows of the table width
+    static void _callback(const Response &response, SArray<float> tgt,
+                          size_t width, int codec) {
+        auto val = decodeValues(codec, get<0>(response), tgt.size(), width);
         CHECK_EQ(val.size(), tgt.size()) << val.size() << " " << tgt.size();
         std::copy(val.begin(), val.end(), tgt.begin());
     }
+    // tgt is the whole table for striped tables (see stripedScatter)
+    static void _stripedCallback(const Response &response, SArray<float> tgt,
+                                 size_t part, size_t nparts, size_t width,
+                                 int codec, size_t len) {
+        auto val = decodeValues(codec, get<0>(response), len, width);
+        stripedScatter(val, tgt, part, nparts, width);
+    }
 };
 
 template <>
@@ -69,15 +82,17 @@ struct PSFData<SSPushPull> {
     using Request = tuple<Key,            // key
                           SArray<size_t>, // push offset
                           SArray<float>,  // data
-                          SArray<size_t>  // pull offset
+                          SArray<size_t>, // pull offset
+                          int             // codec of data and response
                           >;
     using Response = PSFData<SparsePull>::Response;
 
     static void
     _callback(const Response &response, SArray<float> tgt,
               std::vector<std::pair<size_t, std::vector<size_t>>> mapping,
-              size_t offset, size_t width) {
-        auto val = get<0>(response);
+              size_t offset, size_t width, int codec) {
+        auto val = decodeValues(codec, get<0>(response),
+                                mapping.size() * width, width);
         if (val.size() > 0) {
             CHECK_EQ(val.size(), mapping.size() * width)
                 << val.size() << " " << mapping.size() << " " << width;
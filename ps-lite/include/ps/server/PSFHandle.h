@@ -1,9 +1,11 @@
 #pragma once
 
 #include "ps/psf/PSFunc.h"
+#include "ps/psf/codec.h"
 
 #include "common/thread_safe_hash_map.h"
 #include "param.h"
+#include "checkpoint.h"
 #include <algorithm>
 #include <utility>
 #include <mutex>
@@ -27,6 +29,7 @@ public:
                PSFData<DensePull>::Response &response) {
         Key k = get<0>(request);
         size_t len = get<1>(request);
+        int codec = get<2>(request);
         SArray<float> &pull_vals = get<0>(response);
 
         auto iter = const_store.find(k);
@@ -41,13 +44,16 @@ public:
         } else {
             LG << "Key does not exist on PS in DensePull" << k;
         }
+        encodeResponse(pull_vals, codec, kDenseCodecWidth);
     }
 
     void serve(const PSFData<DensePush>::Request &request,
                PSFData<DensePush>::Response &response) {
         Key k = get<0>(request);
         size_t len = get<1>(request);
-        SArray<float> vals = get<2>(request);
+        int codec = get<3>(request);
+        SArray<float> vals =
+            decodeValues(codec, get<2>(request), len, kDenseCodecWidth);
 
         if (const_store.find(k) == const_store.end()) {
             store[k] = std::make_shared<Param<float>>(len, OptType::None,
@@ -62,9 +68,10 @@ public:
             auto &value_set_ =
                 *const_cast<typename tmap::mapped_type &>(iter->second);
             auto write_lock = value_set_.write_guard();
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
             for (size_t j = 0; j < value_set_.size(); j++)
                 value_set_[j] += vals[j];
+            value_set_.markDirty(0);
         } else {
             LG << "Key does not exist on PS in DensePull" << k;
         }
@@ -76,7 +83,9 @@ public:
         // with response result
         Key k = get<0>(request);
         size_t len = get<1>(request);
-        SArray<float> vals = get<2>(request);
+        int codec = get<3>(request);
+        SArray<float> vals =
+            decodeValues(codec, get<2>(request), len, kDenseCodecWidth);
         SArray<float> &pull_vals = get<0>(response);
 
         auto iter = const_store.find(k);
@@ -88,14 +97,16 @@ public:
                 << " size mismatch in DDPushPull " << len << " " << data_size;
             pull_vals.resize(data_size);
             auto write_lock = value_set_.write_guard();
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
             for (size_t j = 0; j < data_size; j++) {
                 value_set_[j] += vals[j];
                 pull_vals[j] = value_set_[j];
             }
+            value_set_.markDirty(0);
         } else {
             LG << "Key does not exist on PS in DensePull" << k;
         }
+        encodeResponse(pull_vals, codec, kDenseCodecWidth);
     }
 
     void serve(const PSFData<SparsePull>::Request &request,
@@ -104,6 +115,7 @@ public:
         // with response result
         Key k = get<0>(request);
         SArray<size_t> offset = get<1>(request);
+        int codec = get<2>(request);
         SArray<float> &pull_vals = get<0>(response);
 
         auto iter = const_store.find(k);
@@ -112,14 +124,18 @@ public:
                 *std::dynamic_pointer_cast<Param2D<float>>(iter->second);
             size_t width = value_set_.width;
             pull_vals.resize(offset.size() * width);
-            auto read_lock = value_set_.read_guard();
-#pragma omp parallel for num_threads(4)
-            for (size_t j = 0; j < offset.size(); ++j) {
-                auto value_begin = value_set_.data() + offset[j] * width;
-                auto value_end = value_begin + width;
-                auto dst_begin = pull_vals.data() + j * width;
-                std::copy(value_begin, value_end, dst_begin);
+            {
+                auto read_lock = value_set_.rows_guard(false);
+#pragma omp parallel for num_threads(serverThreads())
+                for (size_t j = 0; j < offset.size(); ++j) {
+                    auto row_lock = value_set_.lockRow(offset[j]);
+                    auto value_begin = value_set_.data() + offset[j] * width;
+                    auto value_end = value_begin + width;
+                    auto dst_begin = pull_vals.data() + j * width;
+                    std::copy(value_begin, value_end, dst_begin);
+                }
             }
+            encodeResponse(pull_vals, codec, width);
         } else {
             // error, the key does not exist on PS.
             LF << "[Error] The pulled key: " << k
@@ -133,13 +149,15 @@ public:
         // no response result
         Key k = get<0>(request);
         SArray<size_t> offsets = get<1>(request);
-        SArray<float> vals = get<2>(request);
+        int codec = get<3>(request);
 
         auto iter = const_store.find(k);
         if (iter != const_store.end()) {
             auto &value_set_ =
                 *std::dynamic_pointer_cast<Param2D<float>>(iter->second);
             size_t width = value_set_.width;
+            SArray<float> vals = decodeValues(codec, get<2>(request),
+                                              offsets.size() * width, width);
 
             CHECK_EQ(vals.size(), offsets.size() * width)
                 << " in Psf::SparsePush check failed,"
@@ -147,14 +165,16 @@ public:
                 << offsets.size() << " size of width is " << width;
 
             // write, discard const qualifier
-            auto write_lock = value_set_.write_guard();
-#pragma omp parallel for num_threads(4)
+            auto write_lock = value_set_.rows_guard(true);
+#pragma omp parallel for num_threads(serverThreads())
             for (size_t j = 0; j < offsets.size(); ++j) {
+                auto row_lock = value_set_.lockRow(offsets[j]);
                 size_t src_offset = j * width;
                 size_t dst_offset = offsets[j] * width;
                 for (size_t k = 0; k < width; ++k) {
                     value_set_[dst_offset + k] += vals[src_offset + k];
                 }
+                value_set_.markDirty(offsets[j]);
             }
         } else {
             // error, the key does not exist on PS.
@@ -169,6 +189,7 @@ public:
         SArray<size_t> offsets = get<1>(request);
         SArray<float> vals = get<2>(request);
         size_t len = get<3>(request);
+        int codec = get<4>(request);
         SArray<float> &pull_vals = get<0>(response);
 
         auto iter = const_store.find(k);
@@ -182,26 +203,33 @@ public:
 
             // sparsepush phase
             if (vals.size() > 0) {
+                vals = decodeValues(codec, vals, offsets.size() * width, width);
                 CHECK_EQ(vals.size(), offsets.size() * width)
                     << " in Psf::SDPushPull check failed,"
                     << " size of vals is " << vals.size() << " size of lens is "
                     << offsets.size() << " size of width is " << width;
 
                 // write, discard const qualifier
-                auto write_lock = value_set_.write_guard();
-#pragma omp parallel for num_threads(4)
+                auto write_lock = value_set_.rows_guard(true);
+#pragma omp parallel for num_threads(serverThreads())
                 for (size_t j = 0; j < offsets.size(); ++j) {
+                    auto row_lock = value_set_.lockRow(offsets[j]);
                     size_t src_offset = j * width;
                     size_t dst_offset = offsets[j] * width;
                     for (size_t k = 0; k < width; ++k) {
                         value_set_[dst_offset + k] += vals[src_offset + k];
                     }
+                    value_set_.markDirty(offsets[j]);
                 }
             }
             // densepull phase
             pull_vals.resize(value_set_.size());
-            auto read_lock = value_set_.read_guard();
-            std::copy(value_set_.begin(), value_set_.end(), pull_vals.begin());
+            {
+                auto read_lock = value_set_.read_guard();
+                std::copy(value_set_.begin(), value_set_.end(),
+                          pull_vals.begin());
+            }
+            encodeResponse(pull_vals, codec, width);
         } else {
             // error, the key does not exist on PS.
             LF << "[Error] The pushed key: " << k
@@ -215,6 +243,7 @@ public:
         SArray<size_t> push_offsets = get<1>(request);
         SArray<float> vals = get<2>(request);
         SArray<size_t> pull_offsets = get<3>(request);
+        int codec = get<4>(request);
         SArray<float> &pull_vals = get<0>(response);
 
         auto iter = const_store.find(k);
@@ -225,35 +254,43 @@ public:
 
             // sparsepush phase
             if (vals.size() > 0) {
+                vals = decodeValues(codec, vals, push_offsets.size() * width,
+                                    width);
                 CHECK_EQ(vals.size(), push_offsets.size() * width)
                     << " in Psf::SSPushPull check failed,"
                     << " size of vals is " << vals.size() << " size of lens is "
                     << push_offsets.size() << " size of width is " << width;
 
                 // write, discard const qualifier
-                auto write_lock = value_set_.write_guard();
-#pragma omp parallel for num_threads(4)
+                auto write_lock = value_set_.rows_guard(true);
+#pragma omp parallel for num_threads(serverThreads())
                 for (size_t j = 0; j < push_offsets.size(); ++j) {
+                    auto row_lock = value_set_.lockRow(push_offsets[j]);
                     size_t src_offset = j * width;
                     size_t dst_offset = push_offsets[j] * width;
                     for (size_t k = 0; k < width; ++k) {
                         value_set_[dst_offset + k] += vals[src_offset + k];
                     }
+                    value_set_.markDirty(push_offsets[j]);
                 }
             }
 
             // sparsepull phase
             if (pull_offsets.size() > 0) {
                 pull_vals.resize(pull_offsets.size() * width);
-                auto read_lock = value_set_.read_guard();
-#pragma omp parallel for num_threads(4)
-                for (size_t j = 0; j < pull_offsets.size(); ++j) {
-                    auto val_begin =
-                        value_set_.begin() + pull_offsets[j] * width;
-                    auto val_end = val_begin + width;
-                    auto dst_begin = pull_vals.begin() + j * width;
-                    std::copy(val_begin, val_end, dst_begin);
+                {
+                    auto read_lock = value_set_.rows_guard(false);
+#pragma omp parallel for num_threads(serverThreads())
+                    for (size_t j = 0; j < pull_offsets.size(); ++j) {
+                        auto row_lock = value_set_.lockRow(pull_offsets[j]);
+                        auto val_begin =
+                            value_set_.begin() + pull_offsets[j] * width;
+                        auto val_end = val_begin + width;
+                        auto dst_begin = pull_vals.begin() + j * width;
+                        std::copy(val_begin, val_end, dst_begin);
+                    }
                 }
+                encodeResponse(pull_vals, codec, width);
             }
         } else {
             // error, the key does not exist on PS.
@@ -313,7 +350,7 @@ public:
             n_threads = 16;
         if (init_type == InitType::Constant) {
             float filled_value = static_cast<float>(init_a);
-            // #pragma omp parallel for num_threads(4)
+            // #pragma omp parallel for num_threads(serverThreads())
             for (size_t j = 0; j < value_set_.size(); j++)
                 value_set_[j] = filled_value;
         } else if (init_type == InitType::Uniform) {
@@ -390,15 +427,12 @@ public:
                PSFData<ParamSave>::Response &response) {
         Key k = get<0>(request);
         SArray<char> address = get<1>(request);
+        bool incremental = get<2>(request);
         auto iter = store.find(k);
         if (iter != store.end()) {
-            auto &value_set_ = *iter->second;
-            auto read_lock = value_set_.read_guard();
-            std::ofstream fout(
-                std::string(address.data(), address.size()).c_str(),
-                std::ios::binary);
-            fout.write((char *)value_set_.data(),
-                       value_set_.size() * sizeof(float));
+            saveCheckpoint(*iter->second,
+                           std::string(address.data(), address.size()),
+                           incremental);
         } else {
             // error, the key does not exist on PS.
             LF << "[Error] The pushed key: " << k
@@ -412,13 +446,8 @@ public:
         SArray<char> address = get<1>(request);
         auto iter = store.find(k);
         if (iter != store.end()) {
-            auto &value_set_ = *iter->second;
-            auto write_lock = value_set_.write_guard();
-            std::ifstream fin(
-                std::string(address.data(), address.size()).c_str(),
-                std::ios::binary);
-            fin.read((char *)value_set_.data(),
-                     value_set_.size() * sizeof(float));
+            loadCheckpoint(*iter->second,
+                           std::string(address.data(), address.size()));
         } else {
             // error, the key does not exist on PS.
             LF << "[Error] The pushed key: " << k
@@ -427,6 +456,14 @@ public:
     }
 
 private:
+    // encode the pulled values of a response for the wire
+    static void encodeResponse(SArray<float> &pull_vals, int codec,
+                               size_t width) {
+        if (codec != kCodecNone)
+            pull_vals = encodeValues(codec, pull_vals.data(),
+                                     pull_vals.size(), width);
+    }
+
     bool try_init_with_no_conflict(Key key) {
         static std::mutex init_mtx;
         std::lock_guard<std::mutex> lock(init_mtx);
@@ -0,0 +1,308 @@
+#pragma once
+
+#include "ps/server/param.h"
+#include "common/logging.h"
+
+#include <algorithm>
+#include <cerrno>
+#include <cstdio>
+#include <cstring>
+#include <fcntl.h>
+#include <omp.h>
+#include <string>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <vector>
+
+namespace ps {
+
+/*
+ * Checkpoint files of one Param partition, under the address given by the
+ * worker (<dir>/<name>_<part>.dat):
+ *   <address>            the values, raw, same layout as before
+ *   <address>.opt        optimizer states (and row versions of cache tables)
+ *   <address>.delta.<n>  the rows changed since delta n-1 (or the base)
+ * A full save writes the base and drops old deltas; an incremental save
+ * writes the next delta, or a base if there is none at this address yet.
+ * Loading reads the base and replays the deltas in order.
+ *
+ * Delta layout: CkptHeader, scalar states, row ids, row values, then the rows
+ * of each optimizer state and the row versions.
+ */
+
+struct CkptHeader {
+    uint64_t magic;
+    uint64_t num_rows;
+    uint64_t width;
+    uint64_t num_states;
+    uint64_t num_scalars;
+    uint64_t has_version;
+};
+
+const uint64_t kCkptMagic = 0x4b434f4e55544548; // "HETUNOCK"
+const size_t kCkptChunk = 64 << 20;            // bytes per I/O call
+const int kCkptThreads = 8;
+
+inline void ckptWriteAt(int fd, const char *buf, size_t size, size_t offset) {
+    while (size > 0) {
+        ssize_t n = pwrite(fd, buf, size, offset);
+        CHECK(n > 0 || (n < 0 && errno == EINTR))
+            << "checkpoint write: " << (n == 0 ? "no progress" : strerror(errno));
+        if (n <= 0)
+            continue;
+        buf += n, size -= n, offset += n;
+    }
+}
+
+inline void ckptReadAt(int fd, char *buf, size_t size, size_t offset) {
+    while (size > 0) {
+        ssize_t n = pread(fd, buf, size, offset);
+        CHECK(n > 0 || (n < 0 && errno == EINTR))
+            << "checkpoint read: " << (n == 0 ? "truncated" : strerror(errno));
+        if (n <= 0)
+            continue;
+        buf += n, size -= n, offset += n;
+    }
+}
+
+// split a large buffer into chunks written/read by several threads
+inline void ckptParallelIO(int fd, char *buf, size_t size, size_t offset,
+                           bool write) {
+    size_t nchunks = (size + kCkptChunk - 1) / kCkptChunk;
+#pragma omp parallel for num_threads(kCkptThreads) schedule(dynamic)
+    for (size_t i = 0; i < nchunks; ++i) {
+        size_t begin = i * kCkptChunk;
+        size_t len = std::min(kCkptChunk, size - begin);
+        if (write)
+            ckptWriteAt(fd, buf + begin, len, offset + begin);
+        else
+            ckptReadAt(fd, buf + begin, len, offset + begin);
+    }
+}
+
+inline int ckptOpen(const std::string &path, bool write) {
+    int fd = write ? open(path.c_str(), O_WRONLY | O_CREAT | O_TRUNC, 0644) :
+                     open(path.c_str(), O_RDONLY);
+    CHECK_GE(fd, 0) << "cannot open checkpoint " << path << ": "
+                    << strerror(errno);
+    return fd;
+}
+
+inline bool ckptExists(const std::string &path) {
+    struct stat st;
+    return stat(path.c_str(), &st) == 0;
+}
+
+inline std::string ckptDelta(const std::string &address, size_t seq) {
+    return address + ".delta." + std::to_string(seq);
+}
+
+template <typename V>
+version_t *ckptVersions(Param<V> &param) {
+    if (param.type() != kCacheTable)
+        return nullptr;
+    return static_cast<CacheTable<V> &>(param).ver;
+}
+
+template <typename V>
+std::vector<V *> ckptStates(Param<V> &param) {
+    auto opt = param.optimizer();
+    return opt ? opt->States() : std::vector<V *>();
+}
+
+template <typename V>
+std::vector<float *> ckptScalars(Param<V> &param) {
+    auto opt = param.optimizer();
+    return opt ? opt->Scalars() : std::vector<float *>();
+}
+
+// call with the read lock held
+template <typename V>
+void ckptSaveBase(Param<V> &param, const std::string &address) {
+    int fd = ckptOpen(address, true);
+    ckptParallelIO(fd, (char *)param.data(), param.size() * sizeof(V), 0,
+                   true);
+    close(fd);
+
+    auto states = ckptStates(param);
+    auto scalars = ckptScalars(param);
+    version_t *ver = ckptVersions(param);
+    CkptHeader header{kCkptMagic,     param.rows(),   param.rowWidth(),
+                      states.size(), scalars.size(), ver != nullptr};
+    fd = ckptOpen(address + ".opt", true);
+    size_t offset = 0;
+    ckptWriteAt(fd, (char *)&header, sizeof(header), offset);
+    offset += sizeof(header);
+    for (auto scalar : scalars) {
+        ckptWriteAt(fd, (char *)scalar, sizeof(float), offset);
+        offset += sizeof(float);
+    }
+    for (auto state : states) {
+        ckptParallelIO(fd, (char *)state, param.size() * sizeof(V), offset,
+                       true);
+        offset += param.size() * sizeof(V);
+    }
+    if (ver)
+        ckptParallelIO(fd, (char *)ver, param.rows() * sizeof(version_t),
+                       offset, true);
+    close(fd);
+
+    for (size_t seq = 1; ckptExists(ckptDelta(address, seq)); ++seq)
+        std::remove(ckptDelta(address, seq).c_str());
+    std::fill(param.dirty.begin(), param.dirty.end(), 0);
+}
+
+// gather the dirty rows under the read lock, then write without it
+template <typename V>
+void ckptSaveDelta(Param<V> &param, const std::string &path) {
+    std::vector<char> buf;
+    {
+        auto read_lock = param.read_guard();
+        std::vector<uint64_t> rows;
+        for (size_t i = 0; i < param.dirty.size(); ++i)
+            if (param.dirty[i])
+                rows.push_back(i);
+        auto states = ckptStates(param);
+        auto scalars = ckptScalars(param);
+        version_t *ver = ckptVersions(param);
+        size_t width = param.rowWidth(), row_bytes = width * sizeof(V);
+        CkptHeader header{kCkptMagic,     rows.size(),    width,
+                          states.size(), scalars.size(), ver != nullptr};
+        buf.resize(sizeof(header) + scalars.size() * sizeof(float)
+                   + rows.size() * sizeof(uint64_t)
+                   + rows.size() * row_bytes * (1 + states.size())
+                   + (ver ? rows.size() * sizeof(version_t) : 0));
+        char *ptr = buf.data();
+        std::memcpy(ptr, &header, sizeof(header));
+        ptr += sizeof(header);
+        for (auto scalar : scalars) {
+            std::memcpy(ptr, scalar, sizeof(float));
+            ptr += sizeof(float);
+        }
+        std::memcpy(ptr, rows.data(), rows.size() * sizeof(uint64_t));
+        ptr += rows.size() * sizeof(uint64_t);
+        states.insert(states.begin(), param.data());
+        for (auto state : states) {
+            V *dst = reinterpret_cast<V *>(ptr);
+#pragma omp parallel for num_threads(serverThreads())
+            for (size_t j = 0; j < rows.size(); ++j)
+                std::copy(state + rows[j] * width,
+                          state + (rows[j] + 1) * width, dst + j * width);
+            ptr += rows.size() * row_bytes;
+        }
+        if (ver) {
+            version_t *dst = reinterpret_cast<version_t *>(ptr);
+            for (size_t j = 0; j < rows.size(); ++j)
+                dst[j] = ver[rows[j]];
+        }
+        std::fill(param.dirty.begin(), param.dirty.end(), 0);
+    }
+    int fd = ckptOpen(path, true);
+    ckptParallelIO(fd, buf.data(), buf.size(), 0, true);
+    close(fd);
+}
+
+template <typename V>
+void saveCheckpoint(Param<V> &param, const std::string &address,
+                    bool incremental) {
+    std::lock_guard<std::mutex> lock(param.ckpt.mtx);
+    if (incremental && param.ckpt.address == address) {
+        ckptSaveDelta(param, ckptDelta(address, ++param.ckpt.seq));
+        return;
+    }
+    auto read_lock = param.read_guard();
+    ckptSaveBase(param, address);
+    param.ckpt.address = address;
+    param.ckpt.seq = 0;
+}
+
+template <typename V>
+void loadCheckpoint(Param<V> &param, const std::string &address) {
+    std::lock_guard<std::mutex> lock(param.ckpt.mtx);
+    auto write_lock = param.write_guard();
+    int fd = ckptOpen(address, false);
+    ckptParallelIO(fd, (char *)param.data(), param.size() * sizeof(V), 0,
+                   false);
+    close(fd);
+
+    auto states = ckptStates(param);
+    auto scalars = ckptScalars(param);
+    version_t *ver = ckptVersions(param);
+    size_t width = param.rowWidth();
+    // legacy checkpoints have no optimizer states
+    if (ckptExists(address + ".opt")) {
+        fd = ckptOpen(address + ".opt", false);
+        CkptHeader header;
+        size_t offset = 0;
+        ckptReadAt(fd, (char *)&header, sizeof(header), offset);
+        offset += sizeof(header);
+        CHECK_EQ(header.magic, kCkptMagic) << "bad checkpoint " << address;
+        CHECK_EQ(header.width, width) << "width mismatch in " << address;
+        CHECK_EQ(header.num_states, states.size())
+            << "optimizer mismatch in " << address;
+        CHECK_EQ(header.num_scalars, scalars.size())
+            << "optimizer mismatch in " << address;
+        for (auto scalar : scalars) {
+            ckptReadAt(fd, (char *)scalar, sizeof(float), offset);
+            offset += sizeof(float);
+        }
+        for (auto state : states) {
+            ckptParallelIO(fd, (char *)state, param.size() * sizeof(V), offset,
+                           false);
+            offset += param.size() * sizeof(V);
+        }
+        if (ver && header.has_version)
+            ckptParallelIO(fd, (char *)ver, param.rows() * sizeof(version_t),
+                           offset, false);
+        close(fd);
+    }
+
+    size_t seq = 0;
+    for (; ckptExists(ckptDelta(address, seq + 1)); ++seq) {
+        std::string path = ckptDelta(address, seq + 1);
+        fd = ckptOpen(path, false);
+        struct stat st;
+        fstat(fd, &st);
+        std::vector<char> buf(st.st_size);
+        ckptParallelIO(fd, buf.data(), buf.size(), 0, false);
+        close(fd);
+
+        const char *ptr = buf.data();
+        CkptHeader header;
+        std::memcpy(&header, ptr, sizeof(header));
+        ptr += sizeof(header);
+        CHECK_EQ(header.magic, kCkptMagic) << "bad checkpoint " << path;
+        CHECK_EQ(header.width, width) << "width mismatch in " << path;
+        CHECK_EQ(header.num_states, states.size())
+            << "optimizer mismatch in " << path;
+        CHECK_EQ(header.num_scalars, scalars.size())
+            << "optimizer mismatch in " << path;
+        for (auto scalar : scalars) {
+            std::memcpy(scalar, ptr, sizeof(float));
+            ptr += sizeof(float);
+        }
+        size_t nrows = header.num_rows;
+        const uint64_t *rows = reinterpret_cast<const uint64_t *>(ptr);
+        ptr += nrows * sizeof(uint64_t);
+        std::vector<V *> targets(states);
+        targets.insert(targets.begin(), param.data());
+        for (auto target : targets) {
+            const V *src = reinterpret_cast<const V *>(ptr);
+#pragma omp parallel for num_threads(serverThreads())
+            for (size_t j = 0; j < nrows; ++j)
+                std::copy(src + j * width, src + (j + 1) * width,
+                          target + rows[j] * width);
+            ptr += nrows * width * sizeof(V);
+        }
+        if (ver && header.has_version) {
+            const version_t *src = reinterpret_cast<const version_t *>(ptr);
+            for (size_t j = 0; j < nrows; ++j)
+                ver[rows[j]] = src[j];
+        }
+    }
+    std::fill(param.dirty.begin(), param.dirty.end(), 0);
+    param.ckpt.address = address;
+    param.ckpt.seq = seq;
+}
+
+} // namespace ps
@@ -0,0 +1,52 @@
+#pragma once
+
+#include "ps/internal/utils.h"
+
+#include <algorithm>
+#include <string>
+
+namespace ps {
+
+/*
+ * Server settings, read once from the environment:
+ *   PS_SERVER_OMP_THREADS  threads of the OpenMP loops applying pushes and
+ *                          copying pulls (default 4)
+ *   PS_RECV_THREADS        threads serving the messages of a customer
+ *                          (default 5)
+ *   PS_LOCK_MODE           table: one read-write lock per param (default)
+ *                          row: rows are locked by stripes, so that pushes
+ *                          and pulls of disjoint rows run concurrently
+ *   PS_LOCK_STRIPES        row lock stripes of each param (default 1024)
+ *   PS_SSP_TIMEOUT         ms an SSP sync may be parked before it is answered
+ *                          false and retried by the worker (default 0: none)
+ */
+struct ServerConfig {
+    int omp_threads;
+    int recv_threads;
+    bool row_lock;
+    size_t lock_stripes;
+    int ssp_timeout_ms;
+
+    static const ServerConfig &Get() {
+        static ServerConfig config;
+        return config;
+    }
+
+private:
+    ServerConfig() {
+        omp_threads = std::max(GetEnv("PS_SERVER_OMP_THREADS", 4), 1);
+        recv_threads = std::max(GetEnv("PS_RECV_THREADS", 5), 1);
+        std::string mode = GetEnv("PS_LOCK_MODE", std::string("table"));
+        CHECK(mode == "table" || mode == "row")
+            << "unknown PS_LOCK_MODE " << mode;
+        row_lock = mode == "row";
+        lock_stripes = std::max(GetEnv("PS_LOCK_STRIPES", 1024), 1);
+        ssp_timeout_ms = std::max(GetEnv("PS_SSP_TIMEOUT", 0), 0);
+    }
+};
+
+inline int serverThreads() {
+    return ServerConfig::Get().omp_threads;
+}
+
+} // namespace ps
@@ -40,10 +40,15 @@ private:
         auto handler = std::dynamic_pointer_cast<PSHandler<group>>(handler_[static_cast<int>(group)]);
         assert(handler);
         handler->serve(request, response);
+        respond(msg.meta, response);
+    }
+
+    template <typename Response>
+    void respond(const Meta &meta, const Response &response) {
         Message rmsg;
         tupleEncode(response, rmsg.data);
-        rmsg.meta = msg.meta;
-        rmsg.meta.recver = msg.meta.sender;
+        rmsg.meta = meta;
+        rmsg.meta.recver = meta.sender;
         rmsg.meta.request = false;
         Postoffice::Get()->van()->Send(rmsg);
     }
@@ -54,4 +59,19 @@ private:
     friend struct KVAppRegisterHelper;
 };
 
+// SSP syncs are parked by the handler and answered later, without holding a
+// receiving thread
+template <>
+inline void KVServer::onReceive<kSSPSync>(const Message &msg) {
+    PSFData<kSSPSync>::Request request;
+    tupleDecode(request, msg.data);
+    auto handler = std::dynamic_pointer_cast<PSHandler<PsfGroup::kSSPControl>>(
+        handler_[static_cast<int>(PsfGroup::kSSPControl)]);
+    assert(handler);
+    Meta meta = msg.meta;
+    handler->serve(request, [this, meta](const PSFData<kSSPSync>::Response &response) {
+        respond(meta, response);
+    });
+}
+
 } // namespace ps
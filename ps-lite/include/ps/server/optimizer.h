@@ -1,6 +1,7 @@
 #pragma once
 
 #include <cmath>
+#include <vector>
 #include "ps/server/param.h"
 
 namespace ps {
@@ -30,6 +31,14 @@ public:
     virtual void ApplyCache(CacheTable<V> &param, SArray<version_t> &updates,
                             SArray<size_t> &offsets, SArray<V> &grads);
     virtual void InitStates(size_t size);
+    // element-wise states (each as long as the param) and scalar states,
+    // saved along with the param in checkpoints
+    virtual std::vector<V *> States() {
+        return {};
+    }
+    virtual std::vector<float *> Scalars() {
+        return {};
+    }
 };
 
 template <typename V>
@@ -39,7 +48,7 @@ public:
     }
 
     void ApplyDense(Param<V> &param, SArray<V> &grads) {
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < param.size(); ++j) {
             param[j] -= lr * grads[j];
         }
@@ -48,8 +57,9 @@ public:
     void ApplySparse(Param2D<V> &param, SArray<size_t> &offsets,
                      SArray<V> &grads) {
         size_t width = param.width;
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < offsets.size(); ++j) {
+            auto row_lock = param.lockRow(offsets[j]);
             size_t src_offset = j * width;
             size_t dst_offset = offsets[j] * width;
             for (size_t k = 0; k < width; ++k) {
@@ -63,6 +73,7 @@ public:
         size_t width = param.width;
         // #pragma omp parallel for num_threads(4)
         for (size_t j = 0; j < offsets.size(); ++j) {
+            auto row_lock = param.lockRow(offsets[j]);
             param.ver[offsets[j]] += updates[j];
             size_t src_offset = j * width;
             size_t dst_offset = offsets[j] * width;
@@ -88,7 +99,7 @@ public:
     }
 
     void ApplyDense(Param<V> &param, SArray<V> &grads) {
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < param.size(); ++j) {
             velocity[j] = moment * velocity[j] - lr * grads[j];
             param[j] = param[j] + velocity[j];
@@ -98,8 +109,9 @@ public:
     void ApplySparse(Param2D<V> &param, SArray<size_t> &offsets,
                      SArray<V> &grads) {
         size_t width = param.width;
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < offsets.size(); ++j) {
+            auto row_lock = param.lockRow(offsets[j]);
             size_t src_offset = j * width;
             size_t dst_offset = offsets[j] * width;
             for (size_t k = 0; k < width; ++k) {
@@ -117,6 +129,7 @@ public:
         size_t width = param.width;
         // #pragma omp parallel for num_threads(4)
         for (size_t j = 0; j < offsets.size(); ++j) {
+            auto row_lock = param.lockRow(offsets[j]);
             param.ver[offsets[j]] += updates[j];
             size_t src_offset = j * width;
             size_t dst_offset = offsets[j] * width;
@@ -134,6 +147,10 @@ public:
         velocity = new V[size]();
     }
 
+    std::vector<V *> States() {
+        return {velocity};
+    }
+
 private:
     float lr;
     float moment;
@@ -148,7 +165,7 @@ public:
     }
 
     void ApplyDense(Param<V> &param, SArray<V> &grads) {
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < param.size(); ++j) {
             V temp = -lr * grads[j];
             velocity[j] = moment * (velocity[j] + temp);
@@ -159,8 +176,9 @@ public:
     void ApplySparse(Param2D<V> &param, SArray<size_t> &offsets,
                      SArray<V> &grads) {
         size_t width = param.width;
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < offsets.size(); ++j) {
+            auto row_lock = param.lockRow(offsets[j]);
             size_t src_offset = j * width;
             size_t dst_offset = offsets[j] * width;
             for (size_t k = 0; k < width; ++k) {
@@ -178,6 +196,7 @@ public:
         size_t width = param.width;
         // #pragma omp parallel for num_threads(4)
         for (size_t j = 0; j < offsets.size(); ++j) {
+            auto row_lock = param.lockRow(offsets[j]);
             param.ver[offsets[j]] += updates[j];
             size_t src_offset = j * width;
             size_t dst_offset = offsets[j] * width;
@@ -195,6 +214,10 @@ public:
         velocity = new V[size]();
     }
 
+    std::vector<V *> States() {
+        return {velocity};
+    }
+
 private:
     float lr;
     float moment;
@@ -211,7 +234,7 @@ public:
     }
 
     void ApplyDense(Param<V> &param, SArray<V> &grads) {
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < param.size(); ++j) {
             accum[j] = accum[j] + grads[j] * grads[j];
             param[j] = param[j] - lr * grads[j] / (sqrt(accum[j]) + eps);
@@ -221,8 +244,9 @@ public:
     void ApplySparse(Param2D<V> &param, SArray<size_t> &offsets,
                      SArray<V> &grads) {
         size_t width = param.width;
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < offsets.size(); ++j) {
+            auto row_lock = param.lockRow(offsets[j]);
             size_t src_offset = j * width;
             size_t dst_offset = offsets[j] * width;
             for (size_t k = 0; k < width; ++k) {
@@ -242,6 +266,7 @@ public:
         size_t width = param.width;
         // #pragma omp parallel for num_threads(4)
         for (size_t j = 0; j < offsets.size(); ++j) {
+            auto row_lock = param.lockRow(offsets[j]);
             param.ver[offsets[j]] += updates[j];
             size_t src_offset = j * width;
             size_t dst_offset = offsets[j] * width;
@@ -259,11 +284,15 @@ public:
 
     void InitStates(size_t size) {
         accum = new V[size];
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < size; ++j)
             accum[j] = init;
     }
 
+    std::vector<V *> States() {
+        return {accum};
+    }
+
 private:
     float lr;
     float init;
@@ -285,7 +314,7 @@ public:
     void ApplyDense(Param<V> &param, SArray<V> &grads) {
         b1t = b1t * b1;
         b2t = b2t * b2;
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < param.size(); ++j) {
             marr[j] = b1 * marr[j] + (1 - b1) * grads[j];
             varr[j] = b2 * varr[j] + (1 - b2) * grads[j] * grads[j];
@@ -298,8 +327,9 @@ public:
     void ApplySparse(Param2D<V> &param, SArray<size_t> &offsets,
                      SArray<V> &grads) {
         size_t width = param.width;
-#pragma omp parallel for num_threads(4)
+#pragma omp parallel for num_threads(serverThreads())
         for (size_t j = 0; j < offsets.size(); ++j) {
+            auto row_lock = param.lockRow(offsets[j]);
             size_t src_offset = j * width;
             size_t dst_offset = offsets[j] * width;
             for (size_t k = 0; k < width; ++k) {
@@ -321,6 +351,7 @@ public:
         size_t width = param.width;
         // #pragma omp parallel for num_threads(4)
         for (size_t j = 0; j < offsets.size(); ++j) {
+            auto row_lock = param.lockRow(offsets[j]);
             param.ver[offsets[j]] += updates[j];
             size_t src_offset = j * width;
             size_t dst_offset = offsets[j] * width;
@@ -343,6 +374,13 @@ public:
         varr = new V[size]();
     }
 
+    std::vector<V *> States() {
+        return {marr, varr};
+    }
+    std::vector<float *> Scalars() {
+        return {&b1t, &b2t};
+    }
+
 private:
     float lr;
     float b1;
@@ -1,9 +1,14 @@
 #pragma once
 
+#include <cstdint>
+#include <memory>
+#include <mutex>
+#include <string>
 #include <vector>
 
 #include "common/shared_mutex.h"
 #include "ps/psf/PSFunc.h"
+#include "ps/server/config.h"
 #include "ps/server/optimizer.h"
 
 namespace ps {
@@ -14,8 +19,31 @@ enum ParamType {
     kCacheTable,
 };
 
+// RAII lock of a shared_mutex, exclusive or shared as chosen at runtime
+class ParamGuard {
+public:
+    ParamGuard(shared_mutex<4> &mtx, bool exclusive) :
+        mtx_(&mtx), exclusive_(exclusive) {
+        exclusive_ ? mtx_->lock() : mtx_->lock_shared();
+    }
+    ParamGuard(ParamGuard &&other) noexcept :
+        mtx_(other.mtx_), exclusive_(other.exclusive_) {
+        other.mtx_ = nullptr;
+    }
+    ~ParamGuard() {
+        if (mtx_)
+            exclusive_ ? mtx_->unlock() : mtx_->unlock_shared();
+    }
+
+private:
+    shared_mutex<4> *mtx_;
+    bool exclusive_;
+};
+
 /*
-  Param with a read-write lock
+  Param with a read-write lock. In row lock mode (PS_LOCK_MODE=row) accesses
+  to some rows hold the lock shared and lock each row by a stripe, while
+  accesses to the whole param hold it exclusively.
 */
 template <typename V>
 class Param {
@@ -23,6 +51,11 @@ public:
     explicit Param(size_t size, OptType otype, SArray<float> lrs) {
         vec_ = new V[size]();
         size_ = size;
+        dirty.assign(1, 0);
+        if (ServerConfig::Get().row_lock) {
+            num_stripes_ = ServerConfig::Get().lock_stripes;
+            stripes_.reset(new std::mutex[num_stripes_]);
+        }
         switch (otype) {
         case SGD:
             opt = new SGDOptimizer<V>(lrs[0]);
@@ -52,12 +85,22 @@ public:
 
     Param(const Param &) = delete;
 
-    s_lock<4> read_guard() const noexcept {
-        return s_lock<4>(mtx);
+    ParamGuard read_guard() const noexcept {
+        return ParamGuard(mtx, stripes_ != nullptr);
     }
     x_lock<4> write_guard() noexcept {
         return x_lock<4>(mtx);
     }
+    // for pushes (write) and pulls of some rows, each row under lockRow
+    ParamGuard rows_guard(bool write) const noexcept {
+        return ParamGuard(mtx, write && !stripes_);
+    }
+    // lock a row under rows_guard, no-op with table locks
+    std::unique_lock<std::mutex> lockRow(size_t row) const {
+        if (!stripes_)
+            return std::unique_lock<std::mutex>();
+        return std::unique_lock<std::mutex>(stripes_[row % num_stripes_]);
+    }
 
     inline const V *data() const {
         return vec_;
@@ -83,13 +126,40 @@ public:
     virtual ParamType type() {
         return kParam;
     }
+    // number of elements in a row, the unit of dirty tracking; dense params
+    // are a single row
+    virtual size_t rowWidth() const {
+        return size_;
+    }
+    inline size_t rows() const {
+        return size_ / rowWidth();
+    }
+    // call with the write lock held
+    inline void markDirty(size_t row) {
+        dirty[row] = 1;
+    }
+    inline Optimizer<V> *optimizer() {
+        return opt;
+    }
     void updateDense(SArray<V> &grads) {
         auto write_lock = write_guard();
         opt->ApplyDense(*this, grads);
+        markDirty(0);
     }
 
+    // rows changed since the last checkpoint
+    std::vector<uint8_t> dirty;
+    // last checkpoint written, incremental saves append deltas to it
+    struct {
+        std::mutex mtx;
+        std::string address;
+        size_t seq = 0;
+    } ckpt;
+
 private:
     mutable shared_mutex<4> mtx;
+    std::unique_ptr<std::mutex[]> stripes_;
+    size_t num_stripes_ = 0;
     V *vec_;
     size_t size_;
 
@@ -104,14 +174,20 @@ public:
         Param<V>(len * wid, otype, lrs) {
         length = len;
         width = wid;
+        this->dirty.assign(len, 0);
     }
     void updateSparse(SArray<size_t> &offsets, SArray<V> &grads) {
-        auto write_lock = this->write_guard();
+        auto write_lock = this->rows_guard(true);
         this->opt->ApplySparse(*this, offsets, grads);
+        for (auto offset : offsets)
+            this->markDirty(offset);
     }
     ParamType type() {
         return kParam2D;
     }
+    size_t rowWidth() const {
+        return width;
+    }
     size_t length, width;
 };
 
@@ -128,8 +204,10 @@ public:
     }
     void updateCache(SArray<version_t> &updates, SArray<size_t> &offsets,
                      SArray<V> &grads) {
-        auto write_lock = this->write_guard();
+        auto write_lock = this->rows_guard(true);
         this->opt->ApplyCache(*this, updates, offsets, grads);
+        for (auto offset : offsets)
+            this->markDirty(offset);
     }
     ParamType type() {
         return kCacheTable;
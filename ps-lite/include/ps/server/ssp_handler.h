@@ -1,20 +1,57 @@
 #pragma once
 
 #include "ps/psf/PSFunc.h"
+#include "ps/internal/postoffice.h"
+#include "ps/server/config.h"
 
 #include <unordered_map>
 #include <algorithm>
+#include <chrono>
+#include <condition_variable>
+#include <functional>
+#include <map>
 #include <mutex>
+#include <thread>
+#include <vector>
 
 namespace ps {
 
+/*
+ * SSP barrier. A kSSPSync request is parked until the group is fully
+ * initialized and no worker is more than tolerance versions behind it, then
+ * answered true. With PS_SSP_TIMEOUT (ms, default 0 = none) a request parked
+ * for longer is answered false, and the worker asks again.
+ */
 template<>
 class PSHandler<PsfGroup::kSSPControl> : public PSHandler<PsfGroup::kBaseGroup> {
 public:
+    using Reply = std::function<void(const PSFData<kSSPSync>::Response &)>;
+
     PSHandler<PsfGroup::kSSPControl>() {
+        timeout_ = std::chrono::milliseconds(ServerConfig::Get().ssp_timeout_ms);
+        if (timeout_.count() > 0)
+            timer_ = std::thread(&PSHandler<PsfGroup::kSSPControl>::expire, this);
     }
     PSHandler<PsfGroup::kSSPControl>(const PSHandler<PsfGroup::kSSPControl> &handle) {
     }
+    ~PSHandler<PsfGroup::kSSPControl>() {
+        {
+            std::lock_guard<std::mutex> lock(mtx_);
+            stop_ = true;
+        }
+        cv_.notify_all();
+        if (timer_.joinable())
+            timer_.join();
+        for (const auto &p : map_) {
+            for (const auto &s : p.second.rank2wait) {
+                PS_VLOG(1) << "SSP key " << p.first << " rank " << s.first
+                           << ": waited " << s.second.count << " times, "
+                           << s.second.total_ms << " ms in total, at most "
+                           << s.second.max_ms << " ms, " << s.second.timeouts
+                           << " timeouts";
+            }
+        }
+    }
 
     void serve(const PSFData<kSSPInit>::Request &request,
                PSFData<kSSPInit>::Response &response) {
@@ -23,60 +60,139 @@ public:
         size_t group_size = get<2>(request);
         ssp_version_t tol = get<3>(request);
 
-        std::lock_guard<std::mutex> lock(mtx_);
-        if (map_.find(k) == map_.end()) {
-            map_[k] = SSPInternalState();
-            map_[k].tolerance = tol;
-            map_[k].group_size = group_size;
+        std::vector<Reply> replies;
+        {
+            std::lock_guard<std::mutex> lock(mtx_);
+            if (map_.find(k) == map_.end()) {
+                map_[k] = SSPInternalState();
+                map_[k].tolerance = tol;
+                map_[k].group_size = group_size;
+            }
+            SSPInternalState &state = map_[k];
+            CHECK_EQ(state.tolerance, tol) << "kSSPInit : tolerance mismatch";
+            CHECK_EQ(state.group_size, group_size) << "kSSPInit : group size mismatch";
+            CHECK(!state.rank2version.count(rank)) << "kSSPInit : duplicated init";
+            state.rank2version[rank] = 0;
+            CHECK_LE(state.rank2version.size(), group_size) << "kSSPInit : group size larger than desired";
+            release(state, replies);
         }
-        SSPInternalState &state = map_[k];
-        CHECK_EQ(state.tolerance, tol) << "kSSPInit : tolerance mismatch";
-        CHECK_EQ(state.group_size, group_size) << "kSSPInit : group size mismatch";
-        CHECK(!state.rank2version.count(rank)) << "kSSPInit : duplicated init";
-        state.rank2version[rank] = 0;
-        CHECK_LE(state.rank2version.size(), group_size) << "kSSPInit : group size larger than desired";
+        answer(replies, true);
         return;
     }
 
-    void serve(const PSFData<kSSPSync>::Request &request,
-               PSFData<kSSPSync>::Response &response) {
+    // the reply is called once the request is released, maybe while serving
+    // another request
+    void serve(const PSFData<kSSPSync>::Request &request, Reply reply) {
         Key k = get<0>(request);
         int rank = get<1>(request);
         ssp_version_t version = get<2>(request);
-        bool &reply = get<0>(response);
 
-        std::lock_guard<std::mutex> lock(mtx_);
+        std::vector<Reply> replies;
+        {
+            std::lock_guard<std::mutex> lock(mtx_);
 
-        CHECK(map_.count(k)) << "kSSPSync : cannot find key " << k;
-        SSPInternalState &state = map_[k];
-        CHECK(state.rank2version.count(rank));
-        if (state.rank2version.size() < state.group_size) {
-            // not fully initialized
-            reply = false;
-            return;
-        }
-        if (state.rank2version[rank] < version) {
-            state.rank2version[rank] = version;
-        }
-        reply = true;
-        for (const auto &p : state.rank2version) {
-            if (p.second + state.tolerance < version) {
-                reply = false;
-                break;
+            CHECK(map_.count(k)) << "kSSPSync : cannot find key " << k;
+            SSPInternalState &state = map_[k];
+            CHECK(state.rank2version.count(rank));
+            if (state.rank2version[rank] < version) {
+                state.rank2version[rank] = version;
             }
+            state.pending.push_back(
+                {rank, version, std::chrono::steady_clock::now(), std::move(reply)});
+            release(state, replies);
         }
+        answer(replies, true);
         return;
     }
 
 private:
+    struct Pending {
+        int rank;
+        ssp_version_t version;
+        std::chrono::steady_clock::time_point start;
+        Reply reply;
+    };
+    struct WaitStat {
+        size_t count = 0;
+        double total_ms = 0;
+        double max_ms = 0;
+        size_t timeouts = 0;
+    };
     struct SSPInternalState {
         std::unordered_map<int, ssp_version_t> rank2version;
         ssp_version_t tolerance;
         size_t group_size;
+        std::vector<Pending> pending;
+        std::map<int, WaitStat> rank2wait;
     };
+
+    void record(SSPInternalState &state, const Pending &p, bool timeout) {
+        std::chrono::duration<double, std::milli> waited =
+            std::chrono::steady_clock::now() - p.start;
+        WaitStat &stat = state.rank2wait[p.rank];
+        stat.count++;
+        stat.total_ms += waited.count();
+        stat.max_ms = std::max(stat.max_ms, waited.count());
+        stat.timeouts += timeout;
+    }
+
+    // take the parked requests within the staleness bound, holding mtx_
+    void release(SSPInternalState &state, std::vector<Reply> &replies) {
+        if (state.rank2version.size() < state.group_size) {
+            // not fully initialized
+            return;
+        }
+        ssp_version_t slowest = state.rank2version.begin()->second;
+        for (const auto &p : state.rank2version)
+            slowest = std::min(slowest, p.second);
+        auto iter = std::partition(
+            state.pending.begin(), state.pending.end(),
+            [&](const Pending &p) { return slowest + state.tolerance < p.version; });
+        for (auto it = iter; it != state.pending.end(); ++it) {
+            record(state, *it, false);
+            replies.push_back(std::move(it->reply));
+        }
+        state.pending.erase(iter, state.pending.end());
+    }
+
+    // answer outside of mtx_, sending may block
+    static void answer(std::vector<Reply> &replies, bool success) {
+        PSFData<kSSPSync>::Response response;
+        get<0>(response) = success;
+        for (auto &reply : replies)
+            reply(response);
+    }
+
+    // answer false to the requests parked longer than the timeout
+    void expire() {
+        std::unique_lock<std::mutex> lock(mtx_);
+        while (!stop_) {
+            cv_.wait_for(lock, timeout_ / 2);
+            auto now = std::chrono::steady_clock::now();
+            std::vector<Reply> replies;
+            for (auto &p : map_) {
+                auto &pending = p.second.pending;
+                auto iter = std::partition(
+                    pending.begin(), pending.end(),
+                    [&](const Pending &x) { return now - x.start < timeout_; });
+                for (auto it = iter; it != pending.end(); ++it) {
+                    record(p.second, *it, true);
+                    replies.push_back(std::move(it->reply));
+                }
+                pending.erase(iter, pending.end());
+            }
+            lock.unlock();
+            answer(replies, false);
+            lock.lock();
+        }
+    }
+
     std::unordered_map<Key, SSPInternalState> map_;
     std::mutex mtx_;
-
+    std::condition_variable cv_;
+    std::chrono::milliseconds timeout_{0};
+    std::thread timer_;
+    bool stop_ = false;
 };
 
 } // namespace ps
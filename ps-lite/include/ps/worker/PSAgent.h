@@ -3,6 +3,7 @@
 #include "ps/ps.h"
 #include "ps/worker/kvworker.h"
 #include "ps/psf/PSFunc.h"
+#include "ps/psf/codec.h"
 #include "ps/server/param.h"
 #include "common/logging.h"
 
@@ -30,6 +31,18 @@ struct TensorMeta {
     /* [node_name --> timestamp to be waited] */
     std::vector<int> ts;
     std::vector<size_t> part;
+    /* rows striped over the partitions (see Partitioner::stripeSparse) */
+    bool striped = false;
+    /* first position of each partition in the concatenated rows */
+    std::vector<size_t> part_begin;
+    /* encoding of pushed and pulled values (see codec.h) */
+    int codec = kCodecNone;
+    /* error feedback of pushes: what encoding has lost so far, per value of
+     * dense tensors, and per pushed row of sparse tables (by position in the
+     * concatenated order) so that rows never pushed take no memory */
+    bool error_feedback = false;
+    std::vector<float> residual;
+    std::unordered_map<size_t, std::vector<float>> row_residual;
 };
 
 struct SparseInfos {
@@ -46,6 +59,8 @@ struct SparseInfos {
  * one, thus the $lens in @kvpairs is not useful. As a result, we use $lens to
  * store the offset of each vector. for example, key=1000, lens = {1,2,3}, then
  * we are accessing elements with ids as {1000+1, 1000+2, 1000+3}
+ * The sparse indices may be given as float (legacy) or native integers
+ * (IndexT), they are converted to size_t row offsets only once here.
  */
 class PSAgent {
 private:
@@ -60,10 +75,120 @@ private:
     /* for round-robin tensor placement */
     size_t _serverIndex = 0;
 
+    struct SSPWaitStat {
+        size_t count = 0;
+        double total_ms = 0;
+        double max_ms = 0;
+        size_t timeouts = 0;
+    };
+    std::unordered_map<Key, SSPWaitStat> _sspWait;
+
     PSAgent() : _kvworker(0, 0) {
         _par = _kvworker.par;
     }
 
+    /* encode size pushed values in rows of width; with error feedback the
+     * residual of value j is at residual(j), it is added before encoding and
+     * replaced by what the encoding loses */
+    template <typename F>
+    SArray<float> encodePush(TensorMeta &meta, const float *vals, size_t size,
+                             size_t width, F residual) {
+        if (!meta.error_feedback)
+            return encodeValues(meta.codec, vals, size, width);
+        std::vector<float> fed(vals, vals + size);
+        for (size_t j = 0; j < size; ++j)
+            fed[j] += *residual(j);
+        SArray<float> data = encodeValues(meta.codec, fed.data(), size, width);
+        std::vector<float> decoded(size);
+        decodeValues(meta.codec, data, decoded.data(), size, width);
+        for (size_t j = 0; j < size; ++j)
+            *residual(j) = fed[j] - decoded[j];
+        return data;
+    }
+
+    /* pushed rows of a partition starting at row cur_len, offsets are the
+     * rows inside the partition */
+    SArray<float> sparsePushValues(TensorMeta &meta, float *vals,
+                                   const size_t *offsets, size_t nrows,
+                                   size_t cur_len) {
+        size_t width = meta.width, size = nrows * width;
+        if (meta.codec == kCodecNone)
+            return SArray<float>(vals, size);
+        std::vector<float *> rows;
+        if (meta.error_feedback) {
+            for (size_t r = 0; r < nrows; ++r)
+                rows.push_back(rowResidual(meta, cur_len + offsets[r]));
+        }
+        return encodePush(meta, vals, size, width, [&](size_t j) {
+            return rows[j / width] + j % width;
+        });
+    }
+
+    /* residual of the row at position pos of a sparse table, zeros when the
+     * row is pushed for the first time */
+    float *rowResidual(TensorMeta &meta, size_t pos) {
+        std::vector<float> &row = meta.row_residual[pos];
+        if (row.empty())
+            row.assign(meta.width, 0);
+        return row.data();
+    }
+
+    /* values of partition i of a whole tensor, the partition starting at
+     * value cur_len of the concatenated partitions; the rows of striped
+     * tables are gathered */
+    SArray<float> densePartValues(const TensorMeta &meta, float *vals, size_t i,
+                                  size_t cur_len) {
+        size_t width = meta.width, size = meta.part[i] * width;
+        if (!meta.striped)
+            return SArray<float>(vals + cur_len, size);
+        size_t nparts = meta.part.size();
+        SArray<float> rows(size);
+        for (size_t j = 0; j < meta.part[i]; ++j) {
+            const float *row = vals + (j * nparts + i) * width;
+            std::copy(row, row + width, rows.begin() + j * width);
+        }
+        return rows;
+    }
+
+    /* pushed values of a dense partition starting at cur_len */
+    SArray<float> densePushValues(TensorMeta &meta, const SArray<float> &vals,
+                                  size_t cur_len) {
+        if (meta.codec == kCodecNone)
+            return vals;
+        if (meta.ptype == kParam) {
+            return encodePush(
+                meta, vals.data(), vals.size(), kDenseCodecWidth,
+                [&](size_t j) { return meta.residual.data() + cur_len + j; });
+        }
+        // the whole partition of a sparse table
+        size_t width = meta.width;
+        std::vector<float *> rows;
+        if (meta.error_feedback) {
+            for (size_t r = 0; r < vals.size() / width; ++r)
+                rows.push_back(rowResidual(meta, cur_len / width + r));
+        }
+        return encodePush(
+            meta, vals.data(), vals.size(), kDenseCodecWidth,
+            [&](size_t j) { return rows[j / width] + j % width; });
+    }
+
+    /* checkpoint file of partition i; the partitions of striped tables hold
+     * other rows, their files are named apart so that they are not loaded
+     * with another partitioner */
+    std::string ckptAddress(const TensorMeta &meta, const char *address,
+                            int name, size_t i) {
+        return std::string(address) + "/" + std::to_string(name) + "_"
+               + std::to_string(i) + (meta.striped ? ".hash" : "") + ".dat";
+    }
+
+    /* values of a compressed request before encoding, for the load record */
+    void recordRaw(const TensorMeta &meta, PsfType ftype, size_t sent,
+                   size_t received) {
+        if (meta.codec != kCodecNone)
+            _kvworker.recordRaw(ftype, sent * sizeof(float),
+                                received * sizeof(float));
+    }
+
 public:
     static PSAgent *Get() {
         static PSAgent e;
@@ -112,6 +237,11 @@ public:
         } else {
             tm.width = width;
             _par->partitionSparse(length, width, tm.keys, tm.part);
+            // cache tables look up sorted row ranges, keep them contiguous
+            tm.striped = ptype == kParam2D && _par->stripeSparse();
+            tm.part_begin.assign(tm.part.size(), 0);
+            for (size_t i = 1; i < tm.part.size(); i++)
+                tm.part_begin[i] = tm.part_begin[i - 1] + tm.part[i - 1];
             SparseInfos sp;
             sp.in_offset = nullptr;
             sp.out_offset = nullptr;
@@ -121,7 +251,35 @@ public:
         _id2meta[name] = tm;
     }
 
-    void vecPushSparse(const int name, float *dup_index, float *vals,
+    /**
+     * \brief encode the values pushed and pulled for a tensor
+     * \param codec one of Codec, kCodecNone sends raw floats
+     * \param error_feedback keep what encoding loses on this worker and add
+     *        it to the next push of the same values
+     */
+    void setCompression(const int name, int codec, bool error_feedback) {
+        TensorMeta &meta = _id2meta[name];
+        meta.codec = codec;
+        meta.error_feedback = codec != kCodecNone && error_feedback;
+        meta.residual.clear();
+        meta.row_residual.clear();
+        // the rows of sparse tables get theirs when pushed (rowResidual)
+        if (meta.error_feedback && meta.ptype == kParam)
+            meta.residual.assign(meta.length, 0);
+    }
+
+    /* position of a row in the concatenation of all partitions, so that the
+     * rows of each partition are contiguous for striped tables as well; the
+     * offset inside the partition is then position - part_begin */
+    size_t rowIndex(const TensorMeta &meta, size_t row) {
+        if (!meta.striped)
+            return row;
+        size_t nparts = meta.part.size();
+        return meta.part_begin[row % nparts] + row / nparts;
+    }
+
+    template <typename IndexT>
+    void vecPushSparse(const int name, const IndexT *dup_index, float *vals,
                        const size_t dup_index_size, int priority = 0) {
         TensorMeta &meta = _id2meta[name];
         const std::vector<Key> &keys = meta.keys;
@@ -133,7 +291,7 @@ public:
 
         std::map<size_t, std::vector<size_t>> idx2map;
         for (size_t i = 0; i < dup_index_size; ++i) {
-            size_t idx = (size_t)dup_index[i];
+            size_t idx = rowIndex(meta, (size_t)dup_index[i]);
             idx2map[idx].emplace_back(i);
         }
 
@@ -167,7 +325,11 @@ public:
                 PSFData<SparsePush>::Request request(
                     keys[i],
                     SArray<size_t>(cp_offset + st_index, cur_index - st_index),
-                    SArray<float>(cp_val + st_offset, cur_offset - st_offset));
+                    sparsePushValues(meta, cp_val + st_offset,
+                                     cp_offset + st_index,
+                                     cur_index - st_index, cur_len),
+                    meta.codec);
+                recordRaw(meta, SparsePush, cur_offset - st_offset, 0);
                 auto cb = getCallBack<SparsePush>();
                 ts[i].second = _kvworker.Request<SparsePush>(request, cb);
             } else {
@@ -182,7 +344,8 @@ public:
         return;
     }
 
-    void vecPullSparse(const int name, float *dup_index, float *vals,
+    template <typename IndexT>
+    void vecPullSparse(const int name, const IndexT *dup_index, float *vals,
                        const size_t dup_index_size, int priority = 0) {
         TensorMeta &meta = _id2meta[name];
         const std::vector<Key> &keys = meta.keys;
@@ -193,7 +356,7 @@ public:
 
         std::map<size_t, std::vector<size_t>> idx2map;
         for (size_t i = 0; i < dup_index_size; ++i) {
-            size_t idx = (size_t)dup_index[i];
+            size_t idx = rowIndex(meta, (size_t)dup_index[i]);
             idx2map[idx].emplace_back(i);
         }
 
@@ -216,13 +379,16 @@ public:
                 ts[i].first = true;
                 PSFData<SparsePull>::Request request(
                     keys[i],
-                    SArray<size_t>(cp_offset + st_index, cur_index - st_index));
+                    SArray<size_t>(cp_offset + st_index, cur_index - st_index),
+                    meta.codec);
+                recordRaw(meta, SparsePull, 0,
+                          (cur_index - st_index) * width);
                 auto cb = getCallBack<SparsePull>(
                     SArray<float>(vals, dup_index_size * width),
                     std::move(
                         std::vector<std::pair<size_t, std::vector<size_t>>>(
                             st_iter, iter)),
-                    cur_len, width);
+                    cur_len, width, meta.codec);
                 ts[i].second = _kvworker.Request<SparsePull>(request, cb);
             } else {
                 ts[i].first = false;
@@ -236,7 +402,8 @@ public:
         return;
     }
 
-    void vecSDPushPull(const int name, float *dup_index, float *vals,
+    template <typename IndexT>
+    void vecSDPushPull(const int name, const IndexT *dup_index, float *vals,
                        const size_t dup_index_size, float *out_vals,
                        int priority = 0) {
         TensorMeta &meta = _id2meta[name];
@@ -249,7 +416,7 @@ public:
 
         std::map<size_t, std::vector<size_t>> idx2map;
         for (size_t i = 0; i < dup_index_size; ++i) {
-            size_t idx = (size_t)dup_index[i];
+            size_t idx = rowIndex(meta, (size_t)dup_index[i]);
             idx2map[idx].emplace_back(i);
         }
 
@@ -282,19 +449,32 @@ public:
             PSFData<SDPushPull>::Request request(
                 keys[i],
                 SArray<size_t>(cp_offset + st_index, cur_index - st_index),
-                SArray<float>(cp_val + st_offset, cur_offset - st_offset),
-                local_length);
-            auto cb = getCallBack<SDPushPull>(
-                SArray<float>(out_vals + pull_offset, local_length));
-            meta.ts.push_back(_kvworker.Request<SDPushPull>(request, cb));
+                sparsePushValues(meta, cp_val + st_offset, cp_offset + st_index,
+                                 cur_index - st_index, cur_len),
+                local_length, meta.codec);
+            recordRaw(meta, SDPushPull, cur_offset - st_offset, local_length);
+            if (meta.striped) {
+                auto cb = std::bind(PSFData<SDPushPull>::_stripedCallback,
+                                    std::placeholders::_1,
+                                    SArray<float>(out_vals, meta.length * width),
+                                    i, keys.size(), width, meta.codec,
+                                    local_length);
+                meta.ts.push_back(_kvworker.Request<SDPushPull>(request, cb));
+            } else {
+                auto cb = getCallBack<SDPushPull>(
+                    SArray<float>(out_vals + pull_offset, local_length), width,
+                    meta.codec);
+                meta.ts.push_back(_kvworker.Request<SDPushPull>(request, cb));
+            }
             cur_len += lens[i];
             pull_offset += local_length;
         }
         return;
     }
 
-    void vecSSPushPull(const int name, float *in_index, float *in_vals,
-                       float *out_index, float *out_vals,
+    template <typename IndexT>
+    void vecSSPushPull(const int name, const IndexT *in_index, float *in_vals,
+                       const IndexT *out_index, float *out_vals,
                        const size_t dup_index_size, int priority = 0) {
         TensorMeta &meta = _id2meta[name];
         const std::vector<Key> &keys = meta.keys;
@@ -308,9 +488,9 @@ public:
         std::map<size_t, std::vector<size_t>> in_idx2map;
         std::map<size_t, std::vector<size_t>> out_idx2map;
         for (size_t i = 0; i < dup_index_size; ++i) {
-            size_t idx = (size_t)in_index[i];
+            size_t idx = rowIndex(meta, (size_t)in_index[i]);
             in_idx2map[idx].emplace_back(i);
-            idx = (size_t)out_index[i];
+            idx = rowIndex(meta, (size_t)out_index[i]);
             out_idx2map[idx].emplace_back(i);
         }
 
@@ -359,16 +539,20 @@ public:
                     keys[i],
                     SArray<size_t>(in_cp_offset + in_st_index,
                                    in_cur_index - in_st_index),
-                    SArray<float>(in_cp_val + st_offset,
-                                  in_cur_offset - st_offset),
+                    sparsePushValues(meta, in_cp_val + st_offset,
+                                     in_cp_offset + in_st_index,
+                                     in_cur_index - in_st_index, cur_len),
                     SArray<size_t>(out_cp_offset + out_st_index,
-                                   out_cur_index - out_st_index));
+                                   out_cur_index - out_st_index),
+                    meta.codec);
+                recordRaw(meta, SSPushPull, in_cur_offset - st_offset,
+                          (out_cur_index - out_st_index) * width);
                 auto cb = getCallBack<SparsePull>(
                     SArray<float>(out_vals, dup_index_size * width),
                     std::move(
                         std::vector<std::pair<size_t, std::vector<size_t>>>(
                             st_iter, out_iter)),
-                    cur_len, width);
+                    cur_len, width, meta.codec);
                 ts[i].second = _kvworker.Request<SSPushPull>(request, cb);
             } else {
                 ts[i].first = false;
@@ -393,11 +577,15 @@ public:
         /* send push request to each partition according to the offsets. */
         size_t cur_len = 0;
         for (size_t i = 0; i < meta.keys.size(); i++) {
+            size_t cur_length = meta.part[i] * meta.width;
             PSFData<DensePush>::Request request(
-                meta.keys[i], meta.part[i],
-                SArray<float>(vals + cur_len, meta.part[i]));
+                meta.keys[i], cur_length,
+                densePushValues(meta, densePartValues(meta, vals, i, cur_len),
+                                cur_len),
+                meta.codec);
+            recordRaw(meta, DensePush, cur_length, 0);
             meta.ts.push_back(_kvworker.Request<DensePush>(request, cb));
-            cur_len += meta.part[i];
+            cur_len += cur_length;
         }
     }
 
@@ -406,10 +594,20 @@ public:
         size_t cur_offset = 0;
         for (size_t i = 0; i < meta.keys.size(); i++) {
             size_t cur_length = meta.part[i] * meta.width;
-            PSFData<DensePull>::Request request(meta.keys[i], cur_length);
-            auto cb = getCallBack<DensePull>(
-                SArray<float>(vals + cur_offset, cur_length));
-            meta.ts.push_back(_kvworker.Request<DensePull>(request, cb));
+            PSFData<DensePull>::Request request(meta.keys[i], cur_length,
+                                                meta.codec);
+            recordRaw(meta, DensePull, 0, cur_length);
+            if (meta.striped) {
+                auto cb = std::bind(
+                    PSFData<DensePull>::_stripedCallback, std::placeholders::_1,
+                    SArray<float>(vals, meta.length * meta.width), i,
+                    meta.keys.size(), meta.width, meta.codec, cur_length);
+                meta.ts.push_back(_kvworker.Request<DensePull>(request, cb));
+            } else {
+                auto cb = getCallBack<DensePull>(
+                    SArray<float>(vals + cur_offset, cur_length), meta.codec);
+                meta.ts.push_back(_kvworker.Request<DensePull>(request, cb));
+            }
             cur_offset += cur_length;
         }
     }
@@ -420,13 +618,27 @@ public:
         size_t cur_len = 0;
         /* send pull request to each partition */
         for (size_t i = 0; i < meta.keys.size(); i++) {
+            size_t cur_length = meta.part[i] * meta.width;
             PSFData<DDPushPull>::Request request(
-                meta.keys[i], meta.part[i],
-                SArray<float>(in_vals + cur_len, meta.part[i]));
-            auto cb = getCallBack<DDPushPull>(
-                SArray<float>(out_vals + cur_len, meta.part[i]));
-            meta.ts.push_back(_kvworker.Request<DDPushPull>(request, cb));
-            cur_len += meta.part[i];
+                meta.keys[i], cur_length,
+                densePushValues(meta,
+                                densePartValues(meta, in_vals, i, cur_len),
+                                cur_len),
+                meta.codec);
+            recordRaw(meta, DDPushPull, cur_length, cur_length);
+            if (meta.striped) {
+                // the response is the same as of DensePull
+                auto cb = std::bind(
+                    PSFData<DensePull>::_stripedCallback, std::placeholders::_1,
+                    SArray<float>(out_vals, meta.length * meta.width), i,
+                    meta.keys.size(), meta.width, meta.codec, cur_length);
+                meta.ts.push_back(_kvworker.Request<DDPushPull>(request, cb));
+            } else {
+                auto cb = getCallBack<DDPushPull>(
+                    SArray<float>(out_vals + cur_len, cur_length), meta.codec);
+                meta.ts.push_back(_kvworker.Request<DDPushPull>(request, cb));
+            }
+            cur_len += cur_length;
         }
     }
 
@@ -444,18 +656,17 @@ public:
         }
     }
 
-    void ParameterSave(const int name, char *address) {
+    void ParameterSave(const int name, char *address,
+                       bool incremental = false) {
         TensorMeta &meta = _id2meta[name];
         /* send pull request to each partition */
         auto cb = getCallBack<ParamSave>();
         for (size_t i = 0; i < meta.keys.size(); i++) {
-            std::string local_address = std::string(address) + "/"
-                                        + std::to_string(name) + "_"
-                                        + std::to_string(i) + ".dat";
+            std::string local_address = ckptAddress(meta, address, name, i);
             SArray<char> temp_array;
             temp_array.CopyFrom(local_address.c_str(), local_address.size());
             PSFData<ParamSave>::Request request(meta.keys[i], temp_array,
-                                                false);
+                                                incremental);
             meta.ts.push_back(_kvworker.Request<ParamSave>(request, cb));
         }
     }
@@ -465,9 +676,7 @@ public:
         /* send pull request to each partition */
         auto cb = getCallBack<ParamLoad>();
         for (size_t i = 0; i < meta.keys.size(); i++) {
-            std::string local_address = std::string(address) + "/"
-                                        + std::to_string(name) + "_"
-                                        + std::to_string(i) + ".dat";
+            std::string local_address = ckptAddress(meta, address, name, i);
             SArray<char> temp_array;
             temp_array.CopyFrom(local_address.c_str(), local_address.size());
             PSFData<ParamLoad>::Request request(meta.keys[i], temp_array);
@@ -483,13 +692,35 @@ public:
         _kvworker.recordLoads();
     }
 
+    /* the server answers once the staleness bound holds, or false when the
+     * request timed out there (PS_SSP_TIMEOUT) */
     void SSPSync(Key key, ssp_version_t version) {
         PSFData<kSSPSync>::Request request(key, Postoffice::Get()->my_rank(), version);
         bool success = false;
         auto cb = getCallBack<kSSPSync>(std::ref(success));
+        auto start = std::chrono::steady_clock::now();
+        SSPWaitStat &stat = _sspWait[key];
+        _kvworker.Wait(_kvworker.Request<kSSPSync>(request, cb));
         while (!success) {
+            stat.timeouts++;
+            LOG(WARNING) << "SSP sync of key " << key << " version " << version
+                         << " timed out, retrying";
             _kvworker.Wait(_kvworker.Request<kSSPSync>(request, cb));
         }
+        std::chrono::duration<double, std::milli> waited =
+            std::chrono::steady_clock::now() - start;
+        stat.count++;
+        stat.total_ms += waited.count();
+        stat.max_ms = std::max(stat.max_ms, waited.count());
+    }
+
+    /* SSP syncs of this worker: count, total ms, max ms, timeouts */
+    void SSPStats(Key key, double *result) {
+        const SSPWaitStat &stat = _sspWait[key];
+        result[0] = stat.count;
+        result[1] = stat.total_ms;
+        result[2] = stat.max_ms;
+        result[3] = stat.timeouts;
     }
 
     void SSPInit(Key key, size_t group_size, ssp_version_t tolerance) {
@@ -521,15 +752,17 @@ public:
     void PushData(Key idx, float *vals, int len, std::vector<int> &timestamp) {
         auto cb = getCallBack<DensePush>();
         PSFData<DensePush>::Request request(mapWkeyToSkey(idx), len,
-                                            SArray<float>(vals, len));
+                                            SArray<float>(vals, len),
+                                            kCodecNone);
         int ts = _kvworker.Request<DensePush>(request, cb);
         timestamp.push_back(ts);
     }
 
     // This is almost the same as PushData
     void PullData(Key idx, float *vals, int len, std::vector<int> &timestamp) {
-        auto cb = getCallBack<DensePull>(SArray<float>(vals, len));
-        PSFData<DensePull>::Request request(mapWkeyToSkey(idx), len);
+        auto cb = getCallBack<DensePull>(SArray<float>(vals, len), kCodecNone);
+        PSFData<DensePull>::Request request(mapWkeyToSkey(idx), len,
+                                            kCodecNone);
         int ts = _kvworker.Request<DensePull>(request, cb);
         timestamp.push_back(ts);
     }
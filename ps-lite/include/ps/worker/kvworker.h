@@ -5,6 +5,9 @@
 #include "callback_store.h"
 #include "ps/kvapp.h"
 #include "ps/partitioner.h"
+#include <array>
+#include <map>
+#include <mutex>
 #include <vector>
 #include <memory>
 #include <fstream>
@@ -27,7 +30,7 @@ public:
      */
     explicit KVWorker(int app_id, int customer_id) : KVApp(app_id) {
         KVAppRegisterHelper<PsfType(0), KVWorker>::init(this);
-        par = new AveragePartitioner(); // now use naive partitioner
+        par = CreatePartitioner(); // selected by PS_PARTITIONER
     }
 
     ~KVWorker() {
@@ -42,12 +45,37 @@ public:
     }
 
     void recordLoads() {
+        std::lock_guard<std::mutex> lock(loads_mu);
         for (auto iter = loads.begin(); iter != loads.end(); ++iter) {
             logOut << getPSFunctionName(iter->first) << ": " << (iter->second).first
                    << ' ' << (iter->second).second << std::endl;
         }
+        // per server: #requests, bytes sent, bytes received
+        for (auto iter = server_loads.begin(); iter != server_loads.end();
+             ++iter) {
+            logOut << "server " << iter->first << ": " << iter->second[0]
+                   << ' ' << iter->second[1] << ' ' << iter->second[2]
+                   << std::endl;
+        }
+        // values of compressed requests before encoding: sent, received
+        for (auto iter = raw_loads.begin(); iter != raw_loads.end(); ++iter) {
+            logOut << getPSFunctionName(iter->first)
+                   << " uncompressed: " << (iter->second).first << ' '
+                   << (iter->second).second << std::endl;
+        }
         logOut << std::endl;
         loads.clear();
+        server_loads.clear();
+        raw_loads.clear();
+    }
+
+    /* bytes the values of a compressed request take before encoding */
+    void recordRaw(PsfType ftype, long long sent, long long received) {
+        if (!logOut.is_open())
+            return;
+        std::lock_guard<std::mutex> lock(loads_mu);
+        raw_loads[ftype].first += sent;
+        raw_loads[ftype].second += received;
     }
 
     /**
@@ -85,8 +113,12 @@ public:
         Message msg;
         tupleEncode(request, msg.data);
         if (logOut.is_open()) {
+            std::lock_guard<std::mutex> lock(loads_mu);
+            auto &server_load = server_loads[target_server_id];
+            server_load[0]++;
             for (auto x : msg.data) {
                 loads[ftype].first += x.size();
+                server_load[1] += x.size();
             }
         }
         msg.meta.app_id = obj_->app_id();
@@ -104,8 +136,12 @@ private:
     void onReceive(const Message &msg) {
         typename PSFData<ftype>::Response response;
         if (logOut.is_open()) {
+            std::lock_guard<std::mutex> lock(loads_mu);
+            auto &server_load =
+                server_loads[Postoffice::IDtoRank(msg.meta.sender)];
             for (auto x : msg.data) {
                 loads[ftype].second += x.size();
+                server_load[2] += x.size();
             }
         }
         tupleDecode(response, msg.data);
@@ -115,6 +151,9 @@ private:
     template <PsfType, typename>
     friend struct KVAppRegisterHelper;
     std::unordered_map<PsfType, std::pair<long long, long long>> loads;
+    std::map<int, std::array<long long, 3>> server_loads;
+    std::unordered_map<PsfType, std::pair<long long, long long>> raw_loads;
+    std::mutex loads_mu;
     std::ofstream logOut;
 };
 
@@ -24,7 +24,8 @@ public:
                         size_t width, InitType init_type, double init_a,
                         double init_b, unsigned long long seed, OptType otype,
                         SArray<float> lrs);
-    void parameter_save(int node_name, char *address);
+    void parameter_save(int node_name, char *address,
+                        bool incremental = false);
     void parameter_load(int node_name, char *address);
     // for data push&pull
     typedef uint64_t query_t;
@@ -19,11 +19,13 @@ void PSHandler<PsfGroup::kParameterServer>::serve(
         << "PushEmbedding updates size mismatch";
     CHECK_EQ(data.size(), rows.size() * width)
         << "PushEmbedding data size mismatch";
-    auto write_lock = value_set.write_guard();
+    auto write_lock = value_set.rows_guard(true);
     for (size_t i = 0; i < rows.size(); i++) {
+        auto row_lock = value_set.lockRow(rows[i]);
         value_set.ver[rows[i]] += updates[i];
         for (size_t j = 0; j < width; j++)
             value_set[rows[i] * width + j] += data[i * width + j];
+        value_set.markDirty(rows[i]);
     }
 }
 
@@ -43,23 +45,25 @@ void PSHandler<PsfGroup::kParameterServer>::serve(
     auto &value_set =
         *std::dynamic_pointer_cast<CacheTable<float>>(iter->second);
     size_t width = value_set.width;
-    auto read_lock = value_set.read_guard();
-    size_t count = 0;
-    for (size_t i = 0; i < rows.size(); i++)
-        if (ver[i] == -1 || value_set.ver[rows[i]] - ver[i] > bound)
-            count++;
-    idx.resize(count);
-    ret_ver.resize(count);
-    data.resize(count * width);
-    count = 0;
+    auto read_lock = value_set.rows_guard(false);
+    // rows may be pushed between the passes with row locks, so the second
+    // pass copies the rows selected by the first
+    std::vector<size_t> selected;
     for (size_t i = 0; i < rows.size(); i++) {
-        if (ver[i] == -1 || value_set.ver[rows[i]] - ver[i] > bound) {
-            idx[count] = i;
-            ret_ver[count] = value_set.ver[rows[i]];
-            std::copy(&value_set[rows[i] * width],
-                      &value_set[(rows[i] + 1) * width], &data[count * width]);
-            count++;
-        }
+        auto row_lock = value_set.lockRow(rows[i]);
+        if (ver[i] == -1 || value_set.ver[rows[i]] - ver[i] > bound)
+            selected.push_back(i);
+    }
+    idx.resize(selected.size());
+    ret_ver.resize(selected.size());
+    data.resize(selected.size() * width);
+    for (size_t count = 0; count < selected.size(); count++) {
+        size_t i = selected[count];
+        auto row_lock = value_set.lockRow(rows[i]);
+        idx[count] = i;
+        ret_ver[count] = value_set.ver[rows[i]];
+        std::copy(&value_set[rows[i] * width],
+                  &value_set[(rows[i] + 1) * width], &data[count * width]);
     }
 }
 
@@ -3,6 +3,7 @@
  */
 #include "ps/internal/customer.h"
 #include "ps/internal/postoffice.h"
+#include "ps/server/config.h"
 namespace ps {
 
 const int Node::kEmpty = std::numeric_limits<int>::max();
@@ -14,8 +15,7 @@ Customer::Customer(int app_id, int customer_id,
     customer_id_(customer_id), recv_handle_(recv_handle) {
     cur_timestamp = 0;
     Postoffice::Get()->AddCustomer(this);
-    // for debug set num_threads = 5;
-    int num_threads = 5;
+    int num_threads = ServerConfig::Get().recv_threads;
     for (int i = 0; i < num_threads; i++) {
         recv_threads_.emplace_back(new std::thread(&Customer::Receiving, this));
     }
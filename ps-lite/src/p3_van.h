@@ -9,7 +9,7 @@ namespace ps {
 /**
  * \brief P3 based Van implementation
  */
-class P3Van : public ZMQVan {
+class P3Van : public ShmVan {
 public:
     P3Van() {
     }
@@ -31,11 +31,11 @@ protected:
             init_stage++;
         }
         start_mu_.unlock();
-        ZMQVan::Start(customer_id);
+        ShmVan::Start(customer_id);
     }
 
     void Stop() override {
-        ZMQVan::Stop();
+        ShmVan::Stop();
         for (auto &thread : sender_threads_)
             thread->join();
     }
@@ -49,7 +49,7 @@ protected:
         while (true) {
             Message msg;
             send_queue_.WaitAndPop(&msg);
-            ZMQVan::SendMsg(msg);
+            ShmVan::SendMsg(msg);
             if (!msg.meta.control.empty()
                 && msg.meta.control.cmd == Control::TERMINATE) {
                 // debug for stop
@@ -108,14 +108,18 @@ void ClearOnServer(int node_name) {
     worker.clear_on_server(node_name);
 }
 
-void SaveParam(int node_name, char *address) {
-    worker.parameter_save(node_name, address);
+void SaveParam(int node_name, char *address, bool incremental) {
+    worker.parameter_save(node_name, address, incremental);
 }
 
 void LoadParam(int node_name, char *address) {
     worker.parameter_load(node_name, address);
 }
 
+void SetCompression(int node_name, int codec, bool error_feedback) {
+    PSAgent::Get()->setCompression(node_name, codec, error_feedback);
+}
+
 void startRecord(char *dirPath) {
     PSAgent::Get()->startRecord(std::string(dirPath));
 }
@@ -130,6 +134,9 @@ void ssp_init(Key key, size_t group_size, ssp_version_t tolerance) {
 void ssp_sync(Key key, ssp_version_t version) {
     PSAgent::Get()->SSPSync(key, version);
 }
+void ssp_stats(Key key, double *result) {
+    PSAgent::Get()->SSPStats(key, result);
+}
 
 void preduce_get_partner(Key key, int rank, size_t required_worker_num, float wait_time, int* result) {
     PSAgent::Get()->PReduceGetPartner(key, rank, required_worker_num, wait_time, result);
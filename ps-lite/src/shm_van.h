@@ -0,0 +1,324 @@
+/**
+ *  Copyright (c) 2015 by Contributors
+ */
+#ifndef PS_SHM_VAN_H_
+#define PS_SHM_VAN_H_
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <atomic>
+#include <cstring>
+#include <memory>
+#include <string>
+#include <unordered_map>
+#include <unordered_set>
+#include "ps/internal/van.h"
+namespace ps {
+
+/**
+ * \brief a ring buffer in shared memory, written by one sender process and
+ * read by one receiver process
+ *
+ * Chunks are allocated at the head by the sender; the receiver marks a chunk
+ * released when it drops the data, in any order, and the sender moves the
+ * tail over the released chunks at the front. Chunks are aligned to
+ * kChunkAlign, a chunk that does not fit before the end of the ring is
+ * preceded by a released padding chunk.
+ */
+class ShmRing {
+public:
+    static const size_t kChunkAlign = 64;
+
+    struct ChunkHeader {
+        uint64_t length; // bytes of the chunk, header included
+        std::atomic<uint32_t> released;
+        char padding[kChunkAlign - sizeof(uint64_t) - sizeof(uint32_t)];
+    };
+    static_assert(sizeof(ChunkHeader) == kChunkAlign, "chunk header size");
+
+    /** \brief create a ring of capacity bytes, as the sender */
+    static ShmRing *Create(const std::string &name, size_t capacity) {
+        capacity = (capacity + kChunkAlign - 1) / kChunkAlign * kChunkAlign;
+        int fd = shm_open(name.c_str(), O_CREAT | O_EXCL | O_RDWR, 0600);
+        if (fd < 0) {
+            LOG(WARNING) << "failed to create shared memory " << name << ": "
+                         << strerror(errno);
+            return nullptr;
+        }
+        // reserve the pages now: a sparse file would raise SIGBUS on the
+        // first write beyond what /dev/shm can hold
+        int err = posix_fallocate(fd, 0, capacity);
+        if (err != 0) {
+            LOG(WARNING) << "failed to reserve " << capacity
+                         << " bytes of shared memory " << name << ": "
+                         << strerror(err);
+            close(fd);
+            shm_unlink(name.c_str());
+            return nullptr;
+        }
+        void *base =
+            mmap(nullptr, capacity, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+        close(fd);
+        if (base == MAP_FAILED) {
+            LOG(WARNING) << "failed to map shared memory " << name << ": "
+                         << strerror(errno);
+            shm_unlink(name.c_str());
+            return nullptr;
+        }
+        return new ShmRing(name, static_cast<char *>(base), capacity, true);
+    }
+
+    /** \brief map the ring of a sender, as the receiver */
+    static ShmRing *Open(const std::string &name) {
+        int fd = shm_open(name.c_str(), O_RDWR, 0600);
+        CHECK_GE(fd, 0) << "failed to open shared memory " << name << ": "
+                        << strerror(errno);
+        struct stat st;
+        CHECK_EQ(fstat(fd, &st), 0) << strerror(errno);
+        void *base = mmap(nullptr, st.st_size, PROT_READ | PROT_WRITE,
+                          MAP_SHARED, fd, 0);
+        close(fd);
+        CHECK(base != MAP_FAILED) << "failed to map shared memory " << name
+                                  << ": " << strerror(errno);
+        return new ShmRing(name, static_cast<char *>(base), st.st_size, false);
+    }
+
+    ~ShmRing() {
+        munmap(base_, capacity_);
+        Unlink();
+    }
+
+    /** \brief remove the name of a ring we created, the mappings stay */
+    void Unlink() {
+        if (owner_)
+            shm_unlink(name_.c_str());
+        owner_ = false;
+    }
+
+    /**
+     * \brief allocate a chunk for size bytes, as the sender
+     * \return the offset of the chunk data, -1 if the ring is full
+     */
+    int64_t Alloc(size_t size) {
+        Reclaim();
+        uint64_t length =
+            sizeof(ChunkHeader)
+            + (size + kChunkAlign - 1) / kChunkAlign * kChunkAlign;
+        uint64_t pos = head_ % capacity_;
+        uint64_t pad = pos + length > capacity_ ? capacity_ - pos : 0;
+        if (head_ + pad + length - tail_ > capacity_)
+            return -1;
+        if (pad) {
+            InitChunk(pos, pad, 1);
+            head_ += pad;
+            pos = 0;
+        }
+        InitChunk(pos, length, 0);
+        head_ += length;
+        return pos + sizeof(ChunkHeader);
+    }
+
+    /** \brief release the chunk with data at offset, as the receiver */
+    void Release(uint64_t offset) {
+        Header(offset - sizeof(ChunkHeader))
+            ->released.store(1, std::memory_order_release);
+    }
+
+    char *data(uint64_t offset) {
+        return base_ + offset;
+    }
+    const std::string &name() const {
+        return name_;
+    }
+
+    /** \brief serializes the senders of the ring */
+    std::mutex mu;
+
+private:
+    ShmRing(const std::string &name, char *base, size_t capacity, bool owner) :
+        name_(name), base_(base), capacity_(capacity), owner_(owner) {
+    }
+
+    ChunkHeader *Header(uint64_t pos) {
+        return reinterpret_cast<ChunkHeader *>(base_ + pos);
+    }
+
+    void InitChunk(uint64_t pos, uint64_t length, uint32_t released) {
+        ChunkHeader *header = Header(pos);
+        header->length = length;
+        header->released.store(released, std::memory_order_relaxed);
+    }
+
+    /** move the tail over the released chunks at the front */
+    void Reclaim() {
+        while (tail_ < head_) {
+            ChunkHeader *header = Header(tail_ % capacity_);
+            if (!header->released.load(std::memory_order_acquire))
+                break;
+            tail_ += header->length;
+        }
+    }
+
+    std::string name_;
+    char *base_;
+    size_t capacity_;
+    bool owner_;
+    uint64_t head_ = 0;
+    uint64_t tail_ = 0;
+};
+
+/**
+ * \brief ZMQ van moving the data of messages to peers on the same host
+ * through shared memory
+ *
+ * Each process writes the data of its messages to a peer into a ring it owns
+ * (one copy) and sends only the meta through ZMQ, with the offsets of the
+ * data in the ring; the receiver hands out the data in place and releases it
+ * once dropped. Control messages, small messages and messages to other hosts
+ * go through ZMQ as before, so do messages that do not fit in the ring.
+ *
+ * Settings from the environment:
+ *   PS_SHM_VAN        0 disables shared memory (default 1)
+ *   PS_SHM_RING_MB    size of the ring to each peer (default 256)
+ *   PS_SHM_MIN_BYTES  smaller messages go through ZMQ (default 4096)
+ * Peers are on the same host with DMLC_LOCAL, or if their hostname is ours
+ * or a loopback address.
+ */
+class ShmVan : public ZMQVan {
+public:
+    ShmVan() {
+        enabled_ = GetEnv("PS_SHM_VAN", 1);
+        ring_bytes_ = static_cast<size_t>(GetEnv("PS_SHM_RING_MB", 256)) << 20;
+        min_bytes_ = GetEnv("PS_SHM_MIN_BYTES", 4096);
+    }
+    virtual ~ShmVan() {
+    }
+
+protected:
+    void Stop() override {
+        ZMQVan::Stop();
+        // the rings stay mapped, sending threads and data still held may use
+        // them; only their names are removed
+        std::lock_guard<std::mutex> lk(rings_mu_);
+        for (auto &it : send_rings_)
+            it.second->Unlink();
+    }
+
+    void Connect(const Node &node) override {
+        ZMQVan::Connect(node);
+        if (enabled_ && IsLocal(node)) {
+            std::lock_guard<std::mutex> lk(rings_mu_);
+            local_peers_.insert(node.id);
+        }
+    }
+
+    int SendMsg(const Message &msg) override {
+        size_t data_bytes = 0;
+        for (const auto &d : msg.data)
+            data_bytes += d.size();
+        ShmRing *ring = nullptr;
+        if (msg.meta.control.empty() && data_bytes >= min_bytes_)
+            ring = SendRing(msg.meta.recver);
+        if (ring == nullptr)
+            return ZMQVan::SendMsg(msg);
+
+        Message shm_msg;
+        shm_msg.meta = msg.meta;
+        shm_msg.meta.shm_ring = ring->name();
+        {
+            std::lock_guard<std::mutex> lk(ring->mu);
+            for (const auto &d : msg.data) {
+                int64_t offset = ring->Alloc(d.size());
+                if (offset < 0) {
+                    // ring full, give back what is taken and send by ZMQ
+                    for (size_t i = 0; i < shm_msg.meta.shm_chunk.size();
+                         i += 2)
+                        ring->Release(shm_msg.meta.shm_chunk[i]);
+                    return ZMQVan::SendMsg(msg);
+                }
+                memcpy(ring->data(offset), d.data(), d.size());
+                shm_msg.meta.shm_chunk.push_back(offset);
+                shm_msg.meta.shm_chunk.push_back(d.size());
+            }
+        }
+        int meta_bytes = ZMQVan::SendMsg(shm_msg);
+        if (meta_bytes < 0) {
+            for (size_t i = 0; i < shm_msg.meta.shm_chunk.size(); i += 2)
+                ring->Release(shm_msg.meta.shm_chunk[i]);
+            return meta_bytes;
+        }
+        return meta_bytes + data_bytes;
+    }
+
+    int RecvMsg(Message *msg) override {
+        int recv_bytes = ZMQVan::RecvMsg(msg);
+        if (recv_bytes < 0 || msg->meta.shm_ring.empty())
+            return recv_bytes;
+        std::shared_ptr<ShmRing> ring = RecvRing(msg->meta.shm_ring);
+        const auto &chunk = msg->meta.shm_chunk;
+        CHECK_EQ(chunk.size() % 2, 0U);
+        for (size_t i = 0; i < chunk.size(); i += 2) {
+            uint64_t offset = chunk[i], size = chunk[i + 1];
+            // zero-copy, the chunk is released when the data is dropped
+            SArray<char> data;
+            data.reset(ring->data(offset), size,
+                       [ring, offset](char *) { ring->Release(offset); });
+            msg->data.push_back(data);
+            recv_bytes += size;
+        }
+        msg->meta.shm_ring.clear();
+        msg->meta.shm_chunk.clear();
+        return recv_bytes;
+    }
+
+private:
+    bool IsLocal(const Node &node) {
+        if (GetEnv("DMLC_LOCAL", 0))
+            return true;
+        const std::string &host = node.hostname;
+        return host == my_node_.hostname || host == "127.0.0.1"
+               || host == "localhost";
+    }
+
+    /** the ring to a local peer, nullptr if the peer is remote */
+    ShmRing *SendRing(int recver) {
+        std::lock_guard<std::mutex> lk(rings_mu_);
+        if (!local_peers_.count(recver))
+            return nullptr;
+        auto it = send_rings_.find(recver);
+        if (it != send_rings_.end())
+            return it->second.get();
+        std::string name = "/hetu_ps_" + std::to_string(getpid()) + "_"
+                           + std::to_string(recver);
+        ShmRing *ring = ShmRing::Create(name, ring_bytes_);
+        // e.g. /dev/shm missing or full, use ZMQ for this peer
+        if (ring == nullptr)
+            local_peers_.erase(recver);
+        else
+            send_rings_[recver].reset(ring);
+        return ring;
+    }
+
+    std::shared_ptr<ShmRing> RecvRing(const std::string &name) {
+        std::lock_guard<std::mutex> lk(rings_mu_);
+        auto &ring = recv_rings_[name];
+        if (!ring)
+            ring.reset(ShmRing::Open(name));
+        return ring;
+    }
+
+    bool enabled_;
+    size_t ring_bytes_;
+    size_t min_bytes_;
+    std::mutex rings_mu_;
+    /** ids of the peers on this host */
+    std::unordered_set<int> local_peers_;
+    /** receiver id -> the ring we write to */
+    std::unordered_map<int, std::unique_ptr<ShmRing>> send_rings_;
+    /** ring name -> the ring of a sender we read from */
+    std::unordered_map<std::string, std::shared_ptr<ShmRing>> recv_rings_;
+};
+} // namespace ps
+
+#endif // PS_SHM_VAN_H_
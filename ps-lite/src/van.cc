@@ -16,6 +16,7 @@
 #include "./ibverbs_van.h"
 #include "./resender.h"
 #include "./zmq_van.h"
+#include "./shm_van.h"
 #include "./p3_van.h"
 
 namespace ps {
@@ -27,8 +28,9 @@ namespace ps {
 static const int kDefaultHeartbeatInterval = 0;
 
 Van *Van::Create(const std::string &type) {
-    if (type == "zmq") {
-        return new ZMQVan();
+    // both send through shared memory to peers on the same host, see ShmVan
+    if (type == "zmq" || type == "shm") {
+        return new ShmVan();
     } else if (type == "p3") {
         return new P3Van();
 #ifdef DMLC_USE_IBVERBS
@@ -503,6 +505,11 @@ void Van::PackMeta(const Meta &meta, char **meta_buf, int *buf_size) {
     pb.set_priority(meta.priority);
     pb.set_customer_id(meta.customer_id);
     pb.set_psftype(meta.psftype);
+    if (!meta.shm_ring.empty()) {
+        pb.set_shm_ring(meta.shm_ring);
+        for (auto x : meta.shm_chunk)
+            pb.add_shm_chunk(x);
+    }
     if (!meta.control.empty()) {
         auto ctrl = pb.mutable_control();
         ctrl->set_cmd(meta.control.cmd);
@@ -542,6 +549,8 @@ void Van::UnpackMeta(const char *meta_buf, int buf_size, Meta *meta) {
     meta->priority = pb.priority();
     meta->customer_id = pb.customer_id();
     meta->psftype = static_cast<PsfType>(pb.psftype());
+    meta->shm_ring = pb.has_shm_ring() ? pb.shm_ring() : std::string();
+    meta->shm_chunk.assign(pb.shm_chunk().begin(), pb.shm_chunk().end());
 
     if (pb.has_control()) {
         const auto &ctrl = pb.control();
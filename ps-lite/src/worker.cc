@@ -14,8 +14,8 @@ void Worker::parameter_init(int node_name, ParamType ptype, size_t len,
     Postoffice::Get()->Barrier(0, kWorkerGroup);
 }
 
-void Worker::parameter_save(int node_name, char *address) {
-    PSAgent::Get()->ParameterSave(node_name, address);
+void Worker::parameter_save(int node_name, char *address, bool incremental) {
+    PSAgent::Get()->ParameterSave(node_name, address, incremental);
 }
 
 void Worker::parameter_load(int node_name, char *address) {
@@ -113,21 +113,43 @@ void Worker::dd_pushpull(int node_name, const DLArray *in_arr, DLArray *out_arr,
         in_data, out_data, evt);
 }
 
+// Call f with the typed pointer of the sparse index array, so that integer
+// indices reach PSAgent without a round trip through float.
+template <typename F>
+static void dispatchIndex(const DLArray *index, F &&f) {
+    switch (index->dtype) {
+    case DataType::INT32:
+        f(static_cast<const int32_t *>(index->data));
+        break;
+    case DataType::INT64:
+        f(static_cast<const int64_t *>(index->data));
+        break;
+    case DataType::UINT64:
+        f(static_cast<const uint64_t *>(index->data));
+        break;
+    default:
+        assert(index->dtype == DataType::FLOAT32);
+        f(static_cast<const float *>(index->data));
+    }
+}
+
 void Worker::sparse_pull(int node_name, const DLArray *index, DLArray *value,
                          size_t index_size) {
     float *data = static_cast<float *>(value->data);
-    float *indices = static_cast<float *>(index->data);
-    node2pullthread[node_name] = ThreadPool::Get()->Enqueue(
-        [node_name](float *indices, float *data, const size_t index_size,
-                    std::future<void> &push_thread) -> void {
-            if (push_thread.valid()) {
-                push_thread.wait();
-                PSAgent::Get()->wait(node_name);
-            }
-            PSAgent::Get()->vecPullSparse(node_name, indices, data, index_size,
-                                          -node_name);
-        },
-        indices, data, index_size, std::ref(node2pushthread[node_name]));
+    dispatchIndex(index, [&](auto indices) {
+        node2pullthread[node_name] = ThreadPool::Get()->Enqueue(
+            [node_name](decltype(indices) indices, float *data,
+                        const size_t index_size,
+                        std::future<void> &push_thread) -> void {
+                if (push_thread.valid()) {
+                    push_thread.wait();
+                    PSAgent::Get()->wait(node_name);
+                }
+                PSAgent::Get()->vecPullSparse(node_name, indices, data,
+                                              index_size, -node_name);
+            },
+            indices, data, index_size, std::ref(node2pushthread[node_name]));
+    });
 }
 
 void Worker::sparse_push(int node_name, const DLArray *index,
@@ -138,52 +160,59 @@ void Worker::sparse_push(int node_name, const DLArray *index,
     // for sparse push the length of gradient value is not equal to
     // corresponding parameter
     float *data = static_cast<float *>(value->data);
-    float *indices = static_cast<float *>(index->data);
-    node2pushthread[node_name] = ThreadPool::Get()->Enqueue(
-        [node_name](float *indices, float *data, const size_t index_size,
-                    DLEvent *evt) -> void {
-            if (evt != NULL)
-                DLEventSync(evt);
-            PSAgent::Get()->vecPushSparse(node_name, indices, data, index_size,
-                                          -node_name);
-        },
-        indices, data, index_size, evt);
+    dispatchIndex(index, [&](auto indices) {
+        node2pushthread[node_name] = ThreadPool::Get()->Enqueue(
+            [node_name](decltype(indices) indices, float *data,
+                        const size_t index_size, DLEvent *evt) -> void {
+                if (evt != NULL)
+                    DLEventSync(evt);
+                PSAgent::Get()->vecPushSparse(node_name, indices, data,
+                                              index_size, -node_name);
+            },
+            indices, data, index_size, evt);
+    });
 }
 
 void Worker::sd_pushpull(int node_name, const DLArray *index,
                          const DLArray *in_arr, size_t index_size,
                          DLArray *out_arr, DLEvent *evt) {
-    float *indices = static_cast<float *>(index->data);
     float *in_data = static_cast<float *>(in_arr->data);
     float *out_data = static_cast<float *>(out_arr->data);
-    node2pullthread[node_name] = ThreadPool::Get()->Enqueue(
-        [node_name](float *indices, float *in_data, size_t ind_size,
-                    float *out_data, DLEvent *evt) -> void {
-            if (evt != NULL)
-                DLEventSync(evt);
-            PSAgent::Get()->vecSDPushPull(node_name, indices, in_data, ind_size,
-                                          out_data, -node_name);
-        },
-        indices, in_data, index_size, out_data, evt);
+    dispatchIndex(index, [&](auto indices) {
+        node2pullthread[node_name] = ThreadPool::Get()->Enqueue(
+            [node_name](decltype(indices) indices, float *in_data,
+                        size_t ind_size, float *out_data,
+                        DLEvent *evt) -> void {
+                if (evt != NULL)
+                    DLEventSync(evt);
+                PSAgent::Get()->vecSDPushPull(node_name, indices, in_data,
+                                              ind_size, out_data, -node_name);
+            },
+            indices, in_data, index_size, out_data, evt);
+    });
 }
 
 void Worker::ss_pushpull(int node_name, const DLArray *inind,
                          const DLArray *in_arr, const DLArray *outind,
                          DLArray *out_arr, size_t index_size, DLEvent *evt) {
-    float *inindices = static_cast<float *>(inind->data);
-    float *outindices = static_cast<float *>(outind->data);
+    assert(inind->dtype == outind->dtype);
     float *in_data = static_cast<float *>(in_arr->data);
     float *out_data = static_cast<float *>(out_arr->data);
-    node2pullthread[node_name] = ThreadPool::Get()->Enqueue(
-        [node_name](float *inindices, float *in_data, float *outindices,
-                    float *out_data, size_t index_size, DLEvent *evt) -> void {
-            if (evt != NULL)
-                DLEventSync(evt);
-            PSAgent::Get()->vecSSPushPull(node_name, inindices, in_data,
-                                          outindices, out_data, index_size,
-                                          -node_name);
-        },
-        inindices, in_data, outindices, out_data, index_size, evt);
+    dispatchIndex(inind, [&](auto inindices) {
+        using IndexPtr = decltype(inindices);
+        auto outindices = static_cast<IndexPtr>(outind->data);
+        node2pullthread[node_name] = ThreadPool::Get()->Enqueue(
+            [node_name](IndexPtr inindices, float *in_data,
+                        IndexPtr outindices, float *out_data,
+                        size_t index_size, DLEvent *evt) -> void {
+                if (evt != NULL)
+                    DLEventSync(evt);
+                PSAgent::Get()->vecSSPushPull(node_name, inindices, in_data,
+                                              outindices, out_data, index_size,
+                                              -node_name);
+            },
+            inindices, in_data, outindices, out_data, index_size, evt);
+    });
 }
 
 void Worker::wait(int node_name) {
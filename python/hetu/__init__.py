@@ -1,14 +1,46 @@
 from __future__ import absolute_import
-from .gpu_ops import *
+from . import gpu_ops
+from .gpu_ops import Variable, placeholder_op
 from .context import context, get_current_context, DistConfig
 from .dataloader import dataloader_op, Dataloader, GNNDataLoaderOp
 from .ndarray import cpu, gpu, rcpu, rgpu, array, sparse_array, empty, is_gpu_ctx, IndexedSlices
-from . import optimizer as optim
 from . import lr_scheduler as lr
-from . import initializers as init
 from . import data
-from . import layers
 from . import random
-from . import distributed_strategies as dist
-from .profiler import HetuProfiler, NCCLProfiler, HetuSimulator
-from .tokenizers import *
+
+# the heavy parts are imported at the first access, see __getattr__;
+# name -> (module, attribute), attribute None for the module itself
+_LAZY_ATTRS = {name: ('.gpu_ops', name) for name in gpu_ops.__all__}
+_LAZY_ATTRS.update({
+    'optim': ('.optimizer', None),
+    'init': ('.initializers', None),
+    'layers': ('.layers', None),
+    'dist': ('.distributed_strategies', None),
+    'HetuProfiler': ('.profiler', 'HetuProfiler'),
+    'NCCLProfiler': ('.profiler', 'NCCLProfiler'),
+    'HetuSimulator': ('.profiler', 'HetuSimulator'),
+    'BertTokenizer': ('.tokenizers', 'BertTokenizer'),
+    'bert_tokenizer': ('.tokenizers', 'bert_tokenizer'),
+    'utils': ('.tokenizers', 'utils'),
+})
+# submodules which used to be imported along, as attributes of the package
+_LAZY_ATTRS.update({name: ('.' + name, None) for name in (
+    'communicator', 'cpu_links', 'gpu_links', 'memory_pool', 'optimizer',
+    'initializers', 'distributed_strategies', 'profiler', 'stream', 'tokenizers')})
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name))
+    import importlib
+    module, attr = _LAZY_ATTRS[name]
+    value = importlib.import_module(module, __name__)
+    if attr is not None:
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
@@ -8,12 +8,52 @@ import ctypes
 def _check_functions(lib, func_dict):
     for func in func_dict:
         if hasattr(lib, func):
-            func_dict[func] = True
+            dict.__setitem__(func_dict, func, True)
+
+
+class LazyLibrary(object):
+    """ctypes library loaded by load() at the first use of a function.
+
+    The functions found are cached as attributes, so later calls cost the
+    same as on the library itself.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._lib = None
+
+    def get(self):
+        if self._lib is None:
+            self._lib = self._load()
+        return self._lib
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        func = getattr(self.get(), name)
+        setattr(self, name, func)
+        return func
+
+
+class _LibraryFlags(dict):
+    """Whether each function exists in a lazy library; looking up a flag
+    loads the library first."""
+
+    def __init__(self, library, flags):
+        super().__init__(flags)
+        self.library = library
+
+    def __getitem__(self, func):
+        self.library.get()
+        return dict.__getitem__(self, func)
 
 
 # Defines a dictionary to indicate whether to use DNNL.True is use,False not use.
 DNNL_LIB = {
     'DnnlMatrixMultiply': False,
+    'DnnlBatchMatrixMultiply': False,
+    'DnnlLinear': False,
+    'DnnlActivationGradient': False,
     'DnnlMatrixElementwiseMultiplyByConst': False,
     'DnnlMatrixElementwiseMultiply': False,
     'DnnlMatrixElementwiseAddByConst': False,
@@ -25,6 +65,11 @@ DNNL_LIB = {
     'cpu_ArraySet': False,
     'cpu_Reshape': False,  # c++
     'DnnlSoftmax': False,
+    'DnnlSoftmaxGradient': False,
+    'cpu_LayerNormalization': False,
+    'cpu_LayerNormalizationGradient': False,
+    'cpu_Attention': False,
+    'cpu_AttentionGradient': False,
     'DnnlSoftmaxCrossEntropy': False,  # c++
     'DnnlSoftmaxCrossEntropy_Gradient': False,  # c++
     'DnnlSqrt': False,
@@ -51,6 +96,8 @@ DNNL_LIB = {
     'cpu_Pad': False,  # c++
     'cpu_Pad_Gradient': False,  # c++
     'cpu_EmbeddingLookup': False,  # c++
+    'cpu_EmbeddingBag': False,
+    'cpu_EmbeddingBagGradient': False,
     'cpu_Transpose': False,  # c++
     'cpu_IndexedSlices2Dense': False,
     'cpu_SGDOptimizerUpdate': False,  # c++
@@ -64,6 +111,12 @@ DNNL_LIB = {
     'cpu_AdamOptimizerUpdate': False,  # c++
     'cpu_AdamOptimizerSparseUpdate': False,
     'cpu_AdamUpdateIndexedSlices': False,
+    'cpu_SGDOptimizerForeachUpdate': False,  # c++
+    'cpu_MomentumOptimizerForeachUpdate': False,  # c++
+    'cpu_AdaGradOptimizerForeachUpdate': False,  # c++
+    'cpu_AdamOptimizerForeachUpdate': False,  # c++
+    'cpu_AdamWOptimizerForeachUpdate': False,  # c++
+    'cpu_LambOptimizerForeachUpdate': False,  # c++
     'cpu_UniformInit': False,  # c++
     'cpu_NormalInit': False,  # c++
     'cpu_TruncatedNormalInit': False,  # c++
@@ -81,8 +134,9 @@ def _load_lib():
     return lib
 
 
-# global library instance
-_LIB = _load_lib()
+# global library instance, loaded at the first call
+_LIB = LazyLibrary(_load_lib)
+DNNL_LIB = _LibraryFlags(_LIB, DNNL_LIB)
 
 
 ##################
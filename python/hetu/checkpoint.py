@@ -0,0 +1,133 @@
+from __future__ import absolute_import
+
+import os
+import json
+import struct
+import pickle
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+# checkpoint layout:
+#   MAGIC | index length (uint64, little endian) | json index | blobs
+# the index maps each tensor name to its dtype, shape and offset in the file;
+# 'others' (seeds and user data) is pickled into one more blob. Every blob
+# starts at a multiple of ALIGN, so tensors can be memory mapped in place.
+MAGIC = b'HETUCKPT'
+ALIGN = 4096
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def is_checkpoint(path):
+    # whether path is in this format, rather than a pickled state dict
+    with open(path, 'rb') as reader:
+        return reader.read(len(MAGIC)) == MAGIC
+
+
+def _write(path, tensors, others):
+    # tensors are (name, shape, dtype, fetch) tuples, fetch returns the numpy
+    # value and is called only when the tensor is written, so at most one
+    # tensor is held in host memory at a time
+    others = pickle.dumps(others, protocol=4)
+    index = {'tensors': {}, 'others': None}
+    # the index size depends on the offsets, reserve enough digits for them
+    offset = 0
+    for name, shape, dtype, _ in tensors:
+        nbytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+        index['tensors'][name] = {'dtype': np.dtype(dtype).str, 'shape': list(
+            shape), 'offset': offset, 'nbytes': nbytes}
+        offset = _aligned(offset + nbytes)
+    index['others'] = {'offset': offset, 'nbytes': len(others)}
+    header_bytes = len(MAGIC) + 8 + \
+        len(json.dumps(index).encode('utf-8')) + 20 * (len(tensors) + 1)
+    base = _aligned(header_bytes)
+    for entry in list(index['tensors'].values()) + [index['others']]:
+        entry['offset'] += base
+    encoded = json.dumps(index).encode('utf-8')
+    assert len(MAGIC) + 8 + len(encoded) <= base
+
+    # write to a temporary file so a crash never leaves a broken checkpoint
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as writer:
+            writer.write(MAGIC)
+            writer.write(struct.pack('<Q', len(encoded)))
+            writer.write(encoded)
+            for name, shape, dtype, fetch in tensors:
+                entry = index['tensors'][name]
+                value = np.ascontiguousarray(fetch(), dtype=dtype)
+                assert list(value.shape) == entry['shape'], \
+                    'Shape not conform! Got {} and {} for {}.'.format(
+                        entry['shape'], value.shape, name)
+                writer.seek(entry['offset'])
+                writer.write(memoryview(value.reshape(-1)).cast('B'))
+                del value
+            writer.seek(index['others']['offset'])
+            writer.write(others)
+            writer.flush()
+            os.fsync(writer.fileno())
+    except BaseException:
+        # nor a partial temporary file
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+
+def save_checkpoint(path, tensors, others, background=False):
+    # with background, all tensors are fetched (the snapshot) before
+    # returning and written by a thread; the returned future holds the
+    # path once written, or the exception that stopped the writing
+    if not background:
+        _write(path, tensors, others)
+        return None
+    snapshot = [(name, shape, dtype, fetch())
+                for name, shape, dtype, fetch in tensors]
+    snapshot = [(name, shape, dtype, (lambda value=value: value))
+                for name, shape, dtype, value in snapshot]
+    future = Future()
+
+    def write():
+        try:
+            _write(path, snapshot, others)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(path)
+
+    # not a daemon, the interpreter waits for the file at exit
+    threading.Thread(target=write, daemon=False).start()
+    return future
+
+
+def read_index(path):
+    with open(path, 'rb') as reader:
+        assert reader.read(len(MAGIC)) == MAGIC, \
+            '{} is not a hetu checkpoint.'.format(path)
+        length, = struct.unpack('<Q', reader.read(8))
+        return json.loads(reader.read(length).decode('utf-8'))
+
+
+def load_checkpoint(path, names=None):
+    # returns others and a dict from tensor name to a copy-on-write memory
+    # map of the tensor; nothing is read until the values are used.
+    # names restricts the tensors to a subset
+    index = read_index(path)
+    entry = index['others']
+    with open(path, 'rb') as reader:
+        reader.seek(entry['offset'])
+        others = pickle.loads(reader.read(entry['nbytes']))
+    tensors = {}
+    for name, entry in index['tensors'].items():
+        if names is not None and name not in names:
+            continue
+        shape = tuple(entry['shape'])
+        if entry['nbytes'] == 0:
+            tensors[name] = np.empty(shape, dtype=np.dtype(entry['dtype']))
+            continue
+        tensors[name] = np.memmap(path, dtype=np.dtype(
+            entry['dtype']), mode='c', offset=entry['offset'], shape=shape)
+    return others, tensors
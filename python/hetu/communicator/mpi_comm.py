@@ -1,6 +1,7 @@
 from ctypes import *
 import ctypes
 from hetu import ndarray
+from hetu._base import LazyLibrary
 import numpy as np
 import os
 from enum import Enum
@@ -15,7 +16,7 @@ def _load_mpi_lib():
     return lib
 
 
-lib_mpi = _load_mpi_lib()
+lib_mpi = LazyLibrary(_load_mpi_lib)
 
 
 class MPIDataType_t(Enum):
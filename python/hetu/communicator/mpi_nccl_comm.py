@@ -1,5 +1,6 @@
 from ctypes import *
 from hetu import ndarray
+from hetu._base import LazyLibrary
 from hetu.stream import *
 from hetu.context import DeviceGroup
 import numpy as np
@@ -17,7 +18,7 @@ def _load_nccl_lib():
     return lib
 
 
-lib_mpi_nccl = _load_nccl_lib()
+lib_mpi_nccl = LazyLibrary(_load_nccl_lib)
 # lib_mpi_nccl = CDLL("./lib_mpi_nccl_runtime_api.so", RTLD_LOCAL)
 
 
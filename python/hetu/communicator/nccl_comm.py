@@ -1,5 +1,6 @@
 from ctypes import *
 from .. import ndarray
+from .._base import LazyLibrary
 from ..stream import *
 import numpy as np
 import os
@@ -14,7 +15,7 @@ def _load_nccl_lib():
     return lib
 
 
-lib_nccl = _load_nccl_lib()
+lib_nccl = LazyLibrary(_load_nccl_lib)
 
 
 class NCCL_Communicator():
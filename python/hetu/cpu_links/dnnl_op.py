@@ -3,7 +3,7 @@ import os
 import ctypes
 from .._base import _LIB
 import numpy as np
-from ..ndarray import NDArray, IndexedSlices
+from ..ndarray import NDArray, IndexedSlices, DLArrayHandle
 
 
 def matrix_multiply(matA, transposeA, matB, transposeB, matC):
@@ -14,6 +14,38 @@ def matrix_multiply(matA, transposeA, matB, transposeB, matC):
                             matB.handle, transposeB, matC.handle)
 
 
+# activations fused into linear, by their codes in DnnlLinear
+LINEAR_ACTIVATIONS = (None, 'relu', 'sigmoid', 'tanh', 'gelu')
+
+
+def linear(matA, transposeA, matB, transposeB, bias, activation, matC):
+    # matC = activation(matA @ matB + bias) in one pass, bias may be None
+    assert isinstance(matA, NDArray)
+    assert isinstance(matB, NDArray)
+    assert bias is None or isinstance(bias, NDArray)
+    assert isinstance(matC, NDArray)
+    _LIB.DnnlLinear(matA.handle, transposeA, matB.handle, transposeB,
+                    None if bias is None else bias.handle,
+                    LINEAR_ACTIVATIONS.index(activation), matC.handle)
+
+
+def activation_gradient(output, in_grad, activation, grad):
+    # the gradient through relu, sigmoid or tanh from their output
+    assert isinstance(output, NDArray)
+    assert isinstance(in_grad, NDArray)
+    assert isinstance(grad, NDArray)
+    _LIB.DnnlActivationGradient(output.handle, in_grad.handle,
+                                LINEAR_ACTIVATIONS.index(activation), grad.handle)
+
+
+def batch_matrix_multiply(matA, transposeA, matB, transposeB, matC):
+    assert isinstance(matA, NDArray)
+    assert isinstance(matB, NDArray)
+    assert isinstance(matC, NDArray)
+    _LIB.DnnlBatchMatrixMultiply(matA.handle, transposeA,
+                                 matB.handle, transposeB, matC.handle)
+
+
 def matrix_elementwise_multiply_by_const(mat, val, output):
     assert isinstance(mat, NDArray)
     assert isinstance(output, NDArray)
@@ -85,6 +117,81 @@ def softmax(mat, output):
     _LIB.DnnlSoftmax(mat.handle, output.handle)
 
 
+def softmax_gradient(output, in_grad, grad):
+    # the gradient through softmax from its output
+    assert isinstance(output, NDArray)
+    assert isinstance(in_grad, NDArray)
+    assert isinstance(grad, NDArray)
+    _LIB.DnnlSoftmaxGradient(output.handle, in_grad.handle, grad.handle)
+
+
+def layer_normalization(in_arr, ln_scale, ln_bias, mean, var, out_arr, eps):
+    assert isinstance(in_arr, NDArray)
+    assert isinstance(ln_scale, NDArray)
+    assert isinstance(ln_bias, NDArray)
+    assert isinstance(mean, NDArray)
+    assert isinstance(var, NDArray)
+    assert isinstance(out_arr, NDArray)
+    _LIB.cpu_LayerNormalization(in_arr.handle, ln_scale.handle, ln_bias.handle,
+                                mean.handle, var.handle, out_arr.handle, ctypes.c_float(eps))
+
+
+def layer_normalization_gradient(out_grads, in_arr, ln_scale, grad_arr, grad_scale, grad_bias,
+                                 mean_arr, var_arr, eps):
+    assert isinstance(out_grads, NDArray)
+    assert isinstance(in_arr, NDArray)
+    assert isinstance(ln_scale, NDArray)
+    assert isinstance(grad_arr, NDArray)
+    assert isinstance(grad_scale, NDArray)
+    assert isinstance(grad_bias, NDArray)
+    assert isinstance(mean_arr, NDArray)
+    assert isinstance(var_arr, NDArray)
+    _LIB.cpu_LayerNormalizationGradient(out_grads.handle, in_arr.handle, ln_scale.handle,
+                                        grad_arr.handle, grad_scale.handle, grad_bias.handle,
+                                        mean_arr.handle, var_arr.handle, ctypes.c_float(eps))
+
+
+def attention(query, key, value, mask, output, lse, seq_len, num_heads, scale,
+              causal, keep_prob, seed, seqnum):
+    # softmax(scale * query @ key^T + mask) @ value per head in tiles, mask
+    # may be None; lse keeps the log-sum-exp of the scores for the gradient
+    assert isinstance(query, NDArray)
+    assert isinstance(key, NDArray)
+    assert isinstance(value, NDArray)
+    assert mask is None or isinstance(mask, NDArray)
+    assert isinstance(output, NDArray)
+    assert isinstance(lse, NDArray)
+    _LIB.cpu_Attention(query.handle, key.handle, value.handle,
+                       None if mask is None else mask.handle, output.handle,
+                       lse.handle, ctypes.c_int(seq_len), ctypes.c_int(num_heads),
+                       ctypes.c_float(scale), ctypes.c_bool(causal),
+                       ctypes.c_float(keep_prob), ctypes.c_ulonglong(seed),
+                       ctypes.c_ulonglong(seqnum))
+
+
+def attention_gradient(query, key, value, mask, output, lse, out_grad,
+                       grad_query, grad_key, grad_value, seq_len, num_heads,
+                       scale, causal, keep_prob, seed, seqnum):
+    assert isinstance(query, NDArray)
+    assert isinstance(key, NDArray)
+    assert isinstance(value, NDArray)
+    assert mask is None or isinstance(mask, NDArray)
+    assert isinstance(output, NDArray)
+    assert isinstance(lse, NDArray)
+    assert isinstance(out_grad, NDArray)
+    assert isinstance(grad_query, NDArray)
+    assert isinstance(grad_key, NDArray)
+    assert isinstance(grad_value, NDArray)
+    _LIB.cpu_AttentionGradient(query.handle, key.handle, value.handle,
+                               None if mask is None else mask.handle,
+                               output.handle, lse.handle, out_grad.handle,
+                               grad_query.handle, grad_key.handle, grad_value.handle,
+                               ctypes.c_int(seq_len), ctypes.c_int(num_heads),
+                               ctypes.c_float(scale), ctypes.c_bool(causal),
+                               ctypes.c_float(keep_prob), ctypes.c_ulonglong(seed),
+                               ctypes.c_ulonglong(seqnum))
+
+
 def softmax_crossentropy(matA, matB, output):
     assert isinstance(matA, NDArray)
     assert isinstance(matB, NDArray)
@@ -311,6 +418,47 @@ def embedding_lookup(in_mat, ids, out_mat):
     _LIB.cpu_EmbeddingLookup(in_mat.handle, ids.handle, out_mat.handle)
 
 
+# pooling of embedding_bag, by their codes in cpu_EmbeddingBag
+EMBEDDING_BAG_MODES = ('sum', 'mean', 'max')
+
+
+def embedding_bag(embed, ids, offsets, weights, output, argmax, mode,
+                  num_embed, gathered=False):
+    # offsets, weights and argmax (only for max) may be None; if gathered,
+    # embed holds the row of every id instead of the table
+    assert isinstance(embed, NDArray)
+    assert isinstance(ids, NDArray)
+    assert offsets is None or isinstance(offsets, NDArray)
+    assert weights is None or isinstance(weights, NDArray)
+    assert isinstance(output, NDArray)
+    assert argmax is None or isinstance(argmax, NDArray)
+    _LIB.cpu_EmbeddingBag(embed.handle, ids.handle,
+                          None if offsets is None else offsets.handle,
+                          None if weights is None else weights.handle,
+                          output.handle, None if argmax is None else argmax.handle,
+                          ctypes.c_int(EMBEDDING_BAG_MODES.index(mode)),
+                          ctypes.c_int(num_embed), ctypes.c_bool(gathered))
+
+
+def embedding_bag_gradient(out_grad, ids, offsets, weights, argmax,
+                           out_indices, out_values, mode, num_embed):
+    assert isinstance(out_grad, NDArray)
+    assert isinstance(ids, NDArray)
+    assert offsets is None or isinstance(offsets, NDArray)
+    assert weights is None or isinstance(weights, NDArray)
+    assert argmax is None or isinstance(argmax, NDArray)
+    assert isinstance(out_indices, NDArray)
+    assert isinstance(out_values, NDArray)
+    _LIB.cpu_EmbeddingBagGradient(out_grad.handle, ids.handle,
+                                  None if offsets is None else offsets.handle,
+                                  None if weights is None else weights.handle,
+                                  None if argmax is None else argmax.handle,
+                                  out_indices.handle, out_values.handle,
+                                  ctypes.c_int(
+                                      EMBEDDING_BAG_MODES.index(mode)),
+                                  ctypes.c_int(num_embed))
+
+
 def add_l2_regularization(param, grad, l2reg):
     if l2reg > 0:
         if isinstance(grad, IndexedSlices):
@@ -396,6 +544,71 @@ def adam_update(param, grad, expavg, expavgsq, maxv, lr, beta1, beta2, betats, l
                                          beta2), betats.handle, ctypes.c_float(eps))
 
 
+def handle_array(arrs):
+    """The handles of a list of NDArrays, to be passed to the foreach updates
+    in place of the list when the same arrays are updated every step."""
+    assert all(isinstance(arr, NDArray) for arr in arrs)
+    return (DLArrayHandle * len(arrs))(*[arr.handle for arr in arrs])
+
+
+def _handle_array(arrs):
+    if isinstance(arrs, ctypes.Array):
+        return arrs
+    return handle_array(arrs)
+
+
+def sgd_foreach_update(params, grads, lr, l2reg):
+    assert len(params) == len(grads)
+    _LIB.cpu_SGDOptimizerForeachUpdate(
+        _handle_array(params), _handle_array(grads), ctypes.c_int(len(params)),
+        ctypes.c_float(lr), ctypes.c_float(l2reg))
+
+
+def momentum_foreach_update(params, grads, velocities, lr, momentum, nesterov, l2reg):
+    assert len(params) == len(grads) == len(velocities)
+    _LIB.cpu_MomentumOptimizerForeachUpdate(
+        _handle_array(params), _handle_array(grads), _handle_array(velocities),
+        ctypes.c_int(len(params)), ctypes.c_float(lr), ctypes.c_float(momentum),
+        ctypes.c_bool(nesterov), ctypes.c_float(l2reg))
+
+
+def adagrad_foreach_update(params, grads, accumulations, lr, l2reg, eps):
+    assert len(params) == len(grads) == len(accumulations)
+    _LIB.cpu_AdaGradOptimizerForeachUpdate(
+        _handle_array(params), _handle_array(grads), _handle_array(accumulations),
+        ctypes.c_int(len(params)), ctypes.c_float(lr), ctypes.c_float(eps),
+        ctypes.c_float(l2reg))
+
+
+def adam_foreach_update(params, grads, expavgs, expavgsqs, maxvs, lr, beta1, beta2, betats, l2reg, eps):
+    assert len(params) == len(grads) == len(expavgs) == len(expavgsqs)
+    assert maxvs is None or len(maxvs) == len(params)
+    assert isinstance(betats, NDArray)
+    _LIB.cpu_AdamOptimizerForeachUpdate(
+        _handle_array(params), _handle_array(grads), _handle_array(expavgs),
+        _handle_array(expavgsqs), None if maxvs is None else _handle_array(maxvs),
+        ctypes.c_int(len(params)), ctypes.c_float(lr), ctypes.c_float(beta1),
+        ctypes.c_float(beta2), betats.handle, ctypes.c_float(eps), ctypes.c_float(l2reg))
+
+
+def adamw_foreach_update(params, grads, expavgs, expavgsqs, lr, beta1, beta2, beta1_t, beta2_t, eps, weight_decay):
+    assert len(params) == len(grads) == len(expavgs) == len(expavgsqs)
+    _LIB.cpu_AdamWOptimizerForeachUpdate(
+        _handle_array(params), _handle_array(grads), _handle_array(expavgs),
+        _handle_array(expavgsqs), ctypes.c_int(len(params)), ctypes.c_float(lr),
+        ctypes.c_float(beta1), ctypes.c_float(beta2), ctypes.c_float(beta1_t),
+        ctypes.c_float(beta2_t), ctypes.c_float(eps), ctypes.c_float(weight_decay))
+
+
+def lamb_foreach_update(params, grads, expavgs, expavgsqs, lr, beta1, beta2, beta1_t, beta2_t, eps, weight_decay):
+    assert len(params) == len(grads) == len(expavgs) == len(expavgsqs)
+    _LIB.cpu_LambOptimizerForeachUpdate(
+        _handle_array(params), _handle_array(grads), _handle_array(expavgs),
+        _handle_array(expavgsqs), ctypes.c_int(len(params)), ctypes.c_float(lr),
+        ctypes.c_float(beta1), ctypes.c_float(beta2), ctypes.c_float(beta1_t),
+        ctypes.c_float(beta2_t), ctypes.c_float(eps), ctypes.c_float(weight_decay))
+
+
 def reduce_indexedslice(in_indices, in_values, out_indices, out_values):
     assert isinstance(in_indices, NDArray)
     assert isinstance(in_values, NDArray)
@@ -521,3 +734,21 @@ def gelu_gradient(input, in_grad, output):
     assert isinstance(in_grad, NDArray)
     assert isinstance(output, NDArray)
     _LIB.DnnlGelu_Gradient(input.handle, in_grad.handle, output.handle)
+
+
+def dnnl_cache_stats():
+    # counters of the dnnl primitive cache shared by the ops above
+    stats = (ctypes.c_ulonglong * 5)()
+    _LIB.DnnlCacheStats(stats)
+    return dict(zip(('hits', 'misses', 'evictions', 'size', 'capacity'),
+                    stats))
+
+
+def set_dnnl_cache_capacity(capacity):
+    # least recently used primitives are evicted beyond capacity; 0 disables
+    _LIB.DnnlCacheSetCapacity(ctypes.c_int(capacity))
+
+
+def clear_dnnl_cache():
+    # drops the primitives and resets the counters
+    _LIB.DnnlCacheClear()
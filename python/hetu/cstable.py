@@ -13,17 +13,37 @@ from functools import partial
         limit: the max number of embedding lines stored in cache
         node_id: the unique node_id in the model
         policy: cache policy, LRU or LFU
+        num_shards: if larger than 1, keys are hash-partitioned into shards,
+            each with its own lock, so that concurrent lookups/updates and
+            the keys of a batch are processed in parallel
+
+    NDArray keys may be int32, int64/uint64 or (legacy) float32; integer keys
+    are passed to the cache in their native dtype, 64-bit ones without a copy.
+    Float keys are only exact below 2^24.
 """
 
+_RAW_KEY_DTYPES = (np.float32, np.int32, np.int64, np.uint64)
+
+
+def _raw_key_type(keys):
+    assert keys.dtype in _RAW_KEY_DTYPES, \
+        "Unsupported key dtype {}".format(keys.dtype)
+    return ndarray.get_dtype(keys.dtype)
+
 
 class CacheSparseTable:
-    def __init__(self, limit, length, width, node_id, policy="LRU", bound=100):
+    def __init__(self, limit, length, width, node_id, policy="LRU", bound=100, num_shards=1):
         # make sure we open libps.so first
         comm = get_worker_communicate()
         sys.path.append(os.path.dirname(__file__)+"/../../build/lib")
         import hetu_cache
         policy = policy.lower()
-        if policy == "lru":
+        if policy not in ("lru", "lfu", "lfuopt"):
+            raise NotImplementedError(policy)
+        if num_shards > 1:
+            self.cache = hetu_cache.ShardedCache(
+                policy, num_shards, limit, length, width, node_id)
+        elif policy == "lru":
             self.cache = hetu_cache.LRUCache(limit, length, width, node_id)
         elif policy == "lfu":
             self.cache = hetu_cache.LFUCache(limit, length, width, node_id)
@@ -41,7 +61,8 @@ class CacheSparseTable:
             dest: target memory space to write to
             sync: async call of sync call
             if async, a wait_t is returned, use wait.wait() to wait until it finish.
-            if async, must make sure keys and dest are alive throughout the call
+            if async, must make sure dest (and numpy keys) are alive throughout the call,
+            NDArray keys are copied and can be reused at once
     """
 
     def embedding_lookup(self, keys, dest, sync=False):
@@ -56,7 +77,8 @@ class CacheSparseTable:
             assert not ndarray.is_gpu_ctx(keys.ctx)
             assert not ndarray.is_gpu_ctx(dest.ctx)
             wait = self.cache.embedding_lookup_raw(
-                keys.handle.contents.data, dest.handle.contents.data, np.prod(keys.shape))
+                keys.handle.contents.data, dest.handle.contents.data, np.prod(keys.shape),
+                _raw_key_type(keys))
         else:
             raise TypeError
         if sync:
@@ -69,7 +91,8 @@ class CacheSparseTable:
             grads: gradients to send
             sync: async call of sync call
             if async, a wait_t is returned, use wait.wait() to wait until it finish.
-            if async, must make sure keys and dest are alive throughout the call
+            if async, must make sure dest (and numpy keys) are alive throughout the call,
+            NDArray keys are copied and can be reused at once
     """
 
     def embedding_update(self, keys, grads, sync=False):
@@ -84,7 +107,8 @@ class CacheSparseTable:
             assert not ndarray.is_gpu_ctx(keys.ctx)
             assert not ndarray.is_gpu_ctx(grads.ctx)
             wait = self.cache.embedding_update_raw(
-                keys.handle.contents.data, grads.handle.contents.data, np.prod(keys.shape))
+                keys.handle.contents.data, grads.handle.contents.data, np.prod(keys.shape),
+                _raw_key_type(keys))
         else:
             raise TypeError
         if sync:
@@ -102,11 +126,13 @@ class CacheSparseTable:
             assert not ndarray.is_gpu_ctx(pushkeys.ctx)
             assert not ndarray.is_gpu_ctx(grads.ctx)
             assert not ndarray.is_gpu_ctx(dest.ctx)
+            assert pullkeys.dtype == pushkeys.dtype
             wait = self.cache.embedding_push_pull_raw(
                 pullkeys.handle.contents.data, dest.handle.contents.data, np.prod(
                     pullkeys.shape),
                 pushkeys.handle.contents.data, grads.handle.contents.data, np.prod(
-                    pushkeys.shape)
+                    pushkeys.shape),
+                _raw_key_type(pullkeys)
             )
         else:
             raise TypeError
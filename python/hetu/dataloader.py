@@ -1,6 +1,9 @@
 from __future__ import absolute_import
 import numpy as np
-from collections import Iterable
+from collections import deque
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 
 from . import ndarray
 from .random import get_np_rand
@@ -21,14 +24,54 @@ class BatchIndices(object):
     def assert_attr(self, dataloader):
         assert self.batch_num == dataloader.batch_num
         assert self.need_shuffle == dataloader.shuffle
+        assert dataloader.shuffle_mode == 'batch'
+
+    def peek(self, key):
+        # look up a batch of the current epoch without side effects
+        return self.all_batch_indices[key]
 
     def __getitem__(self, key):
         if key == 0 and self.last_key != key:
-            assert self.last_key == len(self.all_batch_indices) - 1
+            assert self.last_key == self.batch_num - 1
             if self.need_shuffle:
                 self.shuffle()
         self.last_key = key
-        return self.all_batch_indices[key]
+        return self.peek(key)
+
+
+class SampleIndices(BatchIndices):
+    # shuffle samples instead of batches; each key maps to an index array
+    def __init__(self, batch_num, batch_size, samples_num, need_shuffle=False, chunk_size=None):
+        super().__init__(batch_num, need_shuffle)
+        self.batch_size = batch_size
+        self.samples_num = samples_num
+        self.chunk_size = chunk_size
+        self.all_sample_indices = np.arange(self.samples_num)
+
+    def shuffle(self):
+        nprs = get_np_rand(1)
+        if self.chunk_size is None:
+            nprs.shuffle(self.all_sample_indices)
+        else:
+            # chunk-local shuffle: permute the chunks and the samples inside
+            # each chunk, so reads from memmaps stay mostly sequential
+            starts = np.arange(0, self.samples_num, self.chunk_size)
+            nprs.shuffle(starts)
+            self.all_sample_indices[:] = np.concatenate([
+                st + nprs.permutation(min(self.chunk_size, self.samples_num - st)) for st in starts])
+
+    def assert_attr(self, dataloader):
+        assert self.batch_num == dataloader.batch_num
+        assert self.need_shuffle == dataloader.shuffle
+        assert dataloader.shuffle_mode == 'sample'
+        assert self.batch_size == dataloader.batch_size
+        assert self.samples_num == dataloader.samples_num
+        assert self.chunk_size == dataloader.shuffle_chunk
+
+    def peek(self, key):
+        # copy, since a later shuffle permutes the indices in place
+        start = key * self.batch_size
+        return self.all_sample_indices[start:start + self.batch_size].copy()
 
 
 class RawData(object):
@@ -41,11 +84,12 @@ class RawData(object):
             raw_data = [self._init_array(raw_data)]
         self.raw_data = raw_data
         self._shape = list(raw_data[0].shape)
-        self._offsets = [0, self._shape[0]]
         for d in raw_data[1:]:
             assert list(d.shape[1:]) == self._shape[1:]
             self._shape[0] += d.shape[0]
-            self._offsets.append(self._shape[0])
+        # starting global index of each array
+        self._offsets = np.cumsum(
+            [0] + [d.shape[0] for d in raw_data], dtype=np.int64)
 
     def _init_array(self, raw_data):
         raw_data = self.func(raw_data)
@@ -63,30 +107,38 @@ class RawData(object):
         return self._shape
 
     def _get_arr_index(self, index):
-        # binary search
         if index < 0:
             index = index % len(self)
         elif index >= len(self):
             index = len(self) - 1
-        l, r = 0, len(self.raw_data)
-        while l + 1 < r:
-            mid = (l + r) // 2
-            if self._offsets[mid] == index:
-                l = mid
-                break
-            elif self._offsets[mid] < index:
-                l = mid
-            else:
-                r = mid
-        arr_ind = l
-        arr_offset = index - self._offsets[arr_ind]
+        arr_ind = int(np.searchsorted(
+            self._offsets, index, side='right')) - 1
+        arr_offset = index - int(self._offsets[arr_ind])
         return arr_ind, arr_offset
 
+    def take(self, indices, out=None):
+        # gather samples at (global) indices into out in one vectorized pass
+        indices = np.asarray(indices)
+        if out is None:
+            out = np.empty([len(indices)] + self._shape[1:], dtype=self.dtype)
+        if len(self.raw_data) == 1:
+            np.take(self.raw_data[0], indices, axis=0, out=out)
+        else:
+            arr_inds = np.searchsorted(
+                self._offsets, indices, side='right') - 1
+            for arr_ind in np.unique(arr_inds):
+                mask = arr_inds == arr_ind
+                out[mask] = self.raw_data[arr_ind][indices[mask] -
+                                                   self._offsets[arr_ind]]
+        return out
+
     def __getitem__(self, key):
         # directly return array; not good for dp split, need further support
-        if isinstance(key, int):
+        if isinstance(key, (int, np.integer)):
             arr_ind, arr_offset = self._get_arr_index(key)
             return self.raw_data[arr_ind][arr_offset]
+        elif isinstance(key, (np.ndarray, list)):
+            return self.take(key)
         else:
             assert isinstance(key, slice) and key.step is None
             start, stop = key.start, key.stop
@@ -107,6 +159,20 @@ class RawData(object):
                 result = np.concatenate(cands)
             return result
 
+    def fill(self, start, stop, out):
+        # copy samples [start, stop) into the preallocated array out
+        start_arr_ind, start_arr_offset = self._get_arr_index(start)
+        stop_arr_ind, stop_arr_offset = self._get_arr_index(stop - 1)
+        if start_arr_ind == stop_arr_ind:
+            out[:] = self.raw_data[start_arr_ind][start_arr_offset:stop_arr_offset + 1]
+        else:
+            pos = 0
+            for i in range(start_arr_ind, stop_arr_ind + 1):
+                lo = start_arr_offset if i == start_arr_ind else 0
+                hi = stop_arr_offset + 1 if i == stop_arr_ind else len(self.raw_data[i])
+                out[pos:pos + hi - lo] = self.raw_data[i][lo:hi]
+                pos += hi - lo
+
     def __iter__(self):
         for d in self.raw_data:
             for dd in d:
@@ -121,9 +187,10 @@ class RawData(object):
         return RawData([d.reshape(new_shape) for d in self.raw_data], dtype=self.dtype, func=None)
 
 
-# Multi-Process not useful now, since we don't have memory to CPU bottleneck
+# Batches can be prefetched by a pool of worker threads (num_workers > 0);
+# the copies release the GIL, so threads suffice for memmap gathering.
 class Dataloader(object):
-    def __init__(self, raw_data, batch_size, name='default', func=None, batch_func=None, shuffle=False, drop_last=True, offset=0, dtype=np.float32):
+    def __init__(self, raw_data, batch_size, name='default', func=None, batch_func=None, shuffle=False, drop_last=True, offset=0, dtype=np.float32, num_workers=0, prefetch_depth=2, shuffle_mode='batch', shuffle_chunk=None):
         self.func = func if func else lambda x: x
         self.dtype = dtype
         self.raw_data = RawData(raw_data, self.dtype, self.func)
@@ -133,16 +200,31 @@ class Dataloader(object):
             def batch_func(x): return x
         self.batch_func = batch_func
         self.shuffle = shuffle
+        # 'batch' permutes whole batches, 'sample' permutes samples;
+        # shuffle_chunk restricts sample shuffling to chunks of that size
+        assert shuffle_mode in ('batch', 'sample'), \
+            'Shuffle mode %s invalid.' % shuffle_mode
+        assert shuffle_chunk is None or shuffle_mode == 'sample'
+        self.shuffle_mode = shuffle_mode
+        self.shuffle_chunk = shuffle_chunk
         if isinstance(name, str):
             self.name = name
         else:
             assert isinstance(name, Iterable)
             self.name = tuple(name)
         self.dp_nrank = None
+        self.sample_offset = 0
         self.parts = None
         self.slices = None
         self.batch_num = None
         self.batch_index = offset
+        # prefetching states
+        self.num_workers = num_workers
+        self.prefetch_depth = prefetch_depth
+        assert num_workers == 0 or prefetch_depth > 0, \
+            'Prefetch depth %d invalid.' % prefetch_depth
+        self.workers = None
+        self.reset_prefetch_stats()
 
     def set_batch_index(self, offset):
         if offset >= self.batch_num:
@@ -152,11 +234,12 @@ class Dataloader(object):
     def init_states(self):
         if self.dp_nrank is not None:
             # this part is only for data parallel
+            # samples are read from the shard lazily, without materializing it
             cur_size = self.raw_data.shape[0] // self.dp_nrank
-            start = cur_size * self.dp_rank
-            ending = start + cur_size
-            self.raw_data = self.raw_data[start:ending]
-        self.samples_num = len(self.raw_data)
+            self.sample_offset = cur_size * self.dp_rank
+            self.samples_num = cur_size
+        else:
+            self.samples_num = len(self.raw_data)
         self.batch_size = int(self.batch_size)
         assert self.batch_size > 0, 'Batch size %d invalid.' % self.batch_size
         self.batch_num = self.get_batch_num(self.samples_num)
@@ -164,28 +247,150 @@ class Dataloader(object):
             self.batch_index = 0
         self.sample_shape = list(self.raw_data.shape[1:])
         self.shape = tuple([self.batch_size] + self.sample_shape)
-        self.arr = ndarray.empty(
-            self.shape, ctx=ndarray.cpu(0), dtype=self.dtype)
+        self.arr = self.empty(self.shape)
         # in case the last batch's shape is different, pre-allocate an array
         self.rest_arr = None
         if not self.drop_last:
             assert self.parts is None, 'Model parallel cannot use dataloader without drop_last.'
             res_num = self.samples_num % self.batch_size
             if res_num > 0 and res_num != self.batch_size:
-                self.rest_arr = ndarray.empty(
-                    tuple([res_num] + self.sample_shape), ctx=ndarray.cpu(0), dtype=self.dtype)
+                self.rest_arr = self.empty(
+                    tuple([res_num] + self.sample_shape))
         self.set_slices()
+        if self.num_workers > 0:
+            self.init_prefetch()
+
+    def empty(self, shape):
+        # 64-bit keys are kept as they are, not narrowed to 32 bits
+        force32 = not (np.issubdtype(self.dtype, np.integer)
+                       and np.dtype(self.dtype).itemsize == 8)
+        return ndarray.empty(shape, ctx=ndarray.cpu(0), dtype=self.dtype, force32=force32)
+
+    def init_prefetch(self):
+        # ring of batch buffers; self.arr is the first one
+        self.close()
+        self.free_bufs = deque([self.arr] + [self.empty(self.arr.shape)
+                                             for _ in range(self.prefetch_depth)])
+        # entries are [key, batchind, buffer, future]
+        self.pending = deque()
+        self.cur_entry = None
+        self.next_key = None
+        self.workers = ThreadPoolExecutor(
+            max_workers=self.num_workers, thread_name_prefix='hetu_dataloader')
+
+    def close(self):
+        if self.workers is not None:
+            self.workers.shutdown(wait=True)
+            self.workers = None
+
+    def reset_prefetch_stats(self):
+        self.prefetch_stats = {
+            'batches': 0,
+            'hits': 0,
+            'misses': 0,
+            'stalls': 0,
+            'stall_time': 0.,
+            'queue_depth_sum': 0,
+        }
+
+    def get_prefetch_stats(self):
+        # queue depth: number of batches ready when a batch is requested
+        stats = dict(self.prefetch_stats)
+        stats['queue_depth'] = 0 if self.workers is None else \
+            sum(entry[3].done() for entry in self.pending)
+        stats['avg_queue_depth'] = stats.pop(
+            'queue_depth_sum') / max(stats['batches'], 1)
+        return stats
+
+    def create_indices(self):
+        if self.shuffle_mode == 'sample':
+            return SampleIndices(self.batch_num, self.batch_size, self.samples_num,
+                                 need_shuffle=self.shuffle, chunk_size=self.shuffle_chunk)
+        return BatchIndices(self.batch_num, need_shuffle=self.shuffle)
+
+    def is_rest_batch(self, batchind):
+        if isinstance(batchind, np.ndarray):
+            return len(batchind) < self.batch_size
+        return (batchind + 1) * self.batch_size > self.samples_num
+
+    @staticmethod
+    def same_batch(entry, key, batchind):
+        return entry[0] == key and np.array_equal(entry[1], batchind)
+
+    def _load_batch(self, batchind, out):
+        if isinstance(batchind, np.ndarray):
+            # sample indices from SampleIndices
+            self.raw_data.take(batchind + self.sample_offset, out)
+        else:
+            index = batchind * self.batch_size + self.sample_offset
+            stop = min(index + self.batch_size,
+                       self.samples_num + self.sample_offset)
+            self.raw_data.fill(index, stop, out)
 
     def _get_arr(self, batchind):
+        if self.workers is not None:
+            return self._get_prefetched_arr(batchind)
         batchind = self.all_batch_indices[batchind]
-        index = batchind * self.batch_size
-        res = self.raw_data[index:index+self.batch_size]
-        if res.shape[0] != self.batch_size:
-            self.rest_arr[:] = res
-            return self.rest_arr
+        res = self.rest_arr if self.is_rest_batch(batchind) else self.arr
+        self._load_batch(batchind, res.numpy_view())
+        return res
+
+    def _get_prefetched_arr(self, key):
+        # resolve the batch index here, so that shuffling happens exactly
+        # as in the synchronous path; prefetched batches are only checked
+        batchind = self.all_batch_indices[key]
+        if self.cur_entry is not None:
+            if self.same_batch(self.cur_entry, key, batchind):
+                return self.cur_entry[2]
+            if self.cur_entry[2] is not self.rest_arr:
+                self.free_bufs.append(self.cur_entry[2])
+            self.cur_entry = None
+        stats = self.prefetch_stats
+        stats['batches'] += 1
+        stats['queue_depth_sum'] += sum(entry[3].done()
+                                        for entry in self.pending)
+        # drop batches prefetched for other keys (e.g. after set_batch_index)
+        while self.pending and not self.same_batch(self.pending[0], key, batchind):
+            entry = self.pending.popleft()
+            entry[3].result()
+            self.free_bufs.append(entry[2])
+        if self.pending:
+            entry = self.pending.popleft()
+            if not entry[3].done():
+                start = time()
+                entry[3].result()
+                stats['stalls'] += 1
+                stats['stall_time'] += time() - start
+            else:
+                entry[3].result()
+            stats['hits'] += 1
+            res = entry[2]
+            self.cur_entry = entry
         else:
-            self.arr[:] = res
-            return self.arr
+            stats['misses'] += 1
+            self.next_key = key + 1
+            if self.is_rest_batch(batchind):
+                res = self.rest_arr
+            else:
+                res = self.free_bufs.popleft()
+            self.cur_entry = [key, batchind, res, None]
+            self._load_batch(batchind, res.numpy_view())
+        self._schedule_prefetch()
+        return res
+
+    def _schedule_prefetch(self):
+        # prefetch within the current epoch only; the next epoch may reshuffle
+        indices = self.all_batch_indices
+        while self.free_bufs and len(self.pending) < self.prefetch_depth \
+                and self.next_key < self.batch_num:
+            batchind = indices.peek(self.next_key)
+            if self.is_rest_batch(batchind):
+                break
+            buf = self.free_bufs.popleft()
+            future = self.workers.submit(
+                self._load_batch, batchind, buf.numpy_view())
+            self.pending.append([self.next_key, batchind, buf, future])
+            self.next_key += 1
 
     def get_arr(self):
         # step forward in this function
@@ -242,7 +447,8 @@ class Dataloader(object):
 
     def get_batch_num(self, samples_num=None):
         if samples_num is None:
-            samples_num = len(self.raw_data)
+            samples_num = len(self.raw_data) if self.batch_num is None \
+                else self.samples_num
         return int(np.ceil(samples_num / self.batch_size)) \
             if not self.drop_last else samples_num // self.batch_size
 
@@ -329,6 +535,13 @@ class DataloaderOp(Op):
     def get_next_arr(self, name):
         return self.dataloaders[name].get_next_arr()
 
+    def get_prefetch_stats(self, name):
+        return self.dataloaders[name].get_prefetch_stats()
+
+    def close(self):
+        for dataloader in self.dataloaders.values():
+            dataloader.close()
+
     def gradient(self, output_grad):
         return None
 
@@ -352,8 +565,7 @@ class DataloaderOp(Op):
                 assert d.dp_nrank == min_dp_nrank
             d.init_states()
             if d.name not in config.dataloader_states:
-                config.dataloader_states[d.name] = BatchIndices(
-                    d.batch_num, need_shuffle=d.shuffle)
+                config.dataloader_states[d.name] = d.create_indices()
             else:
                 config.dataloader_states[d.name].assert_attr(d)
             d.all_batch_indices = config.dataloader_states[d.name]
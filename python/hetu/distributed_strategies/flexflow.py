@@ -1,6 +1,7 @@
 import numpy as np
-from random import choice, random
+from random import Random, getrandbits
 from collections import defaultdict
+from copy import copy
 
 from ..gpu_ops.Variable import PlaceholderOp
 from ..gpu_ops.DataTransfer import DataD2HSparseOp
@@ -9,16 +10,42 @@ from .base import BaseSearchingStrategy
 from ..ndarray import rgpu
 
 
+class ProfileMiss(Exception):
+    pass
+
+
+class ProfiledCache(dict):
+    # the execution time cache of the simulator in a chain process: profiling
+    # needs the GPU and the MPI peers of the searching process, so a case not
+    # profiled yet raises ProfileMiss instead
+    def __contains__(self, key):
+        if not dict.__contains__(self, key):
+            raise ProfileMiss()
+        return True
+
+
 class FlexFlowSearching(BaseSearchingStrategy):
-    def __init__(self, feed_shapes, time_budget=-1, round_budget=-1, unit_round_budget=-1, alpha=0.05, **kargs):
+    def __init__(self, feed_shapes, time_budget=-1, round_budget=-1, unit_round_budget=-1, alpha=0.05, num_chains=1, incremental=True, **kargs):
         # DEPRECATED! Not maintained; not support prune_status in context or nccl primitives.
         # in FlexFlow paper, no duplicate considered
+        # num_chains: independent markov chains run in processes, sharing the
+        # round budget; the best result is kept
+        # incremental: rebuild only the tasks affected by a change and re-time
+        # from the first changed task, instead of simulating from scratch
         assert 'include_duplicate' not in kargs
         super().__init__(feed_shapes, include_duplicate=False, **kargs)
         self.time_budget = time_budget
         self.round_budget = round_budget
         self.unit_round_budget = unit_round_budget
         self.alpha = alpha
+        self.num_chains = num_chains
+        self.incremental = incremental
+        # tasks built for the last task graphs, see init_task_graph
+        self.task_memo = {}
+        self.memo_used = set()
+        self.memo_accepted = set()
+        self.simulate_scan = self.ScanCache()
+        self.memory_scan = self.ScanCache()
 
     def budget_judge(self, start, ending, best_emerge_time, iter_num):
         # we consider both time budget and round budget
@@ -37,101 +64,233 @@ class FlexFlowSearching(BaseSearchingStrategy):
             for node, value in self.search_space.items():
                 cnt += len(value[1])
             self.round_budget = self.unit_round_budget * cnt
-        all_possible_nodes = [
-            k for k, v in self.search_space.items() if v[0]]
         print('No configuration loaded. Start autotuning...')
         # infer states using partial information
         start = time()
         meta_cur_state_map = graph_status.copy_cur_state_to()
+        self.init_state_map = dict(meta_cur_state_map)
         for node, value in self.merging.items():
             graph_status.node_cur_state_map[node] = meta_cur_state_map[value]
         graph_status.complete_state_map_with_partial_information(prune=False)
         simulation_result, memory_excess = self.make_graph_n_simulate(
             graph_status, memory_pool)
+        self.accept_simulation()
         graph_status.reset_status()
         assert memory_excess == 0, 'Data parallel is out of memory by {} MB! Not a good start point.'.format(
             memory_excess / 1024 / 1024 * 4)
 
         print('Initial data parallel configuration generated; simulation result: {:.3f}ms.'.format(
             simulation_result))
-        best_cur_status = {node.name: meta_cur_state_map[node]
-                           for node in self.search_space}
-        best_raw_ctx = {node.name: node.raw_ctx for node in self.search_space}
-        best_simulation = simulation_result
-        best_emerge_time = time()
-        prev_simulation = simulation_result
-        cnt = 0
+        cur_status = {node.name: meta_cur_state_map[node]
+                      for node in self.search_space}
+        cur_raw_ctx = {node.name: node.raw_ctx for node in self.search_space}
+        chain = {
+            'status': cur_status,
+            'raw_ctx': cur_raw_ctx,
+            'simulation': simulation_result,
+            'best_status': dict(cur_status),
+            'best_raw_ctx': dict(cur_raw_ctx),
+            'best_simulation': simulation_result,
+            'start': start,
+            'best_emerge_time': time(),
+            'rounds': 0,
+            'round_budget': self.round_budget,
+            'rng': Random(getrandbits(64)).getstate(),
+            'proposal': None,
+        }
+
+        search_start = time()
+        if self.num_chains > 1:
+            chains = self.parallel_chains(chain, graph_status, memory_pool)
+        else:
+            chains = [self.mcmc_chain(chain, graph_status, memory_pool)]
+        ending = time()
+        rounds = sum(c['rounds'] for c in chains)
+        print('Searched {} rounds in {:.3f}s with {} chain(s) and {} simulation: {:.2f} rounds/s.'.format(
+            rounds, ending - search_start, len(chains), 'incremental' if self.incremental else 'full',
+            rounds / max(ending - search_start, 1e-6)))
+        best_chain = min(chains, key=lambda c: c['best_simulation'])
+        graph_status.copy_cur_state_from(self.load_chain(best_chain))
+        self.simulator.write_cache()
+
+        print('The simulation result of the best strategy discovered is: {:.3f}ms.'.format(
+            best_chain['best_simulation']))
+        return best_chain['best_status'], best_chain['best_raw_ctx']
+
+    def load_chain(self, chain):
+        # set the contexts of the current configuration of a chain and return
+        # its states
+        meta_cur_state_map = dict(self.init_state_map)
+        for node in self.search_space:
+            meta_cur_state_map[node] = chain['status'][node.name]
+            self.set_group_raw_ctx(node, chain['raw_ctx'][node.name])
+        return meta_cur_state_map
+
+    def simulate_config(self, graph_status, meta_cur_state_map, memory_pool):
+        graph_status.copy_cur_state_from(meta_cur_state_map)
+        for node, value in self.merging.items():
+            graph_status.node_cur_state_map[node] = meta_cur_state_map[value]
+        graph_status.complete_state_map_with_partial_information(
+            prune=False)
+        new_simulation, memory_excess = self.make_graph_n_simulate(
+            graph_status, memory_pool)
+        graph_status.reset_status()
+        return new_simulation, memory_excess
+
+    def mcmc_chain(self, chain, graph_status, memory_pool):
+        # run the markov chain from its current configuration until the budget
+        # is used up; chain is updated in place and returned
+        from time import time
+        all_possible_nodes = [
+            k for k, v in self.search_space.items() if v[0]]
+        nodes_by_name = {node.name: node for node in all_possible_nodes}
+        meta_cur_state_map = self.load_chain(chain)
+        rng = Random()
+        rng.setstate(chain['rng'])
 
         ending = time()
-        cnt += 1
-        while self.budget_judge(start, ending, best_emerge_time, cnt - 1):
-            # sample new configuration
-            changing_node = choice(all_possible_nodes)
-            new_status = choice(self.search_space[changing_node][1])
-            new_raw_ctx = choice(self.device_candidates[new_status.dev_num])
-            ori_status = meta_cur_state_map[changing_node]
-            while (new_status.state == ori_status.state and new_status.dev_num == ori_status.dev_num and new_raw_ctx == changing_node.raw_ctx):
-                new_status = choice(self.search_space[changing_node][1])
-                new_raw_ctx = choice(
+        while self.budget_judge(chain['start'], ending, chain['best_emerge_time'], chain['rounds']):
+            if chain['proposal'] is None:
+                # sample new configuration
+                changing_node = rng.choice(all_possible_nodes)
+                new_status = rng.choice(self.search_space[changing_node][1])
+                new_raw_ctx = rng.choice(
                     self.device_candidates[new_status.dev_num])
-            print('Search round {}'.format(cnt))
-            print('    Change node {} from {} in {} to {} in {}.'.format(
-                changing_node, ori_status, changing_node.raw_ctx, new_status, new_raw_ctx))
+                ori_status = meta_cur_state_map[changing_node]
+                while (new_status.state == ori_status.state and new_status.dev_num == ori_status.dev_num and new_raw_ctx == changing_node.raw_ctx):
+                    new_status = rng.choice(
+                        self.search_space[changing_node][1])
+                    new_raw_ctx = rng.choice(
+                        self.device_candidates[new_status.dev_num])
+                # kept until simulated, in case the chain is resumed
+                chain['proposal'] = (
+                    changing_node.name, new_status, new_raw_ctx)
+                chain['rng'] = rng.getstate()
+            else:
+                name, new_status, new_raw_ctx = chain['proposal']
+                changing_node = nodes_by_name[name]
+                ori_status = meta_cur_state_map[changing_node]
+            if self.debugging:
+                print('Search round {}'.format(chain['rounds'] + 1))
+                print('    Change node {} from {} in {} to {} in {}.'.format(
+                    changing_node, ori_status, changing_node.raw_ctx, new_status, new_raw_ctx))
             ori_raw_ctx = changing_node.raw_ctx
             self.set_group_raw_ctx(changing_node, new_raw_ctx)
             meta_cur_state_map[changing_node] = new_status
-            graph_status.copy_cur_state_from(meta_cur_state_map)
-            for node, value in self.merging.items():
-                graph_status.node_cur_state_map[node] = meta_cur_state_map[value]
-            graph_status.complete_state_map_with_partial_information(
-                prune=False)
-            new_simulation, memory_excess = self.make_graph_n_simulate(
-                graph_status, memory_pool)
-            graph_status.reset_status()
+            new_simulation, memory_excess = self.simulate_config(
+                graph_status, meta_cur_state_map, memory_pool)
             memory_excess_in_MB = memory_excess / 1024 / 1024 * 4
-            print('    Simulation result {:.3f}ms. Memory exceeds {}MB.'.format(
-                new_simulation, memory_excess_in_MB))
+            if self.debugging:
+                print('    Simulation result {:.3f}ms. Memory exceeds {}MB.'.format(
+                    new_simulation, memory_excess_in_MB))
             # penalize 1ms for 1MB exceeded, as in FlexFlow
             new_simulation += memory_excess_in_MB
-            if new_simulation < prev_simulation:
+            if new_simulation < chain['simulation']:
                 # move to new strategy
-                print(
-                    '    Better than last simulation; move to new configuration.')
-                if new_simulation < best_simulation and memory_excess == 0:
-                    # ignore out-of-memory cases
-                    best_cur_status = {node.name: meta_cur_state_map[node]
-                                       for node in self.search_space}
-                    best_raw_ctx = {
-                        node.name: node.raw_ctx for node in self.search_space}
-                    best_simulation = new_simulation
-                    best_emerge_time = time()
-                    print('    Reach the best simulation so far!')
-                prev_simulation = new_simulation
+                if self.debugging:
+                    print(
+                        '    Better than last simulation; move to new configuration.')
+                move = True
             else:
                 # probably move to new strategy
                 threshold = np.exp(
-                    self.alpha * (prev_simulation - new_simulation))
-                print('    Worse than last simulation; the probability of moving is {:.3f}.'.format(
-                    threshold))
-                if random() < threshold:
-                    # move to new strategy
-                    print('    Move to new configuration.')
-                    prev_simulation = new_simulation
-                else:
-                    # not move
-                    print('    Keep the last configuration.')
-                    meta_cur_state_map[changing_node] = ori_status
-                    self.set_group_raw_ctx(changing_node, ori_raw_ctx)
-
-                # TODO: delta change current states, target states, task graph, simulation result(maybe need to profile)
+                    self.alpha * (chain['simulation'] - new_simulation))
+                move = rng.random() < threshold
+                if self.debugging:
+                    print('    Worse than last simulation; the probability of moving is {:.3f}.'.format(
+                        threshold))
+                    print('    Move to new configuration.' if move else
+                          '    Keep the last configuration.')
+            if move:
+                chain['status'][changing_node.name] = new_status
+                chain['raw_ctx'][changing_node.name] = new_raw_ctx
+                if new_simulation < chain['best_simulation'] and memory_excess == 0:
+                    # ignore out-of-memory cases
+                    chain['best_status'] = dict(chain['status'])
+                    chain['best_raw_ctx'] = dict(chain['raw_ctx'])
+                    chain['best_simulation'] = new_simulation
+                    chain['best_emerge_time'] = time()
+                    if self.debugging:
+                        print('    Reach the best simulation so far!')
+                chain['simulation'] = new_simulation
+                self.accept_simulation()
+            else:
+                # not move
+                meta_cur_state_map[changing_node] = ori_status
+                self.set_group_raw_ctx(changing_node, ori_raw_ctx)
+            chain['proposal'] = None
             ending = time()
-            cnt += 1
-        graph_status.copy_cur_state_from(meta_cur_state_map)
-        self.simulator.write_cache()
+            chain['rounds'] += 1
+        return chain
 
-        print('The simulation result of the best strategy discovered is: {:.3f}ms.'.format(
-            best_simulation))
-        return best_cur_status, best_raw_ctx
+    def parallel_chains(self, chain, graph_status, memory_pool):
+        # run num_chains chains in forked processes; a chain meeting a case not
+        # profiled returns with its proposal, which is simulated (and so
+        # profiled) here, then goes on in a new process
+        import multiprocessing
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        pending = []
+        for index in range(self.num_chains):
+            cur_chain = dict(chain, index=index)
+            for key in ('status', 'raw_ctx', 'best_status', 'best_raw_ctx'):
+                cur_chain[key] = dict(chain[key])
+            cur_chain['rng'] = Random(getrandbits(64)).getstate()
+            if self.round_budget >= 0:
+                # the rounds are shared among the chains
+                cur_chain['round_budget'] = self.round_budget // self.num_chains + \
+                    int(index < self.round_budget % self.num_chains)
+            pending.append(cur_chain)
+        running = {}
+        results = []
+        while pending or running:
+            for cur_chain in pending:
+                proc = context.Process(target=self.chain_worker, args=(
+                    cur_chain, graph_status, memory_pool, queue))
+                proc.start()
+                running[cur_chain['index']] = proc
+            pending = []
+            kind, index, content = queue.get()
+            running.pop(index).join()
+            if kind == 'error':
+                for proc in running.values():
+                    proc.terminate()
+                raise RuntimeError(
+                    'Searching chain {} failed:\n{}'.format(index, content))
+            elif kind == 'miss':
+                meta_cur_state_map = self.load_chain(content)
+                name, new_status, new_raw_ctx = content['proposal']
+                changing_node = [
+                    node for node in self.search_space if node.name == name][0]
+                self.set_group_raw_ctx(changing_node, new_raw_ctx)
+                meta_cur_state_map[changing_node] = new_status
+                self.simulate_config(
+                    graph_status, meta_cur_state_map, memory_pool)
+                pending.append(content)
+            else:
+                print('Chain {}: {} rounds, best simulation result {:.3f}ms.'.format(
+                    index, content['rounds'], content['best_simulation']))
+                results.append(content)
+        return sorted(results, key=lambda c: c['index'])
+
+    def chain_worker(self, chain, graph_status, memory_pool, queue):
+        # runs in a chain process
+        self.simulator.cached_exetime = ProfiledCache(
+            self.simulator.cached_exetime)
+        self.round_budget = chain['round_budget']
+        try:
+            self.mcmc_chain(chain, graph_status, memory_pool)
+            queue.put(('done', chain['index'], chain))
+        except ProfileMiss:
+            queue.put(('miss', chain['index'], chain))
+        except Exception:
+            import traceback
+            queue.put(('error', chain['index'], traceback.format_exc()))
+
+    def accept_simulation(self):
+        # the tasks of the last simulated graph stay in the memo until another
+        # graph is accepted
+        self.memo_accepted = self.memo_used
 
     class TaskNode(object):
         def __init__(self, name, device, inputs=[], shape=-1, memory_persistent=False, original_node=None):
@@ -180,6 +339,40 @@ class FlexFlowSearching(BaseSearchingStrategy):
         def make_memory_persistent(self):
             self.memory_persistent = True
 
+    class ScanCache(object):
+        # a scan over a list of keys, resumed from a state saved before the
+        # first key differing from the last scan; a state is saved every
+        # interval keys
+        def __init__(self):
+            self.keys = []
+            self.states = []
+            self.interval = None
+
+        def scan(self, keys, init_state, copy_state, step):
+            # step(state, i) updates the state with the i-th key
+            interval = max(16, int(np.sqrt(len(keys))))
+            if interval != self.interval:
+                self.interval = interval
+                self.keys = []
+                self.states = []
+            first = 0
+            bound = min(len(keys), len(self.keys))
+            while first < bound and keys[first] == self.keys[first]:
+                first += 1
+            del self.states[first // interval + 1:]
+            if self.states:
+                start = (len(self.states) - 1) * interval
+                state = copy_state(self.states[-1])
+            else:
+                start = 0
+                state = init_state()
+            for i in range(start, len(keys)):
+                if i % interval == 0 and i // interval == len(self.states):
+                    self.states.append(copy_state(state))
+                step(state, i)
+            self.keys = list(keys)
+            return state
+
     def make_task_node(self, node, index, shape, inputs=[], memory_persistent=False):
         from ..gpu_ops.Sum import SumOp
         name = '{}_{}'.format(node.name, index)
@@ -311,15 +504,76 @@ class FlexFlowSearching(BaseSearchingStrategy):
         return allreduce_tasks, update_tasks
 
     def init_task_graph(self, graph_status):
+        # the tasks of a node, of the updates of a parameter and of the
+        # communications on an edge form an entry of the memo, keyed by what
+        # they are built from: the states and contexts involved and the
+        # shapes of the input tasks (the devices come from the contexts); with
+        # incremental, an entry is reused while its key shows up, wired to the
+        # input tasks of the new graph, so only the tasks affected by a change
+        # are rebuilt
+
+        def signature(tasks):
+            return tuple((t.shape, getattr(t, 'real_shape', None)) for t in tasks)
+
+        def memoize(key, inputs, make_tasks):
+            # make_tasks appends the tasks to run in place to task_topo_order,
+            # returns the result and may make inputs memory persistent
+            memo_used.add(key)
+            if key in memo:
+                order, tasks, wiring, persistent, marks, result = memo[key]
+                refs = tasks + inputs
+                for task, slots, value in zip(tasks, wiring, persistent):
+                    task.inputs = [refs[i] for i in slots]
+                    task.memory_persistent = value
+                    if task.contents is not None:
+                        for t in task.contents:
+                            group_comm_map[t] = task
+                for i in marks:
+                    inputs[i].make_memory_persistent()
+                task_topo_order.extend(order)
+                return [refs[i] for i in result]
+            saved = [task.memory_persistent for task in inputs]
+            for task in inputs:
+                task.memory_persistent = False
+            begin = len(task_topo_order)
+            result = make_tasks()
+            order = task_topo_order[begin:]
+            # all the tasks built, down to the inputs
+            known = set(inputs)
+            tasks = []
+            stack = order + result
+            while stack:
+                task = stack.pop()
+                if task not in known:
+                    known.add(task)
+                    tasks.append(task)
+                    stack.extend(task.inputs)
+                    stack.extend(task.contents or [])
+            marks = [i for i, task in enumerate(
+                inputs) if task.memory_persistent]
+            for task, value in zip(inputs, saved):
+                task.memory_persistent = task.memory_persistent or value
+            # the inputs of the tasks and the result as indices in the tasks
+            # built, then in inputs
+            index = {task: i for i, task in enumerate(tasks + inputs)}
+            wiring = [[index[t] for t in task.inputs] for task in tasks]
+            persistent = [task.memory_persistent for task in tasks]
+            memo[key] = (order, tasks, wiring, persistent,
+                         marks, [index[t] for t in result])
+            return result
 
         def init_task(node, eval_node=False):
             if node not in node_to_task_map:
                 if isinstance(node, PlaceholderOp):
                     status = node_cur_state_map[node]
-                    new_shape = self.simulator.get_split_shape(
-                        status.state, self.feed_shapes.get(node, node.shape))
-                    cur_tasks = [self.make_task_node(
-                        node, i, new_shape, memory_persistent=True) for i in range(status.dev_num)]
+
+                    def make_tasks():
+                        new_shape = self.simulator.get_split_shape(
+                            status.state, self.feed_shapes.get(node, node.shape))
+                        return [self.make_task_node(
+                            node, i, new_shape, memory_persistent=True) for i in range(status.dev_num)]
+                    cur_tasks = memoize(
+                        ('node', node, node.raw_ctx, status.content_hash()), [], make_tasks)
 
                 elif isinstance(node, OptimizerOp):
                     self.simulator.init_empty_optimizer(
@@ -327,23 +581,31 @@ class FlexFlowSearching(BaseSearchingStrategy):
                     cur_tasks = []
                     for grad, param in zip(node.inputs, node.optimizer.params):
                         temp_tasks = init_comm_task(grad, param)
-                        partial = node_cur_state_map[grad].partial
-                        if partial is not None and partial > 1:
-                            # allreduce tasks + update tasks
-                            allreduce_tasks, update_tasks = self.make_allreduce_task_nodes(
-                                param.raw_ctx, temp_tasks, node_cur_state_map[grad])
-                            task_topo_order.extend(allreduce_tasks)
-                            cur_tasks.extend(update_tasks)
-                        else:
-                            # update task
-                            cur_tasks.extend([self.make_update_task_node(
-                                param.raw_ctx.workers[0], i, t) for i, t in enumerate(temp_tasks)])
+
+                        def make_tasks():
+                            partial = node_cur_state_map[grad].partial
+                            if partial is not None and partial > 1:
+                                # allreduce tasks + update tasks
+                                allreduce_tasks, update_tasks = self.make_allreduce_task_nodes(
+                                    param.raw_ctx, temp_tasks, node_cur_state_map[grad])
+                                task_topo_order.extend(allreduce_tasks)
+                                return update_tasks
+                            else:
+                                # update task
+                                return [self.make_update_task_node(
+                                    param.raw_ctx.workers[0], i, t) for i, t in enumerate(temp_tasks)]
+                        cur_tasks.extend(memoize(('update', node, grad, param.raw_ctx, node_cur_state_map[grad].content_hash(), signature(
+                            temp_tasks)), temp_tasks, make_tasks))
                 else:
                     inputs = {}
                     for n in node.inputs:
                         inputs[n] = init_comm_task(n, node)
-                    cur_tasks = [self.make_task_node(node, i, node.naive_infer_shape(
-                        [n.shape for n in ns]), inputs=list(ns)) for i, ns in enumerate(zip(*inputs.values()))]
+
+                    def make_tasks():
+                        return [self.make_task_node(node, i, node.naive_infer_shape(
+                            [n.shape for n in ns]), inputs=list(ns)) for i, ns in enumerate(zip(*inputs.values()))]
+                    cur_tasks = memoize(('node', node, node.raw_ctx, tuple(signature(ts) for ts in inputs.values())), [
+                        t for ts in inputs.values() for t in ts], make_tasks)
 
                 node_to_task_map[node] = cur_tasks
                 if eval_node:
@@ -360,221 +622,228 @@ class FlexFlowSearching(BaseSearchingStrategy):
                 and (cur_stat != tar_stat[node] or prev_ctx != cur_ctx) \
                 and (cur_stat.is_dist() or tar_stat[node].is_dist())
             if deduce_mp:
-                generated_splits = []
-                generated_comb = []
-                comm_tasks = []
                 key = (tar_stat[node].content_hash(), cur_ctx)
                 if not key in recv_src[prev]:
-                    cur_tasks = []
-                    task_buffer = defaultdict(dict)
-                    prev_devices = prev_ctx.workers[0] if prev_ctx.is_mp else [
-                        prev_ctx.workers[0]]
-                    cur_devices = cur_ctx.workers[0] if cur_ctx.is_mp else [
-                        cur_ctx.workers[0]]
-                    prev_state, prev_duplicate, prev_order = cur_stat.get_all()
-                    prev_partial = cur_stat.partial
-                    target_state, target_duplicate, target_order = tar_stat[node].get_all(
-                    )
+                    def make_tasks():
+                        generated_splits = []
+                        generated_comb = []
+                        comm_tasks = []
+                        cur_tasks = []
+                        task_buffer = defaultdict(dict)
+                        prev_devices = prev_ctx.workers[0] if prev_ctx.is_mp else [
+                            prev_ctx.workers[0]]
+                        cur_devices = cur_ctx.workers[0] if cur_ctx.is_mp else [
+                            cur_ctx.workers[0]]
+                        prev_state, prev_duplicate, prev_order = cur_stat.get_all()
+                        prev_partial = cur_stat.partial
+                        target_state, target_duplicate, target_order = tar_stat[node].get_all(
+                        )
 
-                    # send first
-                    def cross_send(split_cur_state, split_target_state, depth, need_split):
-                        nonlocal device_index
-                        if depth == len(target_order):
-                            if need_split:
-                                keys = list(
-                                    split_target_state.keys())
-                                indices = [split_cur_state[k]
-                                           for k in keys]
-                                splits = [split_target_state[k]
-                                          for k in keys]
-                                # split op
-                                res_task = self.make_split_task_node(
-                                    device_index, prev_tasks[mp_index], keys, indices, splits)
-                                generated_splits.append(res_task)
-                            else:
-                                res_task = prev_tasks[mp_index]
-                            if prev_devices[mp_index] != cur_devices[device_index]:
-                                res_task = self.make_comm_task_node(
-                                    prev_devices[mp_index], cur_devices[device_index], res_task)
-                                comm_tasks.append(res_task)
-                            task_buffer[mp_index][device_index] = res_task
-                            device_index += 1
-                        else:
-                            cur_dim = target_order[depth]
-                            if cur_dim < 0:
-                                assert cur_dim == -1, 'Target node status must not enable partial.'
-                                cur_index = cur_state_index.get(cur_dim, 0)
-                                if prev_duplicate % target_duplicate == 0:
-                                    # at `cur_dim` dimension we need to send one output
-                                    multiple = prev_duplicate // target_duplicate
-                                    assert cur_index % multiple == 0
-                                    device_index += cur_index // multiple * \
-                                        loop_sizes[depth]
-                                    cross_send(split_cur_state,
-                                               split_target_state, depth+1, need_split)
-                                    device_index += (prev_duplicate - 1 -
-                                                     cur_index) // multiple * loop_sizes[depth]
-                                elif target_duplicate % prev_duplicate == 0:
-                                    # at `cur_dim` dimension we need to split and send some outputs
-                                    multiple = target_duplicate // prev_duplicate
-                                    device_index += cur_index * \
-                                        multiple * loop_sizes[depth]
-                                    for index in range(multiple):
-                                        cross_send(split_cur_state,
-                                                   split_target_state, depth+1, True)
-                                    device_index += (prev_duplicate - 1 -
-                                                     cur_index) * multiple * loop_sizes[depth]
+                        # send first
+                        def cross_send(split_cur_state, split_target_state, depth, need_split):
+                            nonlocal device_index
+                            if depth == len(target_order):
+                                if need_split:
+                                    keys = list(
+                                        split_target_state.keys())
+                                    indices = [split_cur_state[k]
+                                               for k in keys]
+                                    splits = [split_target_state[k]
+                                              for k in keys]
+                                    # split op
+                                    res_task = self.make_split_task_node(
+                                        device_index, prev_tasks[mp_index], keys, indices, splits)
+                                    generated_splits.append(res_task)
                                 else:
-                                    assert False
+                                    res_task = prev_tasks[mp_index]
+                                if prev_devices[mp_index] != cur_devices[device_index]:
+                                    res_task = self.make_comm_task_node(
+                                        prev_devices[mp_index], cur_devices[device_index], res_task)
+                                    comm_tasks.append(res_task)
+                                task_buffer[mp_index][device_index] = res_task
+                                device_index += 1
                             else:
-                                pre_st = prev_state.get(cur_dim, 1)
-                                cur_st = cur_state_index.get(
-                                    cur_dim, 0)
-                                if pre_st % target_state[cur_dim] == 0:
-                                    # at `cur_dim` dimension we need to send one output
-                                    multiple = pre_st // target_state[cur_dim]
-                                    device_index += cur_st // multiple * \
-                                        loop_sizes[depth]
-                                    split_cur_state[cur_dim] = 0
-                                    split_target_state[cur_dim] = 1
-                                    cross_send(split_cur_state,
-                                               split_target_state, depth+1, need_split)
-                                    device_index += (pre_st - 1 -
-                                                     cur_st) // multiple * loop_sizes[depth]
-                                elif target_state[cur_dim] % pre_st == 0:
-                                    # at `cur_dim` dimension we need to split and send some outputs
-                                    multiple = target_state[cur_dim] // pre_st
-                                    device_index += cur_st * \
-                                        multiple * \
-                                        loop_sizes[depth]
-                                    for index in range(multiple):
-                                        split_cur_state[cur_dim] = index
-                                        split_target_state[cur_dim] = multiple
+                                cur_dim = target_order[depth]
+                                if cur_dim < 0:
+                                    assert cur_dim == -1, 'Target node status must not enable partial.'
+                                    cur_index = cur_state_index.get(cur_dim, 0)
+                                    if prev_duplicate % target_duplicate == 0:
+                                        # at `cur_dim` dimension we need to send one output
+                                        multiple = prev_duplicate // target_duplicate
+                                        assert cur_index % multiple == 0
+                                        device_index += cur_index // multiple * \
+                                            loop_sizes[depth]
                                         cross_send(split_cur_state,
-                                                   split_target_state, depth+1, True)
-                                    device_index += (pre_st - 1 -
-                                                     cur_st) * multiple * loop_sizes[depth]
-                                else:
-                                    assert False, 'The dispatch state (%d, %d) at dimension %d is invalid.' % (
-                                        pre_st, target_state[cur_dim], cur_dim)
-
-                    loop_sizes = tar_stat[node].get_loop_sizes()
-                    for mp_index in range(prev_ctx.mp_dev_num):
-                        cur_state_index = cur_stat.map_dev_to_index(
-                            mp_index, containing_duplicate=True)
-                        if cur_stat.partial == 1 and prev_duplicate > target_duplicate and cur_state_index.get(-1, 0) % (prev_duplicate // target_duplicate) != 0:
-                            pass
-                        else:
-                            device_index = 0
-                            cross_send({}, {}, 0, False)
-                            assert device_index == len(cur_devices)
-
-                    # receive next
-                    def cross_receive(depth):
-                        nonlocal device_index
-                        if depth == len(prev_order):
-                            res_task = task_buffer[device_index][mp_index]
-                            device_index += 1
-                        else:
-                            cur_dim = prev_order[depth]
-                            if cur_dim == -2:
-                                res_task = self.make_sum_task_node(cur_devices[mp_index], [
-                                    cross_receive(depth+1) for _ in range(prev_partial)])
-                                generated_comb.append(res_task)
-                            elif cur_dim == -1:
-                                # TODO: consider how to choose the copy with minimal communication
-                                # now we use following rules:
-                                # if prev_duplicate < target_duplicate, then each prev send to some targets
-                                # else, each target receive from the first duplicate in the group
-                                prev_index = cur_state_index.get(cur_dim, 0)
-                                if prev_duplicate % target_duplicate == 0:
-                                    multiple = prev_duplicate // target_duplicate
-                                    device_index += prev_index * \
-                                        multiple * loop_sizes[depth]
-                                    res_task = cross_receive(depth+1)
-                                    device_index += ((target_duplicate - prev_index)
-                                                     * multiple - 1) * loop_sizes[depth]
-                                elif target_duplicate % prev_duplicate == 0:
-                                    multiple = target_duplicate // prev_duplicate
-                                    device_index += prev_index // multiple * \
-                                        loop_sizes[depth]
-                                    res_task = cross_receive(depth+1)
-                                    device_index += (target_duplicate - 1 -
-                                                     prev_index) // multiple * loop_sizes[depth]
+                                                   split_target_state, depth+1, need_split)
+                                        device_index += (prev_duplicate - 1 -
+                                                         cur_index) // multiple * loop_sizes[depth]
+                                    elif target_duplicate % prev_duplicate == 0:
+                                        # at `cur_dim` dimension we need to split and send some outputs
+                                        multiple = target_duplicate // prev_duplicate
+                                        device_index += cur_index * \
+                                            multiple * loop_sizes[depth]
+                                        for index in range(multiple):
+                                            cross_send(split_cur_state,
+                                                       split_target_state, depth+1, True)
+                                        device_index += (prev_duplicate - 1 -
+                                                         cur_index) * multiple * loop_sizes[depth]
+                                    else:
+                                        assert False
                                 else:
-                                    assert False
+                                    pre_st = prev_state.get(cur_dim, 1)
+                                    cur_st = cur_state_index.get(
+                                        cur_dim, 0)
+                                    if pre_st % target_state[cur_dim] == 0:
+                                        # at `cur_dim` dimension we need to send one output
+                                        multiple = pre_st // target_state[cur_dim]
+                                        device_index += cur_st // multiple * \
+                                            loop_sizes[depth]
+                                        split_cur_state[cur_dim] = 0
+                                        split_target_state[cur_dim] = 1
+                                        cross_send(split_cur_state,
+                                                   split_target_state, depth+1, need_split)
+                                        device_index += (pre_st - 1 -
+                                                         cur_st) // multiple * loop_sizes[depth]
+                                    elif target_state[cur_dim] % pre_st == 0:
+                                        # at `cur_dim` dimension we need to split and send some outputs
+                                        multiple = target_state[cur_dim] // pre_st
+                                        device_index += cur_st * \
+                                            multiple * \
+                                            loop_sizes[depth]
+                                        for index in range(multiple):
+                                            split_cur_state[cur_dim] = index
+                                            split_target_state[cur_dim] = multiple
+                                            cross_send(split_cur_state,
+                                                       split_target_state, depth+1, True)
+                                        device_index += (pre_st - 1 -
+                                                         cur_st) * multiple * loop_sizes[depth]
+                                    else:
+                                        assert False, 'The dispatch state (%d, %d) at dimension %d is invalid.' % (
+                                            pre_st, target_state[cur_dim], cur_dim)
+
+                        loop_sizes = tar_stat[node].get_loop_sizes()
+                        for mp_index in range(prev_ctx.mp_dev_num):
+                            cur_state_index = cur_stat.map_dev_to_index(
+                                mp_index, containing_duplicate=True)
+                            if cur_stat.partial == 1 and prev_duplicate > target_duplicate and cur_state_index.get(-1, 0) % (prev_duplicate // target_duplicate) != 0:
+                                pass
+                            else:
+                                device_index = 0
+                                cross_send({}, {}, 0, False)
+                                assert device_index == len(cur_devices)
+
+                        # receive next
+                        def cross_receive(depth):
+                            nonlocal device_index
+                            if depth == len(prev_order):
+                                res_task = task_buffer[device_index][mp_index]
+                                device_index += 1
                             else:
-                                tar_st = target_state.get(cur_dim, 1)
-                                cur_st = cur_state_index.get(
-                                    cur_dim, 0)
-                                if prev_state[cur_dim] % tar_st == 0:
-                                    # at `cur_dim` dimension we need to concat some inputs
-                                    multiple = prev_state[cur_dim] // tar_st
-                                    device_index += cur_st * \
-                                        multiple * loop_sizes[depth]
-                                    if multiple == 1:
+                                cur_dim = prev_order[depth]
+                                if cur_dim == -2:
+                                    res_task = self.make_sum_task_node(cur_devices[mp_index], [
+                                        cross_receive(depth+1) for _ in range(prev_partial)])
+                                    generated_comb.append(res_task)
+                                elif cur_dim == -1:
+                                    # TODO: consider how to choose the copy with minimal communication
+                                    # now we use following rules:
+                                    # if prev_duplicate < target_duplicate, then each prev send to some targets
+                                    # else, each target receive from the first duplicate in the group
+                                    prev_index = cur_state_index.get(cur_dim, 0)
+                                    if prev_duplicate % target_duplicate == 0:
+                                        multiple = prev_duplicate // target_duplicate
+                                        device_index += prev_index * \
+                                            multiple * loop_sizes[depth]
+                                        res_task = cross_receive(depth+1)
+                                        device_index += ((target_duplicate - prev_index)
+                                                         * multiple - 1) * loop_sizes[depth]
+                                    elif target_duplicate % prev_duplicate == 0:
+                                        multiple = target_duplicate // prev_duplicate
+                                        device_index += prev_index // multiple * \
+                                            loop_sizes[depth]
                                         res_task = cross_receive(depth+1)
+                                        device_index += (target_duplicate - 1 -
+                                                         prev_index) // multiple * loop_sizes[depth]
                                     else:
-                                        # concatenate op task
-                                        inputs = [cross_receive(
-                                            depth+1) for _ in range(multiple)]
-                                        res_task = self.make_concatenate_task_node(
-                                            cur_devices[mp_index], inputs, cur_dim)
-                                        generated_comb.append(res_task)
-                                    device_index += (tar_st - 1 - cur_st) * \
-                                        multiple * loop_sizes[depth]
-                                elif tar_st % prev_state[cur_dim] == 0:
-                                    # at `cur_dim` dimension we need to specify one input
-                                    multiple = tar_st // prev_state[cur_dim]
-                                    device_index += cur_st // multiple * \
-                                        loop_sizes[depth]
-                                    res_task = cross_receive(depth+1)
-                                    device_index += (tar_st - 1 -
-                                                     cur_st) // multiple * loop_sizes[depth]
+                                        assert False
                                 else:
-                                    assert False, 'The dispatch state (%d, %d) at dimension %d is invalid.' % (
-                                        prev_state[cur_dim], tar_st, cur_dim)
-                        return res_task
-
-                    loop_sizes = cur_stat.get_loop_sizes()
-                    for mp_index in range(cur_ctx.mp_dev_num):
-                        cur_state_index = tar_stat[node].map_dev_to_index(
-                            mp_index, containing_duplicate=True)
-                        device_index = 0
-                        cur_tasks.append(cross_receive(0))
-                        assert device_index == len(prev_devices)
-
-                    recv_src[prev][key] = cur_tasks
-                task_topo_order.extend(generated_splits)
-                group_comm_task = self.make_group_comm_task_node(comm_tasks)
-                for t in comm_tasks:
-                    group_comm_map[t] = group_comm_task
-                if group_comm_task is not None:
-                    task_topo_order.append(group_comm_task)
-                task_topo_order.extend(generated_comb)
+                                    tar_st = target_state.get(cur_dim, 1)
+                                    cur_st = cur_state_index.get(
+                                        cur_dim, 0)
+                                    if prev_state[cur_dim] % tar_st == 0:
+                                        # at `cur_dim` dimension we need to concat some inputs
+                                        multiple = prev_state[cur_dim] // tar_st
+                                        device_index += cur_st * \
+                                            multiple * loop_sizes[depth]
+                                        if multiple == 1:
+                                            res_task = cross_receive(depth+1)
+                                        else:
+                                            # concatenate op task
+                                            inputs = [cross_receive(
+                                                depth+1) for _ in range(multiple)]
+                                            res_task = self.make_concatenate_task_node(
+                                                cur_devices[mp_index], inputs, cur_dim)
+                                            generated_comb.append(res_task)
+                                        device_index += (tar_st - 1 - cur_st) * \
+                                            multiple * loop_sizes[depth]
+                                    elif tar_st % prev_state[cur_dim] == 0:
+                                        # at `cur_dim` dimension we need to specify one input
+                                        multiple = tar_st // prev_state[cur_dim]
+                                        device_index += cur_st // multiple * \
+                                            loop_sizes[depth]
+                                        res_task = cross_receive(depth+1)
+                                        device_index += (tar_st - 1 -
+                                                         cur_st) // multiple * loop_sizes[depth]
+                                    else:
+                                        assert False, 'The dispatch state (%d, %d) at dimension %d is invalid.' % (
+                                            prev_state[cur_dim], tar_st, cur_dim)
+                            return res_task
+
+                        loop_sizes = cur_stat.get_loop_sizes()
+                        for mp_index in range(cur_ctx.mp_dev_num):
+                            cur_state_index = tar_stat[node].map_dev_to_index(
+                                mp_index, containing_duplicate=True)
+                            device_index = 0
+                            cur_tasks.append(cross_receive(0))
+                            assert device_index == len(prev_devices)
+
+                        task_topo_order.extend(generated_splits)
+                        group_comm_task = self.make_group_comm_task_node(
+                            comm_tasks)
+                        for t in comm_tasks:
+                            group_comm_map[t] = group_comm_task
+                        if group_comm_task is not None:
+                            task_topo_order.append(group_comm_task)
+                        task_topo_order.extend(generated_comb)
+                        return cur_tasks
+                    recv_src[prev][key] = memoize(('dispatch', prev, prev_ctx, cur_stat.content_hash()) + key + (
+                        signature(prev_tasks),), prev_tasks, make_tasks)
                 return recv_src[prev][key]
             else:
                 # check parallel + data parallel
-                generated_tasks = []
                 assert prev_ctx.worker_num == cur_ctx.worker_num == 1, \
                     'In flexflow, the worker number should be 1!'
                 prev_ctx.check_mp_num(cur_ctx.mp_dev_num)
                 if prev_ctx.mp_dev_num == 1:
                     if prev_ctx.workers[0] != cur_ctx.workers[0]:
                         if cur_ctx not in recv_src[prev]:
-                            res_task = self.make_comm_task_node(
-                                prev_ctx.workers[0], cur_ctx.workers[0], prev_tasks[0])
-                            generated_tasks.append(res_task)
-                            recv_src[prev][cur_ctx] = [res_task]
+                            def make_tasks():
+                                res_task = self.make_comm_task_node(
+                                    prev_ctx.workers[0], cur_ctx.workers[0], prev_tasks[0])
+                                task_topo_order.append(res_task)
+                                return [res_task]
+                            recv_src[prev][cur_ctx] = memoize(
+                                ('comm', prev, signature(prev_tasks[:1]), prev_ctx.workers[0], cur_ctx.workers[0]), prev_tasks[:1], make_tasks)
                         res_task = recv_src[prev][cur_ctx][0]
                     else:
                         res_task = prev_tasks[0]
-                    task_topo_order.extend(generated_tasks)
                     return [res_task]
                 else:
                     # here in the same model parallel
                     assert prev_ctx == cur_ctx
                     return prev_tasks
+        memo = self.task_memo if self.incremental else {}
+        memo_used = set()
         node_to_task_map = {}
         group_comm_map = {}
         task_topo_order = []
@@ -583,6 +852,7 @@ class FlexFlowSearching(BaseSearchingStrategy):
         node_cur_state_map, node_tar_state_map = graph_status.get_state_maps()
         for node in graph_status.node_list:
             init_task(node, eval_node=True)
+        # the tasks reused are wired to the communications too
         for task in task_topo_order:
             changed = False
             for i, t in enumerate(task.inputs):
@@ -591,16 +861,16 @@ class FlexFlowSearching(BaseSearchingStrategy):
                     changed = True
             if changed:
                 task.inputs = list(set(task.inputs))
-            changed = False
-            for i, t in enumerate(task.outputs):
-                if t in group_comm_map:
-                    task.outputs[i] = group_comm_map[t]
-                    changed = True
-            if changed:
-                task.outputs = list(set(task.outputs))
-        for task in set(group_comm_map.values()):
-            outputs = sum([t.outputs for t in task.contents], [])
-            task.outputs = list(set(outputs))
+        for task in task_topo_order:
+            task.outputs = []
+        for task in task_topo_order:
+            for t in task.inputs:
+                t.add_output(task)
+        if self.incremental:
+            # keep the entries of this graph and of the accepted one
+            self.task_memo = {k: v for k, v in memo.items(
+            ) if k in memo_used or k in self.memo_accepted}
+            self.memo_used = memo_used
         graph_status.shrink_oplayers()
         return task_topo_order
 
@@ -673,14 +943,87 @@ class FlexFlowSearching(BaseSearchingStrategy):
             result = max(result, task.endTime)
         return result
 
+    def incremental_simulate(self, task_graph):
+        # the same timing as full_simulate, with the end times of the last
+        # tasks kept in the scan state, so the scan can resume in the middle
+        workers = self.simulator.nccl_profiler.workers
+        pix = self.simulator.pix
+
+        def init_state():
+            last_ends = self.simulator.HostDictionary(
+                workers, lambda key, num_workers: [0.] * num_workers)
+            if pix:
+                def func_init_items_comm(key, num_workers): return [
+                    0.] * (num_workers + (num_workers % 2))
+            else:
+                def func_init_items_comm(key, num_workers): return [
+                    0.] * (2 * num_workers)
+            comm_ends = self.simulator.HostDictionary(
+                workers, func_init_items_comm, pix=pix)
+            return last_ends, comm_ends
+
+        def copy_state(state):
+            result = []
+            for ends in state:
+                ends = copy(ends)
+                ends.contents = {key: list(value)
+                                 for key, value in ends.contents.items()}
+                result.append(ends)
+            return tuple(result)
+
+        def step(state, index):
+            last_ends, comm_ends = state
+            task = task_graph[index]
+            dev = task.device
+            task.readyTime = max([0] + [t.endTime for t in task.inputs])
+            if isinstance(dev, tuple):
+                # communication, on (send, receive) channels
+                if task.name == 'group_comm':
+                    channels = dev
+                elif task.name == 'allreduce':
+                    channels = [(d, d) for d in dev]
+                else:
+                    channels = [dev]
+                task.startTime = max([task.readyTime] + [max(comm_ends.get_comm_send(
+                    send), comm_ends.get_comm_recv(recv)) for send, recv in channels])
+                task.endTime = task.startTime + task.exeTime
+                for send, recv in channels:
+                    comm_ends.set_comm_send(send, task.endTime)
+                    comm_ends.set_comm_recv(recv, task.endTime)
+            else:
+                task.startTime = max(task.readyTime, last_ends[dev])
+                task.endTime = task.startTime + task.exeTime
+                last_ends[dev] = task.endTime
+
+        # reused tasks may be wired to other inputs
+        keys = [(task, tuple(task.inputs)) for task in task_graph]
+        last_ends, _ = self.simulate_scan.scan(
+            keys, init_state, copy_state, step)
+        return max([0] + last_ends.all_values())
+
+    def incremental_test_memory(self, task_graph, memory_pool):
+        def step(state, index):
+            memory_pool.step_memory_test(state, task_graph[index])
+
+        keys = [(task, tuple(task.inputs), task.memory_persistent, len(task.outputs))
+                for task in task_graph]
+        state = self.memory_scan.scan(keys, lambda: memory_pool.start_memory_test(
+            self.all_devices), memory_pool.copy_memory_test, step)
+        return memory_pool.memory_excess(state)
+
     def make_graph_n_simulate(self, graph_status, memory_pool=None):
         task_graph = self.init_task_graph(graph_status)
-        if memory_pool is not None:
+        if memory_pool is None:
+            memory_excess = None
+        elif self.incremental:
+            memory_excess = self.incremental_test_memory(
+                task_graph, memory_pool)
+        else:
             memory_excess = memory_pool.test_memory(
                 self.all_devices, task_graph)
-        else:
-            memory_excess = None
         # self.log_task_graph(task_graph, log_level='node')
+        if self.incremental:
+            return self.incremental_simulate(task_graph), memory_excess
         return self.full_simulate(task_graph), memory_excess
 
     def log_task_graph(self, task_topo, log_path='task_graph_{}.txt', log_level='node'):
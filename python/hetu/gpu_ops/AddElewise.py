@@ -69,16 +69,17 @@ class AddOp(Op):
                 input_vals[0], input_vals[1], output_val)
         elif DNNL_LIB['DnnlMatrixElementwiseAddByConst'] and (input_vals[1].shape == (1,) or input_vals[0].shape == (1,)):
             if input_vals[1].shape == (1,):
-                const_val = input_vals[1].asnumpy()[0]
+                const_val = input_vals[1].numpy_view()[0]
                 cpu_matrix_elementwise_add_by_const(
                     input_vals[0], const_val, output_val)
             elif input_vals[0].shape == (1,):
-                const_val = input_vals[0].asnumpy()[0]
+                const_val = input_vals[0].numpy_view()[0]
                 cpu_matrix_elementwise_add_by_const(
                     input_vals[1], const_val, output_val)
         else:
-            # output_val[:] allows modify in-place
-            output_val[:] = input_vals[0].asnumpy() + input_vals[1].asnumpy()
+            # np.add with out allows modify in-place
+            np.add(input_vals[0].numpy_view(), input_vals[1].numpy_view(),
+                   out=output_val.numpy_view())
 
     def _compute_on_gpu_add_const(self, input_vals, output_val, stream_handle=None):
         assert self.on_gpu
@@ -0,0 +1,254 @@
+from __future__ import absolute_import
+import numpy as np
+from numpy.random import RandomState, MT19937, SeedSequence
+from .Node import Op
+from .. import ndarray
+from .._base import DNNL_LIB
+from ..random import get_seed, get_seed_seqnum, step_seqnum
+from ..cpu_links import attention as cpu_attention
+from ..cpu_links import attention_gradient as cpu_attention_gradient
+
+# the score after the query with a causal mask, as in MultiHeadAttention
+CAUSAL_MASKED_SCORE = -1e4
+
+
+def _split_heads(arr, seq_len, num_heads):
+    # [batch * seq_len, hidden] -> [batch, num_heads, seq_len, head_dim]
+    return arr.reshape(-1, seq_len, num_heads, arr.shape[-1] // num_heads).transpose(0, 2, 1, 3)
+
+
+class FusedAttentionOp(Op):
+    """softmax(scale * Q K^T + mask) V of every head in one CPU node, see
+    fuse_attention_layers."""
+
+    def __init__(self, query, key, value, attention_mask=None, num_heads=1, sequence_length=None,
+                 scale=None, causal_mask=False, dropout_rate=0., ctx=None):
+        inputs = [query, key, value]
+        if attention_mask is not None:
+            inputs.append(attention_mask)
+        super().__init__(FusedAttentionOp, inputs, ctx)
+        assert sequence_length is not None
+        assert dropout_rate >= 0 and dropout_rate < 1
+        self.num_heads = num_heads
+        self.sequence_length = sequence_length
+        self.scale = scale
+        self.causal_mask = causal_mask
+        self.keep_prob = 1 - dropout_rate
+        # log-sum-exp of the scores of every row, for the gradient
+        self.lse = None
+        self.lse_shape = None
+        # the random numbers of dropout in the last training step
+        self.seed = 0
+        self.seqnum = 0
+        self.dropout_in_use = False
+
+    def compute(self, input_vals, output_val, stream_handle=None, inference=False):
+        assert self.on_cpu, 'FusedAttentionOp is only for CPU.'
+        mask = input_vals[3] if len(input_vals) == 4 else None
+        self.dropout_in_use = not inference and self.keep_prob < 1
+        keep_prob = self.keep_prob if self.dropout_in_use else 1.
+        if self.dropout_in_use:
+            self.seed = get_seed()
+            self.seqnum = get_seed_seqnum()
+            step_seqnum(1)
+        if DNNL_LIB['cpu_Attention']:
+            lse_shape = (input_vals[0].shape[0] // self.sequence_length,
+                         self.num_heads, self.sequence_length)
+            if self.lse_shape != lse_shape:
+                self.lse = ndarray.empty(lse_shape, ctx=ndarray.cpu())
+                self.lse_shape = lse_shape
+            cpu_attention(input_vals[0], input_vals[1], input_vals[2], mask, output_val,
+                          self.lse, self.sequence_length, self.num_heads, self.scale,
+                          self.causal_mask, keep_prob, self.seed, self.seqnum)
+        else:
+            probs, dropout = self._probs_np(input_vals)
+            value = _split_heads(input_vals[2].numpy_view(),
+                                 self.sequence_length, self.num_heads)
+            np.matmul(probs * dropout, value, out=_split_heads(
+                output_val.numpy_view(), self.sequence_length, self.num_heads))
+
+    def _probs_np(self, input_vals):
+        # the probabilities and their dropout factors, from the inputs
+        query, key = [_split_heads(val.numpy_view(), self.sequence_length, self.num_heads)
+                      for val in input_vals[:2]]
+        scores = np.matmul(query, key.transpose(0, 1, 3, 2)) * self.scale
+        if self.causal_mask:
+            causal = np.tril(np.ones(scores.shape[-2:], dtype=bool))
+            scores = np.where(causal, scores, CAUSAL_MASKED_SCORE)
+        if len(input_vals) == 4:
+            scores = scores + \
+                input_vals[3].numpy_view().reshape(
+                    scores.shape[0], 1, 1, scores.shape[-1])
+        scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        probs = scores / scores.sum(axis=-1, keepdims=True)
+        dropout = 1.
+        if self.dropout_in_use:
+            nprs = RandomState(MT19937(SeedSequence((self.seed, self.seqnum))))
+            dropout = (nprs.uniform(0, 1.0, probs.shape) <
+                       self.keep_prob) / self.keep_prob
+        return probs, dropout
+
+    def gradient(self, output_grad):
+        attention_grad = fused_attention_gradient_op(
+            output_grad, self, ctx=self.raw_ctx)
+        grads = [fused_attention_gradient_of_input_op(attention_grad, self.inputs[i], i, ctx=self.raw_ctx)
+                 for i in range(3)]
+        if len(self.inputs) == 4:
+            grads.append(None)
+        return grads
+
+    def infer_shape(self, input_shapes):
+        assert len(input_shapes) in (3, 4)
+        assert input_shapes[0] == input_shapes[1] == input_shapes[2]
+        assert len(input_shapes[0]) == 2
+        assert input_shapes[0][0] % self.sequence_length == 0
+        assert input_shapes[0][1] % self.num_heads == 0
+        if self.scale is None:
+            self.scale = 1.0 / np.sqrt(input_shapes[0][1] // self.num_heads)
+        if len(input_shapes) == 4:
+            assert np.prod(input_shapes[3]) == input_shapes[0][0]
+        return input_shapes[0]
+
+
+class FusedAttention_GradientOp(Op):
+    def __init__(self, output_grad, forward_node, ctx=None):
+        super().__init__(FusedAttention_GradientOp,
+                         [output_grad, forward_node] + forward_node.inputs, ctx)
+        self.forward_node = forward_node
+        # gradients of query, key and value
+        self.tmp_gradients = [None, None, None]
+
+    def compute(self, input_vals, output_val, stream_handle=None):
+        assert self.on_cpu, 'FusedAttentionOp is only for CPU.'
+        forward = self.forward_node
+        for i, arr in enumerate(self.tmp_gradients):
+            # the arrays of the gradients not in the graph are our own
+            if arr is None or arr.shape != input_vals[2].shape:
+                self.tmp_gradients[i] = ndarray.empty(
+                    input_vals[2].shape, ctx=ndarray.cpu())
+        output_grad, output, query, key, value = input_vals[:5]
+        mask = input_vals[5] if len(input_vals) == 6 else None
+        if DNNL_LIB['cpu_AttentionGradient']:
+            keep_prob = forward.keep_prob if forward.dropout_in_use else 1.
+            cpu_attention_gradient(query, key, value, mask, output, forward.lse, output_grad,
+                                   *self.tmp_gradients, forward.sequence_length,
+                                   forward.num_heads, forward.scale, forward.causal_mask,
+                                   keep_prob, forward.seed, forward.seqnum)
+        else:
+            seq_len, num_heads = forward.sequence_length, forward.num_heads
+            probs, dropout = forward._probs_np(input_vals[2:])
+            query, key, value, output_grad = [_split_heads(val.numpy_view(), seq_len, num_heads)
+                                              for val in (query, key, value, output_grad)]
+            # gradients of query, key and value, viewed by heads
+            grad_query, grad_key, grad_value = [_split_heads(arr.numpy_view(), seq_len, num_heads)
+                                                for arr in self.tmp_gradients]
+            np.matmul((probs * dropout).transpose(0, 1, 3, 2),
+                      output_grad, out=grad_value)
+            grad_probs = np.matmul(
+                output_grad, value.transpose(0, 1, 3, 2)) * dropout
+            grad_scores = probs * \
+                (grad_probs - (grad_probs * probs).sum(axis=-1, keepdims=True))
+            if forward.causal_mask:
+                grad_scores = np.tril(grad_scores)
+            grad_scores *= forward.scale
+            np.matmul(grad_scores, key, out=grad_query)
+            np.matmul(grad_scores.transpose(0, 1, 3, 2), query, out=grad_key)
+
+    def gradient(self, output_grad):
+        raise NotImplementedError
+
+    def infer_shape(self, input_shapes):
+        return None
+
+
+class FusedAttention_Gradient_of_InputOp(Op):
+    def __init__(self, attention_grad, in_node, index, ctx=None):
+        super().__init__(FusedAttention_Gradient_of_InputOp,
+                         [attention_grad, in_node], ctx)
+        assert index in (0, 1, 2)
+        self.index = index
+
+    def compute(self, input_vals, output_val, stream_handle=None):
+        assert False, 'In memory plan we already set the result array; should not call the compute.'
+
+    def gradient(self, output_grad):
+        raise NotImplementedError
+
+    def infer_shape(self, input_shapes):
+        return input_shapes[1]
+
+    def pass_grad_array(self, array):
+        self.inputs[0].tmp_gradients[self.index] = array
+
+
+def fused_attention_op(query, key, value, attention_mask=None, num_heads=1, sequence_length=None,
+                       scale=None, causal_mask=False, dropout_rate=0., ctx=None):
+    """Multi-head attention computed in tiles on CPU, without the scores of
+    all the queries and keys in memory.
+
+    Parameters:
+    ----
+    query : Node
+        Queries, [batch_size * seq_len, hidden_size].
+    key : Node
+        Keys, [batch_size * seq_len, hidden_size].
+    value : Node
+        Values, [batch_size * seq_len, hidden_size].
+    attention_mask : Node
+        Added to the scores, [batch_size, 1, 1, seq_len], or None.
+    num_heads : int
+        Number of heads, which split the hidden size.
+    sequence_length : int
+        Length of the sequences.
+    scale : float
+        Factor of the scores, 1 / sqrt(head_size) if None.
+    causal_mask : Boolean
+        Whether the queries only attend to the keys up to them.
+    dropout_rate : float
+        Dropout rate of the probabilities in training.
+
+    Returns:
+    ----
+    A new Node instance created by Op.
+
+    """
+    return FusedAttentionOp(query, key, value, attention_mask, num_heads, sequence_length,
+                            scale, causal_mask, dropout_rate, ctx=ctx)
+
+
+def fused_attention_gradient_op(output_grad, forward_node, ctx=None):
+    """Gradient node of fused attention.
+
+    Parameters:
+    ----
+    output_grad : Node
+        Previous gradient node.
+    forward_node : Node
+        The fused attention node.
+
+    Returns:
+    ----
+    A new Node instance created by Op.
+
+    """
+    return FusedAttention_GradientOp(output_grad, forward_node, ctx=ctx)
+
+
+def fused_attention_gradient_of_input_op(attention_grad, in_node, index, ctx=None):
+    """Gradient node of query, key or value of fused attention.
+
+    Parameters:
+    ----
+    attention_grad : Node
+        The gradient node of fused attention.
+    in_node : Node
+        Query, key or value.
+    index : int
+        0 for query, 1 for key and 2 for value.
+
+    Returns:
+    ----
+    A new Node instance created by Op.
+
+    """
+    return FusedAttention_Gradient_of_InputOp(attention_grad, in_node, index, ctx=ctx)
@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 import numpy as np
 from .Node import Op
+from .._base import DNNL_LIB
+from ..cpu_links import batch_matrix_multiply as cpu_batch_matrix_multiply
 from ..gpu_links import batch_matrix_multiply
 
 
@@ -11,26 +13,31 @@ class BatchMatMulOp(Op):
         self.matmul_attr_trans_B = trans_B
 
     def compute(self, input_vals, output_val, stream_handle=None):
-        if self.on_cpu:
-            ndims = len(input_vals[0])
+        if self.on_cpu and DNNL_LIB['DnnlBatchMatrixMultiply']:
+            cpu_batch_matrix_multiply(
+                input_vals[0], self.matmul_attr_trans_A,
+                input_vals[1], self.matmul_attr_trans_B, output_val)
+        elif self.on_cpu:
+            ndims = len(input_vals[0].shape)
             perm = list(range(ndims-2)) + [ndims-1, ndims-2]
 
+            out = output_val.numpy_view()
             if ((self.matmul_attr_trans_A is False) and
                     (self.matmul_attr_trans_B is False)):
-                output_val[:] = np.matmul(
-                    input_vals[0].asnumpy(), input_vals[1].asnumpy())
+                np.matmul(input_vals[0].numpy_view(),
+                          input_vals[1].numpy_view(), out=out)
             elif ((self.matmul_attr_trans_A is True) and
                     (self.matmul_attr_trans_B is False)):
-                output_val[:] = np.matmul(
-                    np.transpose(input_vals[0].asnumpy(), perm), input_vals[1].asnumpy())
+                np.matmul(np.transpose(input_vals[0].numpy_view(), perm),
+                          input_vals[1].numpy_view(), out=out)
             elif ((self.matmul_attr_trans_A is False) and
                     (self.matmul_attr_trans_B is True)):
-                output_val[:] = np.matmul(
-                    input_vals[0].asnumpy(), np.transpose(input_vals[1].asnumpy(), perm))
+                np.matmul(input_vals[0].numpy_view(),
+                          np.transpose(input_vals[1].numpy_view(), perm), out=out)
             elif ((self.matmul_attr_trans_A is True) and
                     (self.matmul_attr_trans_B is True)):
-                output_val[:] = np.matmul(
-                    np.transpose(input_vals[0].asnumpy(), perm), np.transpose(input_vals[1].asnumpy(), perm))
+                np.matmul(np.transpose(input_vals[0].numpy_view(), perm),
+                          np.transpose(input_vals[1].numpy_view(), perm), out=out)
         else:
             batch_matrix_multiply(
                 input_vals[0], self.matmul_attr_trans_A,
@@ -1,6 +1,5 @@
 from __future__ import absolute_import
 import numpy as np
-import scipy.sparse
 from .Node import Op
 from .. import ndarray
 from .Transpose import transpose_op
@@ -15,7 +14,7 @@ class CsrmvOp(Op):
 
     def compute(self, input_vals, output_val, stream_handle=None):
         if self.on_cpu:
-            assert isinstance(input_vals[0], scipy.sparse.spmatrix)
+            assert ndarray.is_spmatrix(input_vals[0])
             if self.csrmv_attr_trans is False:
                 output_val[:] = input_vals[0].dot(input_vals[1].asnumpy())
             else:
@@ -65,7 +64,7 @@ class CsrmmOp(Op):
 
     def compute(self, input_vals, output_val, stream_handle=None):
         if self.on_cpu:
-            assert isinstance(input_vals[0], scipy.sparse.spmatrix)
+            assert ndarray.is_spmatrix(input_vals[0])
             if ((self.csrmm_attr_trans_A is False) and
                     (self.csrmm_attr_trans_B is False)):
                 output_val[:] = input_vals[0].dot(input_vals[1].asnumpy())
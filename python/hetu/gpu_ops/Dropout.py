@@ -1,4 +1,5 @@
 from __future__ import absolute_import
+import numpy as np
 from .Node import Op
 import ctypes
 from .._base import DNNL_LIB
@@ -31,8 +32,8 @@ class DropoutOp(Op):
                     if self.mask is None:
                         self.mask = nprs.uniform(
                             0, 1.0, input_vals[0].shape) >= (1-self.keep_prob)
-                    output_val[:] = dropout_np(
-                        input_vals[0].asnumpy(), self.keep_prob, output_val, self.mask)
+                    dropout_np(input_vals[0].numpy_view(), self.keep_prob,
+                               output_val.numpy_view(), self.mask)
             else:
                 if self.inplace:
                     dropout(input_vals[0], 1 - self.keep_prob,
@@ -66,8 +67,8 @@ class Dropout_Gradient_recomputeOp(Op):
                 cpu_dropout_gradient(
                     input_vals[0], self.keep_prob, output_val, self.seed_seqnum)
             else:
-                output_val[:] = dropout_np_gradient(
-                    input_vals[0].asnumpy(), self.keep_prob, self.forward_node.mask)
+                dropout_np_gradient(input_vals[0].numpy_view(), self.keep_prob,
+                                    self.forward_node.mask, output_val.numpy_view())
         else:
             dropout_gradient_recompute(input_vals[0], 1 - self.keep_prob,
                                        output_val, self.seed_seqnum, stream_handle)
@@ -91,8 +92,8 @@ class Dropout_GradientOp(Op):
                 cpu_dropout_gradient(
                     input_vals[0], self.keep_prob, output_val, self.forward_node.seed_seqnum)
             else:
-                output_val[:] = dropout_np_gradient(
-                    input_vals[0].asnumpy(), self.keep_prob, self.forward_node.mask)
+                dropout_np_gradient(input_vals[0].numpy_view(), self.keep_prob,
+                                    self.forward_node.mask, output_val.numpy_view())
         else:
             dropout_gradient(input_vals[0], input_vals[1], 1 - self.keep_prob,
                              output_val, stream_handle)
@@ -150,10 +151,13 @@ def dropout_gradient_recompute_op(node_in, keep_prob, forward_node, ctx=None):
 
 
 def dropout_np(inputs, keep_prob, out_arr, mask):
-    return mask*inputs*(1/keep_prob)
+    np.multiply(mask, inputs, out=out_arr)
+    out_arr *= 1/keep_prob
+    return out_arr
 
 
-def dropout_np_gradient(in_gradient_y, keep_prob, mask):
-    out_grads = in_gradient_y
-    out_grads *= mask * (1 / keep_prob)
-    return out_grads
+def dropout_np_gradient(in_gradient_y, keep_prob, mask, out=None):
+    # in_gradient_y may be a view of the input buffer; do not modify in place
+    out = np.multiply(in_gradient_y, mask, out=out)
+    out *= 1 / keep_prob
+    return out
@@ -0,0 +1,270 @@
+from __future__ import absolute_import
+from .Node import Op
+from .. import ndarray
+from .._base import DNNL_LIB
+import numpy as np
+from ..cpu_links import \
+    embedding_bag as cpu_embedding_bag, \
+    embedding_bag_gradient as cpu_embedding_bag_gradient, \
+    EMBEDDING_BAG_MODES
+
+
+def _bag_of_entries(ids, offsets, num_bags):
+    # the bag of every id in the flattened ids
+    nnz = ids.size
+    if offsets is None:
+        return np.arange(nnz) // ids.shape[-1]
+    return np.searchsorted(offsets.reshape(-1), np.arange(nnz), side='right') - 1
+
+
+class EmbeddingBagOp(Op):
+    def __init__(self, embedding, index, offsets=None, per_sample_weights=None, mode='sum', ctx=None):
+        inputs = [embedding, index]
+        if offsets is not None:
+            inputs.append(offsets)
+        if per_sample_weights is not None:
+            inputs.append(per_sample_weights)
+        super().__init__(EmbeddingBagOp, inputs, ctx)
+        embedding.is_embed = True
+        assert index.dtype == np.int32
+        assert offsets is None or offsets.dtype == np.int32
+        assert mode in EMBEDDING_BAG_MODES, 'Mode %s not supported.' % mode
+        assert per_sample_weights is None or mode == 'sum', \
+            'Per sample weights are only supported in sum mode.'
+        self.use_offsets = offsets is not None
+        self.use_weights = per_sample_weights is not None
+        self.mode = mode
+        self.grad_node = None
+        self.dtype = embedding.dtype
+        self.num_embed = None
+        # the entry of the maximum of every bag and column in max mode
+        self.argmax = None
+        # the rows of the ids pulled from the parameter server or cache
+        self.gathered = None
+
+    def _split_inputs(self, input_vals):
+        ind = 2
+        offsets = weights = None
+        if self.use_offsets:
+            offsets = input_vals[ind]
+            ind += 1
+        if self.use_weights:
+            weights = input_vals[ind]
+        return input_vals[0], input_vals[1], offsets, weights
+
+    def _prepare_argmax(self, output_val):
+        if self.mode == 'max' and (self.argmax is None or self.argmax.shape != output_val.shape):
+            self.argmax = ndarray.empty(
+                output_val.shape, ctx=ndarray.cpu(), dtype=np.int32)
+
+    def _pool(self, embed, input_vals, output_val, gathered):
+        _, ids, offsets, weights = self._split_inputs(input_vals)
+        self._prepare_argmax(output_val)
+        if DNNL_LIB['cpu_EmbeddingBag']:
+            cpu_embedding_bag(embed, ids, offsets, weights, output_val,
+                              self.argmax, self.mode, self.num_embed, gathered)
+            return
+        ids = ids.asnumpy()
+        offsets = None if offsets is None else offsets.asnumpy()
+        embed = embed.asnumpy()
+        width = embed.shape[-1]
+        num_bags = output_val.shape[0] if self.use_offsets else ids.size // ids.shape[-1]
+        bags = _bag_of_entries(ids, offsets, num_bags)
+        flat = ids.reshape(-1)
+        valid = (flat >= 0) & (flat < self.num_embed)
+        rows = embed.reshape(-1, width) if gathered else embed[np.where(valid, flat, 0)]
+        result = np.zeros((num_bags, width), dtype=np.float32)
+        if self.mode == 'max':
+            argmax = np.full((num_bags, width), -1, dtype=np.int32)
+            for b in range(num_bags):
+                entries = np.nonzero(valid & (bags == b))[0]
+                if len(entries) > 0:
+                    cur = np.argmax(rows[entries], axis=0)
+                    argmax[b] = entries[cur]
+                    result[b] = rows[entries[cur], np.arange(width)]
+            self.argmax[:] = argmax.reshape(self.argmax.shape)
+        else:
+            scale = valid.astype(np.float32)
+            if weights is not None:
+                scale *= weights.asnumpy().reshape(-1)
+            np.add.at(result, bags, scale[:, None] * rows)
+            if self.mode == 'mean':
+                counts = np.bincount(bags[valid], minlength=num_bags)
+                result /= np.maximum(counts, 1)[:, None]
+        output_val[:] = result.reshape(output_val.shape)
+
+    def _compute_cpu(self, input_vals, output_val, stream_handle=None):
+        self._pool(input_vals[0], input_vals, output_val, False)
+
+    def _prepare_gathered(self, ids):
+        shape = ids.shape + (self.inputs[0].shape[-1],)
+        if self.gathered is None or self.gathered.shape != shape:
+            self.gathered = ndarray.empty(shape, ctx=ndarray.cpu())
+
+    def _compute_sparsepull_from_ps(self, input_vals, output_val, stream_handle=None):
+        self._prepare_gathered(input_vals[1])
+        self.event.sync()
+        if self.bsp == 0:
+            self.comm.BarrierWorker()
+        self.comm.SparsePull(
+            self.ps_id, input_vals[1].handle, self.gathered.handle)
+        self.event.update()
+        # the rows are pooled right away
+        self.event.sync()
+        self._pool(self.gathered, input_vals, output_val, True)
+
+    def _compute_sparsepull_from_cache(self, input_vals, output_val, stream_handle=None):
+        self._prepare_gathered(input_vals[1])
+        self.event.sync()
+        if self.bsp == 0:
+            self.comm.BarrierWorker()
+        self.inputs[0].cache.embedding_lookup(
+            input_vals[1], self.gathered, sync=True)
+        self._pool(self.gathered, input_vals, output_val, True)
+
+    def gradient(self, output_grad):
+        self.grad_node = embedding_bag_gradient_op(
+            output_grad, self, ctx=self.raw_ctx)
+        # per sample weights are data, without gradients
+        return [self.grad_node] + [None] * (len(self.inputs) - 1)
+
+    def infer_shape(self, input_shapes):
+        assert len(input_shapes) == len(self.inputs)
+        embed_shape, index_shape = input_shapes[:2]
+        assert len(embed_shape) == 2
+        self.num_embed = embed_shape[0]
+        if self.grad_node is not None:
+            self.grad_node.embed_shape = embed_shape
+        if self.use_weights:
+            assert input_shapes[-1] == index_shape
+        if self.use_offsets:
+            assert len(index_shape) == 1 and len(input_shapes[2]) == 1
+            return (input_shapes[2][0], embed_shape[1])
+        return tuple(index_shape[:-1]) + (embed_shape[1],)
+
+    def forward_hook(self, config):
+        super().forward_hook(config)
+        assert self.on_cpu, 'EmbeddingBagOp is only for CPU.'
+        # the rows are pulled and pooled by the node itself, with or without
+        # prefetch of the rows of the next batch
+        if config.use_sparse_pull or config.cstable_policy:
+            self.event = self.inputs[0].event
+            self.bsp = config.bsp
+            self.comm = config.ps_comm
+            if config.cstable_policy:
+                self.compute = self._compute_sparsepull_from_cache
+            else:
+                self.ps_id = self.inputs[0].id
+                self.compute = self._compute_sparsepull_from_ps
+        else:
+            self.compute = self._compute_cpu
+
+    def backward_hook(self, config):
+        local_comm_mode = config.node_strategy.get(self, config.comm_mode)
+        embedding_comm_mode = config.node_strategy.get(
+            self.inputs[0], config.comm_mode)
+        assert local_comm_mode in (embedding_comm_mode, None), \
+            'Embedding bag communication mode invalid. Should conform with embedding parameter.'
+        if local_comm_mode in ('PS', 'Hybrid'):
+            cpu_ctx = ndarray.cpu(0)
+            self.ctx = cpu_ctx
+            for n in self.inputs:
+                n.ctx = cpu_ctx
+
+
+class EmbeddingBag_GradientOp(Op):
+    def __init__(self, output_grad, forward_node, ctx=None):
+        super().__init__(EmbeddingBag_GradientOp,
+                         [output_grad] + forward_node.inputs[1:], ctx)
+        self.forward_node = forward_node
+        self.embed_shape = None
+        self.use_indexed_slices = True
+
+    def compute(self, input_vals, output_val, stream_handle=None):
+        assert self.on_cpu, 'EmbeddingBagOp is only for CPU.'
+        forward = self.forward_node
+        _, ids, offsets, weights = forward._split_inputs(input_vals)
+        if DNNL_LIB['cpu_EmbeddingBagGradient']:
+            cpu_embedding_bag_gradient(input_vals[0], ids, offsets, weights, forward.argmax,
+                                       output_val.indices, output_val.values,
+                                       forward.mode, forward.num_embed)
+            return
+        ids = ids.asnumpy()
+        grad = input_vals[0].asnumpy()
+        width = grad.shape[-1]
+        grad = grad.reshape(-1, width)
+        bags = _bag_of_entries(
+            ids, None if offsets is None else offsets.asnumpy(), grad.shape[0])
+        flat = ids.reshape(-1)
+        valid = (flat >= 0) & (flat < forward.num_embed)
+        values = grad[bags]
+        if forward.mode == 'max':
+            argmax = forward.argmax.asnumpy().reshape(-1, width)
+            values *= argmax[bags] == np.arange(flat.size)[:, None]
+        elif forward.mode == 'mean':
+            counts = np.bincount(bags[valid], minlength=grad.shape[0])
+            values /= np.maximum(counts, 1)[bags, None]
+        elif weights is not None:
+            values *= weights.asnumpy().reshape(-1, 1)
+        unique, inverse = np.unique(flat[valid], return_inverse=True)
+        indices = np.full(flat.size, -1, dtype=np.int32)
+        indices[:len(unique)] = unique
+        result = np.zeros((flat.size, width), dtype=np.float32)
+        np.add.at(result, inverse, values[valid])
+        output_val.indices[:] = indices.reshape(output_val.indices.shape)
+        output_val.values[:] = result.reshape(output_val.values.shape)
+
+    def gradient(self, output_grad):
+        raise NotImplementedError
+
+    def infer_shape(self, input_shapes):
+        assert self.embed_shape
+        return self.embed_shape
+
+    def backward_hook(self, config):
+        if config.comm_mode == 'PS' or config.comm_mode == "Hybrid":
+            self.ctx = ndarray.cpu(0)
+
+
+def embedding_bag_op(embedding, index, offsets=None, per_sample_weights=None, mode='sum', ctx=None):
+    """Looks up and pools bags of embeddings in one pass on CPU, without the
+    embeddings of every id in memory.
+
+    Parameters:
+    ----
+    embedding : Node
+        The Node of Embedding.
+    index : Node
+        The index to be looked up, int32; the bags are along its last
+        dimension, or given by offsets. Ids out of the embedding are padding.
+    offsets : Node
+        Starts of the bags in a 1-D index, int32, or None.
+    per_sample_weights : Node
+        Weights of the ids in sum mode, in the shape of index, or None.
+    mode : str
+        Pooling of the bags, 'sum', 'mean' or 'max'.
+
+    Returns:
+    ----
+    A new Node instance created by Op.
+
+    """
+    return EmbeddingBagOp(embedding, index, offsets, per_sample_weights, mode, ctx=ctx)
+
+
+def embedding_bag_gradient_op(output_grad, forward_node, ctx=None):
+    """Gradient node of embedding bag, as indexed slices of distinct ids.
+
+    Parameters:
+    ----
+    output_grad : Node
+        Previous gradient node.
+    forward_node : Node
+        The embedding bag node.
+
+    Returns:
+    ----
+    A new Node instance created by Op.
+
+    """
+    return EmbeddingBag_GradientOp(output_grad, forward_node, ctx=ctx)
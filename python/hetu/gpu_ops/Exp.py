@@ -11,7 +11,7 @@ class ExpOp(Op):
 
     def compute(self, input_vals, output_val, stream_handle=None):
         if self.on_cpu:
-            output_val[:] = np.exp(input_vals[0].asnumpy())
+            np.exp(input_vals[0].numpy_view(), out=output_val.numpy_view())
         else:
             exp(input_vals[0], output_val, stream_handle)
 
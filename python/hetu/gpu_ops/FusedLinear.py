@@ -0,0 +1,169 @@
+from __future__ import absolute_import
+import numpy as np
+
+from .Node import Op
+from .._base import DNNL_LIB
+from ..cpu_links import linear as cpu_linear
+from ..cpu_links import activation_gradient as cpu_activation_gradient
+
+
+def _activate(value, activation, out=None):
+    if activation == 'relu':
+        return np.maximum(value, 0, out=out)
+    elif activation == 'sigmoid':
+        out = np.negative(value, out=out)
+        np.exp(out, out=out)
+        out += 1.0
+        return np.divide(1.0, out, out=out)
+    elif activation == 'tanh':
+        return np.tanh(value, out=out)
+    elif activation == 'gelu':
+        from scipy.special import erf
+        return np.multiply(value * 0.5, 1.0 + erf(value / np.sqrt(2.0)), out=out)
+    if out is not None:
+        np.copyto(out, value)
+        return out
+    return value
+
+
+class FusedLinearOp(Op):
+    """activation(op(A) op(B) + bias) as one CPU node, see fuse_linear_ops."""
+
+    def __init__(self, node_A, node_B, bias=None, trans_A=False, trans_B=False, activation=None, ctx=None):
+        inputs = [node_A, node_B] if bias is None else [node_A, node_B, bias]
+        super().__init__(FusedLinearOp, inputs, ctx)
+        assert activation in (None, 'relu', 'sigmoid', 'tanh', 'gelu')
+        self.matmul_attr_trans_A = trans_A
+        self.matmul_attr_trans_B = trans_B
+        self.activation = activation
+        # gradient of a broadcast bias, whose axes are set in infer_shape
+        self.bias_grad_node = None
+
+    def compute(self, input_vals, output_val, stream_handle=None):
+        assert self.on_cpu, 'FusedLinearOp is only for CPU.'
+        bias = input_vals[2] if len(input_vals) == 3 else None
+        if DNNL_LIB['DnnlLinear']:
+            cpu_linear(input_vals[0], self.matmul_attr_trans_A,
+                       input_vals[1], self.matmul_attr_trans_B,
+                       bias, self.activation, output_val)
+        else:
+            lhs = input_vals[0].numpy_view()
+            rhs = input_vals[1].numpy_view()
+            if self.matmul_attr_trans_A:
+                lhs = lhs.T
+            if self.matmul_attr_trans_B:
+                rhs = rhs.T
+            out = np.matmul(lhs, rhs, out=output_val.numpy_view())
+            if bias is not None:
+                out += bias.numpy_view().reshape(-1)
+            _activate(out, self.activation, out=out)
+
+    def gradient(self, output_grad):
+        from .Linear import LinearOp
+        from .MatrixMult import MatMulOp
+        if self.activation is not None:
+            output_grad = activation_gradient_op(
+                self, output_grad, self.activation, ctx=self.raw_ctx)
+        # the same gradients as the unfused nodes
+        if len(self.inputs) == 3:
+            return LinearOp.gradient(self, output_grad)
+        return MatMulOp.gradient(self, output_grad)
+
+    def infer_shape(self, input_shapes):
+        assert all([len(shape) == 2 for shape in input_shapes[:2]])
+        A = input_shapes[0]
+        B = input_shapes[1]
+        assert A[1 - self.matmul_attr_trans_A] == B[self.matmul_attr_trans_B]
+        output_shape = (A[self.matmul_attr_trans_A],
+                        B[1 - self.matmul_attr_trans_B])
+        if len(input_shapes) == 3:
+            bias_shape = tuple(input_shapes[2])
+            assert bias_shape in ((output_shape[1],), (1, output_shape[1]))
+            if self.bias_grad_node is not None:
+                self.bias_grad_node.axes = [0]
+                self.bias_grad_node.keepdims = [len(bias_shape) == 2]
+        return output_shape
+
+
+class ActivationGradientOp(Op):
+    """Gradient of relu, sigmoid or tanh computed from their output."""
+
+    def __init__(self, forward_node, output_grad, activation, ctx=None):
+        super().__init__(ActivationGradientOp,
+                         [forward_node, output_grad], ctx)
+        assert activation in ('relu', 'sigmoid', 'tanh')
+        self.activation = activation
+
+    def compute(self, input_vals, output_val, stream_handle=None):
+        assert self.on_cpu, 'ActivationGradientOp is only for CPU.'
+        if DNNL_LIB['DnnlActivationGradient']:
+            cpu_activation_gradient(
+                input_vals[0], input_vals[1], self.activation, output_val)
+        else:
+            output = input_vals[0].numpy_view()
+            grad = input_vals[1].numpy_view()
+            out = output_val.numpy_view()
+            if self.activation == 'relu':
+                np.multiply(output > 0, grad, out=out)
+            elif self.activation == 'sigmoid':
+                np.subtract(1, output, out=out)
+                out *= output
+                out *= grad
+            else:
+                np.multiply(output, output, out=out)
+                np.subtract(1, out, out=out)
+                out *= grad
+
+    def gradient(self, output_grad):
+        raise NotImplementedError
+
+    def infer_shape(self, input_shapes):
+        assert len(input_shapes) == 2
+        return input_shapes[0]
+
+
+def fused_linear_op(node_A, node_B, bias=None, trans_A=False, trans_B=False, activation=None, ctx=None):
+    """Make a new instance of Matrix Multiplication with optional bias and
+    activation fused, computed in one pass on CPU.
+
+    Parameters:
+    ----
+    node_A : Node
+        The left operand of the matrix multiplication.
+    node_B : Node
+        The right operand of the matrix multiplication.
+    bias : Node
+        The bias of linear operation, or None.
+    trans_A : Boolean
+        Whether node_A to be transposed
+    trans_B : Boolean
+        Whether node_B to be transposed
+    activation : str
+        One of None, 'relu', 'sigmoid', 'tanh' and 'gelu'.
+
+    Returns:
+    ----
+    A new Node instance created by Op.
+
+    """
+    return FusedLinearOp(node_A, node_B, bias, trans_A, trans_B, activation, ctx=ctx)
+
+
+def activation_gradient_op(forward_node, output_grad, activation, ctx=None):
+    """Computes the gradient of relu, sigmoid or tanh from their output.
+
+    Parameters:
+    ----
+    forward_node : Node
+        Output of the activation.
+    output_grad : Node
+        Previous gradient node.
+    activation : str
+        One of 'relu', 'sigmoid' and 'tanh'.
+
+    Returns:
+    ----
+    A new Node instance created by Op.
+
+    """
+    return ActivationGradientOp(forward_node, output_grad, activation, ctx=ctx)
@@ -17,7 +17,8 @@ class GeluOp(Op):
             if DNNL_LIB['DnnlGelu']:
                 cpu_gelu(input_vals[0], output_val)
             else:
-                output_val[:] = np.maximum(input_vals[0].asnumpy(), 0)
+                np.maximum(input_vals[0].numpy_view(), 0,
+                           out=output_val.numpy_view())
         else:
             gelu(input_vals[0], output_val, stream_handle)
     def gradient(self, output_grad):
@@ -43,8 +44,11 @@ class GeluGradientOp(Op):
             if DNNL_LIB['DnnlGelu_Gradient']:
                 cpu_gelu_gradient(input_vals[0], input_vals[1], output_val)
             else:
-                output_val[:] = (np.sign(input_vals[0].asnumpy()) +
-                                 1) * 0.5 * input_vals[1].asnumpy()
+                out = np.sign(input_vals[0].numpy_view(),
+                              out=output_val.numpy_view())
+                out += 1
+                out *= 0.5
+                out *= input_vals[1].numpy_view()
         else:
             gelu_gradient(input_vals[0], input_vals[1],
                           output_val, stream_handle)
@@ -2,10 +2,20 @@ from __future__ import absolute_import
 from .Node import Op
 import numpy as np
 from .. import ndarray
+from .._base import DNNL_LIB
+from ..cpu_links import layer_normalization as cpu_layer_normalization
+from ..cpu_links import layer_normalization_gradient as cpu_layer_normalization_gradient
 from ..gpu_links import layer_normalization
 from ..gpu_links import layer_normalization_gradient
 
 
+def _cpu_view(arr):
+    # gradient buffers are NDArrays once assigned by the memory plan
+    if isinstance(arr, ndarray.NDArray):
+        return arr.numpy_view()
+    return arr
+
+
 class Layer_NormalizationOp(Op):
     def __init__(self, node_in, ln_scale, ln_bias, eps=0.01, ctx=None):
         super().__init__(Layer_NormalizationOp,
@@ -20,31 +30,33 @@ class Layer_NormalizationOp(Op):
         local_shape[-1] = 1
         local_shape = tuple(local_shape)
         if self.on_cpu:
-            input_vals = [n.asnumpy() for n in input_vals]
-            data_type = input_vals[0].dtype
-            if self.data_shape is None:
-                self.save_mean = np.empty(local_shape, dtype=np.float32)
-                self.save_var = np.empty(local_shape, dtype=np.float32)
+            if self.data_shape != local_shape:
+                self.save_mean = ndarray.empty(local_shape, ctx=ndarray.cpu())
+                self.save_var = ndarray.empty(local_shape, ctx=ndarray.cpu())
                 self.data_shape = local_shape
-            elif self.data_shape != local_shape:
-                del self.save_mean
-                del self.save_var
-                self.save_mean = np.empty(local_shape, dtype=np.float32)
-                self.save_var = np.empty(local_shape, dtype=np.float32)
-                self.data_shape = local_shape
-            self.save_mean[:] = input_vals[0].mean(
-                axis=-1, dtype=data_type, keepdims=True)
-            self.save_var[:] = input_vals[0].var(
-                axis=-1, dtype=data_type, keepdims=True)
-            std = np.sqrt(self.save_var + self.eps, dtype=data_type)
-            centered_input = input_vals[0] - self.save_mean
-            normed_input = centered_input / std
+            if DNNL_LIB['cpu_LayerNormalization']:
+                cpu_layer_normalization(input_vals[0], input_vals[1], input_vals[2],
+                                        self.save_mean, self.save_var, output_val, self.eps)
+                return
+            input_vals = [n.numpy_view() for n in input_vals]
+            data_type = input_vals[0].dtype
+            save_mean = self.save_mean.numpy_view()
+            save_var = self.save_var.numpy_view()
+            input_vals[0].mean(axis=-1, dtype=data_type,
+                               keepdims=True, out=save_mean)
+            input_vals[0].var(axis=-1, dtype=data_type,
+                              keepdims=True, out=save_var)
+            std = np.sqrt(save_var + self.eps, dtype=data_type)
 
             bc_shape = [1] * len(input_vals[0].shape)
             bc_shape[-1] = input_vals[0].shape[-1]
 
-            output_val[:] = input_vals[1].reshape(bc_shape) * normed_input + \
-                input_vals[2].reshape(bc_shape)
+            # normed input, scaled and shifted in the output
+            out = np.subtract(input_vals[0], save_mean,
+                              out=output_val.numpy_view())
+            out /= std
+            out *= input_vals[1].reshape(bc_shape)
+            out += input_vals[2].reshape(bc_shape)
 
         else:
             if self.data_shape is None:
@@ -134,40 +146,49 @@ class Layer_Normalization_GradientOp(Op):
 
     def compute(self, input_vals, output_val, stream_handle=None):
         if self.on_cpu:
+            # the arrays of the gradients not in the graph are our own
+            shapeln = input_vals[2].shape
+            if self.tmp_gradient_ln_scale is None:
+                self.tmp_gradient_ln_scale = ndarray.empty(
+                    shapeln, ctx=ndarray.cpu())
             if self.tmp_gradient_ln_bias is None:
-                shapeln = input_vals[2].shape
-                self.data_shape = tuple(input_vals[0].shape)
-                self.tmp_gradient_ln_scale = np.empty(
-                    shape=shapeln, dtype=np.float32)
-                self.tmp_gradient_ln_bias = np.empty(
-                    shape=shapeln, dtype=np.float32)
-                self.tmp_gradient_in_arr = np.empty(
-                    shape=self.data_shape, dtype=np.float32)
-            elif self.data_shape != tuple(input_vals[0].shape):
-                self.data_shape = tuple(input_vals[0].shape)
-                del self.tmp_gradient_in_arr
-                self.tmp_gradient_in_arr = np.empty(
-                    shape=self.data_shape, dtype=np.float32)
+                self.tmp_gradient_ln_bias = ndarray.empty(
+                    shapeln, ctx=ndarray.cpu())
+            if self.tmp_gradient_in_arr is None or self.tmp_gradient_in_arr.shape != input_vals[0].shape:
+                self.tmp_gradient_in_arr = ndarray.empty(
+                    input_vals[0].shape, ctx=ndarray.cpu())
+            if DNNL_LIB['cpu_LayerNormalizationGradient']:
+                cpu_layer_normalization_gradient(
+                    input_vals[0], input_vals[1], input_vals[2],
+                    self.tmp_gradient_in_arr, self.tmp_gradient_ln_scale,
+                    self.tmp_gradient_ln_bias, self.forward_node.save_mean,
+                    self.forward_node.save_var, self.eps)
+                return
+            input_vals = [n.numpy_view() for n in input_vals]
+            save_mean = self.forward_node.save_mean.numpy_view()
+            save_var = self.forward_node.save_var.numpy_view()
 
             red_axis = tuple(range(input_vals[0].ndim - 1))
-            self.tmp_gradient_ln_bias[:] = input_vals[0].sum(red_axis)  # (X,)
+            input_vals[0].sum(red_axis, out=_cpu_view(
+                self.tmp_gradient_ln_bias))  # (X,)
 
-            std = np.sqrt(self.forward_node.save_var + self.eps)  # (N, 1)
-            x_centered = input_vals[1] - self.forward_node.save_mean  # (N, X)
+            std = np.sqrt(save_var + self.eps)  # (N, 1)
+            x_centered = input_vals[1] - save_mean  # (N, X)
             x_norm = x_centered / std  # (N, X)
-            self.tmp_gradient_ln_scale[:] = (
-                input_vals[0] * x_norm).sum(red_axis)  # (X,)
+            (input_vals[0] * x_norm).sum(red_axis,
+                                         out=_cpu_view(self.tmp_gradient_ln_scale))  # (X,)
 
             last_dim = input_vals[1].shape[-1]
             dx_norm = input_vals[0] * input_vals[2].reshape(
                 [1] * (input_vals[0].ndim - 1) + [-1])  # (N, X)
             dvar = (dx_norm * x_centered).sum(axis=-1, keepdims=True) * -0.5 / (
-                self.forward_node.save_var + self.eps) / std  # (N, 1)
+                save_var + self.eps) / std  # (N, 1)
             dx_mu_1 = dx_norm / std  # (N, X)
             dx_mu_2 = dvar * 2 * x_centered / last_dim  # (N, X)
             dx_1 = dx_mu_1 + dx_mu_2  # (N, X)
             dx_2 = -1 * dx_1.sum(axis=-1, keepdims=True) / last_dim  # (N, 1)
-            self.tmp_gradient_in_arr[:] = dx_1 + dx_2  # (N, X)
+            np.add(dx_1, dx_2, out=_cpu_view(
+                self.tmp_gradient_in_arr))  # (N, X)
         else:
             self.check_valid_arrs()
             layer_normalization_gradient(input_vals[0], input_vals[1], input_vals[2],
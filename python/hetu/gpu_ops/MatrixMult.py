@@ -20,22 +20,23 @@ class MatMulOp(Op):
                     input_vals[1], self.matmul_attr_trans_B,
                     output_val)
             else:
-                input_vals = [n.asnumpy() for n in input_vals]
+                input_vals = [n.numpy_view() for n in input_vals]
+                out = output_val.numpy_view()
                 if ((self.matmul_attr_trans_A is False) and
                         (self.matmul_attr_trans_B is False)):
-                    output_val[:] = np.matmul(input_vals[0], input_vals[1])
+                    np.matmul(input_vals[0], input_vals[1], out=out)
                 elif ((self.matmul_attr_trans_A is True) and
                         (self.matmul_attr_trans_B is False)):
-                    output_val[:] = np.matmul(
-                        np.transpose(input_vals[0]), input_vals[1])
+                    np.matmul(np.transpose(input_vals[0]),
+                              input_vals[1], out=out)
                 elif ((self.matmul_attr_trans_A is False) and
                         (self.matmul_attr_trans_B is True)):
-                    output_val[:] = np.matmul(
-                        input_vals[0], np.transpose(input_vals[1]))
+                    np.matmul(input_vals[0], np.transpose(
+                        input_vals[1]), out=out)
                 elif ((self.matmul_attr_trans_A is True) and
                         (self.matmul_attr_trans_B is True)):
-                    output_val[:] = np.matmul(
-                        np.transpose(input_vals[0]), np.transpose(input_vals[1]))
+                    np.matmul(np.transpose(input_vals[0]), np.transpose(
+                        input_vals[1]), out=out)
         else:
             matrix_multiply(
                 input_vals[0], self.matmul_attr_trans_A,
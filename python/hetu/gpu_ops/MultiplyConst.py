@@ -1,4 +1,5 @@
 from __future__ import absolute_import
+import numpy as np
 from .Node import Op
 from .._base import DNNL_LIB
 from ..cpu_links import matrix_elementwise_multiply_by_const as cpu_matrix_elementwise_multiply_by_const
@@ -26,7 +27,8 @@ class MulByConstOp(Op):
                 cpu_matrix_elementwise_multiply_by_const(
                     input_vals[0], self.const_attr, output_val)
             else:
-                output_val[:] = input_vals[0].asnumpy() * self.const_attr
+                np.multiply(input_vals[0].numpy_view(), self.const_attr,
+                            out=output_val.numpy_view())
         else:
             matrix_elementwise_multiply_by_const(
                 input_vals[0], self.const_attr, output_val, stream_handle)
@@ -1,4 +1,5 @@
 from __future__ import absolute_import
+import numpy as np
 from .Node import Op
 from .._base import DNNL_LIB
 from ..cpu_links import matrix_elementwise_multiply as\
@@ -20,16 +21,16 @@ class MulOp(Op):
                     input_vals[0], input_vals[1], output_val)
             elif DNNL_LIB['DnnlMatrixElementwiseMultiplyByConst'] and (input_vals[0].shape == (1,) or input_vals[1].shape == (1,)):
                 if input_vals[1].shape == (1,):
-                    const_val = input_vals[1].asnumpy()[0]
+                    const_val = input_vals[1].numpy_view()[0]
                     cpu_matrix_elementwise_multiply_by_const(
                         input_vals[0], const_val, output_val)
                 elif input_vals[0].shape == (1,):
-                    const_val = input_vals[0].asnumpy()[0]
+                    const_val = input_vals[0].numpy_view()[0]
                     cpu_matrix_elementwise_multiply_by_const(
                         input_vals[1], const_val, output_val)
             else:
-                output_val[:] = input_vals[0].asnumpy() * \
-                    input_vals[1].asnumpy()
+                np.multiply(input_vals[0].numpy_view(), input_vals[1].numpy_view(),
+                            out=output_val.numpy_view())
         else:
             if input_vals[0].shape == input_vals[1].shape:
                 matrix_elementwise_multiply(
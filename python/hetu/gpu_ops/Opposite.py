@@ -1,4 +1,5 @@
 from __future__ import absolute_import
+import numpy as np
 from .Node import Op
 from .._base import DNNL_LIB
 from ..cpu_links import opposite as cpu_opposite
@@ -15,7 +16,8 @@ class OppositeOp(Op):
             if DNNL_LIB['DnnlOpposite']:
                 cpu_opposite(input_vals[0], output_val)
             else:
-                output_val[:] = -input_vals[0].asnumpy()
+                np.negative(input_vals[0].numpy_view(),
+                            out=output_val.numpy_view())
         else:
             matrix_opposite(input_vals[0], output_val, stream_handle)
 
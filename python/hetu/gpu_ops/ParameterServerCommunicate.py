@@ -170,7 +170,7 @@ class ParameterServerCommunicateOp(Op):
             # this function synchronously initialize meta information and do the initialization,
             # ALREADY has barrier!
             self.cache = CacheSparseTable(
-                limit, node_shape[0], node_shape[1], self.parameter.id, config.cstable_policy, config.cache_bound)
+                limit, node_shape[0], node_shape[1], self.parameter.id, config.cstable_policy, config.cache_bound, config.cache_shards)
             self.parameter.cache = self.cache
             if config.prefetch:
                 self.dl_name = config.train_name
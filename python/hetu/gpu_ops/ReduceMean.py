@@ -29,15 +29,13 @@ class ReduceMeanOp(Op):
             input_vals[0].copyto(output_val)
         else:
             if self.on_cpu:
-                if all(self.keepdims) or not any(self.keepdims):
-                    output_val[:] = np.mean(input_vals[0].asnumpy(), axis=tuple(
-                        self.axes), keepdims=self.keepdims[0])
-                else:
-                    temp = input_vals[0].asnumpy()
-                    for i in range(len(self.keepdims))[::-1]:
-                        temp = np.mean(
-                            temp, self.axes[i], keepdims=self.keepdims[i])
-                    output_val[:] = temp
+                # keepdims only changes the shape: reduce all the axes at
+                # once into the output viewed with them kept
+                data = input_vals[0].numpy_view()
+                kept_shape = [1 if i in self.axes else dim
+                              for i, dim in enumerate(data.shape)]
+                np.mean(data, axis=tuple(self.axes), keepdims=True,
+                        out=output_val.numpy_view().reshape(kept_shape))
             else:
                 reduce_mean(input_vals[0], output_val, self.axes, stream_handle)
 
@@ -17,7 +17,8 @@ class ReluOp(Op):
             if DNNL_LIB['DnnlRelu']:
                 cpu_relu(input_vals[0], output_val)
             else:
-                output_val[:] = np.maximum(input_vals[0].asnumpy(), 0)
+                np.maximum(input_vals[0].numpy_view(), 0,
+                           out=output_val.numpy_view())
         else:
             relu(input_vals[0], output_val, stream_handle)
 
@@ -39,8 +40,11 @@ class ReluGradientOp(Op):
                 cpu_relu_gradient(input_vals[0], input_vals[1], output_val)
             # heaviside function, 0.5 at x=0
             else:
-                output_val[:] = (np.sign(input_vals[0].asnumpy()) +
-                                 1) * 0.5 * input_vals[1].asnumpy()
+                out = np.sign(input_vals[0].numpy_view(),
+                              out=output_val.numpy_view())
+                out += 1
+                out *= 0.5
+                out *= input_vals[1].numpy_view()
         else:
             relu_gradient(input_vals[0], input_vals[1],
                           output_val, stream_handle)
@@ -1,4 +1,5 @@
 from __future__ import absolute_import
+import numpy as np
 from .Node import Op
 from .._base import DNNL_LIB
 from ..cpu_links import reshape as cpu_reshape
@@ -41,7 +42,8 @@ class Array_ReshapeOp(Op):
             if DNNL_LIB['cpu_Reshape']:
                 cpu_reshape(input_vals[0], output_val)
             else:
-                output_val[:] = input_vals[0].asnumpy().reshape(output_shape)
+                np.copyto(output_val.numpy_view(),
+                          input_vals[0].numpy_view().reshape(output_shape))
         else:
             if self.inplace:
                 input_vals[0].reshape(output_shape, output_val)
@@ -114,7 +116,8 @@ class Array_Reshape_GradientOp(Op):
             if DNNL_LIB['cpu_Reshape']:
                 cpu_reshape(input_vals[0], output_val)
             else:
-                output_val[:] = input_vals[0].asnumpy().reshape(shapeIn)
+                np.copyto(output_val.numpy_view(),
+                          input_vals[0].numpy_view().reshape(shapeIn))
         else:
             if self.inplace:
                 input_vals[0].reshape(shapeIn, output_val)
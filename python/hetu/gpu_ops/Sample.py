@@ -1,6 +1,5 @@
 from __future__ import absolute_import
 import numpy as np
-from scipy.stats import truncnorm
 from .Node import Op
 from .._base import DNNL_LIB
 from ..cpu_links import uniform_init as cpu_uniform_init, \
@@ -85,6 +84,7 @@ class TruncatedNormalSampleOp(Op):
                 cpu_truncated_normal_init(output_val, self.mean, self.stddev)
             else:
                 get_np_rand(1)
+                from scipy.stats import truncnorm
                 output_val[:] = truncnorm(
                     -2.0, 2.0, loc=self.mean, scale=self.stddev).rvs(output_val.shape).astype(output_val.dtype)
 
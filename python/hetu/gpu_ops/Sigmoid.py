@@ -15,7 +15,11 @@ class SigmoidOp(Op):
             if DNNL_LIB['DnnlSigmoid']:
                 cpu_sigmoid(input_vals[0], output_val)
             else:
-                output_val[:] = 1.0/(1.0+1.0/np.exp(input_vals[0].asnumpy()))
+                out = np.exp(input_vals[0].numpy_view(),
+                             out=output_val.numpy_view())
+                np.divide(1.0, out, out=out)
+                out += 1.0
+                np.divide(1.0, out, out=out)
         else:
             sigmoid(input_vals[0], output_val, stream_handle)
 
@@ -3,21 +3,25 @@ import numpy as np
 from .Node import Op
 from .._base import DNNL_LIB
 from ..cpu_links import softmax as cpu_softmax
+from ..cpu_links import softmax_gradient as cpu_softmax_gradient
 from ..gpu_links import CuDNN_softmax
 from ..gpu_links import CuDNN_softmax_gradient
 
 
-def softmax_func(y):
-    """Numerically stable softmax."""
-    b = y - np.max(y, axis=-1, keepdims=True)
-    expb = np.exp(b)
-    softmax = expb / np.sum(expb, axis=-1, keepdims=True)
-    return softmax
+def softmax_func(y, out=None):
+    """Numerically stable softmax, written into out if given."""
+    if out is None:
+        out = np.empty(np.shape(y), np.result_type(y, np.float32))
+    np.subtract(y, np.max(y, axis=-1, keepdims=True), out=out)
+    np.exp(out, out=out)
+    out /= np.sum(out, axis=-1, keepdims=True)
+    return out
 
 
-def softmax_gradient_func(y, dy):
-    dx = y * (dy - (dy * y).sum(axis=-1, keepdims=True))
-    return dx
+def softmax_gradient_func(y, dy, out=None):
+    out = np.subtract(dy, (dy * y).sum(axis=-1, keepdims=True), out=out)
+    out *= y
+    return out
 
 
 class SoftmaxOp(Op):
@@ -29,7 +33,8 @@ class SoftmaxOp(Op):
             if DNNL_LIB['DnnlSoftmax']:
                 cpu_softmax(input_vals[0], output_val)
             else:
-                output_val[:] = softmax_func(input_vals[0].asnumpy())
+                softmax_func(input_vals[0].numpy_view(),
+                             out=output_val.numpy_view())
         else:
             CuDNN_softmax(input_vals[0], output_val, stream_handle)
 
@@ -49,8 +54,11 @@ class SoftmaxGradientOp(Op):
 
     def compute(self, input_vals, output_val, stream_handle=None):
         if self.on_cpu:
-            output_val[:] = softmax_gradient_func(
-                input_vals[0].asnumpy(), input_vals[1].asnumpy())
+            if DNNL_LIB['DnnlSoftmaxGradient']:
+                cpu_softmax_gradient(input_vals[0], input_vals[1], output_val)
+            else:
+                softmax_gradient_func(input_vals[0].numpy_view(), input_vals[1].numpy_view(),
+                                      out=output_val.numpy_view())
         else:
             CuDNN_softmax_gradient(
                 input_vals[0], input_vals[1], output_val, stream_handle)
@@ -17,7 +17,7 @@ class SqrtOp(Op):
             if DNNL_LIB['DnnlSqrt']:
                 cpu_sqrt(input_vals[0], output_val)
             else:
-                output_val[:] = np.sqrt(input_vals[0].asnumpy())
+                np.sqrt(input_vals[0].numpy_view(), out=output_val.numpy_view())
         else:
             matrix_sqrt(input_vals[0], output_val, stream_handle)
 
@@ -38,7 +38,9 @@ class ReciprocalSqrtOp(Op):
             if DNNL_LIB['DnnlReciprocalSqrt']:
                 cpu_rsqrt(input_vals[0], output_val)
             else:
-                output_val[:] = 1 / np.sqrt(input_vals[0].asnumpy())
+                out = np.sqrt(input_vals[0].numpy_view(),
+                              out=output_val.numpy_view())
+                np.divide(1, out, out=out)
         else:
             matrix_rsqrt(input_vals[0], output_val, stream_handle)
 
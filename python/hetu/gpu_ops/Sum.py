@@ -11,6 +11,7 @@ from ..gpu_links import matrix_elementwise_add_by_const,\
 import numpy as np
 from .DataTransfer import DataD2HSparseOp, DataH2DSparseOp
 from .EmbeddingLookUp import EmbeddingLookUp_Gradient
+from .EmbeddingBag import EmbeddingBag_GradientOp
 
 
 class SumOp(Op):
@@ -38,8 +39,9 @@ class SumOp(Op):
         output_val += input_val.asnumpy()
 
     def _indexed_cpu_callback(self, input_val, output_val):
-        output_val[input_val.indices.asnumpy().astype(
-            np.int)] += input_val.values.asnumpy()
+        # ids may repeat; padding ids (-1) come with zero rows
+        np.add.at(output_val, input_val.indices.asnumpy().astype(
+            np.int64).reshape(-1), input_val.values.asnumpy().reshape(-1, output_val.shape[-1]))
 
     def _simple_gpu_callback(self, input_val, output_val, ind, stream_handle):
         matrix_elementwise_add_simple(
@@ -220,7 +222,7 @@ class SparseSumOp(Op):
     def forward_hook(self, config):
         super().forward_hook(config)
         for node in self.inputs:
-            assert isinstance(node, (EmbeddingLookUp_Gradient,
+            assert isinstance(node, (EmbeddingLookUp_Gradient, EmbeddingBag_GradientOp,
                                      DataD2HSparseOp, DataH2DSparseOp))
 
 
@@ -15,7 +15,7 @@ class TanhOp(Op):
             if DNNL_LIB['DnnlTanh']:
                 cpu_tanh(input_vals[0], output_val)
             else:
-                output_val[:] = np.tanh(input_vals[0].asnumpy())
+                np.tanh(input_vals[0].numpy_view(), out=output_val.numpy_view())
         else:
             tanh(input_vals[0], output_val, stream_handle)
 
@@ -33,8 +33,10 @@ class TanhGradientOp(Op):
 
     def compute(self, input_vals, output_val, stream_handle=None):
         if self.on_cpu:
-            temp = input_vals[0].asnumpy()
-            output_val[:] = (1 - temp * temp) * input_vals[1].asnumpy()
+            temp = input_vals[0].numpy_view()
+            out = np.multiply(temp, temp, out=output_val.numpy_view())
+            np.subtract(1, out, out=out)
+            out *= input_vals[1].numpy_view()
         else:
             tanh_gradient(input_vals[0], input_vals[1],
                           output_val, stream_handle)
@@ -17,8 +17,8 @@ class TransposeOp(Op):
             if DNNL_LIB['cpu_Transpose']:
                 cpu_transpose(input_vals[0], output_val, self.perm)
             else:
-                output_val[:] = np.transpose(
-                    input_vals[0].asnumpy(), self.perm)
+                np.copyto(output_val.numpy_view(), np.transpose(
+                    input_vals[0].numpy_view(), self.perm))
         else:
             # matrix_transpose(input_vals[0], output_val, self.perm, stream_handle)
             matrix_transpose_simple(
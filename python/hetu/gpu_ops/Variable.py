@@ -5,22 +5,35 @@ from .. import ndarray
 from .. import stream
 
 
-def Variable(name, value=None, initializer=None, trainable=True, dtype=np.float32, ctx=None):
+# encodings of the values pushed to and pulled from PS, see ps-lite codec.h
+PS_COMPRESSION = {None: 0, 'fp16': 1, 'bf16': 2, 'int8': 3}
+
+
+def Variable(name, value=None, initializer=None, trainable=True, dtype=np.float32, ctx=None, compression=None, error_feedback=True):
     """
         Defined a variable.
         Trainable: Parameter
         Not Trainable: Constant
+        compression: encoding of the values sent to and from PS for this
+            parameter, one of None, 'fp16', 'bf16' and 'int8' (a scale per row)
+        error_feedback: keep what the encoding of pushes loses on the worker
+            and send it with the next push; for embeddings only the rows
+            pushed by the worker keep it
     """
     placeholder_node = placeholder_op(
-        name, value, initializer, trainable, dtype, ctx)
+        name, value, initializer, trainable, dtype, ctx, compression, error_feedback)
     return placeholder_node
 
 
 class PlaceholderOp(Op):
-    def __init__(self, name, value=None, initializer=None, trainable=True, dtype=np.float32, ctx=None):
+    def __init__(self, name, value=None, initializer=None, trainable=True, dtype=np.float32, ctx=None, compression=None, error_feedback=True):
         super().__init__(PlaceholderOp, [], ctx)
         self.name = name
         self.is_embed = False
+        assert compression in PS_COMPRESSION, 'Compression %s not valid.' % str(
+            compression)
+        self.compression = compression
+        self.error_feedback = error_feedback
         self.shape = None
         if value is None and initializer is None:
             trainable = False
@@ -135,7 +148,7 @@ class PlaceholderOp(Op):
         return tensor
 
 
-def placeholder_op(name, value=None, initializer=None, trainable=True, dtype=np.float32, ctx=None):
+def placeholder_op(name, value=None, initializer=None, trainable=True, dtype=np.float32, ctx=None, compression=None, error_feedback=True):
     """Node of variable placeholder.
 
     Parameters:
@@ -147,4 +160,4 @@ def placeholder_op(name, value=None, initializer=None, trainable=True, dtype=np.
     A new Node instance created by Op.
 
     """
-    return PlaceholderOp(name, value, initializer, trainable, dtype, ctx)
+    return PlaceholderOp(name, value, initializer, trainable, dtype, ctx, compression, error_feedback)
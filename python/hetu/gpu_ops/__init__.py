@@ -1,147 +1,189 @@
 from __future__ import absolute_import
 from ast import Import
-from .executor import wrapped_mpi_nccl_init, Executor, gradients, scheduler_init,\
-    scheduler_finish, get_worker_communicate, worker_init, worker_finish, server_init, server_finish, HetuConfig, new_group_comm
-
-from .Abs import abs_op, abs_gradient_op
-from .AddConst import addbyconst_op
-from .AddElewise import add_op
-from .Addmm import addmm_op, addmm_gradient_op
-from .Arange import arange_op
-from .Argsort import argsort_op
-from .Argmax import argmax_op
-from .ArgmaxPartial import argmax_partial_op
-from .AvgPool import avg_pool2d_op, avg_pool2d_gradient_op
-from .Baddbmm import baddbmm_op
-from .BatchNorm import batch_normalization_op, batch_normalization_gradient_op, batch_normalization_gradient_of_data_op, batch_normalization_gradient_of_scale_op, batch_normalization_gradient_of_bias_op
-from .Bool import bool_op
-from .Broadcast import broadcastto_op
-from .BinaryCrossEntropy import binarycrossentropy_op
-from .BinaryCrossEntropyWithLogits import binarycrossentropywithlogits_op, binarycrossentropywithlogits_gradient_op
-from .Clamp import clamp_op
-from .Concat import concat_op, concat_gradient_op
-from .Concatenate import concatenate_op, concatenate_gradient_op
-from .ConstPow import const_pow_op, const_pow_gradient_op
-from .Conv2d import conv2d_op, conv2d_gradient_of_data_op, conv2d_gradient_of_filter_op
-from .Conv2dBroadcast import conv2d_broadcastto_op
-from .Conv2dReduceSum import conv2d_reducesum_op
-from .CuSparse import csrmv_op, csrmm_op
-from .Division import div_op, div_handle_zero_op, div_const_op
-from .Dropout import dropout_op, dropout_gradient_op
-# from .Dropout2d import dropout2d_op, dropout2d_gradient_op
-from .Exp import exp_op
-from .Floor import floor_op
-from .Full import full_op, full_like_op
-from .Gather import gather_op, gather_gradient_op
-from .Interpolate import interpolate_op, interpolate_grad_op
-from .MaskedFill import masked_fill_op
-from .MatrixMult import matmul_op
-from .Max import max_op
-from .MaxPool import max_pool2d_op, max_pool2d_gradient_op
-from .MinDist import min_dist_op
-from .Min import min_op
-from .MinusByConst import minus_byconst_op
-from .MinusElewise import minus_op
-from .MultiplyConst import mul_byconst_op
-from .MultiplyElewise import mul_op
-from .Norm import norm_op, norm_gradient_op
-from .OnesLike import oneslike_op
-from .Opposite import opposite_op
-from .OptEmbedBinaryStep import binary_step_op, binary_step_gradient_op
-from .ParamClip import param_clip_op
-from .Pad import pad_op, pad_gradient_op
-from .Pow import pow_op, pow_gradient_op
-from .Rand import rand_op
-from .ReduceSumAxisZero import reducesumaxiszero_op
-from .Relu import relu_op, relu_gradient_op
-from .Repeat import repeat_op, repeat_gradient_op
-from .Roll import roll_op
-from .Gelu import gelu_op, gelu_gradient_op
-from .LeakyRelu import leaky_relu_op, leaky_relu_gradient_op
-from .Reshape import array_reshape_op, array_reshape_gradient_op
-from .ReshapeTo import reshape_to_op
-from .Sigmoid import sigmoid_op
-from .Sign import sign_op
-from .Sin import sin_op, cos_op
-from .Slice import slice_op, slice_gradient_op
-from .SliceAssign import slice_assign_op, slice_assign_matrix_op
-from .SliceByMatrix import slice_by_matrix_op, slice_by_matrix_gradient_op
-from .Softmax import softmax_func, softmax_op, softmax_gradient_op
-from .LogSoftmax import log_softmax_op, log_softmax_gradient_op
-from .SoftmaxCrossEntropy import softmaxcrossentropy_op
-from .SoftmaxCrossEntropySparse import softmaxcrossentropy_sparse_op
-from .SparseSet import sparse_set_op
-from .CrossEntropy import crossentropy_op
-from .CrossEntropySparse import crossentropy_sparse_op
-from .Split import split_op, split_gradient_op
-from .Sqrt import sqrt_op, rsqrt_op
-from .StopGradient import stop_gradient_op
-from .Sum import sum_op
-from .SumSparseGradient import sum_sparse_gradient_op
-from .Tanh import tanh_op, tanh_gradient_op
-from .Transpose import transpose_op
+# Variable is also the name of a module here; the function is bound first, so
+# importing the module later does not shadow it
 from .Variable import Variable, placeholder_op
-from .ZerosLike import zeroslike_op
-from .EmbeddingLookUp import embedding_lookup_op
-from .SparseEmbeddingLookUp import sparse_embedding_lookup_op
-from .Where import where_op, where_const_op
-from .BatchMatrixMult import batch_matmul_op
-from .LayerNorm import layer_normalization_op
-from .InstanceNorm2d import instance_normalization2d_op
-from .BroadcastShape import broadcast_shape_op
-from .Power import power_op
-from .ReduceSum import reduce_sum_op
-from .ReduceMean import reduce_mean_op
-from .ReduceMin import reduce_min_op
-from .ReduceMul import reduce_mul_op
-from .ReduceNorm1 import reduce_norm1_op
-from .ReduceNorm2 import reduce_norm2_op
-from .OneHot import one_hot_op
-from .Linear import linear_op
-from .Conv2dAddBias import conv2d_add_bias_op
-from .AllReduceCommunicate import allreduceCommunicate_op, groupallreduceCommunicate_op, allreduceCommunicatep2p_op
-from .AllGatherCommunicate import allgatherCommunicate_op
-from .ReduceScatterCommunicate import reducescatterCommunicate_op
-from .BroadcastCommunicate import broadcastCommunicate_op
-from .ReduceCommunicate import reduceCommunicate_op
-from .ParameterServerCommunicate import parameterServerCommunicate_op, parameterServerSparsePull_op
-from .DataTransfer import datah2d_op, datad2h_op
-from .MatrixDot import matrix_dot_op
-from .DistGCN_15d import distgcn_15d_op
-from .PipelineSend import pipeline_send_op
-from .PipelineReceive import pipeline_receive_op
-from .Dispatch import dispatch
-from .Tile import tile_op
-from .TopKIdx import topk_idx_op
-from .TopKVal import topk_val_op
-from .Scatter import scatter_op
-from .Cumsum import cumsum_with_bias_op
-from .AllToAll import alltoall_op
-from .LayoutTransform import layout_transform_op
-from .LayoutTransform import layout_transform_gradient_op
-from .ReverseLayoutTransform import reverse_layout_transform_gradient_data_op
-from .ReverseLayoutTransform import reverse_layout_transform_gradient_gate_op
-from .ReverseLayoutTransform import reverse_layout_transform_op
-from .BalanceAssignment import balance_assignment_op
-from .Indexing import indexing_op
-from .Scatter1D import scatter1d_op, scatter1d_grad_op
-from .LogElewise import log_op, log_grad_op
-from .Mask import mask_op
-from .NllLoss import nll_loss_op, nll_loss_grad_op
-from .ReverseLayoutTransformNoGate import reverse_layout_transform_no_gate_op, reverse_layout_transform_no_gate_gradient_op
-from .HAllToAll import halltoall_op
-from .SamGroupSum import sam_group_sum_op
-from .GroupTopKIdx import group_topk_idx_op
-from .SamMax import sam_max_op
-from .CompressedEmbedding import mod_hash_op, mod_hash_negative_op, div_hash_op, compo_hash_op, learn_hash_op, robe_hash_op, robe_sign_op
-from .TrilLookup import tril_lookup_op, tril_lookup_gradient_op
-from .Prune import prune_low_magnitude_op
-from .Quantize import quantize_op, dequantize_op
-from .QuantizeALPTEmb import alpt_embedding_lookup_op, alpt_rounding_op, alpt_scale_gradient_op
-from .QuantizeEmbedding import quantized_embedding_lookup_op, unified_quantized_embedding_lookup_op
-from .AssignWithIndexedSlices import assign_with_indexedslices_op, assign_quantized_embedding_op
-from .Sample import uniform_sample_op, normal_sample_op, truncated_normal_sample_op, gumbel_sample_op, randint_sample_op
-from .Unique import unique_indices_op, unique_indices_offsets_op, deduplicate_lookup_op, deduplicate_grad_op
+
+# the ops are imported at the first access, see __getattr__;
+# module -> names
+_LAZY_MODULES = {
+    'executor': ['wrapped_mpi_nccl_init', 'Executor', 'gradients',
+        'scheduler_init', 'scheduler_finish', 'get_worker_communicate',
+        'worker_init', 'worker_finish', 'server_init', 'server_finish',
+        'HetuConfig', 'new_group_comm'],
+    'Abs': ['abs_op', 'abs_gradient_op'],
+    'AddConst': ['addbyconst_op'],
+    'AddElewise': ['add_op'],
+    'Addmm': ['addmm_op', 'addmm_gradient_op'],
+    'Arange': ['arange_op'],
+    'Argsort': ['argsort_op'],
+    'Argmax': ['argmax_op'],
+    'ArgmaxPartial': ['argmax_partial_op'],
+    'AvgPool': ['avg_pool2d_op', 'avg_pool2d_gradient_op'],
+    'Attention': ['fused_attention_op', 'fused_attention_gradient_op',
+        'fused_attention_gradient_of_input_op'],
+    'Baddbmm': ['baddbmm_op'],
+    'BatchNorm': ['batch_normalization_op', 'batch_normalization_gradient_op',
+        'batch_normalization_gradient_of_data_op',
+        'batch_normalization_gradient_of_scale_op',
+        'batch_normalization_gradient_of_bias_op'],
+    'Bool': ['bool_op'],
+    'Broadcast': ['broadcastto_op'],
+    'BinaryCrossEntropy': ['binarycrossentropy_op'],
+    'BinaryCrossEntropyWithLogits': ['binarycrossentropywithlogits_op',
+        'binarycrossentropywithlogits_gradient_op'],
+    'Clamp': ['clamp_op'],
+    'Concat': ['concat_op', 'concat_gradient_op'],
+    'Concatenate': ['concatenate_op', 'concatenate_gradient_op'],
+    'ConstPow': ['const_pow_op', 'const_pow_gradient_op'],
+    'Conv2d': ['conv2d_op', 'conv2d_gradient_of_data_op', 'conv2d_gradient_of_filter_op'],
+    'Conv2dBroadcast': ['conv2d_broadcastto_op'],
+    'Conv2dReduceSum': ['conv2d_reducesum_op'],
+    'CuSparse': ['csrmv_op', 'csrmm_op'],
+    'Division': ['div_op', 'div_handle_zero_op', 'div_const_op'],
+    'Dropout': ['dropout_op', 'dropout_gradient_op'],
+    # from .Dropout2d import dropout2d_op, dropout2d_gradient_op
+    'Exp': ['exp_op'],
+    'Floor': ['floor_op'],
+    'Full': ['full_op', 'full_like_op'],
+    'Gather': ['gather_op', 'gather_gradient_op'],
+    'Interpolate': ['interpolate_op', 'interpolate_grad_op'],
+    'MaskedFill': ['masked_fill_op'],
+    'MatrixMult': ['matmul_op'],
+    'Max': ['max_op'],
+    'MaxPool': ['max_pool2d_op', 'max_pool2d_gradient_op'],
+    'MinDist': ['min_dist_op'],
+    'Min': ['min_op'],
+    'MinusByConst': ['minus_byconst_op'],
+    'MinusElewise': ['minus_op'],
+    'MultiplyConst': ['mul_byconst_op'],
+    'MultiplyElewise': ['mul_op'],
+    'Norm': ['norm_op', 'norm_gradient_op'],
+    'OnesLike': ['oneslike_op'],
+    'Opposite': ['opposite_op'],
+    'OptEmbedBinaryStep': ['binary_step_op', 'binary_step_gradient_op'],
+    'ParamClip': ['param_clip_op'],
+    'Pad': ['pad_op', 'pad_gradient_op'],
+    'Pow': ['pow_op', 'pow_gradient_op'],
+    'Rand': ['rand_op'],
+    'ReduceSumAxisZero': ['reducesumaxiszero_op'],
+    'Relu': ['relu_op', 'relu_gradient_op'],
+    'Repeat': ['repeat_op', 'repeat_gradient_op'],
+    'Roll': ['roll_op'],
+    'Gelu': ['gelu_op', 'gelu_gradient_op'],
+    'LeakyRelu': ['leaky_relu_op', 'leaky_relu_gradient_op'],
+    'Reshape': ['array_reshape_op', 'array_reshape_gradient_op'],
+    'ReshapeTo': ['reshape_to_op'],
+    'Sigmoid': ['sigmoid_op'],
+    'Sign': ['sign_op'],
+    'Sin': ['sin_op', 'cos_op'],
+    'Slice': ['slice_op', 'slice_gradient_op'],
+    'SliceAssign': ['slice_assign_op', 'slice_assign_matrix_op'],
+    'SliceByMatrix': ['slice_by_matrix_op', 'slice_by_matrix_gradient_op'],
+    'Softmax': ['softmax_func', 'softmax_op', 'softmax_gradient_op'],
+    'LogSoftmax': ['log_softmax_op', 'log_softmax_gradient_op'],
+    'SoftmaxCrossEntropy': ['softmaxcrossentropy_op'],
+    'SoftmaxCrossEntropySparse': ['softmaxcrossentropy_sparse_op'],
+    'SparseSet': ['sparse_set_op'],
+    'CrossEntropy': ['crossentropy_op'],
+    'CrossEntropySparse': ['crossentropy_sparse_op'],
+    'Split': ['split_op', 'split_gradient_op'],
+    'Sqrt': ['sqrt_op', 'rsqrt_op'],
+    'StopGradient': ['stop_gradient_op'],
+    'Sum': ['sum_op'],
+    'SumSparseGradient': ['sum_sparse_gradient_op'],
+    'Tanh': ['tanh_op', 'tanh_gradient_op'],
+    'Transpose': ['transpose_op'],
+    'ZerosLike': ['zeroslike_op'],
+    'EmbeddingLookUp': ['embedding_lookup_op'],
+    'EmbeddingBag': ['embedding_bag_op', 'embedding_bag_gradient_op'],
+    'SparseEmbeddingLookUp': ['sparse_embedding_lookup_op'],
+    'Where': ['where_op', 'where_const_op'],
+    'BatchMatrixMult': ['batch_matmul_op'],
+    'LayerNorm': ['layer_normalization_op'],
+    'InstanceNorm2d': ['instance_normalization2d_op'],
+    'BroadcastShape': ['broadcast_shape_op'],
+    'Power': ['power_op'],
+    'ReduceSum': ['reduce_sum_op'],
+    'ReduceMean': ['reduce_mean_op'],
+    'ReduceMin': ['reduce_min_op'],
+    'ReduceMul': ['reduce_mul_op'],
+    'ReduceNorm1': ['reduce_norm1_op'],
+    'ReduceNorm2': ['reduce_norm2_op'],
+    'OneHot': ['one_hot_op'],
+    'Linear': ['linear_op'],
+    'FusedLinear': ['fused_linear_op', 'activation_gradient_op'],
+    'Conv2dAddBias': ['conv2d_add_bias_op'],
+    'AllReduceCommunicate': ['allreduceCommunicate_op',
+        'groupallreduceCommunicate_op', 'allreduceCommunicatep2p_op'],
+    'AllGatherCommunicate': ['allgatherCommunicate_op'],
+    'ReduceScatterCommunicate': ['reducescatterCommunicate_op'],
+    'BroadcastCommunicate': ['broadcastCommunicate_op'],
+    'ReduceCommunicate': ['reduceCommunicate_op'],
+    'ParameterServerCommunicate': ['parameterServerCommunicate_op', 'parameterServerSparsePull_op'],
+    'DataTransfer': ['datah2d_op', 'datad2h_op'],
+    'MatrixDot': ['matrix_dot_op'],
+    'DistGCN_15d': ['distgcn_15d_op'],
+    'PipelineSend': ['pipeline_send_op'],
+    'PipelineReceive': ['pipeline_receive_op'],
+    'Dispatch': ['dispatch'],
+    'Tile': ['tile_op'],
+    'TopKIdx': ['topk_idx_op'],
+    'TopKVal': ['topk_val_op'],
+    'Scatter': ['scatter_op'],
+    'Cumsum': ['cumsum_with_bias_op'],
+    'AllToAll': ['alltoall_op'],
+    'LayoutTransform': ['layout_transform_op', 'layout_transform_gradient_op'],
+    'ReverseLayoutTransform': ['reverse_layout_transform_gradient_data_op',
+        'reverse_layout_transform_gradient_gate_op', 'reverse_layout_transform_op'],
+    'BalanceAssignment': ['balance_assignment_op'],
+    'Indexing': ['indexing_op'],
+    'Scatter1D': ['scatter1d_op', 'scatter1d_grad_op'],
+    'LogElewise': ['log_op', 'log_grad_op'],
+    'Mask': ['mask_op'],
+    'NllLoss': ['nll_loss_op', 'nll_loss_grad_op'],
+    'ReverseLayoutTransformNoGate': ['reverse_layout_transform_no_gate_op',
+        'reverse_layout_transform_no_gate_gradient_op'],
+    'HAllToAll': ['halltoall_op'],
+    'SamGroupSum': ['sam_group_sum_op'],
+    'GroupTopKIdx': ['group_topk_idx_op'],
+    'SamMax': ['sam_max_op'],
+    'CompressedEmbedding': ['mod_hash_op', 'mod_hash_negative_op',
+        'div_hash_op', 'compo_hash_op', 'learn_hash_op', 'robe_hash_op',
+        'robe_sign_op'],
+    'TrilLookup': ['tril_lookup_op', 'tril_lookup_gradient_op'],
+    'Prune': ['prune_low_magnitude_op'],
+    'Quantize': ['quantize_op', 'dequantize_op'],
+    'QuantizeALPTEmb': ['alpt_embedding_lookup_op', 'alpt_rounding_op', 'alpt_scale_gradient_op'],
+    'QuantizeEmbedding': ['quantized_embedding_lookup_op', 'unified_quantized_embedding_lookup_op'],
+    'AssignWithIndexedSlices': ['assign_with_indexedslices_op', 'assign_quantized_embedding_op'],
+    'Sample': ['uniform_sample_op', 'normal_sample_op',
+        'truncated_normal_sample_op', 'gumbel_sample_op', 'randint_sample_op'],
+    'Unique': ['unique_indices_op', 'unique_indices_offsets_op',
+        'deduplicate_lookup_op', 'deduplicate_grad_op'],
+}
+_LAZY_ATTRS = {name: module for module,
+               names in _LAZY_MODULES.items() for name in names}
+
+
+def __getattr__(name):
+    import importlib
+    import importlib.util
+    module = _LAZY_ATTRS.get(name)
+    if module is not None:
+        value = getattr(importlib.import_module('.' + module, __name__), name)
+    elif not name.startswith('__') and importlib.util.find_spec('.' + name, __name__) is not None:
+        # the op modules themselves, e.g. ht.gpu_ops.Dropout.dropout_np
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
 
 __all__ = [
     'Executor',
@@ -283,6 +325,8 @@ __all__ = [
     'placeholder_op',
     'zeroslike_op',
     "embedding_lookup_op",
+    'embedding_bag_op',
+    'embedding_bag_gradient_op',
     "sparse_embedding_lookup_op",
     'where_op',
     'where_const_op',
@@ -299,6 +343,11 @@ __all__ = [
     'reduce_norm2_op',
     'one_hot_op',
     'linear_op',
+    'fused_linear_op',
+    'activation_gradient_op',
+    'fused_attention_op',
+    'fused_attention_gradient_op',
+    'fused_attention_gradient_of_input_op',
     'conv2d_add_bias_op',
     'allreduceCommunicate_op',
     'allreduceCommunicatep2p_op',
@@ -2,13 +2,13 @@ from __future__ import absolute_import, annotations
 from .BatchNorm import Batch_NormalizationOp, Batch_Normalization_Gradient_of_DataOp, Batch_Normalization_Gradient_of_ScaleOp, Batch_Normalization_Gradient_of_BiasOp
 from .LayerNorm import Layer_NormalizationOp, Layer_Normalization_Gradient_of_DataOp, Layer_Normalization_Gradient_of_ScaleOp, Layer_Normalization_Gradient_of_BiasOp
 from .MultiplyConst import MulByConstOp
+from .Attention import FusedAttentionOp, FusedAttention_Gradient_of_InputOp
 import numpy as np
-from scipy.sparse import spmatrix, coo_matrix
 from .. import ndarray
 from .._base import DNNL_LIB
 from ..gpu_links import array_set
 from ..cpu_links import array_set as cpu_array_set
-from .Variable import PlaceholderOp  # add for optimizer
+from .Variable import PlaceholderOp, PS_COMPRESSION  # add for optimizer
 from ..dataloader import DataloaderOp, GNNDataLoaderOp
 from .AllReduceCommunicate import AllReduceCommunicateOp, AllReduceCommunicateP2POp
 from .AllGatherCommunicate import AllGatherCommunicateOp
@@ -23,6 +23,7 @@ from .StopGradient import StopGradientOp
 from .DataTransfer import DataH2DOp, DataD2HOp, DataD2HSparseOp, DataH2DSparseOp
 from ..communicator.mpi_nccl_comm import ncclDataType_t, GroupStart, GroupEnd
 from .EmbeddingLookUp import EmbeddingLookUp, EmbeddingLookUp_Gradient
+from .EmbeddingBag import EmbeddingBag_GradientOp
 from .Unique import UniqueIndicesOffsetsOp
 from ..optimizer import OptimizerOp
 from . import OnesLike
@@ -34,6 +35,7 @@ from .PipelineReceive import PipelineReceiveOp
 from .Split import SplitOp
 from .Concatenate import ConcatenateOp
 from .Dropout import DropoutOp
+from .fusion import fuse_attention_layers, fuse_linear_ops
 from operator import add
 from functools import reduce
 import ctypes
@@ -49,6 +51,7 @@ if TYPE_CHECKING:
     from ..distributed_strategies.base import Strategy
     from .Node import Op
     from ctypes import CDLL
+    from scipy.sparse import spmatrix
     from typing import Type, Optional, Union, Tuple, List, Dict, Set
     FEEDINS = Union[np.ndarray, spmatrix, NDArray, ND_Sparse_Array]
     OP_LIST = List[Op]
@@ -169,6 +172,7 @@ class HetuConfig(object):
         'bsp',
         'prefetch',
         'cache_bound',
+        'cache_shards',
         'log_path',
         'logger',
         'my_eval_nodes',
@@ -188,6 +192,8 @@ class HetuConfig(object):
         'memory_pool',
         'overlap',
         'use_nccl_collectives',
+        'compile_plan',
+        'fuse_ops',
     ]
 
     def __init__(
@@ -204,6 +210,7 @@ class HetuConfig(object):
         prefetch: bool = True,
         enable_lazy: bool = False,
         cache_bound: int = 100,
+        cache_shards: int = 1,
         log_path: Optional[str] = None,
         logger: Optional[str] = None,
         project: Optional[str] = None,
@@ -214,6 +221,9 @@ class HetuConfig(object):
         use_preduce: bool = False,
         overlap: bool = True,
         use_nccl_collectives: bool = True,
+        compile_plan: bool = True,
+        memory_planner: str = 'exact',
+        fuse_ops: bool = True,
     ):
         '''
         context: default device context
@@ -222,12 +232,22 @@ class HetuConfig(object):
             PS         -> Parameter Server
             AllRedeuce -> MPI AllReduce
             Hybrid     -> Parameter Server for Sparse Parameter and MPI AllReduce for Dense Parameter
+        compile_plan: replay a precompiled instruction list in SubExecutor.compute
+            until shapes change, instead of interpreting the graph every step
+        memory_planner: how to share memory between intermediate tensors
+            exact      -> reuse a freed GPU buffer of the same shape and dtype
+            arena      -> pack tensors into one arena per device by lifetime
+        fuse_ops: fuse matmul (+ bias) + activation chains on CPU into one
+            oneDNN matmul with post-ops, and MultiHeadAttention layers on CPU
+            into one tiled attention node, see gpu_ops.fusion
         '''
         assert pipeline in (None, "gpipe", "pipedream", "hetpipe")
         self.pipeline = pipeline
         self.use_preduce = use_preduce
         self.overlap = overlap
         self.use_nccl_collectives = use_nccl_collectives
+        self.compile_plan = compile_plan
+        self.fuse_ops = fuse_ops
 
         self.eval_node_list = eval_node_list
         self.train_name = train_name
@@ -241,7 +261,7 @@ class HetuConfig(object):
             self.all_forward_nodes = set(find_topo_sort(
                 self.graph_status.forward_node_list))
             self.graph_status.shrink_oplayers()
-        self.memory_pool = HetuMemoryPool()
+        self.memory_pool = HetuMemoryPool(memory_planner)
 
         if self.dist_strategy is None:
             if ctx is None:
@@ -393,6 +413,7 @@ class HetuConfig(object):
         self.enable_lazy = enable_lazy
         self.bsp = bsp
         self.cache_bound = int(cache_bound)
+        self.cache_shards = int(cache_shards)
 
         self.log_path = log_path
         if log_path is not None and (self.comm_mode == 'PS' or self.comm_mode == "Hybrid"):
@@ -497,6 +518,8 @@ class Executor(object):
         self.ps_comm = self.config.ps_comm
         self.local_rank = self.config.local_rank
         self.rank = self.config.rank
+        # future of the writer thread of the last background save
+        self.save_future = None
 
     def profile(
         self,
@@ -545,6 +568,9 @@ class Executor(object):
     def get_batch_num(self, name: str = 'default') -> int:
         return self.subexecutor[name].batch_num
 
+    def memory_report(self, name: str = 'default') -> Dict[DLContext, Dict[str, float]]:
+        return self.subexecutor[name].memory_report()
+
     def sync_all_streams(self):
         if self.config.comp_stream is not None:
             self.config.comp_stream.sync()
@@ -565,21 +591,39 @@ class Executor(object):
                 assert node.shape is None
         return state_dict
 
-    def save(self, file_path: str, file_name: str, others: Optional[dict] = None) -> None:
+    def save(
+        self,
+        file_path: str,
+        file_name: str,
+        others: Optional[dict] = None,
+        incremental: bool = False,
+        stream: bool = False,
+        background: bool = False
+    ) -> None:
+        # incremental: parameters on PS only write the rows changed since the
+        # last save to file_path as delta files (with optimizer states),
+        # load replays them on top of the base; ignored without PS
+        # stream: write the checkpoint format of hetu.checkpoint tensor by
+        # tensor instead of pickling a whole state dict
+        # background (with stream): return once the parameters are copied to
+        # host, the file is written by a thread; see wait_save for its errors
         if others is None:
             others = {}
         else:
             assert 'state_dict' not in others
+        assert stream or not background, 'Background save needs stream.'
 
+        self.wait_save()
         self.sync_all_streams()
         assert os.path.isdir(
             file_path), 'Need to specify a work directory to save parameters.'
         assert others is None or 'state_dict' not in others
         if self.comm_mode in (None, 'AllReduce'):
             # when using allreduce, users need to specify the worker whose rank equals 0 to save
-            state_dict = self.state_dict()
+            params = [(node, value) for node, value in self.config.placeholder_to_arr_map.items()
+                      if value is not None]
         else:
-            state_dict = {}
+            params = []
             self.ps_comm.BarrierWorker()
             if self.config.rank == 0:
                 for node, value in self.config.placeholder_to_arr_map.items():
@@ -587,25 +631,59 @@ class Executor(object):
                         node.event.sync()
                         nodeid = ctypes.c_int(node.id)
                         self.ps_comm.SaveParam(
-                            nodeid, ctypes.c_char_p(bytes(file_path, 'utf-8')))
+                            nodeid, ctypes.c_char_p(bytes(file_path, 'utf-8')),
+                            ctypes.c_bool(incremental))
                         self.ps_comm.Wait(nodeid)
                     else:
-                        state_dict[node.name] = value.asnumpy()
+                        params.append((node, value))
             self.ps_comm.BarrierWorker()
 
-        others['state_dict'] = state_dict
         from ..random import get_seed_status
         others['seed'] = get_seed_status()
-        with open(os.path.join(file_path, file_name), "wb") as writer:
-            pickle.dump(others, writer, protocol=4)
-
-    def load(self, file_path: str, file_name: str, consider_splits: bool = False) -> None:
+        path = os.path.join(file_path, file_name)
+        if stream:
+            from ..checkpoint import save_checkpoint
+            tensors = [(node.name, value.shape, value.dtype, value.asnumpy)
+                       for node, value in params]
+            self.save_future = save_checkpoint(
+                path, tensors, others, background=background)
+        else:
+            others['state_dict'] = {
+                node.name: value.asnumpy() for node, value in params}
+            with open(path, "wb") as writer:
+                pickle.dump(others, writer, protocol=4)
+
+    def wait_save(self) -> None:
+        # wait for the last background save to finish writing; the exception
+        # that stopped it is raised, once, here or by the next save or load
+        if self.save_future is not None:
+            future, self.save_future = self.save_future, None
+            future.result()
+
+    def load(
+        self,
+        file_path: str,
+        file_name: str,
+        consider_splits: bool = False,
+        names: Optional[List[str]] = None
+    ) -> None:
+        # names: only load these parameters (not applied to parameters on PS)
+        # checkpoints written with stream are memory mapped, each parameter
+        # is read from the file straight into its buffer
         assert os.path.isdir(
             file_path), 'Need to specify a work directory to load parameters.'
 
-        with open(os.path.join(file_path, file_name), 'rb') as reader:
-            state_dict = pickle.load(reader)
-        variables = state_dict['state_dict']
+        self.wait_save()
+        path = os.path.join(file_path, file_name)
+        from ..checkpoint import is_checkpoint, load_checkpoint
+        if is_checkpoint(path):
+            state_dict, variables = load_checkpoint(path, names)
+        else:
+            with open(path, 'rb') as reader:
+                state_dict = pickle.load(reader)
+            variables = state_dict['state_dict']
+            if names is not None:
+                variables = {k: v for k, v in variables.items() if k in names}
         seeds = state_dict['seed']
         self.load_seeds(seeds)
         self.load_dict(variables, file_path, consider_splits)
@@ -726,6 +804,11 @@ class Executor(object):
         for node in self.param_nodes:
             if node.event:
                 node.event.sync()
+        # stop the prefetching threads of the dataloaders
+        for subexecutor in self.subexecutor.values():
+            for node in subexecutor.dataloader_nodes:
+                if isinstance(node, DataloaderOp):
+                    node.close()
         if self.comm_mode in ('PS', 'Hybrid'):
             worker_finish()
 
@@ -764,6 +847,12 @@ class SubExecutor(object):
             self.eval_node_list = config.my_eval_nodes
             self.global_eval_nodes = eval_node_list
 
+        if config.fuse_ops and config.pipeline is None and config.layer_indices is None:
+            # the subexecutors share the graph, which is rewritten as a whole
+            fuse_attention_layers(config.graph_status.oplayers,
+                                  config.eval_node_list, config.eval_node_list)
+            fuse_linear_ops(config.eval_node_list, config.eval_node_list)
+
         if inference == False:
             self.topo_order = find_topo_sort(self.eval_node_list)
         else:  # in inference phase
@@ -802,10 +891,12 @@ class SubExecutor(object):
         self.param_nodes: OP_LIST = []
         self.dataloader_nodes: OP_LIST = []
         self.computing_nodes: OP_LIST = []
+        # compiled instruction list of computing_nodes, see compile_plan
+        self.plan = None
 
         ln_bn_grad_nodes = (Batch_Normalization_Gradient_of_DataOp, Batch_Normalization_Gradient_of_ScaleOp, Batch_Normalization_Gradient_of_BiasOp,
                             Layer_Normalization_Gradient_of_DataOp, Layer_Normalization_Gradient_of_ScaleOp, Layer_Normalization_Gradient_of_BiasOp,
-                            UniqueIndicesOffsetsOp,)
+                            FusedAttention_Gradient_of_InputOp, UniqueIndicesOffsetsOp,)
         no_compute_nodes = ln_bn_grad_nodes + (StopGradientOp,)
 
         for node in self.topo_order:
@@ -920,6 +1011,7 @@ class SubExecutor(object):
         self.param_nodes = []
         self.dataloader_nodes = []
         self.computing_nodes = []
+        self.plan = None
 
         for node in self.topo_order:
             if isinstance(node, DataloaderOp) or isinstance(node, GNNDataLoaderOp):
@@ -1020,6 +1112,10 @@ class SubExecutor(object):
                 else:
                     self.indexed_slices_shape[node] = (
                         node.index.shape, self.node_to_shape_map[node.inputs[0]])
+            elif isinstance(node, EmbeddingBag_GradientOp):
+                ind_shape = self.node_to_shape_map[node.inputs[1]]
+                self.indexed_slices_shape[node] = (
+                    ind_shape, ind_shape + (node.embed_shape[1],))
             elif isinstance(node, (DataD2HSparseOp, PipelineSendOp)) and node.use_indexed_slices:
                 self.indexed_slices_shape[node] = self.indexed_slices_shape[node.inputs[0]]
             elif isinstance(node, AllReduceCommunicateOp) and node.use_indexed_slices:
@@ -1051,6 +1147,14 @@ class SubExecutor(object):
     def memory_plan(self) -> None:
         self.config.memory_pool.memory_plan(
             self.computing_nodes, self.node_to_shape_map, self.node_to_arr_map, self.config, self.eval_node_list, self.indexed_slices_shape)
+        # arrays are re-bound, so the compiled plan is stale
+        self.plan = None
+
+    def memory_report(self) -> Dict[DLContext, Dict[str, float]]:
+        # bytes of the exact and arena planners for the current shapes
+        assert self.node_to_shape_map, 'Memory report needs shapes, please run first.'
+        return self.config.memory_pool.memory_report(
+            self.computing_nodes, self.node_to_shape_map, self.eval_node_list, self.indexed_slices_shape, self.inference)
 
     def get_feed_value(self, arr_map: ARR_MAP, node: Op, value: FEEDINS) -> Tuple[Tuple[int, ...], bool]:
         if node.reshaped:
@@ -1059,13 +1163,18 @@ class SubExecutor(object):
         local_realloc = local_shape != self.node_to_shape_map.get(
             node, None)
         value_dtype = ndarray.convert_dtype(value.dtype)
+        if isinstance(value, np.ndarray) and value_dtype in (np.int64, np.uint64) \
+                and node.dtype not in (np.int64, np.uint64):
+            # numpy integers default to 64 bits; the ops take 32 bits unless
+            # the node is declared with 64 bits
+            value_dtype = np.int32 if value_dtype == np.int64 else np.uint32
         if node.dtype != value_dtype:
             message = 'Node dtype (original {}) will be set by value dtype {}.'.format(
                 node.dtype.__name__.upper(), value_dtype.__name__.upper())
             warnings.warn(message)
             node.dtype = value_dtype
         if node.on_cpu:
-            assert isinstance(value, (np.ndarray, spmatrix, ndarray.NDArray)), \
+            assert isinstance(value, (np.ndarray, ndarray.NDArray)) or ndarray.is_spmatrix(value), \
                 "feed_dict value type not supported"
             if isinstance(value, np.ndarray):
                 if local_realloc:
@@ -1081,7 +1190,8 @@ class SubExecutor(object):
                         value, ctx=node.ctx, dtype=node.dtype)
                 else:
                     arr_map[node][:] = value
-            elif isinstance(value, spmatrix):
+            elif ndarray.is_spmatrix(value):
+                from scipy.sparse import coo_matrix
                 value = coo_matrix(value)
                 value = ndarray.sparse_array(value.data,
                                              (value.row, value.col), shape=local_shape, ctx=node.ctx)
@@ -1188,10 +1298,88 @@ class SubExecutor(object):
 
         return results
 
+    def compile_plan(self) -> Optional[list]:
+        """Flatten computing_nodes into a list of instructions for replay.
+
+        Each instruction binds the compute callable, the input and output
+        arrays, the stream and the events to sync and record, so that a step
+        does no dictionary lookups or type dispatch. Arrays of nodes outside
+        computing_nodes (feeds, dataloaders, parameters) may be replaced
+        between steps, so their slots are refreshed from node_to_arr_map.
+        Returns None if the graph needs the interpreted path.
+        """
+        if self.config.pipeline or any(isinstance(node, (PipelineSendOp, PipelineReceiveOp)) for node in self.computing_nodes):
+            return None
+        arr_map = self.node_to_arr_map
+        # stream on which each computing node records its event
+        node_streams = {}
+        plan = []
+        for node in self.computing_nodes:
+            node_type = type(node)
+            cur_stream = self.node_type_to_stream_map.get(
+                node_type, self.comp_stream)
+            node_val = arr_map[node]
+            zero_fill = node.on_cpu and isinstance(node_val, ndarray.NDArray) and \
+                DNNL_LIB['cpu_ArraySet'] and not isinstance(node, DataD2HOp)
+            # an event recorded on the same stream orders the kernels already,
+            # the host sync is only needed across streams or for cpu consumers
+            syncs = [n.event for n in node.inputs if n.event and not (
+                isinstance(n.event, Event) and not node.on_cpu and cur_stream is not None
+                and node_streams.get(n) is cur_stream)]
+            refresh = [(i, n) for i, n in enumerate(node.inputs)
+                       if n not in node_streams]
+            record = cur_stream if isinstance(node.event, Event) else None
+            plan.append((node, node.compute, [arr_map[n] for n in node.inputs], refresh, node_val,
+                         cur_stream, syncs, record, node_type in (
+                             DropoutOp, Batch_NormalizationOp, MulByConstOp, FusedAttentionOp),
+                         zero_fill, isinstance(node, OptimizerOp)))
+            node_streams[node] = cur_stream
+        return plan
+
+    def replay(self, inference: bool) -> None:
+        arr_map = self.node_to_arr_map
+        foreach_optimizers = {}
+        foreach_inputs = set()
+        for node, compute, input_vals, refresh, node_val, stream, syncs, record, with_inference, zero_fill, is_optimizer in self.plan:
+            if zero_fill:
+                cpu_array_set(node_val, 0.0)
+            for event in syncs:
+                event.sync()
+            for i, n in refresh:
+                input_vals[i] = arr_map[n]
+            if is_optimizer and node.defer(input_vals):
+                foreach_optimizers[node.optimizer] = None
+                foreach_inputs.update(node.inputs)
+                continue
+            if foreach_inputs and not foreach_inputs.isdisjoint(node.inputs):
+                for optimizer in foreach_optimizers:
+                    optimizer.foreach_flush()
+                foreach_optimizers.clear()
+                foreach_inputs.clear()
+            if with_inference:
+                compute(input_vals, node_val, stream, inference=inference)
+            else:
+                compute(input_vals, node_val, stream)
+            if record is not None:
+                node.event.record(record)
+        for optimizer in foreach_optimizers:
+            optimizer.foreach_flush()
+
     def compute(self, computing_nodes: OP_LIST, arr_map: ARR_MAP, inference: Optional[bool] = None) -> None:
+        if inference is None:
+            inference = self.inference
+        if self.config.compile_plan and computing_nodes is self.computing_nodes and arr_map is self.node_to_arr_map:
+            if self.plan is None:
+                self.plan = self.compile_plan() or False
+            if self.plan:
+                self.replay(inference)
+                return
         # computing
         grouping_nodes = []
         cur_ind = -1
+        # optimizers with queued foreach updates, and the nodes these updates write
+        foreach_optimizers = {}
+        foreach_inputs = set()
 
         def make_group() -> None:
             p2p_stream = self.config.p2p_stream
@@ -1203,8 +1391,13 @@ class SubExecutor(object):
             for node in grouping_nodes:
                 node.event.record(p2p_stream)
             grouping_nodes.clear()
-        if inference is None:
-            inference = self.inference
+
+        def flush_foreach() -> None:
+            for optimizer in foreach_optimizers:
+                optimizer.foreach_flush()
+            foreach_optimizers.clear()
+            foreach_inputs.clear()
+
         for node in computing_nodes:
             if node.on_cpu and isinstance(arr_map[node], ndarray.NDArray):
                 if DNNL_LIB['cpu_ArraySet'] and not isinstance(node, DataD2HOp):
@@ -1228,13 +1421,19 @@ class SubExecutor(object):
                     if n.event:
                         n.event.sync()
                 input_vals = [arr_map[n] for n in node.inputs]
+                if isinstance(node, OptimizerOp) and node.defer(input_vals):
+                    foreach_optimizers[node.optimizer] = None
+                    foreach_inputs.update(node.inputs)
+                    continue
+                if foreach_inputs and not foreach_inputs.isdisjoint(node.inputs):
+                    flush_foreach()
                 node_val = arr_map[node]
 
                 node_type = type(node)
                 cur_stream = self.node_type_to_stream_map.get(
                     node_type, self.comp_stream)
 
-                if node_type in (DropoutOp, Batch_NormalizationOp, MulByConstOp):
+                if node_type in (DropoutOp, Batch_NormalizationOp, MulByConstOp, FusedAttentionOp):
                     node.compute(input_vals, node_val, cur_stream,
                                  inference=inference)
                 else:
@@ -1253,6 +1452,7 @@ class SubExecutor(object):
 
         if len(grouping_nodes) > 0:
             make_group()
+        flush_foreach()
 
     def logNodes(self, node_list: OP_LIST, log_path: str) -> None:
         if self.config.rank is not None:
@@ -1420,6 +1620,9 @@ def topo_sort_register_ps(
                 node_type = 2
             node.initializer.init_on_ps(
                 ps_comm, node.id, node_type, seed=seed + node.id, opt=opt)
+            if node.compression is not None:
+                ps_comm.SetCompression(node.id, ctypes.c_int(
+                    PS_COMPRESSION[node.compression]), ctypes.c_bool(node.error_feedback))
         for n in node.inputs:
             _topo_sort_register_ps(n)
 
@@ -0,0 +1,221 @@
+from __future__ import absolute_import, annotations
+import numpy as np
+from .AddConst import AddByConstOp
+from .AddElewise import AddOp
+from .Attention import FusedAttentionOp, FusedAttention_GradientOp, FusedAttention_Gradient_of_InputOp
+from .Broadcast import BroadcastToOp
+from .FusedLinear import FusedLinearOp, ActivationGradientOp
+from .Gelu import GeluOp
+from .Linear import LinearOp
+from .MatrixMult import MatMulOp
+from .MultiplyElewise import MulOp
+from .Opposite import OppositeOp
+from .Relu import ReluOp, ReluGradientOp
+from .Sigmoid import SigmoidOp
+from .Tanh import TanhOp, TanhGradientOp
+from .._base import DNNL_LIB
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .Node import Op
+    from typing import Dict, Iterable, List, Optional, Set, Tuple
+    OP_LIST = List[Op]
+
+ACTIVATIONS = {ReluOp: 'relu', SigmoidOp: 'sigmoid',
+               TanhOp: 'tanh', GeluOp: 'gelu'}
+
+
+class _Graph(object):
+    # the consumers of every node, kept up to date while rewriting
+    def __init__(self, topo_order: OP_LIST) -> None:
+        self.consumers: Dict[Op, OP_LIST] = {node: [] for node in topo_order}
+        for node in topo_order:
+            for n in node.inputs:
+                self.consumers[n].append(node)
+
+    def add(self, node: Op, like: Op) -> Op:
+        # place node as like, the hooks have already run on the graph
+        node.raw_ctx = like.raw_ctx
+        node.ctx = like.ctx
+        node.on_gpu = like.on_gpu
+        node.on_cpu = like.on_cpu
+        self.consumers[node] = []
+        for n in node.inputs:
+            self.consumers[n].append(node)
+        return node
+
+    def replace(self, old: Op, new: Op) -> None:
+        # the consumers of old read new instead, then old is dropped
+        for node in self.consumers[old]:
+            for i, n in enumerate(node.inputs):
+                if n is old:
+                    node.inputs[i] = new
+            self.consumers[new].append(node)
+        self.consumers[old] = []
+        self.remove(old)
+
+    def remove(self, node: Op) -> None:
+        assert self.consumers[node] == []
+        for n in node.inputs:
+            if node in self.consumers[n]:
+                self.consumers[n] = [c for c in self.consumers[n] if c is not node]
+        del self.consumers[node]
+
+    def only_consumer(self, node: Op, keep: Set[Op]) -> Optional[Op]:
+        users = self.consumers.get(node, [])
+        if len(users) == 1 and node not in keep:
+            return users[0]
+        return None
+
+
+def _linear_of(node: Op, graph: _Graph, keep: Set[Op]) -> Optional[Tuple]:
+    # (A, B, bias, trans_A, trans_B, nodes) if node computes op(A) op(B) + bias
+    # with nodes, bias is None for a plain matmul
+    if isinstance(node, LinearOp):
+        return tuple(node.inputs) + (node.matmul_attr_trans_A, node.matmul_attr_trans_B, [node])
+    if isinstance(node, MatMulOp):
+        return tuple(node.inputs) + (None, node.matmul_attr_trans_A, node.matmul_attr_trans_B, [node])
+    if isinstance(node, AddOp):
+        for mm, bc in (node.inputs, node.inputs[::-1]):
+            # the bias is a parameter of shape (n,) or (1, n)
+            bias_shape = getattr(bc.inputs[0], 'shape', None) \
+                if isinstance(bc, BroadcastToOp) else None
+            if bias_shape is None or len(bias_shape) not in (1, 2) or len(bias_shape) == 2 and bias_shape[0] != 1:
+                continue
+            # the broadcast reads the shape of the matmul
+            if isinstance(mm, MatMulOp) and bc.inputs[1] is mm and mm not in keep \
+                    and sorted(graph.consumers[mm], key=id) == sorted([node, bc], key=id) \
+                    and graph.only_consumer(bc, keep) is node:
+                return (mm.inputs[0], mm.inputs[1], bc.inputs[0],
+                        mm.matmul_attr_trans_A, mm.matmul_attr_trans_B, [node, bc, mm])
+    return None
+
+
+def _fuse_sigmoid_gradient(fused: Op, graph: _Graph, keep: Set[Op]) -> None:
+    # SigmoidOp.gradient: y * (1 - y) * grad in four nodes
+    for opp in list(graph.consumers[fused]):
+        if not isinstance(opp, OppositeOp):
+            continue
+        add = graph.only_consumer(opp, keep)
+        if not isinstance(add, AddByConstOp) or add.const_attr != 1:
+            continue
+        mul = graph.only_consumer(add, keep)
+        if not isinstance(mul, MulOp) or fused not in mul.inputs:
+            continue
+        mul_grad = graph.only_consumer(mul, keep)
+        if not isinstance(mul_grad, MulOp) or mul_grad in keep:
+            continue
+        grad = mul_grad.inputs[1] if mul_grad.inputs[0] is mul else mul_grad.inputs[0]
+        new = graph.add(ActivationGradientOp(
+            fused, grad, 'sigmoid'), mul_grad)
+        graph.replace(mul_grad, new)
+        for node in (mul, add, opp):
+            graph.remove(node)
+
+
+def fuse_linear_ops(node_list: OP_LIST, keep: OP_LIST) -> OP_LIST:
+    """Fuse matmul / linear -> (broadcast bias add) -> relu / gelu / sigmoid /
+    tanh chains on CPU into FusedLinearOp nodes.
+
+    The graph is rewritten in place, backward nodes included: the relu, sigmoid
+    and tanh gradients are computed from the fused output by
+    ActivationGradientOp, so the pre-activation needs not be kept. An activation
+    whose gradient reads its input (gelu) stays unfused in training. The nodes
+    in keep are never replaced. Returns the fused nodes.
+    """
+    from .executor import find_topo_sort
+    keep = set(keep)
+    topo_order = find_topo_sort(node_list)
+    graph = _Graph(topo_order)
+    fused_nodes = []
+    for node in topo_order:
+        if node not in graph.consumers or node in keep:
+            continue
+        linear = _linear_of(node, graph, keep)
+        if linear is None:
+            continue
+        node_A, node_B, bias, trans_A, trans_B, nodes = linear
+        if not all(n.on_cpu and n.ctx == node.ctx and n.dtype == np.float32 for n in nodes):
+            continue
+        users = graph.consumers[node]
+        act = [n for n in users if type(n) in ACTIVATIONS]
+        act = act[0] if len(act) == 1 and act[0] not in keep and act[0].on_cpu else None
+        others = [n for n in users if n is not act]
+        relu_grads = [n for n in others if isinstance(n, ReluGradientOp) and n not in keep
+                      and n.inputs[0] is node and n.inputs[1] is not node]
+        if act is not None and len(relu_grads if isinstance(act, ReluOp) else []) != len(others):
+            act = None
+        if act is None and bias is None:
+            continue
+        activation = None if act is None else ACTIVATIONS[type(act)]
+        fused = graph.add(FusedLinearOp(
+            node_A, node_B, bias, trans_A, trans_B, activation), node)
+        if len(nodes) == 3:
+            fused.bias_grad_node = nodes[1].grad_node
+        if act is not None:
+            for grad in relu_grads:
+                new = graph.add(ActivationGradientOp(
+                    fused, grad.inputs[1], 'relu'), grad)
+                graph.replace(grad, new)
+            graph.replace(act, fused)
+        graph.replace(node, fused)
+        for n in nodes[1:]:
+            graph.remove(n)
+        if activation == 'sigmoid':
+            _fuse_sigmoid_gradient(fused, graph, keep)
+        elif activation == 'tanh':
+            for grad in list(graph.consumers[fused]):
+                if isinstance(grad, TanhGradientOp) and grad.inputs[0] is fused \
+                        and grad.inputs[1] is not fused and grad not in keep:
+                    new = graph.add(ActivationGradientOp(
+                        fused, grad.inputs[1], 'tanh'), grad)
+                    graph.replace(grad, new)
+        fused_nodes.append(fused)
+    return fused_nodes
+
+
+def fuse_attention_layers(layers: Iterable, node_list: OP_LIST, keep: OP_LIST) -> OP_LIST:
+    """Replace the inner nodes of MultiHeadAttention layers on CPU, already
+    extended into the graph, by FusedAttentionOp nodes.
+
+    The scores, probabilities and their gradients of the unfused layer are
+    [batch, heads, seq_len, seq_len] each; the fused node works in tiles and
+    keeps the log-sum-exp of every row instead. The gradients of query, key and
+    value are fused with the forward pass; a layer whose gradients are only
+    partly in the graph, or whose query, key and value are not distinct, stays
+    unfused. The nodes in keep are never replaced. Returns the fused nodes.
+    """
+    from ..layers.attention import MultiHeadAttention
+    from .executor import find_topo_sort
+    if not DNNL_LIB['cpu_Attention'] or not DNNL_LIB['cpu_AttentionGradient']:
+        return []
+    keep = set(keep)
+    topo_order = find_topo_sort(node_list)
+    graph = _Graph(topo_order)
+    fused_nodes = []
+    for layer in layers:
+        if not isinstance(layer, MultiHeadAttention) or layer.output not in graph.consumers \
+                or layer.output in keep or not layer.output.on_cpu:
+            continue
+        grad_outputs = [] if layer.grad_outputs is None else [
+            n for n in layer.grad_outputs[:3] if n in graph.consumers]
+        if grad_outputs and (len(grad_outputs) != 3 or keep.intersection(grad_outputs)):
+            continue
+        query, key, value, mask = layer.inputs
+        if len({query, key, value}) != 3:
+            # the layer gives an input passed twice the gradients of both
+            continue
+        fused = graph.add(FusedAttentionOp(
+            query, key, value, mask, layer.num_heads, layer.sequence_length, layer.scale,
+            layer.causal_mask, layer.dropout_rate), layer.output)
+        if grad_outputs:
+            # the gradient reaching the layer, as the extended graph reads it
+            bnode, index = layer.grad_input_outputs[0]
+            attention_grad = graph.add(FusedAttention_GradientOp(
+                bnode.inputs[index], fused), grad_outputs[0])
+            for i, grad in enumerate(grad_outputs):
+                graph.replace(grad, graph.add(FusedAttention_Gradient_of_InputOp(
+                    attention_grad, layer.inputs[i], i), grad))
+        graph.replace(layer.output, fused)
+        fused_nodes.append(fused)
+    return fused_nodes
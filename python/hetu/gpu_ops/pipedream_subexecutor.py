@@ -16,6 +16,7 @@ from ..dataloader import DataloaderOp, GNNDataLoaderOp
 from ..optimizer import OptimizerOp
 from .AllReduceCommunicate import AllReduceCommunicateOp
 from .EmbeddingLookUp import EmbeddingLookUp_Gradient
+from .EmbeddingBag import EmbeddingBag_GradientOp
 from .DataTransfer import DataH2DOp, DataD2HOp, DataD2HSparseOp
 from ..gpu_links import matrix_elementwise_add, matrix_elementwise_multiply_by_const
 from ..preduce import PartialReduce
@@ -120,7 +121,7 @@ class SubExecutor4Pipedream(SubExecutor4Pipe):
                 # add for OptimizerOp and ParameterServerOp
                 if shape is None:
                     mp[node] = None
-                elif isinstance(node, (EmbeddingLookUp_Gradient, DataD2HSparseOp)):
+                elif isinstance(node, (EmbeddingLookUp_Gradient, EmbeddingBag_GradientOp, DataD2HSparseOp)):
                     mp[node] = ndarray.IndexedSlices(dense_shape=shape)
                 elif self.inference and isinstance(node, DropoutOp):
                     mp[node] = mp[node.inputs[0]]
@@ -1,8 +1,11 @@
 from .gpu_ops.AllReduceCommunicate import AllReduceCommunicateOp
+from .gpu_ops.ParameterServerCommunicate import ParameterServerCommunicateOp
 from .gpu_ops.EmbeddingLookUp import EmbeddingLookUp, EmbeddingLookUp_Gradient
+from .gpu_ops.EmbeddingBag import EmbeddingBag_GradientOp
 from .gpu_ops.DataTransfer import DataD2HSparseOp, DataH2DSparseOp, DataH2DOp
 from .gpu_ops.LayerNorm import Layer_Normalization_Gradient_of_DataOp, Layer_Normalization_Gradient_of_ScaleOp, Layer_Normalization_Gradient_of_BiasOp
 from .gpu_ops.BatchNorm import Batch_Normalization_Gradient_of_DataOp, Batch_Normalization_Gradient_of_ScaleOp, Batch_Normalization_Gradient_of_BiasOp
+from .gpu_ops.Attention import FusedAttention_Gradient_of_InputOp
 from .gpu_ops.Variable import PlaceholderOp
 from .gpu_ops.EmbeddingLookUp import EmbeddingLookUp
 from .gpu_ops.Dropout import DropoutOp
@@ -21,13 +24,23 @@ import numpy as np
 
 
 class HetuMemoryPool(object):
-    def __init__(self):
+    # byte alignment of tensors in an arena
+    arena_alignment = 256
+
+    def __init__(self, planner='exact'):
+        # exact: reuse a freed gpu buffer only for the same (shape, ctx, dtype)
+        # arena: pack the tensors of each context into one buffer by lifetime
+        assert planner in ('exact', 'arena'), 'Memory planner %s not supported.' % planner
+        self.planner = planner
         # here the indexed_nodes only used for flexflow
-        self.indexed_nodes = (EmbeddingLookUp_Gradient, DataD2HSparseOp, DataH2DSparseOp, SparseSumOp)
+        self.indexed_nodes = (EmbeddingLookUp_Gradient, EmbeddingBag_GradientOp,
+                              DataD2HSparseOp, DataH2DSparseOp, SparseSumOp)
         self.ln_bn_grad_nodes = (Batch_Normalization_Gradient_of_DataOp, Batch_Normalization_Gradient_of_ScaleOp, Batch_Normalization_Gradient_of_BiasOp,
                                  Layer_Normalization_Gradient_of_DataOp, Layer_Normalization_Gradient_of_ScaleOp, Layer_Normalization_Gradient_of_BiasOp,
-                                 UniqueIndicesOffsetsOp)
+                                 FusedAttention_Gradient_of_InputOp, UniqueIndicesOffsetsOp)
         self.no_compute_nodes = (StopGradientOp, DataloaderOp, GNNDataLoaderOp)
+        # free memory of a device in simulation, in number of floats
+        self.free_memory = None
 
     def compute_memory_reuse_plan(self, computing_nodes, node_to_shape, eval_node_list):
         persistent_nodes = self.form_persistent_nodes(
@@ -70,6 +83,118 @@ class HetuMemoryPool(object):
                 release_node(n)
         return reuse_map
 
+    def tensor_nbytes(self, node, shape):
+        nbytes = int(np.prod(shape, dtype=np.int64)) * \
+            np.dtype(ndarray.convert_dtype(node.dtype)).itemsize
+        align = self.arena_alignment
+        return (nbytes + align - 1) // align * align
+
+    def compute_lifetimes(self, computing_nodes, node_to_shape, eval_node_list, indexed_slices_shape, inference):
+        """Return {node: (first, last)} for the outputs that can share memory.
+
+        Indices are positions in computing_nodes. Arrays aliasing another
+        node (inplace gpu ops, stop gradient, dropout in inference) extend
+        the lifetime of the node owning the memory; inputs of optimizers stay
+        alive to the end since their updates may be deferred (foreach). Inputs
+        of parameter server pushes are persistent (see form_persistent_nodes).
+        """
+        persistent_nodes = self.form_persistent_nodes(
+            eval_node_list, node_to_shape)
+        end = len(computing_nodes)
+
+        def owner(node):
+            while isinstance(node, StopGradientOp) or (node.on_gpu and (node.inplace or (inference and isinstance(node, DropoutOp)))):
+                node = node.inputs[0]
+            return node
+
+        lifetimes = {}
+        for i, node in enumerate(computing_nodes):
+            shape = node_to_shape.get(node, None)
+            if shape is None or node.inplace and node.on_gpu or isinstance(node, self.indexed_nodes) \
+                    or node in indexed_slices_shape or node.use_indexed_slices \
+                    or (inference and node.on_gpu and isinstance(node, DropoutOp)):
+                continue
+            lifetimes[node] = (i, i)
+        for i, node in enumerate(computing_nodes):
+            last = end if isinstance(node, OptimizerOp) else i
+            for n in node.inputs:
+                n = owner(n)
+                if n in lifetimes:
+                    lifetimes[n] = (lifetimes[n][0], max(lifetimes[n][1], last))
+        for node in persistent_nodes:
+            node = owner(node)
+            if node in lifetimes:
+                lifetimes.pop(node)
+        return lifetimes
+
+    def compute_arena_plan(self, computing_nodes, node_to_shape, eval_node_list, indexed_slices_shape, inference):
+        """Pack tensor lifetimes into one arena per context.
+
+        Greedy by size: the largest tensors are placed first, each at the
+        best fitting gap among the placed tensors alive at the same time.
+        Returns the offsets {node: offset} and the arena sizes {ctx: bytes}.
+        """
+        lifetimes = self.compute_lifetimes(
+            computing_nodes, node_to_shape, eval_node_list, indexed_slices_shape, inference)
+        sizes = {node: self.tensor_nbytes(node, node_to_shape[node])
+                 for node in lifetimes}
+        order = sorted(lifetimes, key=lambda node: -sizes[node])
+        placed = defaultdict(list)
+        offsets = {}
+        arena_sizes = defaultdict(int)
+        for node in order:
+            size = sizes[node]
+            first, last = lifetimes[node]
+            conflicts = sorted((offsets[n], offsets[n] + sizes[n])
+                               for n in placed[node.ctx] if lifetimes[n][0] <= last and first <= lifetimes[n][1])
+            best, best_gap, prev_end = None, None, 0
+            for begin, stop in conflicts:
+                gap = begin - prev_end
+                if gap >= size and (best_gap is None or gap < best_gap):
+                    best, best_gap = prev_end, gap
+                prev_end = max(prev_end, stop)
+            offsets[node] = prev_end if best is None else best
+            placed[node.ctx].append(node)
+            arena_sizes[node.ctx] = max(
+                arena_sizes[node.ctx], offsets[node] + size)
+        return offsets, dict(arena_sizes)
+
+    def memory_report(self, computing_nodes, node_to_shape, eval_node_list, indexed_slices_shape, inference):
+        """Compare the planners on the tensors that can share memory.
+
+        Returns {ctx: stats} with the bytes the exact planner allocates
+        ('exact'), the arena size ('arena'), the peak of live bytes over
+        the steps ('lower_bound') and the arena fragmentation
+        (1 - lower_bound / arena).
+        """
+        lifetimes = self.compute_lifetimes(
+            computing_nodes, node_to_shape, eval_node_list, indexed_slices_shape, inference)
+        _, arena_sizes = self.compute_arena_plan(
+            computing_nodes, node_to_shape, eval_node_list, indexed_slices_shape, inference)
+        reuse_map = self.compute_memory_reuse_plan(
+            computing_nodes, node_to_shape, eval_node_list)
+        report = {}
+        for ctx, arena in arena_sizes.items():
+            nodes = [node for node in lifetimes if node.ctx == ctx]
+            live = np.zeros(len(computing_nodes) + 2, dtype=np.int64)
+            exact = 0
+            for node in nodes:
+                size = self.tensor_nbytes(node, node_to_shape[node])
+                first, last = lifetimes[node]
+                live[first] += size
+                live[last + 1] -= size
+                # the exact planner only reuses buffers on gpu
+                if not node.on_gpu or node not in reuse_map:
+                    exact += size
+            lower_bound = int(np.cumsum(live).max())
+            report[ctx] = {
+                'exact': exact,
+                'arena': arena,
+                'lower_bound': lower_bound,
+                'fragmentation': 1 - lower_bound / arena if arena else 0.,
+            }
+        return report
+
     def form_persistent_nodes(self, eval_node_list, _node_to_shape):
         persistent_nodes = set(eval_node_list)
         for node in _node_to_shape:
@@ -78,6 +203,10 @@ class HetuMemoryPool(object):
             elif isinstance(node, AllReduceCommunicateOp):
                 persistent_nodes.add(node.inputs[0])
                 persistent_nodes.add(node)
+            elif isinstance(node, ParameterServerCommunicateOp) and node.inputs[0].on_cpu:
+                # ps-lite reads cpu gradients in the background, possibly
+                # after the end of the step
+                persistent_nodes.add(node.inputs[0])
             elif isinstance(node, PipelineReceiveOp):
                 persistent_nodes.add(node)
             elif isinstance(node, PipelineSendOp):
@@ -91,6 +220,15 @@ class HetuMemoryPool(object):
         param_psval_map = config.infer_ps_map if inference else config.ps_map
         reuse_map = self.compute_memory_reuse_plan(
             computing_nodes, node_to_shape_map, eval_node_list)
+        arena_views = {}
+        if self.planner == 'arena':
+            offsets, arena_sizes = self.compute_arena_plan(
+                computing_nodes, node_to_shape_map, eval_node_list, indexed_slices_shape, inference)
+            arenas = {ctx: ndarray.empty((size // 4,), ctx=ctx)
+                      for ctx, size in arena_sizes.items()}
+            for node, offset in offsets.items():
+                arena_views[node] = ndarray.view(
+                    arenas[node.ctx], node_to_shape_map[node], offset, node.dtype)
         for node, shape in node_to_shape_map.items():
             if isinstance(node, PlaceholderOp):
                 if placeholder_to_arr_map[node] is not None:
@@ -110,6 +248,8 @@ class HetuMemoryPool(object):
                         indices=indices, values=values, dense_shape=shape)
                 elif isinstance(node, EmbeddingLookUp) and (config.use_sparse_pull or config.cstable_policy) and config.prefetch:
                     node_to_arr_map[node] = param_psval_map[node.inputs[0]]
+                elif node in arena_views:
+                    node_to_arr_map[node] = arena_views[node]
                 else:
                     if node.on_gpu:
                         if node.inplace or isinstance(node, self.indexed_nodes):
@@ -135,67 +275,88 @@ class HetuMemoryPool(object):
     def start_simulate(self, devices):
         # we simply assume the environment is homogeneous
         # TODO: support heterogeneous environment
-        pynvml.nvmlInit()
-        handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-        meminfo = pynvml.nvmlDeviceGetMemoryInfo(handle)
-        # since there're memory fragments, we assume only use 90%
-        # TODO: need a more accurate fragments prediction
-        free_memory = int(meminfo.free * 0.9 / 4)
-        memory_free = {dev: free_memory for dev in devices}
+        if self.free_memory is None:
+            # queried once, the searching runs many tests
+            pynvml.nvmlInit()
+            handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+            meminfo = pynvml.nvmlDeviceGetMemoryInfo(handle)
+            # since there're memory fragments, we assume only use 90%
+            # TODO: need a more accurate fragments prediction
+            self.free_memory = int(meminfo.free * 0.9 / 4)
+        memory_free = {dev: self.free_memory for dev in devices}
         return memory_free
 
-    def test_memory(self, devices, task_graph):
-        # this function is only for flexflow now
-        # here we don't consider eval nodes as persistent nodes, since they occupy little memory
-        # TODO: re-design to support other strategies
+    def start_memory_test(self, devices):
+        # the state of test_memory: free memory, remaining uses of the
+        # buffers in use and number of released buffers of each shape
+        memory_free = self.start_simulate(devices)
+        dev_outdeg = {dev: {} for dev in devices}
+        memory_pool = {dev: defaultdict(int) for dev in devices}
+        return memory_free, dev_outdeg, memory_pool
+
+    def copy_memory_test(self, state):
+        memory_free, dev_outdeg, memory_pool = state
+        return dict(memory_free), \
+            {dev: dict(outdeg) for dev, outdeg in dev_outdeg.items()}, \
+            {dev: defaultdict(int, pool) for dev, pool in memory_pool.items()}
+
+    def step_memory_test(self, state, task):
         def add_usage(device, size):
             if isinstance(size, tuple):
                 size = int(np.prod(size, dtype=int))
             memory_free[device] -= size
 
-        # compute output deg
-        memory_free = self.start_simulate(devices)
-        dev_outdeg = {dev: {} for dev in devices}
-        memory_pool = {dev: defaultdict(list) for dev in devices}
-        for task in task_graph:
-            if task.name.startswith('update'):
-                continue
-            dev = task.device
-            if isinstance(dev, tuple):
-                is_group = (task.name == 'group_comm')
-                is_allreduce = (task.name == 'allreduce')
-                if is_group:
-                    for t in task.contents:
-                        # communication in another stream, not reuse
-                        add_usage(t.device[1], t.shape)
-                elif is_allreduce:
-                    for d in dev:
-                        # allreduce in another stream, not reuse
-                        add_usage(d, task.shape)
-                else:
+        memory_free, dev_outdeg, memory_pool = state
+        if task.name.startswith('update'):
+            return
+        dev = task.device
+        if isinstance(dev, tuple):
+            is_group = (task.name == 'group_comm')
+            is_allreduce = (task.name == 'allreduce')
+            if is_group:
+                for t in task.contents:
                     # communication in another stream, not reuse
-                    add_usage(dev[1], task.shape)
+                    add_usage(t.device[1], t.shape)
+            elif is_allreduce:
+                for d in dev:
+                    # allreduce in another stream, not reuse
+                    add_usage(d, task.shape)
             else:
-                shape = task.shape
-                if shape is not None and not isinstance(task.original_node, self.indexed_nodes):
-                    if task.memory_persistent:
-                        # variables need the memory
-                        add_usage(dev, shape)
-                    else:
+                # communication in another stream, not reuse
+                add_usage(dev[1], task.shape)
+        else:
+            shape = task.shape
+            if shape is not None and not isinstance(task.original_node, self.indexed_nodes):
+                if task.memory_persistent:
+                    # variables need the memory
+                    add_usage(dev, shape)
+                else:
+                    if len(task.outputs) > 0:
                         dev_outdeg[dev][task] = len(task.outputs)
-                        if len(memory_pool[dev][shape]) > 0:
-                            memory_pool[dev][shape].pop()
-                        else:
-                            add_usage(dev, task.shape)
-                for t in task.inputs:
-                    if t.shape is not None and t.device == dev and not t.memory_persistent and not isinstance(t.original_node, self.indexed_nodes):
-                        dev_outdeg[dev][t] -= 1
-                        if dev_outdeg[dev][t] == 0:
-                            memory_pool[dev][t.shape].append(t)
-
-        # get result
+                    if memory_pool[dev][shape] > 0:
+                        memory_pool[dev][shape] -= 1
+                    else:
+                        add_usage(dev, task.shape)
+            for t in task.inputs:
+                if t.shape is not None and t.device == dev and not t.memory_persistent and not isinstance(t.original_node, self.indexed_nodes) \
+                        and t in dev_outdeg[dev]:
+                    dev_outdeg[dev][t] -= 1
+                    if dev_outdeg[dev][t] == 0:
+                        del dev_outdeg[dev][t]
+                        memory_pool[dev][t.shape] += 1
+
+    def memory_excess(self, state):
         result = 0
-        for value in memory_free.values():
+        for value in state[0].values():
             if value < 0:
                 result -= value
         return result
+
+    def test_memory(self, devices, task_graph):
+        # this function is only for flexflow now
+        # here we don't consider eval nodes as persistent nodes, since they occupy little memory
+        # TODO: re-design to support other strategies
+        state = self.start_memory_test(devices)
+        for task in task_graph:
+            self.step_memory_test(state, task)
+        return self.memory_excess(state)
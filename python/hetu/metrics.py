@@ -38,41 +38,41 @@ def confusion_matrix_at_thresholds(labels, predictions, thresholds, includes=Non
     # Reshape predictions and labels.
     # This function is often used in dichotomies.
     # In multi-classification problems, we often stretch the dimensions directly into dichotomies.
-    predictions_2d = np.reshape(predictions, [-1, 1])
-    labels_2d = np.reshape(labels.astype(dtype=np.bool), [1, -1])
-    num_predictions = predictions_2d.shape[0]
+    predictions = np.reshape(predictions, [-1])
+    labels = np.reshape(labels, [-1]).astype(dtype=np.bool_)
+    thresholds = np.array(thresholds, dtype=np.float64)
     num_thresholds = len(thresholds)
-    # thresh_tiled's shape:[num_thresholds,num_predictions]
-    thresh_tiled = np.tile(
-        np.expand_dims(np.array(thresholds), axis=1), [1, num_predictions])
-    pred_is_pos = np.greater(
-        np.tile(np.transpose(predictions_2d), [num_thresholds, 1]),
-        thresh_tiled)
-    if ('fn' in includes) or ('tn' in includes):
-        pred_is_neg = np.logical_not(pred_is_pos)
-    # Tile labels by number of thresholds
-    # label_is_pos's shape:[num_thresholds,num_predictions]
-    label_is_pos = np.tile(labels_2d, [num_thresholds, 1])
-    if ('fp' in includes) or ('tn' in includes):
-        label_is_neg = np.logical_not(label_is_pos)
+    # Instead of comparing every prediction with every threshold, count the
+    # thresholds below each prediction: a prediction is positive at exactly
+    # the first pred_rank[i] sorted thresholds.
+    order = np.argsort(thresholds, kind='stable')
+    pred_rank = np.searchsorted(
+        thresholds[order], predictions.astype(np.float64), side='left')
+    pred_rank[np.isnan(predictions)] = 0
+
+    def count_positive(mask):
+        # number of masked predictions above each threshold
+        hist = np.bincount(pred_rank[mask], minlength=num_thresholds + 1)
+        above = np.cumsum(hist[::-1])[::-1][1:]
+        result = np.empty(num_thresholds, dtype=np.float32)
+        result[order] = above
+        return result
 
     values = {}
+    num_pos = np.sum(labels, dtype=np.float32)
+    num_neg = np.float32(len(labels)) - num_pos
+    if ('tp' in includes) or ('fn' in includes):
+        tp = count_positive(labels)
+    if ('fp' in includes) or ('tn' in includes):
+        fp = count_positive(np.logical_not(labels))
     if 'tp' in includes:
-        is_true_positive = np.logical_and(
-            label_is_pos, pred_is_pos).astype(np.float32)
-        values['tp'] = np.sum(is_true_positive, axis=1)
+        values['tp'] = tp
     if 'fn' in includes:
-        is_false_negative = np.logical_and(
-            label_is_pos, pred_is_neg).astype(np.float32)
-        values['fn'] = np.sum(is_false_negative, axis=1)
+        values['fn'] = num_pos - tp
     if 'tn' in includes:
-        is_true_negative = np.logical_and(
-            label_is_neg, pred_is_neg).astype(np.float32)
-        values['tn'] = np.sum(is_true_negative, axis=1)
+        values['tn'] = num_neg - fp
     if 'fp' in includes:
-        is_false_positive = np.logical_and(
-            label_is_neg, pred_is_pos).astype(np.float32)
-        values['fp'] = np.sum(is_false_positive, axis=1)
+        values['fp'] = fp
     return values
 
 
@@ -151,6 +151,152 @@ def auc(labels, predictions, num_thresholds=200,
     return auc_value
 
 
+
+def _gather_float64(executor, values):
+    # gathers a float64 row of every worker through the float32 gather, which
+    # only copies, as pairs of float32 words holding the float64 bits
+    local = np.array(values, dtype=np.float64).reshape(1, -1)
+    gathered = executor.gatherPredict(local.view(np.float32))
+    return np.ascontiguousarray(gathered, dtype=np.float32).view(np.float64)
+
+
+class StreamingAUC(object):
+    """Streaming AUC, PR-AUC, log loss and accuracy of binary predictions.
+      Each update() only adds a batch into counts of positive and negative
+      labels per score, so evaluating any number of predictions takes
+      O(num_bins) memory, unlike auc() which sees all predictions at once.
+      Predictions in `[0, 1]` are quantized into `num_bins` equal-width bins;
+      with `exact=True` the distinct scores themselves are kept, which gives
+      the exact AUC (ties counted as half) at O(distinct scores) memory.
+      Accumulators of several workers are combined with merge(), or with
+      all_reduce() through the executor's communicator.
+      Args:
+        num_bins: Number of score bins, if not exact.
+        exact: Whether to keep the distinct scores instead of bins.
+        threshold: Predictions above it are positive for the accuracy.
+      """
+
+    def __init__(self, num_bins=10000, exact=False, threshold=0.5):
+        assert num_bins > 0, 'num_bins should be positive.'
+        self.num_bins = num_bins
+        self.exact = exact
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        size = 0 if self.exact else self.num_bins
+        # scores of the counts, in ascending order; bin indices if not exact
+        self.scores = np.arange(size, dtype=np.float64)
+        self.pos = np.zeros(size, dtype=np.float64)
+        self.neg = np.zeros(size, dtype=np.float64)
+        self.loss_sum = 0.
+        self.correct = 0
+        self.count = 0
+
+    def update(self, labels, predictions):
+        """Adds a batch of labels and predictions of the same size."""
+        predictions = np.reshape(predictions, [-1]).astype(np.float64)
+        labels = np.reshape(labels, [-1]).astype(np.bool_)
+        assert labels.shape == predictions.shape, \
+            'labels and predictions should have the same size.'
+        if self.exact:
+            scores, inverse = np.unique(predictions, return_inverse=True)
+            self._add_counts(scores,
+                             np.bincount(inverse, weights=labels,
+                                         minlength=len(scores)),
+                             np.bincount(inverse, weights=~labels,
+                                         minlength=len(scores)))
+        else:
+            bins = np.clip((predictions * self.num_bins).astype(np.int64),
+                           0, self.num_bins - 1)
+            self.pos += np.bincount(bins[labels], minlength=self.num_bins)
+            self.neg += np.bincount(bins[~labels], minlength=self.num_bins)
+        epsilon = 1e-7
+        clipped = np.clip(predictions, epsilon, 1 - epsilon)
+        self.loss_sum -= np.sum(np.where(labels, np.log(clipped),
+                                         np.log(1 - clipped)))
+        self.correct += int(np.sum((predictions > self.threshold) == labels))
+        self.count += len(labels)
+
+    def _add_counts(self, scores, pos, neg):
+        scores = np.concatenate([self.scores, scores])
+        self.scores, inverse = np.unique(scores, return_inverse=True)
+        size = len(self.scores)
+        self.pos = np.bincount(inverse, weights=np.concatenate(
+            [self.pos, pos]), minlength=size)
+        self.neg = np.bincount(inverse, weights=np.concatenate(
+            [self.neg, neg]), minlength=size)
+
+    def merge(self, other):
+        """Adds the counts of another accumulator with the same settings."""
+        assert self.exact == other.exact and self.num_bins == other.num_bins
+        if self.exact:
+            self._add_counts(other.scores, other.pos, other.neg)
+        else:
+            self.pos += other.pos
+            self.neg += other.neg
+        self.loss_sum += other.loss_sum
+        self.correct += other.correct
+        self.count += other.count
+
+    def all_reduce(self, executor):
+        """Merges the accumulators of all workers, through executor.gatherPredict.
+          Each float64 is sent as its two 32-bit words, so the merged counts
+          and scores are exactly those of a single process.
+        """
+        size = len(self.pos)
+        fields = (self.scores, self.pos, self.neg) if self.exact else \
+            (self.pos, self.neg)
+        if self.exact:
+            # pad to the longest score list
+            sizes = _gather_float64(executor, [size])[:, 0].astype(np.int64)
+            size = int(np.max(sizes))
+        local = np.zeros(len(fields) * size + 3, dtype=np.float64)
+        for i, arr in enumerate(fields):
+            local[i * size: i * size + len(arr)] = arr
+        local[-3:] = (self.loss_sum, self.correct, self.count)
+        gathered = _gather_float64(executor, local)
+        self.reset()
+        for rank, row in enumerate(gathered):
+            if self.exact:
+                scores, pos, neg = row[:-3].reshape(3, size)[:, :sizes[rank]]
+                self._add_counts(scores, pos, neg)
+            else:
+                pos, neg = row[:-3].reshape(2, size)
+                self.pos += pos
+                self.neg += neg
+            self.loss_sum += row[-3]
+            self.correct += int(row[-2])
+            self.count += int(row[-1])
+
+    def auc(self, curve='ROC'):
+        """Computes the roc-auc, or for 'PR' the average precision; nan if
+          there are no positive or no negative labels.
+        """
+        total_pos, total_neg = np.sum(self.pos), np.sum(self.neg)
+        if total_pos == 0 or total_neg == 0:
+            return np.nan
+        if curve == 'ROC':
+            neg_below = np.cumsum(self.neg) - self.neg
+            return np.sum(self.pos * (neg_below + 0.5 * self.neg)) / \
+                (total_pos * total_neg)
+        # thresholds from the highest score down
+        tp = np.cumsum(self.pos[::-1])
+        fp = np.cumsum(self.neg[::-1])
+        precision = np.divide(tp, tp + fp, out=np.zeros_like(tp),
+                              where=(tp + fp) > 0)
+        return np.sum(self.pos[::-1] * precision) / total_pos
+
+    def logloss(self):
+        return self.loss_sum / self.count if self.count else np.nan
+
+    def accuracy(self):
+        return self.correct / self.count if self.count else np.nan
+
+    def result(self):
+        return {'auc': self.auc(), 'pr_auc': self.auc(curve='PR'),
+                'logloss': self.logloss(), 'accuracy': self.accuracy()}
+
 def accuracy(labels, predictions):
     """Calculates the degree of `predictions` matches `labels`.
     Args:
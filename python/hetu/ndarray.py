@@ -3,8 +3,8 @@ from __future__ import absolute_import
 from ._base import _LIB, check_call, c_array
 import ctypes
 import numpy as np
-import scipy.sparse
 import socket
+import sys
 
 
 class DLContext(ctypes.Structure):
@@ -65,6 +65,8 @@ DataType = {
     np.uint8: 4,
     np.int16: 5,
     np.uint16: 6,
+    np.int64: 7,
+    np.uint64: 8,
 }
 
 
@@ -134,6 +136,13 @@ def rgpu(hostname, dev_id=0):
     return DLContext(dev_id, 2, hostname=hostname)
 
 
+def is_spmatrix(value):
+    # scipy.sparse is slow to import and only imported when needed; a scipy
+    # matrix cannot exist before it is imported
+    sparse = sys.modules.get('scipy.sparse')
+    return sparse is not None and isinstance(value, sparse.spmatrix)
+
+
 def is_gpu_ctx(ctx):
     """Return if context is GPU context.
     Parameters
@@ -159,9 +168,11 @@ def shape_to_stride(shape):
 
 
 def convert_dtype(dtype):
-    # now only support 4 bytes int and float
+    # now only support 4 bytes int and float, and 8 bytes int for keys
     if isinstance(dtype, np.dtype):
         dtype = dtype.type
+    if dtype in (np.int64, np.uint64):
+        return dtype
     if dtype is int or issubclass(dtype, np.signedinteger):
         dtype = np.int32
     if dtype is float or issubclass(dtype, np.floating):
@@ -350,6 +361,19 @@ class NDArray(object):
         _ = stride
         return np_arr
 
+    def numpy_view(self):
+        """Return a writable numpy array sharing memory with this CPU array.
+        Unlike asnumpy, no data is copied; writes into the returned array
+        are visible in this NDArray and vice versa.
+        Returns
+        -------
+        np_arr : numpy.ndarray
+            The numpy array viewing the underlying DLArray buffer.
+        """
+        assert self.handle.contents.ctx.device_type == 1, \
+            'Only CPU arrays can be viewed as numpy arrays.'
+        return np.asarray(_NDArrayView(self))
+
     def copyto(self, target):
         """Copy array to target
         Parameters
@@ -482,6 +506,26 @@ class NDArray(object):
             self.lazy_callback(stream)
 
 
+class _NDArrayView(object):
+    """Expose a CPU NDArray through the numpy array interface.
+    The resulting numpy array keeps this object (and thus the NDArray) alive.
+    """
+    __slots__ = ["__array_interface__", "base"]
+
+    def __init__(self, base):
+        contents = base.handle.contents
+        itemsize = np.dtype(base.dtype).itemsize
+        shape = base.shape
+        self.base = base
+        self.__array_interface__ = {
+            'shape': shape,
+            'typestr': np.dtype(base.dtype).str,
+            'data': (contents.data or 0, False),
+            'strides': tuple(s * itemsize for s in base.stride),
+            'version': 3,
+        }
+
+
 def array(arr, ctx, dtype=np.float32, force32=True):
     """Create an array from source arr.
     Parameters
@@ -498,7 +542,8 @@ def array(arr, ctx, dtype=np.float32, force32=True):
     if not isinstance(arr, np.ndarray):
         arr = np.array(arr, dtype=dtype)
     ret = empty(arr.shape, ctx, dtype=dtype, force32=force32)
-    ret._sync_copyfrom(arr, dtype=dtype)
+    # copied in the dtype allocated, which force32 may narrow
+    ret._sync_copyfrom(arr, dtype=ret.dtype)
     return ret
 
 
@@ -531,6 +576,45 @@ def empty_like(arr):
     return empty(arr.shape, arr.ctx, arr.dtype)
 
 
+class NDArrayView(NDArray):
+    """NDArray over a byte range of a base NDArray, which it keeps alive."""
+    __slots__ = ["base"]
+
+
+def view(base, shape, offset=0, dtype=np.float32):
+    """Create an array on the memory of base, starting at a byte offset.
+    Parameters
+    ----------
+    base : NDArray
+        The array owning the memory
+    shape : tuple of int
+        The shape of the view
+    offset : int
+        The offset in bytes from the start of base
+    Returns
+    -------
+    arr : NDArrayView
+        The view, never freeing the memory itself.
+    """
+    dtype = convert_dtype(dtype)
+    nbytes = int(np.prod(shape, dtype=np.int64)) * get_nbits(dtype) // 8
+    base_nbytes = int(np.prod(base.shape, dtype=np.int64)) * \
+        base.handle.contents.nbits // 8
+    assert offset + nbytes <= base_nbytes, 'View out of range.'
+    arr = DLArray()
+    arr.data = base.handle.contents.data + offset
+    arr.ctx = base.handle.contents.ctx
+    arr.ndim = len(shape)
+    arr.nbits = get_nbits(dtype)
+    arr.dtype = get_dtype(dtype)
+    arr.shape = c_array(ctypes.c_int64, shape)
+    arr.stride = c_array(ctypes.c_int64, shape_to_stride(shape))
+    ret = NDArrayView(ctypes.pointer(arr), dtype=dtype)
+    ret.no_free = True
+    ret.base = base
+    return ret
+
+
 def numpyasdlarrayhandle(data):
     if not data.flags['C_CONTIGUOUS']:
         data = np.ascontiguousarray(data)
@@ -580,6 +664,7 @@ class ND_Sparse_Array(object):
 
     def __setitem__(self, in_slice, value):
         """Set ndarray value"""
+        import scipy.sparse
         if (not isinstance(in_slice, slice) or
                 in_slice.start is not None
                 or in_slice.stop is not None):
@@ -613,6 +698,7 @@ class ND_Sparse_Array(object):
             raise TypeError('type %s not supported' % str(type(value)))
 
     def asnumpy(self):
+        import scipy.sparse
         if self.form == 'csr':
             result = scipy.sparse.csr_matrix(
                 (self.data.asnumpy(), self.col.asnumpy(), self.row.asnumpy()),
@@ -625,6 +711,7 @@ class ND_Sparse_Array(object):
 
 
 def csr_sparse_array(mat, shape, ctx=cpu(0)):
+    import scipy.sparse
     assert isinstance(mat, scipy.sparse.csr.csr_matrix) and len(shape) == 2
     new_array = ND_Sparse_Array(shape[0], shape[1], ctx=ctx)
     new_array[:] = mat
@@ -632,6 +719,7 @@ def csr_sparse_array(mat, shape, ctx=cpu(0)):
 
 
 def coo_sparse_array(mat, shape, ctx=cpu(0)):
+    import scipy.sparse
     assert isinstance(mat, scipy.sparse.coo.coo_matrix) and len(shape) == 2
     new_array = ND_Sparse_Array(shape[0], shape[1], ctx=ctx)
     new_array[:] = mat
@@ -655,6 +743,7 @@ def sparse_array(values, indices, shape, form='csr', ctx=cpu(0)):
     assert len(shape) == len(indices) == 2
     assert len(values) == len(indices[0]) == len(indices[1])
     assert isinstance(indices, tuple)
+    import scipy.sparse
     if form == 'csr':
         mat = scipy.sparse.csr_matrix((values, indices), shape)
         result = csr_sparse_array(mat, shape, ctx)
@@ -668,6 +757,7 @@ def dense_to_sparse(arr, form='csr'):
     ctx = arr.ctx
     arr = arr.asnumpy()
     shape = arr.shape
+    import scipy.sparse
     if form == 'csr':
         mat = scipy.sparse.csr_matrix(arr, shape)
         result = csr_sparse_array(mat, shape, ctx)
@@ -18,14 +18,28 @@ from .cpu_links.dnnl_op import sgd_update as cpu_sgd_update, \
     adagrad_update_indexedslices as cpu_adagrad_update_indexedslices,\
     adam_update as cpu_adam_update, \
     adam_update_indexedslices as cpu_adam_update_indexedslices, \
-    betats_update as cpu_betats_update
+    betats_update as cpu_betats_update, \
+    sgd_foreach_update as cpu_sgd_foreach_update, \
+    momentum_foreach_update as cpu_momentum_foreach_update, \
+    adagrad_foreach_update as cpu_adagrad_foreach_update, \
+    adam_foreach_update as cpu_adam_foreach_update, \
+    adamw_foreach_update as cpu_adamw_foreach_update, \
+    lamb_foreach_update as cpu_lamb_foreach_update, \
+    handle_array as cpu_handle_array
 from ._base import DNNL_LIB
 
 
 class Optimizer(object):
-    """Optimizers."""
+    """Optimizers.
 
-    def __init__(self, learning_rate, l2reg=0):
+    With foreach=True, dense updates of CPU parameters are not applied one
+    parameter at a time: the executor queues them and applies each batch with
+    a single multi-tensor kernel call (see foreach_flush). It is off by
+    default: it pays off for many small parameters, while the updates of a
+    few large ones are bound by memory traffic either way.
+    """
+
+    def __init__(self, learning_rate, l2reg=0, foreach=False):
         if isinstance(learning_rate, FixedScheduler):
             self.lr_sched = learning_rate
         else:
@@ -38,11 +52,38 @@ class Optimizer(object):
         self.l2reg = l2reg
         self.opt_op_type = None
         self.sparse_opt_op_type = None
+        self.foreach = foreach
+        self.foreach_pending = []
+        # handle arrays of the queued tensors (see foreach_handles)
+        self.foreach_handle_cache = {}
 
     @property
     def learning_rate(self):
         return self.lr_sched.get()
 
+    def foreach_flush(self):
+        """Apply the queued dense CPU updates with one kernel call."""
+        if self.foreach_pending:
+            pending, self.foreach_pending = self.foreach_pending, []
+            self.opt_op_type.foreach_compute(pending)
+
+    def foreach_handles(self, *lists):
+        """The handle arrays of tuples of NDArrays for the foreach kernels.
+
+        The executor queues the same arrays every step; building the ctypes
+        arrays costs more than the per-parameter calls saved, so they are
+        built once and reused.
+        """
+        handles = self.foreach_handle_cache.get(lists)
+        if handles is None:
+            # the cache holds its arrays, drop it when they keep changing
+            if len(self.foreach_handle_cache) >= 8:
+                self.foreach_handle_cache.clear()
+            handles = [None if arrs is None else cpu_handle_array(arrs)
+                       for arrs in lists]
+            self.foreach_handle_cache[lists] = handles
+        return handles
+
     @staticmethod
     def get_var_list(loss):
         def topo_sort_dfs(node, visited, var_list):
@@ -125,15 +166,36 @@ class Optimizer(object):
 
 
 class OptimizerOp(Op):
+    # name of the multi-tensor CPU kernel in DNNL_LIB, None if not supported
+    foreach_kernel = None
+
     def __init__(self, param, grad, optimizer, *states):
         self.optimizer = optimizer
         self.learning_rate = optimizer.learning_rate
         self.l2reg = optimizer.l2reg
+        self.foreach = False
         super().__init__(type(self), [param, grad] + list(states))
 
     def compute(self, input_vals, output_val, stream_handle=None):
         raise NotImplementedError
 
+    def defer(self, input_vals):
+        """Queue a dense CPU update on the optimizer instead of computing it.
+
+        Returns False if the update has to be computed right away.
+        The caller must call optimizer.foreach_flush() before the parameter
+        or the optimizer states are used again.
+        """
+        if not self.foreach or isinstance(input_vals[1], IndexedSlices):
+            return False
+        self.optimizer.foreach_pending.append((self, input_vals))
+        return True
+
+    @staticmethod
+    def foreach_compute(pending):
+        # pending: list of (op, input_vals), all from the same optimizer
+        raise NotImplementedError
+
     def gradient(self, output_grad):
         raise NotImplementedError
 
@@ -152,6 +214,9 @@ class OptimizerOp(Op):
         self.on_gpu = param.on_gpu
         self.on_cpu = param.on_cpu
         self.comm_mode = config.comm_mode
+        self.foreach = self.optimizer.foreach and self.on_cpu and \
+            self.foreach_kernel is not None and DNNL_LIB[self.foreach_kernel] and \
+            not isinstance(grad, ParameterServerCommunicateOp)
         if self.comm_mode != 'PS':
             # Though the gradients for transfer ops are well defined,
             # we called gradients in optimizer op before transfer ops are added.
@@ -201,9 +266,18 @@ class OptimizerSparseOp(Op):
 
 
 class SGDUpdateOp(OptimizerOp):
+    foreach_kernel = 'cpu_SGDOptimizerForeachUpdate'
+
     def __init__(self, param, grad, optimizer):
         super().__init__(param, grad, optimizer)
 
+    @staticmethod
+    def foreach_compute(pending):
+        op = pending[0][0]
+        tensors, grads = op.optimizer.foreach_handles(
+            *zip(*(input_vals for _, input_vals in pending)))
+        cpu_sgd_foreach_update(tensors, grads, op.learning_rate, op.l2reg)
+
     def compute(self, input_vals, output_val, stream_handle=None):
         tensor, grad = input_vals
         if self.on_gpu:
@@ -253,8 +327,8 @@ class SGDSparseUpdateOp(OptimizerSparseOp):
 
 
 class SGDOptimizer(Optimizer):
-    def __init__(self, learning_rate=0.01, l2reg=0):
-        super(SGDOptimizer, self).__init__(learning_rate, l2reg)
+    def __init__(self, learning_rate=0.01, l2reg=0, foreach=False):
+        super(SGDOptimizer, self).__init__(learning_rate, l2reg, foreach)
         self.opt_op_type = SGDUpdateOp
         self.sparse_opt_op_type = SGDSparseUpdateOp
 
@@ -287,12 +361,22 @@ def _raw_init_states(shape, name, ctx, func=None, **kargs):
 
 
 class MomentumUpdateOp(OptimizerOp):
+    foreach_kernel = 'cpu_MomentumOptimizerForeachUpdate'
+
     def __init__(self, param, grad, optimizer):
         velocity = _init_states(param, 'momentum_v')
         self.momentum = optimizer.momentum
         self.nesterov = optimizer.nesterov
         super().__init__(param, grad, optimizer, velocity)
 
+    @staticmethod
+    def foreach_compute(pending):
+        op = pending[0][0]
+        tensors, grads, velocities = op.optimizer.foreach_handles(
+            *zip(*(input_vals for _, input_vals in pending)))
+        cpu_momentum_foreach_update(tensors, grads, velocities, op.learning_rate,
+                                    op.momentum, op.nesterov, op.l2reg)
+
     def compute(self, input_vals, output_val, stream_handle=None):
         tensor, grad, velocity = input_vals
         if self.on_gpu:
@@ -322,8 +406,8 @@ class MomentumUpdateOp(OptimizerOp):
 
 
 class MomentumOptimizer(Optimizer):
-    def __init__(self, learning_rate=0.01, momentum=0.9, nesterov=False, l2reg=0):
-        super(MomentumOptimizer, self).__init__(learning_rate, l2reg)
+    def __init__(self, learning_rate=0.01, momentum=0.9, nesterov=False, l2reg=0, foreach=False):
+        super(MomentumOptimizer, self).__init__(learning_rate, l2reg, foreach)
         self.momentum = momentum
         self.nesterov = nesterov
         self.opt_op_type = MomentumUpdateOp
@@ -333,6 +417,8 @@ class MomentumOptimizer(Optimizer):
 
 
 class AdaGradUpdateOp(OptimizerOp):
+    foreach_kernel = 'cpu_AdaGradOptimizerForeachUpdate'
+
     def __init__(self, param, grad, optimizer):
         from .initializers import constant
         accum = _init_states(param, 'adagrad_accum', constant,
@@ -340,6 +426,14 @@ class AdaGradUpdateOp(OptimizerOp):
         self.eps = optimizer.eps
         super().__init__(param, grad, optimizer, accum)
 
+    @staticmethod
+    def foreach_compute(pending):
+        op = pending[0][0]
+        tensors, grads, accums = op.optimizer.foreach_handles(
+            *zip(*(input_vals for _, input_vals in pending)))
+        cpu_adagrad_foreach_update(
+            tensors, grads, accums, op.learning_rate, op.l2reg, op.eps)
+
     def compute(self, input_vals, output_val, stream_handle=None):
         tensor, grad, accum = input_vals
         if self.on_gpu:
@@ -416,12 +510,12 @@ class AdaGradSparseUpdateOp(OptimizerSparseOp):
 
 
 class AdaGradOptimizer(Optimizer):
-    def __init__(self, learning_rate=0.01, initial_accumulator_value=0.0, eps=1e-7, l2reg=0):
+    def __init__(self, learning_rate=0.01, initial_accumulator_value=0.0, eps=1e-7, l2reg=0, foreach=False):
         assert initial_accumulator_value >= 0.0, \
             "initial accumulator value must be non-negative"
         assert eps > 0.0, \
             "epsilon must be positive"
-        super(AdaGradOptimizer, self).__init__(learning_rate, l2reg)
+        super(AdaGradOptimizer, self).__init__(learning_rate, l2reg, foreach)
         self.initial_accumulator_value = initial_accumulator_value
         self.eps = eps
         self.opt_op_type = AdaGradUpdateOp
@@ -460,6 +554,8 @@ def betats_update_op(betats, beta1, beta2, ctx=None):
 
 
 class AdamUpdateOp(OptimizerOp):
+    foreach_kernel = 'cpu_AdamOptimizerForeachUpdate'
+
     def __init__(self, param, grad, optimizer):
         from .initializers import zeros
         m = _init_states(param, 'adam_m', zeros)
@@ -476,6 +572,20 @@ class AdamUpdateOp(OptimizerOp):
         self.epsilon = optimizer.epsilon
         super().__init__(param, grad, optimizer, *states)
 
+    @staticmethod
+    def foreach_compute(pending):
+        op = pending[0][0]
+        # parameters on different contexts have their own betats
+        groups = {}
+        for _, input_vals in pending:
+            groups.setdefault(id(input_vals[4]), []).append(input_vals)
+        for group in groups.values():
+            maxvs = tuple(vals[-1] for vals in group) if op.amsgrad else None
+            tensors, grads, ms, vs, maxvs = op.optimizer.foreach_handles(
+                *zip(*(vals[:4] for vals in group)), maxvs)
+            cpu_adam_foreach_update(tensors, grads, ms, vs, maxvs, op.learning_rate,
+                                    op.beta1, op.beta2, group[0][4], op.l2reg, op.epsilon)
+
     def compute(self, input_vals, output_val, stream_handle=None):
         tensor, grad, m, v, betats = input_vals[:5]
         if self.amsgrad:
@@ -608,8 +718,8 @@ class AdamSparseUpdateOp(OptimizerSparseOp):
 
 
 class AdamOptimizer(Optimizer):
-    def __init__(self, learning_rate=1e-3, beta1=0.9, beta2=0.999, epsilon=1e-8, l2reg=0, amsgrad=False):
-        super(AdamOptimizer, self).__init__(learning_rate, l2reg)
+    def __init__(self, learning_rate=1e-3, beta1=0.9, beta2=0.999, epsilon=1e-8, l2reg=0, amsgrad=False, foreach=False):
+        super(AdamOptimizer, self).__init__(learning_rate, l2reg, foreach)
         self.beta1 = beta1
         self.beta2 = beta2
         self.epsilon = epsilon
@@ -622,11 +732,13 @@ class AdamOptimizer(Optimizer):
 
 
 class AMSGradOptimizer(AdamOptimizer):
-    def __init__(self, learning_rate=0.01, beta1=0.9, beta2=0.999, epsilon=1e-7, l2reg=0):
-        super().__init__(learning_rate, beta1, beta2, epsilon, l2reg, amsgrad=True)
+    def __init__(self, learning_rate=0.01, beta1=0.9, beta2=0.999, epsilon=1e-7, l2reg=0, foreach=False):
+        super().__init__(learning_rate, beta1, beta2, epsilon, l2reg, amsgrad=True, foreach=foreach)
 
 
 class AdamWUpdateOp(OptimizerOp):
+    foreach_kernel = 'cpu_AdamWOptimizerForeachUpdate'
+
     def __init__(self, param, grad, optimizer):
         from .initializers import zeros
         m = _init_states(param, 'adamw_m', zeros)
@@ -639,6 +751,21 @@ class AdamWUpdateOp(OptimizerOp):
         self.weight_decay = optimizer.weight_decay
         super().__init__(param, grad, optimizer, m, v)
 
+    def defer(self, input_vals):
+        if not super().defer(input_vals):
+            return False
+        self.beta1_t *= self.beta1
+        self.beta2_t *= self.beta2
+        return True
+
+    @staticmethod
+    def foreach_compute(pending):
+        op = pending[0][0]
+        tensors, grads, ms, vs = op.optimizer.foreach_handles(
+            *zip(*(input_vals for _, input_vals in pending)))
+        cpu_adamw_foreach_update(tensors, grads, ms, vs, op.learning_rate, op.beta1, op.beta2,
+                                 op.beta1_t, op.beta2_t, op.epsilon, op.weight_decay)
+
     def compute(self, input_vals, output_val, stream_handle=None):
         self.beta1_t *= self.beta1
         self.beta2_t *= self.beta2
@@ -669,8 +796,8 @@ class AdamWUpdateOp(OptimizerOp):
 
 
 class AdamWOptimizer(Optimizer):
-    def __init__(self, learning_rate=0.01, beta1=0.9, beta2=0.999, epsilon=1e-7, weight_decay=0):
-        super(AdamWOptimizer, self).__init__(learning_rate)
+    def __init__(self, learning_rate=0.01, beta1=0.9, beta2=0.999, epsilon=1e-7, weight_decay=0, foreach=False):
+        super(AdamWOptimizer, self).__init__(learning_rate, foreach=foreach)
         self.beta1 = beta1
         self.beta1_t = 1.0
         self.beta2 = beta2
@@ -684,6 +811,8 @@ class AdamWOptimizer(Optimizer):
 
 
 class LambUpdateOp(OptimizerOp):
+    foreach_kernel = 'cpu_LambOptimizerForeachUpdate'
+
     def __init__(self, param, grad, optimizer):
         from .initializers import zeros
         m = _init_states(param, 'lamb_m', zeros)
@@ -696,6 +825,21 @@ class LambUpdateOp(OptimizerOp):
         self.weight_decay = optimizer.weight_decay
         super().__init__(param, grad, optimizer, m, v)
 
+    def defer(self, input_vals):
+        if not super().defer(input_vals):
+            return False
+        self.beta1_t *= self.beta1
+        self.beta2_t *= self.beta2
+        return True
+
+    @staticmethod
+    def foreach_compute(pending):
+        op = pending[0][0]
+        tensors, grads, ms, vs = op.optimizer.foreach_handles(
+            *zip(*(input_vals for _, input_vals in pending)))
+        cpu_lamb_foreach_update(tensors, grads, ms, vs, op.learning_rate, op.beta1, op.beta2,
+                                op.beta1_t, op.beta2_t, op.epsilon, op.weight_decay)
+
     def compute(self, input_vals, output_val, stream_handle=None):
         self.beta1_t *= self.beta1
         self.beta2_t *= self.beta2
@@ -728,8 +872,8 @@ class LambUpdateOp(OptimizerOp):
 
 
 class LambOptimizer(Optimizer):
-    def __init__(self, learning_rate=0.01, beta1=0.9, beta2=0.999, epsilon=1e-7, weight_decay=0):
-        super(LambOptimizer, self).__init__(learning_rate)
+    def __init__(self, learning_rate=0.01, beta1=0.9, beta2=0.999, epsilon=1e-7, weight_decay=0, foreach=False):
+        super(LambOptimizer, self).__init__(learning_rate, foreach=foreach)
         self.beta1 = beta1
         self.beta1_t = 1.0
         self.beta2 = beta2
@@ -976,6 +976,10 @@ HETUSYS_EXTERN_C {
                            const DLArrayHandle matB, bool transposeB,
                            const DLArrayHandle matC);
 
+    int DnnlBatchMatrixMultiply(const DLArrayHandle matA, bool transposeA,
+                                const DLArrayHandle matB, bool transposeB,
+                                DLArrayHandle matC);
+
     int DnnlMatrixElementwiseMultiplyByConst(const DLArrayHandle mat, float val,
                                              DLArrayHandle output);
 
@@ -1007,6 +1011,36 @@ HETUSYS_EXTERN_C {
 
     int DnnlSoftmax(const DLArrayHandle input, DLArrayHandle output);
 
+    int DnnlSoftmaxGradient(const DLArrayHandle output,
+                            const DLArrayHandle in_grad, DLArrayHandle grad);
+
+    int cpu_LayerNormalization(const DLArrayHandle in_arr,
+                               const DLArrayHandle ln_scale,
+                               const DLArrayHandle ln_bias,
+                               DLArrayHandle mean_arr, DLArrayHandle var_arr,
+                               DLArrayHandle out_arr, float eps);
+
+    int cpu_LayerNormalizationGradient(
+        const DLArrayHandle out_grads, const DLArrayHandle in_arr,
+        const DLArrayHandle ln_scale, DLArrayHandle grad_arr,
+        DLArrayHandle grad_scale, DLArrayHandle grad_bias,
+        const DLArrayHandle mean_arr, const DLArrayHandle var_arr, float eps);
+
+    int cpu_Attention(const DLArrayHandle query, const DLArrayHandle key,
+                      const DLArrayHandle value, const DLArrayHandle mask,
+                      DLArrayHandle output, DLArrayHandle lse, int seq_len,
+                      int num_heads, float scale, bool causal, float keep_prob,
+                      unsigned long long seed, unsigned long long seqnum);
+
+    int cpu_AttentionGradient(
+        const DLArrayHandle query, const DLArrayHandle key,
+        const DLArrayHandle value, const DLArrayHandle mask,
+        const DLArrayHandle output, const DLArrayHandle lse,
+        const DLArrayHandle out_grad, DLArrayHandle grad_query,
+        DLArrayHandle grad_key, DLArrayHandle grad_value, int seq_len,
+        int num_heads, float scale, bool causal, float keep_prob,
+        unsigned long long seed, unsigned long long seqnum);
+
     int DnnlSoftmaxCrossEntropy(const DLArrayHandle A, const DLArrayHandle B,
                                 DLArrayHandle output);
 
@@ -1091,6 +1125,18 @@ HETUSYS_EXTERN_C {
     int cpu_EmbeddingLookup(const DLArrayHandle in_mat, const DLArrayHandle ids,
                             DLArrayHandle out_mat);
 
+    int cpu_EmbeddingBag(const DLArrayHandle embed, const DLArrayHandle ids,
+                         const DLArrayHandle offsets,
+                         const DLArrayHandle weights, DLArrayHandle output,
+                         DLArrayHandle argmax, int mode, int num_embed,
+                         bool gathered);
+
+    int cpu_EmbeddingBagGradient(
+        const DLArrayHandle out_grad, const DLArrayHandle ids,
+        const DLArrayHandle offsets, const DLArrayHandle weights,
+        const DLArrayHandle argmax, DLArrayHandle out_indices,
+        DLArrayHandle out_values, int mode, int num_embed);
+
     int cpu_IndexedSlices2Dense(const DLArrayHandle indices,
                                 const DLArrayHandle values,
                                 DLArrayHandle output);
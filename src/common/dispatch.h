@@ -10,6 +10,8 @@ typedef enum {
     UINT8 = 4,
     INT16 = 5,
     UINT16 = 6,
+    INT64 = 7,
+    UINT64 = 8,
 } DataType;
 
 template <DataType DTYPE>
@@ -27,6 +29,8 @@ DECLARE_DATA_TYPE_TO_SPECIALIZED_META(DataType::INT16, int16_t);
 DECLARE_DATA_TYPE_TO_SPECIALIZED_META(DataType::UINT16, uint16_t);
 DECLARE_DATA_TYPE_TO_SPECIALIZED_META(DataType::INT32, int32_t);
 DECLARE_DATA_TYPE_TO_SPECIALIZED_META(DataType::UINT32, uint32_t);
+DECLARE_DATA_TYPE_TO_SPECIALIZED_META(DataType::INT64, int64_t);
+DECLARE_DATA_TYPE_TO_SPECIALIZED_META(DataType::UINT64, uint64_t);
 DECLARE_DATA_TYPE_TO_SPECIALIZED_META(DataType::FLOAT32, float);
 
 // adapted from pytorch
@@ -66,6 +70,14 @@ DECLARE_DATA_TYPE_TO_SPECIALIZED_META(DataType::FLOAT32, float);
     HT_DISPATH_SWITCH(DTYPE,                                                   \
                       HT_DISPATH_CASE_INTEGER_TYPES(SPEC_TYPE, __VA_ARGS__))
 
+#define HT_DISPATH_CASE_INDEX_TYPES(SPEC_TYPE, ...)                            \
+    HT_DISPATH_CASE(DataType::INT32, SPEC_TYPE, __VA_ARGS__)                   \
+    HT_DISPATH_CASE(DataType::INT64, SPEC_TYPE, __VA_ARGS__)
+
+#define HT_DISPATCH_INDEX_TYPES(DTYPE, SPEC_TYPE, ...)                         \
+    HT_DISPATH_SWITCH(DTYPE,                                                   \
+                      HT_DISPATH_CASE_INDEX_TYPES(SPEC_TYPE, __VA_ARGS__))
+
 #define HT_DISPATH_CASE_INTEGER_AND_FLOATING_TYPES(SPEC_TYPE, ...)             \
     HT_DISPATH_CASE_FLOATING_TYPES(SPEC_TYPE, __VA_ARGS__)                     \
     HT_DISPATH_CASE_INTEGER_TYPES(SPEC_TYPE, __VA_ARGS__)
@@ -36,14 +36,19 @@ extern "C" int DnnlMatrixElementwiseAddByConst(const DLArrayHandle input,
     auto src_mem = memory(mat_md, eng, input->data);
     auto dst_mem = memory(mat_md, eng, output->data);
 
-    auto AddConst_d =
-        eltwise_forward::desc(prop_kind::forward_training,
-                              algorithm::eltwise_linear, mat_md, 1.f, val);
-    auto AddConst_pd = eltwise_forward::primitive_desc(AddConst_d, eng);
-    auto AddConst = eltwise_forward(AddConst_pd);
-
-    AddConst.execute(engine_stream,
-                     {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
+    auto AddConst = dnnl_cached(
+        DnnlKey("eltwise_forward")
+            << algorithm::eltwise_linear << input << 1.f << val,
+        [&] {
+            auto AddConst_d = eltwise_forward::desc(prop_kind::forward_training,
+                                                    algorithm::eltwise_linear,
+                                                    mat_md, 1.f, val);
+            auto AddConst_pd = eltwise_forward::primitive_desc(AddConst_d, eng);
+            return eltwise_forward(AddConst_pd);
+        });
+
+    AddConst->execute(engine_stream,
+                      {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
     return 0;
 }
@@ -59,14 +59,17 @@ extern "C" int DnnlMatrixElementwiseAdd(const DLArrayHandle matA,
         auto srcA_mem = memory(mat_md, eng, matA->data);
         auto srcB_mem = memory(mat_md, eng, matB->data);
         auto dst_mem = memory(mat_md, eng, output->data);
-        auto AddElewise_d =
-            binary::desc(algorithm::binary_add, mat_md, mat_md, mat_md);
-        auto AddElewise_pd = binary::primitive_desc(AddElewise_d, eng);
-        auto AddElewise = binary(AddElewise_pd);
+        auto AddElewise = dnnl_cached(
+            DnnlKey("binary") << algorithm::binary_add << matA, [&] {
+                auto AddElewise_d =
+                    binary::desc(algorithm::binary_add, mat_md, mat_md, mat_md);
+                auto AddElewise_pd = binary::primitive_desc(AddElewise_d, eng);
+                return binary(AddElewise_pd);
+            });
 
-        AddElewise.execute(engine_stream, {{DNNL_ARG_SRC_0, srcA_mem},
-                                           {DNNL_ARG_SRC_1, srcB_mem},
-                                           {DNNL_ARG_DST, dst_mem}});
+        AddElewise->execute(engine_stream, {{DNNL_ARG_SRC_0, srcA_mem},
+                                            {DNNL_ARG_SRC_1, srcB_mem},
+                                            {DNNL_ARG_DST, dst_mem}});
         engine_stream.wait();
 
     }
@@ -0,0 +1,317 @@
+#include <algorithm>
+#include <cassert>
+#include <cctype>
+#include <cmath>
+#include <cstdio>
+#include <cstring>
+#include <iostream>
+#include <limits>
+#include <random>
+#include <stdexcept>
+#include <vector>
+#include <type_traits>
+#include <sys/time.h>
+#include <omp.h>
+
+#include "dnnl.hpp"
+
+#include "../common/c_runtime_api.h"
+#include "dnnl_runtime.h"
+
+using namespace dnnl;
+
+// Multi-head attention softmax(scale * Q K^T + mask) V in tiles of queries
+// and keys, so the [batch, heads, seq_len, seq_len] scores are never
+// materialized: every tile of scores is folded into the output with a
+// running max and sum (online softmax), and the backward pass recomputes
+// them from the log-sum-exp of every row saved by the forward pass.
+//
+// q, k, v, out and their gradients are [batch * seq_len, num_heads *
+// head_dim], the heads side by side as the projections give them; the tiles
+// are strided views of them. mask is added to the scores of every query and
+// head, [batch, seq_len] in memory, or NULL. lse is [batch, num_heads,
+// seq_len].
+
+// 64 x 128 scores and the 64 rows of output of a tile stay in cache
+static const int ATTENTION_BLOCK_Q = 64;
+static const int ATTENTION_BLOCK_K = 128;
+// the score after the query with a causal mask, as MultiHeadAttention sets
+// it; the tiles entirely after the queries are skipped
+static const float CAUSAL_MASKED_SCORE = -1e4f;
+
+struct AttentionShape {
+    int64_t batch, seq_len, num_heads, head_dim, hidden;
+    float scale;
+    bool causal;
+    const float *mask;
+    // dropout of the probabilities, keep_prob 1 for none
+    float keep_prob;
+    uint64_t seed;
+};
+
+static AttentionShape attention_shape(const DLArrayHandle query,
+                                      const DLArrayHandle mask, int64_t seq_len,
+                                      int num_heads, float scale, bool causal,
+                                      float keep_prob, uint64_t seed,
+                                      uint64_t seqnum) {
+    assert(query->ndim == 2 && query->shape[0] % seq_len == 0);
+    assert(query->shape[1] % num_heads == 0);
+    AttentionShape shape;
+    shape.batch = query->shape[0] / seq_len;
+    shape.seq_len = seq_len;
+    shape.num_heads = num_heads;
+    shape.hidden = query->shape[1];
+    shape.head_dim = shape.hidden / num_heads;
+    shape.scale = scale;
+    shape.causal = causal;
+    shape.mask = mask == NULL ? NULL : (const float *)mask->data;
+    shape.keep_prob = keep_prob;
+    // one stream of random numbers per call, indexed by the position of the
+    // probability in [batch, heads, seq_len, seq_len]
+    shape.seed = seed ^ (seqnum * 0x9E3779B97F4A7C15ULL);
+    return shape;
+}
+
+static inline uint64_t splitmix64(uint64_t x) {
+    x += 0x9E3779B97F4A7C15ULL;
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9ULL;
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EBULL;
+    return x ^ (x >> 31);
+}
+
+// the factor of the probability (b, h, i, j) after dropout, 0 or 1 /
+// keep_prob; the same in the forward and backward passes
+static inline float attention_dropout(const AttentionShape &shape, int64_t b,
+                                      int64_t h, int64_t i, int64_t j) {
+    uint64_t index =
+        ((b * shape.num_heads + h) * shape.seq_len + i) * shape.seq_len + j;
+    float uniform = (splitmix64(shape.seed + index) >> 40) * (1.f / (1 << 24));
+    return uniform < shape.keep_prob ? 1.f / shape.keep_prob : 0.f;
+}
+
+// the first row of head h of sequence b in a [batch * seq_len, hidden] array
+static inline size_t attention_offset(const AttentionShape &shape, int64_t b,
+                                      int64_t h, int64_t row) {
+    return (b * shape.seq_len + row) * shape.hidden + h * shape.head_dim;
+}
+
+// scores[i][j] = scale * q_(q0 + i) . k_(k0 + j) + mask, bq x bk
+static void attention_scores(const AttentionShape &shape, const float *query,
+                             const float *key, int64_t b, int64_t h, int64_t q0,
+                             int64_t bq, int64_t k0, int64_t bk,
+                             float *scores) {
+    sgemm('N', 'T', bq, bk, shape.head_dim, shape.scale,
+          query + attention_offset(shape, b, h, q0), shape.hidden,
+          key + attention_offset(shape, b, h, k0), shape.hidden, 0.f, scores,
+          bk);
+    for (int64_t i = 0; i < bq; ++i) {
+        float *row = scores + i * bk;
+        if (shape.causal) {
+            for (int64_t j = std::max<int64_t>(q0 + i + 1 - k0, 0); j < bk; ++j)
+                row[j] = CAUSAL_MASKED_SCORE;
+        }
+        if (shape.mask != NULL) {
+            const float *mask_row = shape.mask + b * shape.seq_len + k0;
+            for (int64_t j = 0; j < bk; ++j)
+                row[j] += mask_row[j];
+        }
+    }
+}
+
+// the keys seen by the queries before q_end
+static inline int64_t attention_key_end(const AttentionShape &shape,
+                                        int64_t q_end) {
+    return shape.causal ? std::min(q_end, shape.seq_len) : shape.seq_len;
+}
+
+extern "C" int cpu_Attention(const DLArrayHandle query, const DLArrayHandle key,
+                             const DLArrayHandle value,
+                             const DLArrayHandle mask, DLArrayHandle output,
+                             DLArrayHandle lse, int seq_len, int num_heads,
+                             float scale, bool causal, float keep_prob,
+                             unsigned long long seed,
+                             unsigned long long seqnum) {
+    AttentionShape shape =
+        attention_shape(query, mask, seq_len, num_heads, scale, causal,
+                        keep_prob, seed, seqnum);
+    const float *q_data = (const float *)query->data;
+    const float *k_data = (const float *)key->data;
+    const float *v_data = (const float *)value->data;
+    float *out_data = (float *)output->data;
+    float *lse_data = (float *)lse->data;
+    const int64_t head_dim = shape.head_dim;
+    const int64_t num_q_blocks =
+        (shape.seq_len + ATTENTION_BLOCK_Q - 1) / ATTENTION_BLOCK_Q;
+    const int64_t num_tasks = shape.batch * shape.num_heads * num_q_blocks;
+
+#pragma omp parallel
+    {
+        std::vector<float> scores(ATTENTION_BLOCK_Q * ATTENTION_BLOCK_K);
+        std::vector<float> acc(ATTENTION_BLOCK_Q * head_dim);
+        float row_max[ATTENTION_BLOCK_Q], row_sum[ATTENTION_BLOCK_Q];
+
+        // the causal tiles are uneven
+#pragma omp for schedule(dynamic)
+        for (int64_t task = 0; task < num_tasks; ++task) {
+            int64_t b = task / (shape.num_heads * num_q_blocks);
+            int64_t h = task / num_q_blocks % shape.num_heads;
+            int64_t q0 = task % num_q_blocks * ATTENTION_BLOCK_Q;
+            int64_t bq =
+                std::min<int64_t>(ATTENTION_BLOCK_Q, shape.seq_len - q0);
+            std::fill(acc.begin(), acc.end(), 0.f);
+            std::fill(row_max, row_max + bq,
+                      -std::numeric_limits<float>::infinity());
+            std::fill(row_sum, row_sum + bq, 0.f);
+
+            int64_t k_end = attention_key_end(shape, q0 + bq);
+            for (int64_t k0 = 0; k0 < k_end; k0 += ATTENTION_BLOCK_K) {
+                int64_t bk = std::min<int64_t>(ATTENTION_BLOCK_K, k_end - k0);
+                attention_scores(shape, q_data, k_data, b, h, q0, bq, k0, bk,
+                                 scores.data());
+                for (int64_t i = 0; i < bq; ++i) {
+                    float *row = scores.data() + i * bk;
+                    float cur_max = row_max[i];
+                    for (int64_t j = 0; j < bk; ++j)
+                        cur_max = std::max(cur_max, row[j]);
+                    // rescale what the previous tiles summed to the new max
+                    float correction = expf(row_max[i] - cur_max);
+                    float cur_sum = 0;
+                    for (int64_t j = 0; j < bk; ++j) {
+                        row[j] = expf(row[j] - cur_max);
+                        cur_sum += row[j];
+                    }
+                    row_sum[i] = row_sum[i] * correction + cur_sum;
+                    row_max[i] = cur_max;
+                    float *acc_row = acc.data() + i * head_dim;
+                    for (int64_t t = 0; t < head_dim; ++t)
+                        acc_row[t] *= correction;
+                    if (shape.keep_prob < 1) {
+                        for (int64_t j = 0; j < bk; ++j)
+                            row[j] *=
+                                attention_dropout(shape, b, h, q0 + i, k0 + j);
+                    }
+                }
+                sgemm('N', 'N', bq, head_dim, bk, 1.f, scores.data(), bk,
+                      v_data + attention_offset(shape, b, h, k0), shape.hidden,
+                      1.f, acc.data(), head_dim);
+            }
+
+            float *lse_row =
+                lse_data + (b * shape.num_heads + h) * shape.seq_len + q0;
+            for (int64_t i = 0; i < bq; ++i) {
+                float *out_row =
+                    out_data + attention_offset(shape, b, h, q0 + i);
+                const float *acc_row = acc.data() + i * head_dim;
+                float inv_sum = 1 / row_sum[i];
+                for (int64_t t = 0; t < head_dim; ++t)
+                    out_row[t] = acc_row[t] * inv_sum;
+                lse_row[i] = row_max[i] + logf(row_sum[i]);
+            }
+        }
+    }
+    return 0;
+}
+
+extern "C" int
+cpu_AttentionGradient(const DLArrayHandle query, const DLArrayHandle key,
+                      const DLArrayHandle value, const DLArrayHandle mask,
+                      const DLArrayHandle output, const DLArrayHandle lse,
+                      const DLArrayHandle out_grad, DLArrayHandle grad_query,
+                      DLArrayHandle grad_key, DLArrayHandle grad_value,
+                      int seq_len, int num_heads, float scale, bool causal,
+                      float keep_prob, unsigned long long seed,
+                      unsigned long long seqnum) {
+    AttentionShape shape =
+        attention_shape(query, mask, seq_len, num_heads, scale, causal,
+                        keep_prob, seed, seqnum);
+    const float *q_data = (const float *)query->data;
+    const float *k_data = (const float *)key->data;
+    const float *v_data = (const float *)value->data;
+    const float *out_data = (const float *)output->data;
+    const float *lse_data = (const float *)lse->data;
+    const float *dout_data = (const float *)out_grad->data;
+    float *dq_data = (float *)grad_query->data;
+    float *dk_data = (float *)grad_key->data;
+    float *dv_data = (float *)grad_value->data;
+    const int64_t head_dim = shape.head_dim;
+    const int64_t num_tasks = shape.batch * shape.num_heads;
+    const bool dropout = shape.keep_prob < 1;
+
+    // every (sequence, head) writes its own columns of the gradients
+#pragma omp parallel
+    {
+        std::vector<float> probs(ATTENTION_BLOCK_Q * ATTENTION_BLOCK_K);
+        std::vector<float> dprobs(ATTENTION_BLOCK_Q * ATTENTION_BLOCK_K);
+        std::vector<float> dropped(dropout ? probs.size() : 0);
+        std::vector<float> delta(shape.seq_len);
+
+#pragma omp for schedule(dynamic)
+        for (int64_t task = 0; task < num_tasks; ++task) {
+            int64_t b = task / shape.num_heads;
+            int64_t h = task % shape.num_heads;
+            size_t rowsize = sizeof(float) * head_dim;
+            // delta_i = sum_j p_ij dp_ij = dout_i . out_i
+            for (int64_t i = 0; i < shape.seq_len; ++i) {
+                size_t offset = attention_offset(shape, b, h, i);
+                float cur = 0;
+                for (int64_t t = 0; t < head_dim; ++t)
+                    cur += dout_data[offset + t] * out_data[offset + t];
+                delta[i] = cur;
+                memset(dq_data + offset, 0, rowsize);
+                memset(dk_data + offset, 0, rowsize);
+                memset(dv_data + offset, 0, rowsize);
+            }
+            const float *lse_head =
+                lse_data + (b * shape.num_heads + h) * shape.seq_len;
+
+            for (int64_t q0 = 0; q0 < shape.seq_len; q0 += ATTENTION_BLOCK_Q) {
+                int64_t bq =
+                    std::min<int64_t>(ATTENTION_BLOCK_Q, shape.seq_len - q0);
+                size_t q_offset = attention_offset(shape, b, h, q0);
+                int64_t k_end = attention_key_end(shape, q0 + bq);
+                for (int64_t k0 = 0; k0 < k_end; k0 += ATTENTION_BLOCK_K) {
+                    int64_t bk =
+                        std::min<int64_t>(ATTENTION_BLOCK_K, k_end - k0);
+                    size_t k_offset = attention_offset(shape, b, h, k0);
+                    attention_scores(shape, q_data, k_data, b, h, q0, bq, k0,
+                                     bk, probs.data());
+                    // dp = dout v^T
+                    sgemm('N', 'T', bq, bk, head_dim, 1.f, dout_data + q_offset,
+                          shape.hidden, v_data + k_offset, shape.hidden, 0.f,
+                          dprobs.data(), bk);
+                    for (int64_t i = 0; i < bq; ++i) {
+                        float *p_row = probs.data() + i * bk;
+                        float *dp_row = dprobs.data() + i * bk;
+                        for (int64_t j = 0; j < bk; ++j)
+                            p_row[j] = expf(p_row[j] - lse_head[q0 + i]);
+                        if (dropout) {
+                            float *d_row = dropped.data() + i * bk;
+                            for (int64_t j = 0; j < bk; ++j) {
+                                float factor = attention_dropout(
+                                    shape, b, h, q0 + i, k0 + j);
+                                d_row[j] = p_row[j] * factor;
+                                dp_row[j] *= factor;
+                            }
+                        }
+                        // ds = p * (dp - delta), into dp
+                        for (int64_t j = 0; j < bk; ++j)
+                            dp_row[j] = p_row[j] * (dp_row[j] - delta[q0 + i]);
+                    }
+                    // dv += p^T dout
+                    sgemm('T', 'N', bk, head_dim, bq, 1.f,
+                          dropout ? dropped.data() : probs.data(), bk,
+                          dout_data + q_offset, shape.hidden, 1.f,
+                          dv_data + k_offset, shape.hidden);
+                    // dq += scale * ds k, dk += scale * ds^T q
+                    sgemm('N', 'N', bq, head_dim, bk, shape.scale,
+                          dprobs.data(), bk, k_data + k_offset, shape.hidden,
+                          1.f, dq_data + q_offset, shape.hidden);
+                    sgemm('T', 'N', bk, head_dim, bq, shape.scale,
+                          dprobs.data(), bk, q_data + q_offset, shape.hidden,
+                          1.f, dk_data + k_offset, shape.hidden);
+                }
+            }
+        }
+    }
+    return 0;
+}
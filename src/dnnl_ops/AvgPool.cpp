@@ -45,17 +45,24 @@ extern "C" int DnnlAvgPool(const DLArrayHandle input, const int kernel_H,
     auto output_data = memory(pool_dst_md, eng, (void *)output->data);
 
     //[Create pooling primitive]
-    auto pool_desc = pooling_forward::desc(
-        prop_kind::forward_inference, algorithm::pooling_avg_include_padding,
-        pool_src_md, pool_dst_md, pool_strides, pool_kernel, pool_padding,
-        pool_padding);
-
-    auto pool_pd = pooling_forward::primitive_desc(pool_desc, eng);
-    auto pool_p = pooling_forward(pool_pd);
+    auto pool_p = dnnl_cached(
+        DnnlKey("pooling_forward")
+            << algorithm::pooling_avg_include_padding << input << output
+            << kernel_H << kernel_W << padding << stride,
+        [&] {
+            auto pool_desc =
+                pooling_forward::desc(prop_kind::forward_inference,
+                                      algorithm::pooling_avg_include_padding,
+                                      pool_src_md, pool_dst_md, pool_strides,
+                                      pool_kernel, pool_padding, pool_padding);
+
+            auto pool_pd = pooling_forward::primitive_desc(pool_desc, eng);
+            return pooling_forward(pool_pd);
+        });
 
     //	stream s(eng);
-    pool_p.execute(engine_stream,
-                   {{DNNL_ARG_SRC, input_data}, {DNNL_ARG_DST, output_data}});
+    pool_p->execute(engine_stream,
+                    {{DNNL_ARG_SRC, input_data}, {DNNL_ARG_DST, output_data}});
     engine_stream.wait();
     return 0;
 }
@@ -82,27 +89,34 @@ extern "C" int DnnlAvgPool_Gradient(const DLArrayHandle gradient_Y,
     auto gradient_Y_mem = memory(gradient_Y_md, eng, (void *)gradient_Y->data);
     auto gradient_X_mem = memory(gradient_X_md, eng, (void *)gradient_X->data);
 
-    auto pooling_backward_d = pooling_backward::desc(
-        algorithm::pooling_avg_include_padding, gradient_X_md, gradient_Y_md,
-        {stride, stride}, {kernel_H, kernel_W}, {padding, padding},
-        {padding, padding});
-
-    // forward
-    auto pool_desc = pooling_forward::desc(
-        prop_kind::forward_training, algorithm::pooling_avg_include_padding,
-        gradient_X_md, gradient_Y_md, {stride, stride}, {kernel_H, kernel_W},
-        {padding, padding}, {padding, padding});
-
-    auto pool_pd = pooling_forward::primitive_desc(pool_desc, eng);
-    // forward
-
-    auto pooling_backward_pd =
-        pooling_backward::primitive_desc(pooling_backward_d, eng, pool_pd);
-    auto pooling_backward_p = pooling_backward(pooling_backward_pd);
+    auto pooling_backward_p = dnnl_cached(
+        DnnlKey("pooling_backward")
+            << algorithm::pooling_avg_include_padding << gradient_Y
+            << gradient_X << kernel_H << kernel_W << padding << stride,
+        [&] {
+            auto pooling_backward_d = pooling_backward::desc(
+                algorithm::pooling_avg_include_padding, gradient_X_md,
+                gradient_Y_md, {stride, stride}, {kernel_H, kernel_W},
+                {padding, padding}, {padding, padding});
+
+            // forward
+            auto pool_desc = pooling_forward::desc(
+                prop_kind::forward_training,
+                algorithm::pooling_avg_include_padding, gradient_X_md,
+                gradient_Y_md, {stride, stride}, {kernel_H, kernel_W},
+                {padding, padding}, {padding, padding});
+
+            auto pool_pd = pooling_forward::primitive_desc(pool_desc, eng);
+            // forward
+
+            auto pooling_backward_pd = pooling_backward::primitive_desc(
+                pooling_backward_d, eng, pool_pd);
+            return pooling_backward(pooling_backward_pd);
+        });
 
     //	stream s(eng);
-    pooling_backward_p.execute(engine_stream,
-                               {{DNNL_ARG_DIFF_SRC, gradient_X_mem},
-                                {DNNL_ARG_DIFF_DST, gradient_Y_mem}});
+    pooling_backward_p->execute(engine_stream,
+                                {{DNNL_ARG_DIFF_SRC, gradient_X_mem},
+                                 {DNNL_ARG_DIFF_DST, gradient_Y_mem}});
     return 0;
 }
\ No newline at end of file
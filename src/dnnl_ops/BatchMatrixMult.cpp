@@ -0,0 +1,65 @@
+#include <cassert>
+#include <cctype>
+#include <cmath>
+#include <cstdio>
+#include <iostream>
+#include <random>
+#include <stdexcept>
+#include <vector>
+#include <type_traits>
+#include <sys/time.h>
+
+#include "dnnl.hpp"
+
+#include "../common/c_runtime_api.h"
+#include "dnnl_runtime.h"
+
+using namespace dnnl;
+
+// the leading dimensions are collapsed into the batch of one 3d matmul
+extern "C" int DnnlBatchMatrixMultiply(const DLArrayHandle matA,
+                                       bool transposeA,
+                                       const DLArrayHandle matB,
+                                       bool transposeB, DLArrayHandle matC) {
+    dnnl_stream_init();
+
+    int ndim = matA->ndim;
+    assert(ndim >= 2 && matB->ndim == ndim && matC->ndim == ndim);
+    memory::dim batch = 1;
+    for (int i = 0; i < ndim - 2; ++i) {
+        assert(matA->shape[i] == matB->shape[i]
+               && matA->shape[i] == matC->shape[i]);
+        batch *= matA->shape[i];
+    }
+    memory::dim M = matC->shape[ndim - 2];
+    memory::dim N = matC->shape[ndim - 1];
+    memory::dim K = matA->shape[transposeA ? ndim - 2 : ndim - 1];
+
+    auto srcA_md = memory::desc({batch, M, K}, memory::data_type::f32,
+                                transposeA ? memory::format_tag::acb :
+                                             memory::format_tag::abc);
+    auto srcB_md = memory::desc({batch, K, N}, memory::data_type::f32,
+                                transposeB ? memory::format_tag::acb :
+                                             memory::format_tag::abc);
+    auto dst_md = memory::desc({batch, M, N}, memory::data_type::f32,
+                               memory::format_tag::abc);
+
+    auto srcA_mem = memory(srcA_md, eng, matA->data);
+    auto srcB_mem = memory(srcB_md, eng, matB->data);
+    auto dst_mem = memory(dst_md, eng, matC->data);
+
+    auto Matmul =
+        dnnl_cached(DnnlKey("batch_matmul")
+                        << batch << M << N << K << transposeA << transposeB,
+                    [&] {
+                        auto Matmul_d = matmul::desc(srcA_md, srcB_md, dst_md);
+                        auto Matmul_pd = matmul::primitive_desc(Matmul_d, eng);
+                        return matmul(Matmul_pd);
+                    });
+
+    Matmul->execute(engine_stream, {{DNNL_ARG_SRC, srcA_mem},
+                                    {DNNL_ARG_WEIGHTS, srcB_mem},
+                                    {DNNL_ARG_DST, dst_mem}});
+    engine_stream.wait();
+    return 0;
+}
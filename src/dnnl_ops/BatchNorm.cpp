@@ -60,17 +60,22 @@ int DnnlBatchNorm(const DLArrayHandle input, const DLArrayHandle bn_scale,
     auto mean_mem = memory(mean_var_md, eng, save_mean_data);
     auto var_mem = memory(mean_var_md, eng, save_var_data);
 
-    auto bn_d = batch_normalization_forward::desc(
-        prop_kind::forward_training, data_md, eps,
-        normalization_flags::use_scale_shift);
-    auto bn_pd = batch_normalization_forward::primitive_desc(bn_d, eng);
-    auto bn = batch_normalization_forward(bn_pd);
-
-    bn.execute(engine_stream, {{DNNL_ARG_SRC, input_mem},
-                               {DNNL_ARG_SCALE_SHIFT, ptr_mem},
-                               {DNNL_ARG_MEAN, mean_mem},
-                               {DNNL_ARG_VARIANCE, var_mem},
-                               {DNNL_ARG_DST, output_mem}});
+    auto bn = dnnl_cached(
+        DnnlKey("batch_normalization_forward")
+            << prop_kind::forward_training << input << eps,
+        [&] {
+            auto bn_d = batch_normalization_forward::desc(
+                prop_kind::forward_training, data_md, eps,
+                normalization_flags::use_scale_shift);
+            auto bn_pd = batch_normalization_forward::primitive_desc(bn_d, eng);
+            return batch_normalization_forward(bn_pd);
+        });
+
+    bn->execute(engine_stream, {{DNNL_ARG_SRC, input_mem},
+                                {DNNL_ARG_SCALE_SHIFT, ptr_mem},
+                                {DNNL_ARG_MEAN, mean_mem},
+                                {DNNL_ARG_VARIANCE, var_mem},
+                                {DNNL_ARG_DST, output_mem}});
     engine_stream.wait();
     for (int i = 0; i < C; ++i) {
         running_mean_data[i] = running_mean_data[i] * (1 - momentum)
@@ -131,24 +136,28 @@ int DnnlBatchNorm_Gradient(const DLArrayHandle grad_y,
     auto mean_mem = memory(mean_var_md, eng, mean->data);
     auto var_mem = memory(mean_var_md, eng, var->data);
 
-    auto bn_d = batch_normalization_forward::desc(
-        prop_kind::forward_training, data_md, eps,
-        normalization_flags::use_scale_shift);
-    auto bn_pd = batch_normalization_forward::primitive_desc(bn_d, eng);
-    auto bn_grad_d = batch_normalization_backward::desc(
-        prop_kind::backward, diff_md, data_md, eps,
-        normalization_flags::use_scale_shift);
-    auto bn_grad_pd =
-        batch_normalization_backward::primitive_desc(bn_grad_d, eng, bn_pd);
-    auto bn_grad = batch_normalization_backward(bn_grad_pd);
-
-    bn_grad.execute(engine_stream, {{DNNL_ARG_SRC, input_mem},
-                                    {DNNL_ARG_SCALE_SHIFT, ptr_mem},
-                                    {DNNL_ARG_MEAN, mean_mem},
-                                    {DNNL_ARG_VARIANCE, var_mem},
-                                    {DNNL_ARG_DIFF_DST, grad_y_mem},
-                                    {DNNL_ARG_DIFF_SRC, grad_x_mem},
-                                    {DNNL_ARG_DIFF_SCALE_SHIFT, grad_ptr_mem}});
+    auto bn_grad = dnnl_cached(
+        DnnlKey("batch_normalization_backward") << input << grad_y << eps, [&] {
+            auto bn_d = batch_normalization_forward::desc(
+                prop_kind::forward_training, data_md, eps,
+                normalization_flags::use_scale_shift);
+            auto bn_pd = batch_normalization_forward::primitive_desc(bn_d, eng);
+            auto bn_grad_d = batch_normalization_backward::desc(
+                prop_kind::backward, diff_md, data_md, eps,
+                normalization_flags::use_scale_shift);
+            auto bn_grad_pd = batch_normalization_backward::primitive_desc(
+                bn_grad_d, eng, bn_pd);
+            return batch_normalization_backward(bn_grad_pd);
+        });
+
+    bn_grad->execute(engine_stream,
+                     {{DNNL_ARG_SRC, input_mem},
+                      {DNNL_ARG_SCALE_SHIFT, ptr_mem},
+                      {DNNL_ARG_MEAN, mean_mem},
+                      {DNNL_ARG_VARIANCE, var_mem},
+                      {DNNL_ARG_DIFF_DST, grad_y_mem},
+                      {DNNL_ARG_DIFF_SRC, grad_x_mem},
+                      {DNNL_ARG_DIFF_SCALE_SHIFT, grad_ptr_mem}});
     engine_stream.wait();
 
     scale = (float *)(grad_scale->data);
@@ -200,18 +209,23 @@ int DnnlBatchNorm_Inference(const DLArrayHandle input,
     auto mean_mem = memory(mean_var_md, eng, running_mean);
     auto var_mem = memory(mean_var_md, eng, running_var);
 
-    auto bn_d = batch_normalization_forward::desc(
-        prop_kind::forward_inference, data_md, eps,
-        normalization_flags::use_global_stats
-            | normalization_flags::use_scale_shift);
-    auto bn_pd = batch_normalization_forward::primitive_desc(bn_d, eng);
-    auto bn = batch_normalization_forward(bn_pd);
-
-    bn.execute(engine_stream, {{DNNL_ARG_SRC, input_mem},
-                               {DNNL_ARG_SCALE_SHIFT, ptr_mem},
-                               {DNNL_ARG_MEAN, mean_mem},
-                               {DNNL_ARG_VARIANCE, var_mem},
-                               {DNNL_ARG_DST, output_mem}});
+    auto bn = dnnl_cached(
+        DnnlKey("batch_normalization_forward")
+            << prop_kind::forward_inference << input << eps,
+        [&] {
+            auto bn_d = batch_normalization_forward::desc(
+                prop_kind::forward_inference, data_md, eps,
+                normalization_flags::use_global_stats
+                    | normalization_flags::use_scale_shift);
+            auto bn_pd = batch_normalization_forward::primitive_desc(bn_d, eng);
+            return batch_normalization_forward(bn_pd);
+        });
+
+    bn->execute(engine_stream, {{DNNL_ARG_SRC, input_mem},
+                                {DNNL_ARG_SCALE_SHIFT, ptr_mem},
+                                {DNNL_ARG_MEAN, mean_mem},
+                                {DNNL_ARG_VARIANCE, var_mem},
+                                {DNNL_ARG_DST, output_mem}});
     engine_stream.wait();
 
     return 0;
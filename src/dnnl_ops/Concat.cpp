@@ -62,11 +62,15 @@ extern "C" int DnnlConcat(const DLArrayHandle input_x,
     srcs_mem.push_back(src_memA);
     srcs_mem.push_back(src_memB);
 
-    auto concat_pd = concat::primitive_desc(dst_md, axis, srcs_md, eng);
-    auto concat_e = concat(concat_pd);
-    concat_e.execute(engine_stream, {{DNNL_ARG_DST, dst_mem},
-                                     {DNNL_ARG_MULTIPLE_SRC + 0, srcs_mem[0]},
-                                     {DNNL_ARG_MULTIPLE_SRC + 1, srcs_mem[1]}});
+    auto concat_e = dnnl_cached(
+        DnnlKey("concat") << input_x << input_y << output << axis, [&] {
+            auto concat_pd = concat::primitive_desc(dst_md, axis, srcs_md, eng);
+            return concat(concat_pd);
+        });
+    concat_e->execute(engine_stream,
+                      {{DNNL_ARG_DST, dst_mem},
+                       {DNNL_ARG_MULTIPLE_SRC + 0, srcs_mem[0]},
+                       {DNNL_ARG_MULTIPLE_SRC + 1, srcs_mem[1]}});
     engine_stream.wait();
     return 0;
 }
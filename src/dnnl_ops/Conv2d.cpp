@@ -62,12 +62,21 @@ extern "C" int DnnlConv2d(const DLArrayHandle input_x, DLArrayHandle input_f,
     auto conv_weights_mem = weights_mem;
     auto conv_dst_mem = dst_mem;
 
-    auto conv_desc = convolution_forward::desc(
-        prop_kind::forward, algorithm::convolution_auto, conv_src_md,
-        conv_weights_md, conv_dst_md, {stride, stride}, {padding, padding},
-        {padding, padding});
-
-    auto conv_prim_desc = convolution_forward::primitive_desc(conv_desc, eng);
+    auto conv = dnnl_cached(
+        DnnlKey("convolution_forward")
+            << input_x << input_f << padding << stride,
+        [&] {
+            auto conv_desc = convolution_forward::desc(
+                prop_kind::forward, algorithm::convolution_auto, conv_src_md,
+                conv_weights_md, conv_dst_md, {stride, stride},
+                {padding, padding}, {padding, padding});
+
+            auto conv_prim_desc =
+                convolution_forward::primitive_desc(conv_desc, eng);
+            return DnnlPrimitiveWithDesc<convolution_forward>{
+                conv_prim_desc, convolution_forward(conv_prim_desc)};
+        });
+    auto &conv_prim_desc = conv->pd;
 
     if (conv_prim_desc.src_desc() != src_mem.get_desc()) {
         conv_src_mem = memory(conv_prim_desc.src_desc(), eng);
@@ -85,11 +94,10 @@ extern "C" int DnnlConv2d(const DLArrayHandle input_x, DLArrayHandle input_f,
             .execute(engine_stream, dst_mem, conv_dst_mem);
     }
 
-    auto conv = convolution_forward(conv_prim_desc);
-
-    conv.execute(engine_stream, {{DNNL_ARG_SRC, conv_src_mem},
-                                 {DNNL_ARG_WEIGHTS, conv_weights_mem},
-                                 {DNNL_ARG_DST, conv_dst_mem}});
+    conv->primitive.execute(engine_stream,
+                            {{DNNL_ARG_SRC, conv_src_mem},
+                             {DNNL_ARG_WEIGHTS, conv_weights_mem},
+                             {DNNL_ARG_DST, conv_dst_mem}});
 
     if (conv_prim_desc.dst_desc() != dst_mem.get_desc())
         reorder(conv_dst_mem, dst_mem)
@@ -147,20 +155,29 @@ extern "C" int DnnlConv2d_Gradient_of_Data(const DLArrayHandle input_f,
     auto conv_gradient_y_mem = gradient_y_mem;
     auto conv_gradient_x_mem = gradient_x_mem;
 
-    auto gradient_data_d = convolution_backward_data::desc(
-        algorithm::convolution_auto, conv_gradient_x_md, conv_input_f_md,
-        conv_gradient_y_md, {stride, stride}, {padding, padding},
-        {padding, padding});
-    // forward
-    auto conv_desc = convolution_forward::desc(
-        prop_kind::forward, algorithm::convolution_auto, conv_gradient_x_md,
-        conv_input_f_md, conv_gradient_y_md, {stride, stride},
-        {padding, padding}, {padding, padding});
-    auto conv_prim_desc = convolution_forward::primitive_desc(conv_desc, eng);
-    // forward
-
-    auto gradient_data_pd = convolution_backward_data::primitive_desc(
-        gradient_data_d, eng, conv_prim_desc);
+    auto gradient_data = dnnl_cached(
+        DnnlKey("convolution_backward_data")
+            << input_f << gradient_y << gradient_x << padding << stride,
+        [&] {
+            auto gradient_data_d = convolution_backward_data::desc(
+                algorithm::convolution_auto, conv_gradient_x_md,
+                conv_input_f_md, conv_gradient_y_md, {stride, stride},
+                {padding, padding}, {padding, padding});
+            // forward
+            auto conv_desc = convolution_forward::desc(
+                prop_kind::forward, algorithm::convolution_auto,
+                conv_gradient_x_md, conv_input_f_md, conv_gradient_y_md,
+                {stride, stride}, {padding, padding}, {padding, padding});
+            auto conv_prim_desc =
+                convolution_forward::primitive_desc(conv_desc, eng);
+            // forward
+
+            auto gradient_data_pd = convolution_backward_data::primitive_desc(
+                gradient_data_d, eng, conv_prim_desc);
+            return DnnlPrimitiveWithDesc<convolution_backward_data>{
+                gradient_data_pd, convolution_backward_data(gradient_data_pd)};
+        });
+    auto &gradient_data_pd = gradient_data->pd;
 
     if (gradient_data_pd.weights_desc() != input_f_mem.get_desc()) {
         conv_input_f_mem = memory(gradient_data_pd.weights_desc(), eng);
@@ -178,12 +195,10 @@ extern "C" int DnnlConv2d_Gradient_of_Data(const DLArrayHandle input_f,
             .execute(engine_stream, gradient_x_mem, conv_gradient_x_mem);
     }
 
-    auto gradient_data = convolution_backward_data(gradient_data_pd);
-
-    gradient_data.execute(engine_stream,
-                          {{DNNL_ARG_DIFF_SRC, conv_gradient_x_mem},
-                           {DNNL_ARG_WEIGHTS, conv_input_f_mem},
-                           {DNNL_ARG_DIFF_DST, conv_gradient_y_mem}});
+    gradient_data->primitive.execute(
+        engine_stream, {{DNNL_ARG_DIFF_SRC, conv_gradient_x_mem},
+                        {DNNL_ARG_WEIGHTS, conv_input_f_mem},
+                        {DNNL_ARG_DIFF_DST, conv_gradient_y_mem}});
 
     if (gradient_data_pd.diff_src_desc() != gradient_x_mem.get_desc())
         reorder(conv_gradient_x_mem, gradient_x_mem)
@@ -241,22 +256,33 @@ extern "C" int DnnlConv2d_Gradient_of_Filter(const DLArrayHandle input_x,
         memory::desc({output_N, output_C, output_H, output_W},
                      memory::data_type::f32, memory::format_tag::any);
 
-    auto gradient_filter_d = convolution_backward_weights::desc(
-        algorithm::convolution_auto, conv_input_x_md, conv_gradient_f_md,
-        conv_gradient_y_md, {stride, stride}, {padding, padding},
-        {padding, padding});
-
-    // forward
-    auto conv_desc = convolution_forward::desc(
-        prop_kind::forward, algorithm::convolution_auto, conv_input_x_md,
-        conv_gradient_f_md, conv_gradient_y_md, {stride, stride},
-        {padding, padding}, {padding, padding});
-
-    auto conv_prim_desc = convolution_forward::primitive_desc(conv_desc, eng);
-    // forward
-
-    auto gradient_filter_pd = convolution_backward_weights::primitive_desc(
-        gradient_filter_d, eng, conv_prim_desc);
+    auto gradient_filter = dnnl_cached(
+        DnnlKey("convolution_backward_weights")
+            << input_x << gradient_y << gradient_f << padding << stride,
+        [&] {
+            auto gradient_filter_d = convolution_backward_weights::desc(
+                algorithm::convolution_auto, conv_input_x_md,
+                conv_gradient_f_md, conv_gradient_y_md, {stride, stride},
+                {padding, padding}, {padding, padding});
+
+            // forward
+            auto conv_desc = convolution_forward::desc(
+                prop_kind::forward, algorithm::convolution_auto,
+                conv_input_x_md, conv_gradient_f_md, conv_gradient_y_md,
+                {stride, stride}, {padding, padding}, {padding, padding});
+
+            auto conv_prim_desc =
+                convolution_forward::primitive_desc(conv_desc, eng);
+            // forward
+
+            auto gradient_filter_pd =
+                convolution_backward_weights::primitive_desc(
+                    gradient_filter_d, eng, conv_prim_desc);
+            return DnnlPrimitiveWithDesc<convolution_backward_weights>{
+                gradient_filter_pd,
+                convolution_backward_weights(gradient_filter_pd)};
+        });
+    auto &gradient_filter_pd = gradient_filter->pd;
 
     if (gradient_filter_pd.src_desc() != input_x_mem.get_desc()) {
         conv_input_x_mem = memory(gradient_filter_pd.src_desc(), eng);
@@ -274,12 +300,10 @@ extern "C" int DnnlConv2d_Gradient_of_Filter(const DLArrayHandle input_x,
         reorder(gradient_y_mem, conv_gradient_y_mem)
             .execute(engine_stream, gradient_y_mem, conv_gradient_y_mem);
     }
-    auto gradient_filter = convolution_backward_weights(gradient_filter_pd);
-
-    gradient_filter.execute(engine_stream,
-                            {{DNNL_ARG_SRC, conv_input_x_mem},
-                             {DNNL_ARG_DIFF_WEIGHTS, conv_gradient_f_mem},
-                             {DNNL_ARG_DIFF_DST, conv_gradient_y_mem}});
+    gradient_filter->primitive.execute(
+        engine_stream, {{DNNL_ARG_SRC, conv_input_x_mem},
+                        {DNNL_ARG_DIFF_WEIGHTS, conv_gradient_f_mem},
+                        {DNNL_ARG_DIFF_DST, conv_gradient_y_mem}});
     if (gradient_filter_pd.diff_weights_desc() != gradient_f_mem.get_desc())
         reorder(conv_gradient_f_mem, gradient_f_mem)
             .execute(engine_stream, conv_gradient_f_mem, gradient_f_mem);
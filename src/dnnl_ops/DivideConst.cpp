@@ -36,13 +36,20 @@ extern "C" int DnnlMatrixElementwiseDivideByConst(const DLArrayHandle input,
     auto src_mem = memory(mat_md, eng, input->data);
     auto dst_mem = memory(mat_md, eng, output->data);
 
-    auto DivideConst_d = eltwise_forward::desc(
-        prop_kind::forward_training, algorithm::eltwise_pow, mat_md, val, -1.f);
-    auto DivideConst_pd = eltwise_forward::primitive_desc(DivideConst_d, eng);
-    auto DivideConst = eltwise_forward(DivideConst_pd);
-
-    DivideConst.execute(engine_stream,
-                        {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
+    auto DivideConst =
+        dnnl_cached(DnnlKey("eltwise_forward")
+                        << algorithm::eltwise_pow << input << val << -1.f,
+                    [&] {
+                        auto DivideConst_d = eltwise_forward::desc(
+                            prop_kind::forward_training, algorithm::eltwise_pow,
+                            mat_md, val, -1.f);
+                        auto DivideConst_pd =
+                            eltwise_forward::primitive_desc(DivideConst_d, eng);
+                        return eltwise_forward(DivideConst_pd);
+                    });
+
+    DivideConst->execute(engine_stream,
+                         {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
     return 0;
 }
@@ -38,21 +38,32 @@ extern "C" int DnnlMatrixElementwiseDivide(const DLArrayHandle matA,
     auto temp_mem = memory(mat_md, eng, temp);
     auto dst_mem = memory(mat_md, eng, output->data);
 
-    auto Reciprocal_d = eltwise_forward::desc(
-        prop_kind::forward_training, algorithm::eltwise_pow, mat_md, 1.f, -1.f);
-    auto Reciprocal_pd = eltwise_forward::primitive_desc(Reciprocal_d, eng);
-    auto Reciprocal = eltwise_forward(Reciprocal_pd);
-    auto MultiplyElewise_d =
-        binary::desc(algorithm::binary_mul, mat_md, mat_md, mat_md);
-    auto MultiplyElewise_pd = binary::primitive_desc(MultiplyElewise_d, eng);
-    auto MultiplyElewise = binary(MultiplyElewise_pd);
+    auto Reciprocal =
+        dnnl_cached(DnnlKey("eltwise_forward")
+                        << algorithm::eltwise_pow << matA << 1.f << -1.f,
+                    [&] {
+                        auto Reciprocal_d = eltwise_forward::desc(
+                            prop_kind::forward_training, algorithm::eltwise_pow,
+                            mat_md, 1.f, -1.f);
+                        auto Reciprocal_pd =
+                            eltwise_forward::primitive_desc(Reciprocal_d, eng);
+                        return eltwise_forward(Reciprocal_pd);
+                    });
+    auto MultiplyElewise =
+        dnnl_cached(DnnlKey("binary") << algorithm::binary_mul << matA, [&] {
+            auto MultiplyElewise_d =
+                binary::desc(algorithm::binary_mul, mat_md, mat_md, mat_md);
+            auto MultiplyElewise_pd =
+                binary::primitive_desc(MultiplyElewise_d, eng);
+            return binary(MultiplyElewise_pd);
+        });
 
-    Reciprocal.execute(engine_stream,
-                       {{DNNL_ARG_SRC, srcB_mem}, {DNNL_ARG_DST, temp_mem}});
+    Reciprocal->execute(engine_stream,
+                        {{DNNL_ARG_SRC, srcB_mem}, {DNNL_ARG_DST, temp_mem}});
     engine_stream.wait();
-    MultiplyElewise.execute(engine_stream, {{DNNL_ARG_SRC_0, srcA_mem},
-                                            {DNNL_ARG_SRC_1, temp_mem},
-                                            {DNNL_ARG_DST, dst_mem}});
+    MultiplyElewise->execute(engine_stream, {{DNNL_ARG_SRC_0, srcA_mem},
+                                             {DNNL_ARG_SRC_1, temp_mem},
+                                             {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
     delete temp;
     return 0;
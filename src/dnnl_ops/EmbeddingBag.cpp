@@ -0,0 +1,193 @@
+#include <cassert>
+#include <cfloat>
+#include <cstring>
+#include <vector>
+#include <omp.h>
+
+#include "dnnl.hpp"
+
+#include "../common/c_runtime_api.h"
+#include "dnnl_runtime.h"
+
+// Bags are either the rows of ids along its last dimension (offsets NULL), or
+// ids[offsets[b]], ..., ids[offsets[b + 1] - 1] of a flat ids, the last bag
+// ending at the end of ids. Ids out of [0, num_embed) are padding: they are
+// skipped and not counted in the mean; an empty bag pools to zeros.
+enum EmbeddingBagMode { BAG_SUM = 0, BAG_MEAN = 1, BAG_MAX = 2 };
+
+static size_t num_entries(const DLArrayHandle ids) {
+    size_t size = 1;
+    for (int i = 0; i < ids->ndim; ++i)
+        size *= ids->shape[i];
+    return size;
+}
+
+// the entries of every bag, as a start of (num_bags + 1) offsets
+static void bag_starts(const DLArrayHandle ids, const DLArrayHandle offsets,
+                       size_t num_bags, std::vector<size_t> &starts) {
+    size_t nnz = num_entries(ids);
+    starts.resize(num_bags + 1);
+    if (offsets == NULL) {
+        size_t bag_size = ids->shape[ids->ndim - 1];
+        for (size_t b = 0; b <= num_bags; ++b)
+            starts[b] = b * bag_size;
+        return;
+    }
+    const int *off = (const int *)offsets->data;
+    for (size_t b = 0; b < num_bags; ++b)
+        starts[b] = off[b];
+    starts[num_bags] = nnz;
+}
+
+// embed is the table, or the rows of the entries one by one if gathered (as
+// pulled from the parameter server); argmax (max mode) keeps the entry of
+// the maximum of every bag and column, -1 for empty bags
+extern "C" int cpu_EmbeddingBag(const DLArrayHandle embed,
+                                const DLArrayHandle ids,
+                                const DLArrayHandle offsets,
+                                const DLArrayHandle weights,
+                                DLArrayHandle output, DLArrayHandle argmax,
+                                int mode, int num_embed, bool gathered) {
+    assert(mode == BAG_SUM || mode == BAG_MEAN || mode == BAG_MAX);
+    assert(mode != BAG_MAX || argmax != NULL);
+    const float *embed_data = (const float *)embed->data;
+    const int *index = (const int *)ids->data;
+    const float *weight = weights == NULL ? NULL : (const float *)weights->data;
+    float *out = (float *)output->data;
+    int *arg = argmax == NULL ? NULL : (int *)argmax->data;
+    size_t width = embed->shape[embed->ndim - 1];
+    size_t num_bags = num_entries(output) / width;
+    std::vector<size_t> starts;
+    bag_starts(ids, offsets, num_bags, starts);
+
+    // bags differ in length with offsets
+#pragma omp parallel for schedule(dynamic, 16)
+    for (size_t b = 0; b < num_bags; ++b) {
+        float *y = out + b * width;
+        int *cur_arg = arg == NULL ? NULL : arg + b * width;
+        if (mode == BAG_MAX) {
+            for (size_t k = 0; k < width; ++k) {
+                y[k] = -FLT_MAX;
+                cur_arg[k] = -1;
+            }
+        } else {
+            memset(y, 0, width * sizeof(float));
+        }
+        int count = 0;
+        for (size_t p = starts[b]; p < starts[b + 1]; ++p) {
+            int id = index[p];
+            if (id < 0 || id >= num_embed)
+                continue;
+            ++count;
+            const float *x = embed_data + (gathered ? p : id) * width;
+            if (mode == BAG_MAX) {
+                for (size_t k = 0; k < width; ++k) {
+                    if (x[k] > y[k]) {
+                        y[k] = x[k];
+                        cur_arg[k] = p;
+                    }
+                }
+            } else {
+                float w = weight == NULL ? 1 : weight[p];
+#pragma omp simd
+                for (size_t k = 0; k < width; ++k)
+                    y[k] += w * x[k];
+            }
+        }
+        if (mode == BAG_MEAN && count > 0) {
+            float scale = 1.f / count;
+#pragma omp simd
+            for (size_t k = 0; k < width; ++k)
+                y[k] *= scale;
+        } else if (mode == BAG_MAX && count == 0) {
+            memset(y, 0, width * sizeof(float));
+        }
+    }
+    return 0;
+}
+
+// The gradient of the table as indexed slices with distinct ids: the first
+// rows are the valid ids in ascending order, the rest are -1 with zeros.
+extern "C" int
+cpu_EmbeddingBagGradient(const DLArrayHandle out_grad, const DLArrayHandle ids,
+                         const DLArrayHandle offsets,
+                         const DLArrayHandle weights,
+                         const DLArrayHandle argmax, DLArrayHandle out_indices,
+                         DLArrayHandle out_values, int mode, int num_embed) {
+    assert(mode == BAG_SUM || mode == BAG_MEAN || mode == BAG_MAX);
+    assert(mode != BAG_MAX || argmax != NULL);
+    const float *grad = (const float *)out_grad->data;
+    const int *index = (const int *)ids->data;
+    const float *weight = weights == NULL ? NULL : (const float *)weights->data;
+    const int *arg = argmax == NULL ? NULL : (const int *)argmax->data;
+    int *out_ind = (int *)out_indices->data;
+    float *out_val = (float *)out_values->data;
+    size_t width = out_values->shape[out_values->ndim - 1];
+    size_t nnz = num_entries(ids);
+    size_t num_bags = num_entries(out_grad) / width;
+    std::vector<size_t> starts;
+    bag_starts(ids, offsets, num_bags, starts);
+
+    // the bag of every entry, and the valid entries of every bag for the mean
+    static thread_local std::vector<int> bags, counts, unique, positions,
+        lengths;
+    bags.resize(nnz);
+    counts.assign(num_bags, 0);
+    unique.resize(nnz);
+    positions.resize(nnz);
+    lengths.resize(nnz + 1);
+    // the buffers of this thread, shared with the others below
+    int *bag_of = bags.data(), *bag_count = counts.data();
+    const int *uniq = unique.data(), *id_offset = positions.data(),
+              *id_length = lengths.data();
+    const size_t *bag_start = starts.data();
+#pragma omp parallel for schedule(dynamic, 16)
+    for (size_t b = 0; b < num_bags; ++b) {
+        for (size_t p = bag_start[b]; p < bag_start[b + 1]; ++p) {
+            bag_of[p] = b;
+            if (index[p] >= 0 && index[p] < num_embed)
+                ++bag_count[b];
+        }
+    }
+    size_t nunique = unique_indices(index, nnz, unique.data(), positions.data(),
+                                    lengths.data());
+    // the distinct ids are sorted, the valid ones in between the padding
+    size_t lo = 0, hi = nunique;
+    while (lo < hi && uniq[lo] < 0)
+        ++lo;
+    while (hi > lo && uniq[hi - 1] >= num_embed)
+        --hi;
+    size_t nvalid = hi - lo;
+    size_t rowsize = width * sizeof(float);
+
+    // frequent ids make some rows much longer to reduce
+#pragma omp parallel for schedule(dynamic, 64)
+    for (size_t i = 0; i < nnz; ++i) {
+        float *y = out_val + i * width;
+        memset(y, 0, rowsize);
+        if (i >= nvalid) {
+            out_ind[i] = -1;
+            continue;
+        }
+        out_ind[i] = uniq[lo + i];
+        for (int j = id_length[lo + i]; j < id_length[lo + i + 1]; ++j) {
+            int p = id_offset[j];
+            int b = bag_of[p];
+            const float *dy = grad + b * width;
+            if (mode == BAG_MAX) {
+                const int *cur_arg = arg + b * width;
+                for (size_t k = 0; k < width; ++k) {
+                    if (cur_arg[k] == p)
+                        y[k] += dy[k];
+                }
+            } else {
+                float w = mode == BAG_MEAN ? 1.f / bag_count[b] :
+                                             (weight == NULL ? 1 : weight[p]);
+#pragma omp simd
+                for (size_t k = 0; k < width; ++k)
+                    y[k] += w * dy[k];
+            }
+        }
+    }
+    return 0;
+}
@@ -0,0 +1,133 @@
+#include <cassert>
+#include <cctype>
+#include <cmath>
+#include <cstdio>
+#include <iostream>
+#include <random>
+#include <stdexcept>
+#include <vector>
+#include <type_traits>
+#include <sys/time.h>
+#include <omp.h>
+
+#include "dnnl.hpp"
+
+#include "../common/c_runtime_api.h"
+#include "dnnl_runtime.h"
+
+// completed by omp, normalizing over the last dimension
+
+extern "C" int cpu_LayerNormalization(const DLArrayHandle in_arr,
+                                      const DLArrayHandle ln_scale,
+                                      const DLArrayHandle ln_bias,
+                                      DLArrayHandle mean_arr,
+                                      DLArrayHandle var_arr,
+                                      DLArrayHandle out_arr, float eps) {
+    int ndim = in_arr->ndim;
+    size_t last_dim = in_arr->shape[ndim - 1];
+    size_t rows = 1;
+    for (int i = 0; i < ndim - 1; ++i)
+        rows *= in_arr->shape[i];
+    const float *input = (const float *)in_arr->data;
+    const float *scale = (const float *)ln_scale->data;
+    const float *bias = (const float *)ln_bias->data;
+    float *mean = (float *)mean_arr->data;
+    float *var = (float *)var_arr->data;
+    float *output = (float *)out_arr->data;
+
+#pragma omp parallel for
+    for (size_t i = 0; i < rows; ++i) {
+        const float *x = input + i * last_dim;
+        float *y = output + i * last_dim;
+        float sum = 0;
+#pragma omp simd reduction(+ : sum)
+        for (size_t k = 0; k < last_dim; ++k)
+            sum += x[k];
+        float mu = sum / last_dim;
+        float square = 0;
+#pragma omp simd reduction(+ : square)
+        for (size_t k = 0; k < last_dim; ++k)
+            square += (x[k] - mu) * (x[k] - mu);
+        float sigma2 = square / last_dim;
+        mean[i] = mu;
+        var[i] = sigma2;
+        float rstd = 1 / sqrtf(sigma2 + eps);
+#pragma omp simd
+        for (size_t k = 0; k < last_dim; ++k)
+            y[k] = (x[k] - mu) * rstd * scale[k] + bias[k];
+    }
+    return 0;
+}
+
+extern "C" int cpu_LayerNormalizationGradient(
+    const DLArrayHandle out_grads, const DLArrayHandle in_arr,
+    const DLArrayHandle ln_scale, DLArrayHandle grad_arr,
+    DLArrayHandle grad_scale, DLArrayHandle grad_bias,
+    const DLArrayHandle mean_arr, const DLArrayHandle var_arr, float eps) {
+    int ndim = in_arr->ndim;
+    size_t last_dim = in_arr->shape[ndim - 1];
+    size_t rows = 1;
+    for (int i = 0; i < ndim - 1; ++i)
+        rows *= in_arr->shape[i];
+    const float *dy_data = (const float *)out_grads->data;
+    const float *input = (const float *)in_arr->data;
+    const float *scale = (const float *)ln_scale->data;
+    const float *mean = (const float *)mean_arr->data;
+    const float *var = (const float *)var_arr->data;
+    float *dx_data = (float *)grad_arr->data;
+    float *dscale = (float *)grad_scale->data;
+    float *dbias = (float *)grad_bias->data;
+
+    // the scale and bias gradients are summed over the rows of every thread,
+    // then over the threads in order
+    int max_threads = omp_get_max_threads();
+    std::vector<float> partial(2 * max_threads * last_dim, 0);
+    int num_threads = 1;
+#pragma omp parallel
+    {
+        int rank = omp_get_thread_num();
+#pragma omp single
+        num_threads = omp_get_num_threads();
+        float *cur_dscale = partial.data() + 2 * rank * last_dim;
+        float *cur_dbias = cur_dscale + last_dim;
+#pragma omp for
+        for (size_t i = 0; i < rows; ++i) {
+            const float *x = input + i * last_dim;
+            const float *dy = dy_data + i * last_dim;
+            float *dx = dx_data + i * last_dim;
+            float mu = mean[i];
+            float rstd = 1 / sqrtf(var[i] + eps);
+            // dx = rstd * (dxhat - mean(dxhat) - xhat * mean(dxhat * xhat))
+            float sum_dxhat = 0, sum_dxhat_xhat = 0;
+#pragma omp simd reduction(+ : sum_dxhat, sum_dxhat_xhat)
+            for (size_t k = 0; k < last_dim; ++k) {
+                float xhat = (x[k] - mu) * rstd;
+                float dxhat = dy[k] * scale[k];
+                sum_dxhat += dxhat;
+                sum_dxhat_xhat += dxhat * xhat;
+                cur_dscale[k] += dy[k] * xhat;
+                cur_dbias[k] += dy[k];
+            }
+            float mean_dxhat = sum_dxhat / last_dim;
+            float mean_dxhat_xhat = sum_dxhat_xhat / last_dim;
+#pragma omp simd
+            for (size_t k = 0; k < last_dim; ++k) {
+                float xhat = (x[k] - mu) * rstd;
+                dx[k] =
+                    rstd
+                    * (dy[k] * scale[k] - mean_dxhat - xhat * mean_dxhat_xhat);
+            }
+        }
+    }
+#pragma omp parallel for
+    for (size_t k = 0; k < last_dim; ++k) {
+        float cur_dscale = 0, cur_dbias = 0;
+        for (int t = 0; t < num_threads; ++t) {
+            cur_dscale += partial[2 * t * last_dim + k];
+            cur_dbias += partial[(2 * t + 1) * last_dim + k];
+        }
+        dscale[k] = cur_dscale;
+        dbias[k] = cur_dbias;
+    }
+    return 0;
+}
@@ -0,0 +1,160 @@
+#include <cassert>
+#include <cctype>
+#include <cmath>
+#include <cstdio>
+#include <iostream>
+#include <random>
+#include <stdexcept>
+#include <vector>
+#include <type_traits>
+#include <sys/time.h>
+
+#include "dnnl.hpp"
+
+#include "../common/c_runtime_api.h"
+#include "dnnl_runtime.h"
+
+using namespace dnnl;
+
+// activation codes shared with hetu.cpu_links.linear: 0 for none, then
+// relu, sigmoid, tanh and gelu
+static algorithm linear_activation(int activation) {
+    switch (activation) {
+    case 1:
+        return algorithm::eltwise_relu;
+    case 2:
+        return algorithm::eltwise_logistic;
+    case 3:
+        return algorithm::eltwise_tanh;
+    case 4:
+        return algorithm::eltwise_gelu_erf;
+    default:
+        assert(false);
+        return algorithm::undef;
+    }
+}
+
+// the backward algorithms computing the gradient from the forward output
+static algorithm activation_use_dst_for_bwd(int activation) {
+    switch (activation) {
+    case 1:
+        return algorithm::eltwise_relu_use_dst_for_bwd;
+    case 2:
+        return algorithm::eltwise_logistic_use_dst_for_bwd;
+    case 3:
+        return algorithm::eltwise_tanh_use_dst_for_bwd;
+    default:
+        assert(false);
+        return algorithm::undef;
+    }
+}
+
+// matC = activation(op(matA) op(matB) + bias) in one matmul primitive, with
+// the bias and the activation as its post-ops; bias may be NULL
+extern "C" int DnnlLinear(const DLArrayHandle matA, bool transposeA,
+                          const DLArrayHandle matB, bool transposeB,
+                          const DLArrayHandle bias, int activation,
+                          DLArrayHandle matC) {
+    dnnl_stream_init();
+
+    assert(matA->ndim == 2 && matB->ndim == 2 && matC->ndim == 2);
+    memory::desc srcA_md, srcB_md, bias_md, dst_md;
+    if (!transposeA)
+        srcA_md = memory::desc({matA->shape[0], matA->shape[1]},
+                               memory::data_type::f32, memory::format_tag::ab);
+    else
+        srcA_md = memory::desc({matA->shape[1], matA->shape[0]},
+                               memory::data_type::f32, memory::format_tag::ba);
+    if (!transposeB)
+        srcB_md = memory::desc({matB->shape[0], matB->shape[1]},
+                               memory::data_type::f32, memory::format_tag::ab);
+    else
+        srcB_md = memory::desc({matB->shape[1], matB->shape[0]},
+                               memory::data_type::f32, memory::format_tag::ba);
+    dst_md = memory::desc({matC->shape[0], matC->shape[1]},
+                          memory::data_type::f32, memory::format_tag::ab);
+    if (bias != NULL)
+        bias_md = memory::desc({1, matC->shape[1]}, memory::data_type::f32,
+                               memory::format_tag::ab);
+
+    auto srcA_mem = memory(srcA_md, eng, matA->data);
+    auto srcB_mem = memory(srcB_md, eng, matB->data);
+    auto dst_mem = memory(dst_md, eng, matC->data);
+
+    auto Linear = dnnl_cached(
+        DnnlKey("linear") << matA << transposeA << matB << transposeB
+                          << (bias != NULL) << activation << matC,
+        [&] {
+            primitive_attr attr;
+            if (activation != 0) {
+                post_ops ops;
+                ops.append_eltwise(1.f, linear_activation(activation), 0.f,
+                                   0.f);
+                attr.set_post_ops(ops);
+            }
+            auto Linear_d =
+                bias != NULL ? matmul::desc(srcA_md, srcB_md, bias_md, dst_md) :
+                               matmul::desc(srcA_md, srcB_md, dst_md);
+            auto Linear_pd = matmul::primitive_desc(Linear_d, attr, eng);
+            return matmul(Linear_pd);
+        });
+
+    if (bias != NULL) {
+        auto bias_mem = memory(bias_md, eng, bias->data);
+        Linear->execute(engine_stream, {{DNNL_ARG_SRC, srcA_mem},
+                                        {DNNL_ARG_WEIGHTS, srcB_mem},
+                                        {DNNL_ARG_BIAS, bias_mem},
+                                        {DNNL_ARG_DST, dst_mem}});
+    } else {
+        Linear->execute(engine_stream, {{DNNL_ARG_SRC, srcA_mem},
+                                        {DNNL_ARG_WEIGHTS, srcB_mem},
+                                        {DNNL_ARG_DST, dst_mem}});
+    }
+    engine_stream.wait();
+    return 0;
+}
+
+// grad = activation'(x) * in_grad, computed from output = activation(x), so
+// x needs not be kept; relu, sigmoid and tanh only
+extern "C" int DnnlActivationGradient(const DLArrayHandle output,
+                                      const DLArrayHandle in_grad,
+                                      int activation, DLArrayHandle grad) {
+    dnnl_stream_init();
+
+    std::vector<long int> shape, format;
+    for (int i = 0; i < output->ndim; i++)
+        shape.push_back(output->shape[i]);
+    format.resize(output->ndim);
+    format[(output->ndim) - 1] = 1;
+    for (int i = format.size() - 2; i >= 0; i--)
+        format[i] = format[i + 1] * shape[i + 1];
+    auto mat_md = memory::desc(shape, memory::data_type::f32, format);
+
+    auto output_mem = memory(mat_md, eng, output->data);
+    auto in_grad_mem = memory(mat_md, eng, in_grad->data);
+    auto grad_mem = memory(mat_md, eng, grad->data);
+
+    auto Gradient = dnnl_cached(
+        DnnlKey("eltwise_backward")
+            << activation_use_dst_for_bwd(activation) << output,
+        [&] {
+            // forward
+            auto Forward_d = eltwise_forward::desc(
+                prop_kind::forward_training,
+                activation_use_dst_for_bwd(activation), mat_md, 0.f, 0.f);
+            auto Forward_pd = eltwise_forward::primitive_desc(Forward_d, eng);
+
+            // backward
+            auto Gradient_d =
+                eltwise_backward::desc(activation_use_dst_for_bwd(activation),
+                                       mat_md, mat_md, 0.f, 0.f);
+            auto Gradient_pd =
+                eltwise_backward::primitive_desc(Gradient_d, eng, Forward_pd);
+            return eltwise_backward(Gradient_pd);
+        });
+    Gradient->execute(engine_stream, {{DNNL_ARG_DST, output_mem},
+                                      {DNNL_ARG_DIFF_DST, in_grad_mem},
+                                      {DNNL_ARG_DIFF_SRC, grad_mem}});
+    engine_stream.wait();
+    return 0;
+}
@@ -43,13 +43,17 @@ extern "C" int DnnlMatrixMultiply(const DLArrayHandle matA, bool transposeA,
     auto srcB_mem = memory(srcB_md, eng, matB->data);
     auto dst_mem = memory(dst_md, eng, matC->data);
 
-    auto Matmul_d = matmul::desc(srcA_md, srcB_md, dst_md);
-    auto Matmul_pd = matmul::primitive_desc(Matmul_d, eng);
-    auto Matmul = matmul(Matmul_pd);
-
-    Matmul.execute(engine_stream, {{DNNL_ARG_SRC, srcA_mem},
-                                   {DNNL_ARG_WEIGHTS, srcB_mem},
-                                   {DNNL_ARG_DST, dst_mem}});
+    auto Matmul = dnnl_cached(
+        DnnlKey("matmul") << matA << transposeA << matB << transposeB << matC,
+        [&] {
+            auto Matmul_d = matmul::desc(srcA_md, srcB_md, dst_md);
+            auto Matmul_pd = matmul::primitive_desc(Matmul_d, eng);
+            return matmul(Matmul_pd);
+        });
+
+    Matmul->execute(engine_stream, {{DNNL_ARG_SRC, srcA_mem},
+                                    {DNNL_ARG_WEIGHTS, srcB_mem},
+                                    {DNNL_ARG_DST, dst_mem}});
 
     engine_stream.wait();
     return 0;
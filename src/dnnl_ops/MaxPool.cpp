@@ -45,19 +45,32 @@ extern "C" int DnnlMaxPool(const DLArrayHandle input, const int kernel_H,
     auto output_data = memory(pool_dst_md, eng, (void *)output->data);
 
     //[Create pooling primitive]
-    auto pool_desc = pooling_forward::desc(
-        prop_kind::forward_inference, algorithm::pooling_max, pool_src_md,
-        pool_dst_md, pool_strides, pool_kernel, pool_padding, pool_padding);
-
-    auto pool_pd = pooling_forward::primitive_desc(pool_desc, eng);
-    auto pool_p = pooling_forward(pool_pd);
-
-    pool_p.execute(engine_stream,
-                   {{DNNL_ARG_SRC, input_data}, {DNNL_ARG_DST, output_data}});
+    auto pool_p = dnnl_cached(
+        DnnlKey("pooling_forward") << algorithm::pooling_max << input << output
+                                   << kernel_H << kernel_W << padding << stride,
+        [&] {
+            auto pool_desc = pooling_forward::desc(
+                prop_kind::forward_inference, algorithm::pooling_max,
+                pool_src_md, pool_dst_md, pool_strides, pool_kernel,
+                pool_padding, pool_padding);
+
+            auto pool_pd = pooling_forward::primitive_desc(pool_desc, eng);
+            return pooling_forward(pool_pd);
+        });
+
+    pool_p->execute(engine_stream,
+                    {{DNNL_ARG_SRC, input_data}, {DNNL_ARG_DST, output_data}});
 
     return 0;
 }
 
+// the forward pass is replayed for the workspace the backward pass reads
+struct MaxPoolGradient {
+    pooling_forward::primitive_desc pool_pd;
+    pooling_forward pool_p;
+    pooling_backward pooling_backward_p;
+};
+
 extern "C" int DnnlMaxPool_Gradient(const DLArrayHandle input,
                                     const DLArrayHandle input_grad,
                                     const int kernel_H, const int kernel_W,
@@ -87,36 +100,42 @@ extern "C" int DnnlMaxPool_Gradient(const DLArrayHandle input,
     auto output_grad_mem =
         memory(output_grad_md, eng, (void *)output_grad->data);
 
-    auto pooling_backward_d = pooling_backward::desc(
-        algorithm::pooling_max, output_grad_md, input_grad_md, {stride, stride},
-        {kernel_H, kernel_W}, {padding, padding}, {padding, padding});
+    auto pooling = dnnl_cached(
+        DnnlKey("max_pooling_gradient")
+            << input << input_grad << kernel_H << kernel_W << padding << stride,
+        [&] {
+            auto pooling_backward_d = pooling_backward::desc(
+                algorithm::pooling_max, output_grad_md, input_grad_md,
+                {stride, stride}, {kernel_H, kernel_W}, {padding, padding},
+                {padding, padding});
+
+            // forward
+            auto pool_desc = pooling_forward::desc(
+                prop_kind::forward_training, algorithm::pooling_max, input_md,
+                input_grad_md, {stride, stride}, {kernel_H, kernel_W},
+                {padding, padding}, {padding, padding});
+            auto pool_pd = pooling_forward::primitive_desc(pool_desc, eng);
+
+            // backward
+            auto pooling_backward_pd = pooling_backward::primitive_desc(
+                pooling_backward_d, eng, pool_pd);
+            return MaxPoolGradient{pool_pd, pooling_forward(pool_pd),
+                                   pooling_backward(pooling_backward_pd)};
+        });
 
     // forward
-    auto input_forward_md =
-        memory::desc({input_N, input_C, pooled_H, pooled_W},
-                     memory::data_type::f32, memory::format_tag::nchw);
-    auto input_forward_mem = memory(input_forward_md, eng);
-    auto pool_desc = pooling_forward::desc(
-        prop_kind::forward_training, algorithm::pooling_max, input_md,
-        input_forward_md, {stride, stride}, {kernel_H, kernel_W},
-        {padding, padding}, {padding, padding});
-    auto pool_pd = pooling_forward::primitive_desc(pool_desc, eng);
-    auto workspace_mem = memory(pool_pd.workspace_desc(), eng);
-    auto pool_p = pooling_forward(pool_pd);
-    pool_p.execute(engine_stream, {{DNNL_ARG_SRC, input_mem},
-                                   {DNNL_ARG_DST, input_forward_mem},
-                                   {DNNL_ARG_WORKSPACE, workspace_mem}});
+    auto input_forward_mem = memory(input_grad_md, eng);
+    auto workspace_mem = memory(pooling->pool_pd.workspace_desc(), eng);
+    pooling->pool_p.execute(engine_stream,
+                            {{DNNL_ARG_SRC, input_mem},
+                             {DNNL_ARG_DST, input_forward_mem},
+                             {DNNL_ARG_WORKSPACE, workspace_mem}});
 
     // backward
-    auto pooling_backward_pd =
-        pooling_backward::primitive_desc(pooling_backward_d, eng, pool_pd);
-
-    auto pooling_backward_p = pooling_backward(pooling_backward_pd);
-
-    pooling_backward_p.execute(engine_stream,
-                               {{DNNL_ARG_DIFF_SRC, output_grad_mem},
-                                {DNNL_ARG_WORKSPACE, workspace_mem},
-                                {DNNL_ARG_DIFF_DST, input_grad_mem}});
+    pooling->pooling_backward_p.execute(engine_stream,
+                                        {{DNNL_ARG_DIFF_SRC, output_grad_mem},
+                                         {DNNL_ARG_WORKSPACE, workspace_mem},
+                                         {DNNL_ARG_DIFF_DST, input_grad_mem}});
 
     engine_stream.wait();
     return 1;
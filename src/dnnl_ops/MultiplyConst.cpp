@@ -36,15 +36,20 @@ extern "C" int DnnlMatrixElementwiseMultiplyByConst(const DLArrayHandle input,
     auto src_mem = memory(mat_md, eng, input->data);
     auto dst_mem = memory(mat_md, eng, output->data);
 
-    auto MultiplyConst_d =
-        eltwise_forward::desc(prop_kind::forward_training,
-                              algorithm::eltwise_linear, mat_md, val, 0.f);
-    auto MultiplyConst_pd =
-        eltwise_forward::primitive_desc(MultiplyConst_d, eng);
-    auto MultiplyConst = eltwise_forward(MultiplyConst_pd);
-
-    MultiplyConst.execute(engine_stream,
-                          {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
+    auto MultiplyConst =
+        dnnl_cached(DnnlKey("eltwise_forward")
+                        << algorithm::eltwise_linear << input << val << 0.f,
+                    [&] {
+                        auto MultiplyConst_d = eltwise_forward::desc(
+                            prop_kind::forward_training,
+                            algorithm::eltwise_linear, mat_md, val, 0.f);
+                        auto MultiplyConst_pd = eltwise_forward::primitive_desc(
+                            MultiplyConst_d, eng);
+                        return eltwise_forward(MultiplyConst_pd);
+                    });
+
+    MultiplyConst->execute(engine_stream,
+                           {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
     return 0;
 }
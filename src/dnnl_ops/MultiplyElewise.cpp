@@ -35,14 +35,18 @@ extern "C" int DnnlMatrixElementwiseMultiply(const DLArrayHandle matA,
     auto srcA_mem = memory(mat_md, eng, matA->data);
     auto srcB_mem = memory(mat_md, eng, matB->data);
     auto dst_mem = memory(mat_md, eng, output->data);
-    auto MultiplyElewise_d =
-        binary::desc(algorithm::binary_mul, mat_md, mat_md, mat_md);
-    auto MultiplyElewise_pd = binary::primitive_desc(MultiplyElewise_d, eng);
-    auto MultiplyElewise = binary(MultiplyElewise_pd);
+    auto MultiplyElewise =
+        dnnl_cached(DnnlKey("binary") << algorithm::binary_mul << matA, [&] {
+            auto MultiplyElewise_d =
+                binary::desc(algorithm::binary_mul, mat_md, mat_md, mat_md);
+            auto MultiplyElewise_pd =
+                binary::primitive_desc(MultiplyElewise_d, eng);
+            return binary(MultiplyElewise_pd);
+        });
 
-    MultiplyElewise.execute(engine_stream, {{DNNL_ARG_SRC_0, srcA_mem},
-                                            {DNNL_ARG_SRC_1, srcB_mem},
-                                            {DNNL_ARG_DST, dst_mem}});
+    MultiplyElewise->execute(engine_stream, {{DNNL_ARG_SRC_0, srcA_mem},
+                                             {DNNL_ARG_SRC_1, srcB_mem},
+                                             {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
     return 0;
 }
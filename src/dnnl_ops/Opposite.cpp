@@ -33,14 +33,19 @@ extern "C" int DnnlOpposite(const DLArrayHandle input, DLArrayHandle output) {
     auto src_mem = memory(mat_md, eng, input->data);
     auto dst_mem = memory(mat_md, eng, output->data);
 
-    auto Opposite_d =
-        eltwise_forward::desc(prop_kind::forward_training,
-                              algorithm::eltwise_linear, mat_md, -1.f, 0.f);
-    auto Opposite_pd = eltwise_forward::primitive_desc(Opposite_d, eng);
-    auto Opposite = eltwise_forward(Opposite_pd);
+    auto Opposite = dnnl_cached(
+        DnnlKey("eltwise_forward")
+            << algorithm::eltwise_linear << input << -1.f << 0.f,
+        [&] {
+            auto Opposite_d = eltwise_forward::desc(prop_kind::forward_training,
+                                                    algorithm::eltwise_linear,
+                                                    mat_md, -1.f, 0.f);
+            auto Opposite_pd = eltwise_forward::primitive_desc(Opposite_d, eng);
+            return eltwise_forward(Opposite_pd);
+        });
 
-    Opposite.execute(engine_stream,
-                     {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
+    Opposite->execute(engine_stream,
+                      {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
     return 0;
 }
@@ -336,3 +336,206 @@ cpu_AdamOptimizerSparseUpdate(DLArrayHandle param, const DLArrayHandle indices,
 
     return 0;
 }
+
+// Multi-tensor ("foreach") updates: one call updates a whole list of dense
+// parameters, so that models with many small tensors do not pay one call per
+// tensor. The element ranges are cut into (tensor, chunk) work items that are
+// balanced across threads; l2 regularization is applied on the fly.
+
+const size_t kForeachChunk = 1 << 15;
+
+struct ForeachItem {
+    int tensor;
+    size_t begin;
+    size_t end;
+};
+
+static vector<ForeachItem> foreachItems(const DLArrayHandle *params, int n) {
+    vector<ForeachItem> items;
+    for (int t = 0; t < n; ++t) {
+        size_t num = arrSize(params[t]);
+        for (size_t begin = 0; begin < num; begin += kForeachChunk)
+            items.push_back({t, begin, min(begin + kForeachChunk, num)});
+    }
+    return items;
+}
+
+extern "C" int cpu_SGDOptimizerForeachUpdate(DLArrayHandle *params,
+                                             const DLArrayHandle *grads,
+                                             int n, float learning_rate,
+                                             float l2reg) {
+    auto items = foreachItems(params, n);
+#pragma omp parallel for schedule(dynamic)
+    for (size_t k = 0; k < items.size(); ++k) {
+        const ForeachItem &it = items[k];
+        float *param_data = (float *)(params[it.tensor]->data);
+        const float *grad_data = (const float *)(grads[it.tensor]->data);
+        for (size_t i = it.begin; i < it.end; ++i)
+            param_data[i] -=
+                learning_rate * (grad_data[i] + l2reg * param_data[i]);
+    }
+    return 0;
+}
+
+extern "C" int cpu_MomentumOptimizerForeachUpdate(
+    DLArrayHandle *params, const DLArrayHandle *grads,
+    DLArrayHandle *velocities, int n, float learning_rate, float momentum,
+    bool nesterov, float l2reg) {
+    auto items = foreachItems(params, n);
+#pragma omp parallel for schedule(dynamic)
+    for (size_t k = 0; k < items.size(); ++k) {
+        const ForeachItem &it = items[k];
+        float *param_data = (float *)(params[it.tensor]->data);
+        const float *grad_data = (const float *)(grads[it.tensor]->data);
+        float *velocity_data = (float *)(velocities[it.tensor]->data);
+        for (size_t i = it.begin; i < it.end; ++i) {
+            float lr_grad =
+                learning_rate * (grad_data[i] + l2reg * param_data[i]);
+            if (nesterov) {
+                velocity_data[i] = momentum * (velocity_data[i] - lr_grad);
+                param_data[i] = param_data[i] + velocity_data[i] - lr_grad;
+            } else {
+                velocity_data[i] = momentum * velocity_data[i] - lr_grad;
+                param_data[i] = param_data[i] + velocity_data[i];
+            }
+        }
+    }
+    return 0;
+}
+
+extern "C" int cpu_AdaGradOptimizerForeachUpdate(DLArrayHandle *params,
+                                                 const DLArrayHandle *grads,
+                                                 DLArrayHandle *accs, int n,
+                                                 float learning_rate,
+                                                 float eps, float l2reg) {
+    auto items = foreachItems(params, n);
+#pragma omp parallel for schedule(dynamic)
+    for (size_t k = 0; k < items.size(); ++k) {
+        const ForeachItem &it = items[k];
+        float *param_data = (float *)(params[it.tensor]->data);
+        const float *grad_data = (const float *)(grads[it.tensor]->data);
+        float *acc_data = (float *)(accs[it.tensor]->data);
+        for (size_t i = it.begin; i < it.end; ++i) {
+            float cur_grad = grad_data[i] + l2reg * param_data[i];
+            acc_data[i] += cur_grad * cur_grad;
+            param_data[i] -=
+                learning_rate * cur_grad / (sqrtf(acc_data[i]) + eps);
+        }
+    }
+    return 0;
+}
+
+// maxvs is NULL unless amsgrad is used
+extern "C" int cpu_AdamOptimizerForeachUpdate(
+    DLArrayHandle *params, const DLArrayHandle *grads, DLArrayHandle *expavgs,
+    DLArrayHandle *expavgsqs, DLArrayHandle *maxvs, int n,
+    float learning_rate, float beta1, float beta2, DLArrayHandle betats,
+    float eps, float l2reg) {
+    float *betats_data = (float *)(betats->data);
+    float beta1t = betats_data[0], beta2t = betats_data[1];
+    auto items = foreachItems(params, n);
+#pragma omp parallel for schedule(dynamic)
+    for (size_t k = 0; k < items.size(); ++k) {
+        const ForeachItem &it = items[k];
+        float *param_data = (float *)(params[it.tensor]->data);
+        const float *grad_data = (const float *)(grads[it.tensor]->data);
+        float *expavg_data = (float *)(expavgs[it.tensor]->data);
+        float *expavgsq_data = (float *)(expavgsqs[it.tensor]->data);
+        float *maxv_data =
+            maxvs == NULL ? NULL : (float *)(maxvs[it.tensor]->data);
+        for (size_t i = it.begin; i < it.end; ++i) {
+            float cur_grad = grad_data[i] + l2reg * param_data[i];
+            expavg_data[i] = beta1 * expavg_data[i] + (1 - beta1) * cur_grad;
+            expavgsq_data[i] =
+                beta2 * expavgsq_data[i] + (1 - beta2) * cur_grad * cur_grad;
+            float v_local = expavgsq_data[i] / (1 - beta2t);
+            if (maxv_data != NULL) {
+                v_local = max(v_local, maxv_data[i]);
+                maxv_data[i] = v_local;
+            }
+            param_data[i] -= learning_rate * (expavg_data[i] / (1 - beta1t))
+                             / (sqrtf(v_local) + eps);
+        }
+    }
+    return 0;
+}
+
+extern "C" int cpu_AdamWOptimizerForeachUpdate(
+    DLArrayHandle *params, const DLArrayHandle *grads, DLArrayHandle *expavgs,
+    DLArrayHandle *expavgsqs, int n, float learning_rate, float beta1,
+    float beta2, float beta1t, float beta2t, float eps, float weight_decay) {
+    auto items = foreachItems(params, n);
+#pragma omp parallel for schedule(dynamic)
+    for (size_t k = 0; k < items.size(); ++k) {
+        const ForeachItem &it = items[k];
+        float *param_data = (float *)(params[it.tensor]->data);
+        const float *grad_data = (const float *)(grads[it.tensor]->data);
+        float *expavg_data = (float *)(expavgs[it.tensor]->data);
+        float *expavgsq_data = (float *)(expavgsqs[it.tensor]->data);
+        for (size_t i = it.begin; i < it.end; ++i) {
+            expavg_data[i] =
+                beta1 * expavg_data[i] + (1 - beta1) * grad_data[i];
+            expavgsq_data[i] = beta2 * expavgsq_data[i]
+                               + (1 - beta2) * grad_data[i] * grad_data[i];
+            float update = (expavg_data[i] / (1 - beta1t))
+                           / (sqrtf(expavgsq_data[i] / (1 - beta2t)) + eps);
+            param_data[i] -=
+                learning_rate * (update + weight_decay * param_data[i]);
+        }
+    }
+    return 0;
+}
+
+// two passes: moments and per-chunk squared norms, then the trust-ratio
+// scaled update once the norms of every tensor are known
+extern "C" int cpu_LambOptimizerForeachUpdate(
+    DLArrayHandle *params, const DLArrayHandle *grads, DLArrayHandle *expavgs,
+    DLArrayHandle *expavgsqs, int n, float learning_rate, float beta1,
+    float beta2, float beta1t, float beta2t, float eps, float weight_decay) {
+    auto items = foreachItems(params, n);
+    vector<double> param_sq(items.size()), update_sq(items.size());
+#pragma omp parallel for schedule(dynamic)
+    for (size_t k = 0; k < items.size(); ++k) {
+        const ForeachItem &it = items[k];
+        const float *param_data = (const float *)(params[it.tensor]->data);
+        const float *grad_data = (const float *)(grads[it.tensor]->data);
+        float *expavg_data = (float *)(expavgs[it.tensor]->data);
+        float *expavgsq_data = (float *)(expavgsqs[it.tensor]->data);
+        double cur_param_sq = 0, cur_update_sq = 0;
+        for (size_t i = it.begin; i < it.end; ++i) {
+            expavg_data[i] =
+                beta1 * expavg_data[i] + (1 - beta1) * grad_data[i];
+            expavgsq_data[i] = beta2 * expavgsq_data[i]
+                               + (1 - beta2) * grad_data[i] * grad_data[i];
+            float update = (expavg_data[i] / (1 - beta1t))
+                           / (sqrtf(expavgsq_data[i] / (1 - beta2t)) + eps);
+            cur_param_sq += param_data[i] * param_data[i];
+            cur_update_sq += update * update;
+        }
+        param_sq[k] = cur_param_sq;
+        update_sq[k] = cur_update_sq;
+    }
+    vector<double> norm_param(n, 0), norm_update(n, 0);
+    for (size_t k = 0; k < items.size(); ++k) {
+        norm_param[items[k].tensor] += param_sq[k];
+        norm_update[items[k].tensor] += update_sq[k];
+    }
+    vector<float> ratios(n);
+    for (int t = 0; t < n; ++t)
+        ratios[t] = sqrt(norm_param[t]) / sqrt(norm_update[t]);
+#pragma omp parallel for schedule(dynamic)
+    for (size_t k = 0; k < items.size(); ++k) {
+        const ForeachItem &it = items[k];
+        float *param_data = (float *)(params[it.tensor]->data);
+        const float *expavg_data = (const float *)(expavgs[it.tensor]->data);
+        const float *expavgsq_data =
+            (const float *)(expavgsqs[it.tensor]->data);
+        float scale = learning_rate * ratios[it.tensor];
+        for (size_t i = it.begin; i < it.end; ++i) {
+            float update = (expavg_data[i] / (1 - beta1t))
+                           / (sqrtf(expavgsq_data[i] / (1 - beta2t)) + eps);
+            param_data[i] -= scale * (update + weight_decay * param_data[i]);
+        }
+    }
+    return 0;
+}
@@ -9,7 +9,7 @@
 #include <vector>
 #include <type_traits>
 #include <sys/time.h>
-#include <map>
+#include <cstring>
 
 #include "dnnl.hpp"
 
@@ -18,48 +18,62 @@
 using namespace dnnl;
 using namespace std;
 
+// the rows of in_values summed by index, in_params (if not NULL) copied at the
+// first row of every index
+template <typename T>
+static void reduce_indexed_slice(const T *dup_index, size_t dup_index_size,
+                                 size_t width, const float *in_val,
+                                 const float *in_par, T *out_ind,
+                                 float *out_val, float *out_par) {
+    static thread_local vector<int> positions, lengths;
+    positions.resize(dup_index_size);
+    lengths.resize(dup_index_size + 1);
+    size_t index_size = unique_indices(dup_index, dup_index_size, out_ind,
+                                       positions.data(), lengths.data());
+    const int *id_offset = positions.data();
+    const int *id_length = lengths.data();
+    size_t rowsize = sizeof(float) * width;
+
+    // frequent indices make some rows much longer to reduce
+#pragma omp parallel for schedule(dynamic, 64)
+    for (size_t i = 0; i < dup_index_size; ++i) {
+        size_t cur_offset = i * width;
+        if (i >= index_size) {
+            out_ind[i] = -1;
+            memset(out_val + cur_offset, 0, rowsize);
+            if (out_par != NULL)
+                memset(out_par + cur_offset, 0, rowsize);
+            continue;
+        }
+        int l = id_length[i], r = id_length[i + 1];
+        size_t ori_offset = id_offset[l] * width;
+        if (out_par != NULL)
+            memcpy(out_par + cur_offset, in_par + ori_offset, rowsize);
+        memcpy(out_val + cur_offset, in_val + ori_offset, rowsize);
+        for (int j = l + 1; j < r; ++j) {
+            ori_offset = id_offset[j] * width;
+            for (size_t k = 0; k < width; ++k) {
+                out_val[cur_offset + k] += in_val[ori_offset + k];
+            }
+        }
+    }
+}
+
 extern "C" int cpu_ReduceIndexedSlice(const DLArrayHandle in_indices,
                                       const DLArrayHandle in_values,
                                       DLArrayHandle out_indices,
                                       DLArrayHandle out_values) {
-    map<int, vector<size_t>> idx2map;
     size_t dup_index_size = 1;
     for (int i = 0; i < in_indices->ndim; ++i) {
         dup_index_size *= in_indices->shape[i];
     }
     size_t width = in_values->shape[in_values->ndim - 1];
-    const int *dup_index = (const int *)in_indices->data;
-    const float *in_val = (const float *)in_values->data;
-    int *out_ind = (int *)out_indices->data;
-    float *out_val = (float *)out_values->data;
-    for (size_t i = 0; i < dup_index_size; ++i) {
-        idx2map[dup_index[i]].emplace_back(i);
-        out_ind[i] = -1;
-    }
-
-    size_t index_size = idx2map.size();
-    size_t num_all = dup_index_size * width;
-
-    vector<pair<int, vector<size_t>>> idx2vector(idx2map.begin(),
-                                                 idx2map.end());
-
-#pragma omp parallel for
-    for (size_t i = 0; i < num_all; ++i)
-        out_val[i] = 0;
-
-#pragma omp parallel for
-    for (size_t i = 0; i < index_size; ++i) {
-        auto cur_pair = idx2vector[i];
-        out_ind[i] = cur_pair.first;
-        size_t cur_offset = i * width;
-        for (auto j : cur_pair.second) {
-            size_t ori_offset = j * width;
-            for (size_t k = 0; k < width; ++k) {
-                out_val[cur_offset + k] += in_val[ori_offset + k];
-            }
-        }
-    }
-
+    HT_DISPATCH_INDEX_TYPES(in_indices->dtype, id_t, [&]() {
+        reduce_indexed_slice((const id_t *)in_indices->data, dup_index_size,
+                             width, (const float *)in_values->data,
+                             (const float *)NULL, (id_t *)out_indices->data,
+                             (float *)out_values->data, (float *)NULL);
+    });
     return 0;
 }
 
@@ -67,52 +81,18 @@ extern "C" int cpu_ReduceIndexedSliceWithEmbedding(
     const DLArrayHandle in_indices, const DLArrayHandle in_values,
     const DLArrayHandle in_params, DLArrayHandle out_indices,
     DLArrayHandle out_values, DLArrayHandle out_params) {
-    map<int, vector<size_t>> idx2map;
     size_t dup_index_size = 1;
     for (int i = 0; i < in_indices->ndim; ++i) {
         dup_index_size *= in_indices->shape[i];
     }
     size_t width = in_values->shape[in_values->ndim - 1];
-    const int *dup_index = (const int *)in_indices->data;
-    const float *in_val = (const float *)in_values->data;
-    const float *in_par = (const float *)in_params->data;
-    int *out_ind = (int *)out_indices->data;
-    float *out_val = (float *)out_values->data;
-    float *out_par = (float *)out_params->data;
-    for (size_t i = 0; i < dup_index_size; ++i) {
-        idx2map[dup_index[i]].emplace_back(i);
-        out_ind[i] = -1;
-    }
-
-    size_t index_size = idx2map.size();
-    size_t num_all = dup_index_size * width;
-
-    vector<pair<int, vector<size_t>>> idx2vector(idx2map.begin(),
-                                                 idx2map.end());
-
-#pragma omp parallel for
-    for (size_t i = 0; i < num_all; ++i) {
-        out_val[i] = 0;
-        out_par[i] = 0;
-    }
-
-#pragma omp parallel for
-    for (size_t i = 0; i < index_size; ++i) {
-        auto cur_pair = idx2vector[i];
-        out_ind[i] = cur_pair.first;
-        size_t cur_offset = i * width;
-        size_t ori_offset = cur_pair.second[0] * width;
-        for (size_t k = 0; k < width; ++k) {
-            out_par[cur_offset + k] = in_par[ori_offset + k];
-        }
-        for (auto j : cur_pair.second) {
-            ori_offset = j * width;
-            for (size_t k = 0; k < width; ++k) {
-                out_val[cur_offset + k] += in_val[ori_offset + k];
-            }
-        }
-    }
-
+    HT_DISPATCH_INDEX_TYPES(in_indices->dtype, id_t, [&]() {
+        reduce_indexed_slice(
+            (const id_t *)in_indices->data, dup_index_size, width,
+            (const float *)in_values->data, (const float *)in_params->data,
+            (id_t *)out_indices->data, (float *)out_values->data,
+            (float *)out_params->data);
+    });
     return 0;
 }
 
@@ -33,13 +33,19 @@ extern "C" int DnnlRelu(const DLArrayHandle input, DLArrayHandle output) {
     auto src_mem = memory(mat_md, eng, input->data);
     auto dst_mem = memory(mat_md, eng, output->data);
 
-    auto Relu_d = eltwise_forward::desc(
-        prop_kind::forward_training, algorithm::eltwise_relu, mat_md, 0.f, 0.f);
-    auto Relu_pd = eltwise_forward::primitive_desc(Relu_d, eng);
-    auto Relu = eltwise_forward(Relu_pd);
+    auto Relu = dnnl_cached(
+        DnnlKey("eltwise_forward")
+            << algorithm::eltwise_relu << input << 0.f << 0.f,
+        [&] {
+            auto Relu_d = eltwise_forward::desc(prop_kind::forward_training,
+                                                algorithm::eltwise_relu, mat_md,
+                                                0.f, 0.f);
+            auto Relu_pd = eltwise_forward::primitive_desc(Relu_d, eng);
+            return eltwise_forward(Relu_pd);
+        });
 
-    Relu.execute(engine_stream,
-                 {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
+    Relu->execute(engine_stream,
+                  {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
     return 0;
 }
@@ -64,20 +70,23 @@ extern "C" int DnnlRelu_Gradient(const DLArrayHandle input,
     auto in_grad_mem = memory(in_grad_md, eng, in_grad->data);
     auto output_mem = memory(output_md, eng, output->data);
 
-    // forward
-    auto Relu_d = eltwise_forward::desc(prop_kind::forward_training,
-                                        algorithm::eltwise_relu, input_md);
-    auto Relu_pd = eltwise_forward::primitive_desc(Relu_d, eng);
+    auto Relu_gradient_p = dnnl_cached(
+        DnnlKey("eltwise_backward") << algorithm::eltwise_relu << input, [&] {
+            // forward
+            auto Relu_d = eltwise_forward::desc(
+                prop_kind::forward_training, algorithm::eltwise_relu, input_md);
+            auto Relu_pd = eltwise_forward::primitive_desc(Relu_d, eng);
 
-    // backward
-    auto Relu_gradient_d =
-        eltwise_backward::desc(algorithm::eltwise_relu, in_grad_md, output_md);
-    auto Relu_gradient_pd =
-        eltwise_backward::primitive_desc(Relu_gradient_d, eng, Relu_pd);
-    auto Relu_gradient_p = eltwise_backward(Relu_gradient_pd);
-    Relu_gradient_p.execute(engine_stream, {{DNNL_ARG_SRC, input_mem},
-                                            {DNNL_ARG_DIFF_DST, in_grad_mem},
-                                            {DNNL_ARG_DIFF_SRC, output_mem}});
+            // backward
+            auto Relu_gradient_d = eltwise_backward::desc(
+                algorithm::eltwise_relu, in_grad_md, output_md);
+            auto Relu_gradient_pd =
+                eltwise_backward::primitive_desc(Relu_gradient_d, eng, Relu_pd);
+            return eltwise_backward(Relu_gradient_pd);
+        });
+    Relu_gradient_p->execute(engine_stream, {{DNNL_ARG_SRC, input_mem},
+                                             {DNNL_ARG_DIFF_DST, in_grad_mem},
+                                             {DNNL_ARG_DIFF_SRC, output_mem}});
     engine_stream.wait();
     return 0;
 }
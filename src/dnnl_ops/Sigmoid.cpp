@@ -33,14 +33,19 @@ extern "C" int DnnlSigmoid(const DLArrayHandle input, DLArrayHandle output) {
     auto src_mem = memory(mat_md, eng, input->data);
     auto dst_mem = memory(mat_md, eng, output->data);
 
-    auto Sigmoid_d =
-        eltwise_forward::desc(prop_kind::forward_training,
-                              algorithm::eltwise_logistic, mat_md, 0.f, 0.f);
-    auto Sigmoid_pd = eltwise_forward::primitive_desc(Sigmoid_d, eng);
-    auto Sigmoid = eltwise_forward(Sigmoid_pd);
+    auto Sigmoid = dnnl_cached(
+        DnnlKey("eltwise_forward")
+            << algorithm::eltwise_logistic << input << 0.f << 0.f,
+        [&] {
+            auto Sigmoid_d = eltwise_forward::desc(prop_kind::forward_training,
+                                                   algorithm::eltwise_logistic,
+                                                   mat_md, 0.f, 0.f);
+            auto Sigmoid_pd = eltwise_forward::primitive_desc(Sigmoid_d, eng);
+            return eltwise_forward(Sigmoid_pd);
+        });
 
-    Sigmoid.execute(engine_stream,
-                    {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
+    Sigmoid->execute(engine_stream,
+                     {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
     return 0;
 }
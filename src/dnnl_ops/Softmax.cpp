@@ -17,24 +17,67 @@ using namespace dnnl;
 
 // DLArrayHandle A,B,C,D;
 
+// softmax over the last dimension, the others are collapsed into the rows
+static memory::desc softmax_rows_md(const DLArrayHandle arr) {
+    memory::dim rows = 1;
+    for (int i = 0; i < arr->ndim - 1; ++i)
+        rows *= arr->shape[i];
+    return memory::desc({rows, arr->shape[arr->ndim - 1]},
+                        memory::data_type::f32, memory::format_tag::ab);
+}
+
 extern "C" int DnnlSoftmax(const DLArrayHandle input, DLArrayHandle output) {
     // engine eng(engine::kind::cpu, 0);
     // stream engine_stream(eng);
     dnnl_stream_init();
 
-    assert(input->ndim == 2);
-    auto mat_md = memory::desc({input->shape[0], input->shape[1]},
-                               memory::data_type::f32, memory::format_tag::ab);
+    auto mat_md = softmax_rows_md(input);
     auto src_mem = memory(mat_md, eng, input->data);
     auto dst_softmax_mem = memory(mat_md, eng, output->data);
 
-    auto softmax_d =
-        softmax_forward::desc(prop_kind::forward_training, mat_md, 1);
-    auto softmax_pd = softmax_forward::primitive_desc(softmax_d, eng);
-    auto softmax = softmax_forward(softmax_pd);
+    auto softmax =
+        dnnl_cached(DnnlKey("softmax_forward") << mat_md.dims() << 1, [&] {
+            auto softmax_d =
+                softmax_forward::desc(prop_kind::forward_training, mat_md, 1);
+            auto softmax_pd = softmax_forward::primitive_desc(softmax_d, eng);
+            return softmax_forward(softmax_pd);
+        });
+
+    softmax->execute(engine_stream, {{DNNL_ARG_SRC, src_mem},
+                                     {DNNL_ARG_DST, dst_softmax_mem}});
+    engine_stream.wait();
+    return 0;
+}
+
+// grad = y * (in_grad - sum(in_grad * y)) from the forward output y
+extern "C" int DnnlSoftmaxGradient(const DLArrayHandle output,
+                                   const DLArrayHandle in_grad,
+                                   DLArrayHandle grad) {
+    dnnl_stream_init();
+
+    auto mat_md = softmax_rows_md(output);
+    auto dst_mem = memory(mat_md, eng, output->data);
+    auto diff_dst_mem = memory(mat_md, eng, in_grad->data);
+    auto diff_src_mem = memory(mat_md, eng, grad->data);
+
+    auto softmax_gradient =
+        dnnl_cached(DnnlKey("softmax_backward") << mat_md.dims() << 1, [&] {
+            // forward
+            auto softmax_d =
+                softmax_forward::desc(prop_kind::forward_training, mat_md, 1);
+            auto softmax_pd = softmax_forward::primitive_desc(softmax_d, eng);
+
+            // backward
+            auto softmax_gradient_d = softmax_backward::desc(mat_md, mat_md, 1);
+            auto softmax_gradient_pd = softmax_backward::primitive_desc(
+                softmax_gradient_d, eng, softmax_pd);
+            return softmax_backward(softmax_gradient_pd);
+        });
 
-    softmax.execute(engine_stream,
-                    {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_softmax_mem}});
+    softmax_gradient->execute(engine_stream,
+                              {{DNNL_ARG_DST, dst_mem},
+                               {DNNL_ARG_DIFF_DST, diff_dst_mem},
+                               {DNNL_ARG_DIFF_SRC, diff_src_mem}});
     engine_stream.wait();
     return 0;
 }
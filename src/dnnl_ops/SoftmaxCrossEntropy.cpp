@@ -32,13 +32,16 @@ extern "C" int DnnlSoftmaxCrossEntropy(const DLArrayHandle A,
     auto src_mem_2 = memory(mat_md, eng, B->data);
     auto dst_logsoftmax_mem = memory(mat_md, eng, C);
 
-    auto Logsoftmax_d =
-        logsoftmax_forward::desc(prop_kind::forward_training, mat_md, 1);
-    auto Logsoftmax_pd = logsoftmax_forward::primitive_desc(Logsoftmax_d, eng);
-    auto Logsoftmax = logsoftmax_forward(Logsoftmax_pd);
+    auto Logsoftmax = dnnl_cached(DnnlKey("logsoftmax_forward") << A << 1, [&] {
+        auto Logsoftmax_d =
+            logsoftmax_forward::desc(prop_kind::forward_training, mat_md, 1);
+        auto Logsoftmax_pd =
+            logsoftmax_forward::primitive_desc(Logsoftmax_d, eng);
+        return logsoftmax_forward(Logsoftmax_pd);
+    });
 
-    Logsoftmax.execute(engine_stream, {{DNNL_ARG_SRC, src_mem_1},
-                                       {DNNL_ARG_DST, dst_logsoftmax_mem}});
+    Logsoftmax->execute(engine_stream, {{DNNL_ARG_SRC, src_mem_1},
+                                        {DNNL_ARG_DST, dst_logsoftmax_mem}});
     // engine_stream.wait();
     float *output_data = (float *)output->data;
 #pragma omp parallel for
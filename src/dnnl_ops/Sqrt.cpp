@@ -33,13 +33,19 @@ extern "C" int DnnlSqrt(const DLArrayHandle input, DLArrayHandle output) {
     auto src_mem = memory(mat_md, eng, input->data);
     auto dst_mem = memory(mat_md, eng, output->data);
 
-    auto Sqrt_d = eltwise_forward::desc(
-        prop_kind::forward_training, algorithm::eltwise_sqrt, mat_md, 0.f, 0.f);
-    auto Sqrt_pd = eltwise_forward::primitive_desc(Sqrt_d, eng);
-    auto Sqrt = eltwise_forward(Sqrt_pd);
-
-    Sqrt.execute(engine_stream,
-                 {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
+    auto Sqrt = dnnl_cached(
+        DnnlKey("eltwise_forward")
+            << algorithm::eltwise_sqrt << input << 0.f << 0.f,
+        [&] {
+            auto Sqrt_d = eltwise_forward::desc(prop_kind::forward_training,
+                                                algorithm::eltwise_sqrt, mat_md,
+                                                0.f, 0.f);
+            auto Sqrt_pd = eltwise_forward::primitive_desc(Sqrt_d, eng);
+            return eltwise_forward(Sqrt_pd);
+        });
+
+    Sqrt->execute(engine_stream,
+                  {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
     return 0;
 }
@@ -69,22 +75,34 @@ extern "C" int DnnlReciprocalSqrt(const DLArrayHandle input,
     auto temp_mem = memory(mat_md, eng, temp);
     auto dst_mem = memory(mat_md, eng, output->data);
 
-    auto Sqrt_d = eltwise_forward::desc(prop_kind::forward_training,
-                                        algorithm::eltwise_sqrt, mat_md);
-    auto Sqrt_pd = eltwise_forward::primitive_desc(Sqrt_d, eng);
-    auto Sqrt = eltwise_forward(Sqrt_pd);
-
-    Sqrt.execute(engine_stream,
-                 {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, temp_mem}});
+    auto Sqrt = dnnl_cached(
+        DnnlKey("eltwise_forward")
+            << algorithm::eltwise_sqrt << input << 0.f << 0.f,
+        [&] {
+            auto Sqrt_d = eltwise_forward::desc(
+                prop_kind::forward_training, algorithm::eltwise_sqrt, mat_md);
+            auto Sqrt_pd = eltwise_forward::primitive_desc(Sqrt_d, eng);
+            return eltwise_forward(Sqrt_pd);
+        });
+
+    Sqrt->execute(engine_stream,
+                  {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, temp_mem}});
     engine_stream.wait();
 
-    auto DivideConst_d = eltwise_forward::desc(
-        prop_kind::forward_training, algorithm::eltwise_pow, mat_md, 1, -1.f);
-    auto DivideConst_pd = eltwise_forward::primitive_desc(DivideConst_d, eng);
-    auto DivideConst = eltwise_forward(DivideConst_pd);
-
-    DivideConst.execute(engine_stream,
-                        {{DNNL_ARG_SRC, temp_mem}, {DNNL_ARG_DST, dst_mem}});
+    auto DivideConst =
+        dnnl_cached(DnnlKey("eltwise_forward")
+                        << algorithm::eltwise_pow << input << 1.f << -1.f,
+                    [&] {
+                        auto DivideConst_d = eltwise_forward::desc(
+                            prop_kind::forward_training, algorithm::eltwise_pow,
+                            mat_md, 1, -1.f);
+                        auto DivideConst_pd =
+                            eltwise_forward::primitive_desc(DivideConst_d, eng);
+                        return eltwise_forward(DivideConst_pd);
+                    });
+
+    DivideConst->execute(engine_stream,
+                         {{DNNL_ARG_SRC, temp_mem}, {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
 
     delete temp;
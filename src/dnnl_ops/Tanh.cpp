@@ -33,13 +33,19 @@ extern "C" int DnnlTanh(const DLArrayHandle input, DLArrayHandle output) {
     auto src_mem = memory(mat_md, eng, input->data);
     auto dst_mem = memory(mat_md, eng, output->data);
 
-    auto Tanh_d = eltwise_forward::desc(
-        prop_kind::forward_training, algorithm::eltwise_tanh, mat_md, 0.f, 0.f);
-    auto Tanh_pd = eltwise_forward::primitive_desc(Tanh_d, eng);
-    auto Tanh = eltwise_forward(Tanh_pd);
+    auto Tanh = dnnl_cached(
+        DnnlKey("eltwise_forward")
+            << algorithm::eltwise_tanh << input << 0.f << 0.f,
+        [&] {
+            auto Tanh_d = eltwise_forward::desc(prop_kind::forward_training,
+                                                algorithm::eltwise_tanh, mat_md,
+                                                0.f, 0.f);
+            auto Tanh_pd = eltwise_forward::primitive_desc(Tanh_d, eng);
+            return eltwise_forward(Tanh_pd);
+        });
 
-    Tanh.execute(engine_stream,
-                 {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
+    Tanh->execute(engine_stream,
+                  {{DNNL_ARG_SRC, src_mem}, {DNNL_ARG_DST, dst_mem}});
     engine_stream.wait();
     return 0;
 }
@@ -1,4 +1,6 @@
 
+#include <algorithm>
+#include <cassert>
 #include <cctype>
 #include <cmath>
 #include <cstdio>
@@ -9,7 +11,7 @@
 #include <vector>
 #include <type_traits>
 #include <sys/time.h>
-#include <map>
+#include <omp.h>
 
 #include "dnnl.hpp"
 
@@ -18,42 +20,163 @@
 using namespace dnnl;
 using namespace std;
 
+// 11 bits a pass, ids within 2^22 of each other take two passes
+static const int RADIX_BITS = 11;
+static const size_t RADIX = size_t(1) << RADIX_BITS;
+// fewer ids are sorted by one thread
+static const size_t UNIQUE_PARALLEL_SIZE = 1 << 15;
+
+template <typename K>
+struct UniqueScratch {
+    vector<K> keys[2];
+    vector<int> positions;
+    // the digit counts of every thread, then where its ids go
+    vector<size_t> counts;
+    // the distinct ids before every thread's part
+    vector<size_t> starts;
+};
+
+template <typename K>
+static UniqueScratch<K> &unique_scratch() {
+    static thread_local UniqueScratch<K> scratch;
+    return scratch;
+}
+
+template <typename T>
+size_t unique_indices(const T *ids, size_t n, T *unique, int *positions,
+                      int *lengths) {
+    using K = typename make_unsigned<T>::type;
+    lengths[0] = 0;
+    if (n == 0)
+        return 0;
+    int max_threads = n < UNIQUE_PARALLEL_SIZE ? 1 : omp_get_max_threads();
+
+    // the keys are the ids less the smallest one, only the digits of the
+    // largest key are sorted
+    T lo = ids[0], hi = ids[0];
+#pragma omp parallel for num_threads(max_threads) reduction(min : lo)          \
+    reduction(max : hi)
+    for (size_t i = 0; i < n; ++i) {
+        lo = min(lo, ids[i]);
+        hi = max(hi, ids[i]);
+    }
+    K range = K(hi) - K(lo);
+    int passes = 0;
+    while (passes * RADIX_BITS < int(sizeof(K) * 8)
+           && (range >> (passes * RADIX_BITS)) != 0)
+        ++passes;
+
+    UniqueScratch<K> &scratch = unique_scratch<K>();
+    scratch.keys[0].resize(n);
+    scratch.keys[1].resize(n);
+    if (passes > 1)
+        scratch.positions.resize(n);
+    scratch.counts.resize(max_threads * RADIX);
+    scratch.starts.assign(max_threads + 1, 0);
+    K *keys[2] = {scratch.keys[0].data(), scratch.keys[1].data()};
+    size_t *counts = scratch.counts.data();
+    size_t *starts = scratch.starts.data();
+    // the positions alternate between scratch and positions, ending in
+    // positions after the last pass
+    int *pass_positions[2] = {positions, scratch.positions.data()};
+
+#pragma omp parallel num_threads(max_threads)
+    {
+        int num_threads = omp_get_num_threads();
+        int rank = omp_get_thread_num();
+        size_t begin = n * rank / num_threads;
+        size_t end = n * (rank + 1) / num_threads;
+        size_t *count = counts + rank * RADIX;
+
+        for (size_t i = begin; i < end; ++i)
+            keys[0][i] = K(ids[i]) - K(lo);
+        if (passes == 0) {
+            for (size_t i = begin; i < end; ++i)
+                positions[i] = int(i);
+        }
+        // stable LSD radix sort: every thread scatters its part of the ids
+        // after the same digits of the threads before it
+        for (int p = 0; p < passes; ++p) {
+            int shift = p * RADIX_BITS;
+            const K *src = keys[p % 2];
+            K *dst = keys[(p + 1) % 2];
+            const int *src_pos =
+                p == 0 ? nullptr : pass_positions[(passes - p) % 2];
+            int *dst_pos = pass_positions[(passes - 1 - p) % 2];
+            fill(count, count + RADIX, 0);
+            for (size_t i = begin; i < end; ++i)
+                ++count[(src[i] >> shift) & (RADIX - 1)];
+#pragma omp barrier
+#pragma omp single
+            {
+                size_t total = 0;
+                for (size_t d = 0; d < RADIX; ++d) {
+                    for (int t = 0; t < num_threads; ++t) {
+                        size_t cur = counts[t * RADIX + d];
+                        counts[t * RADIX + d] = total;
+                        total += cur;
+                    }
+                }
+            }
+            for (size_t i = begin; i < end; ++i) {
+                size_t j = count[(src[i] >> shift) & (RADIX - 1)]++;
+                dst[j] = src[i];
+                dst_pos[j] = src_pos ? src_pos[i] : int(i);
+            }
+#pragma omp barrier
+        }
+
+        // a distinct id starts wherever the sorted key changes
+        const K *sorted = keys[passes % 2];
+        size_t cnt = 0;
+        for (size_t i = begin; i < end; ++i)
+            cnt += i == 0 || sorted[i] != sorted[i - 1];
+        starts[rank + 1] = cnt;
+#pragma omp barrier
+#pragma omp single
+        {
+            for (int t = 0; t < max_threads; ++t)
+                starts[t + 1] += starts[t];
+        }
+        size_t j = starts[rank];
+        for (size_t i = begin; i < end; ++i) {
+            if (i == 0 || sorted[i] != sorted[i - 1]) {
+                unique[j] = T(sorted[i] + K(lo));
+                lengths[j] = int(i);
+                ++j;
+            }
+        }
+    }
+
+    size_t num_unique = starts[max_threads];
+    lengths[num_unique] = int(n);
+    return num_unique;
+}
+
+template size_t unique_indices<int32_t>(const int32_t *, size_t, int32_t *,
+                                        int *, int *);
+template size_t unique_indices<int64_t>(const int64_t *, size_t, int64_t *,
+                                        int *, int *);
+
 int cpu_UniqueIndices(const DLArrayHandle indices, DLArrayHandle output,
                       DLArrayHandle idoffsets) {
-    map<int, vector<size_t>> idx2map;
     size_t dup_index_size = 1;
     for (int i = 0; i < indices->ndim; ++i) {
         dup_index_size *= indices->shape[i];
     }
-    const int *dup_index = (const int *)indices->data;
-    int *out_ind = (int *)output->data;
     int *punique_size = (int *)(idoffsets->data);
     int *id_offset = punique_size + 1;
     int *id_length = id_offset + dup_index_size;
-    for (size_t i = 0; i < dup_index_size; ++i) {
-        idx2map[dup_index[i]].emplace_back(i);
-        out_ind[i] = -1;
-    }
 
-    size_t index_size = idx2map.size();
-    *punique_size = (int)index_size;
-
-    vector<pair<int, vector<size_t>>> idx2vector(idx2map.begin(),
-                                                 idx2map.end());
-
-    size_t cnt = 0;
-    id_length[0] = 0;
-    for (size_t i = 0; i < index_size; ++i) {
-        auto cur_pair = idx2vector[i];
-        out_ind[i] = cur_pair.first;
-        auto &cur_vector = cur_pair.second;
-        size_t cur_size = cur_vector.size();
-        for (size_t j = 0; j < cur_size; ++j) {
-            id_offset[cnt + j] = cur_vector[j];
-        }
-        cnt += cur_size;
-        id_length[i + 1] = cnt;
-    }
+    HT_DISPATCH_INDEX_TYPES(indices->dtype, id_t, [&]() {
+        const id_t *dup_index = (const id_t *)indices->data;
+        id_t *out_ind = (id_t *)output->data;
+        size_t index_size = unique_indices(dup_index, dup_index_size, out_ind,
+                                           id_offset, id_length);
+        *punique_size = (int)index_size;
+        for (size_t i = index_size; i < dup_index_size; ++i)
+            out_ind[i] = -1;
+    });
 
     return 0;
 }
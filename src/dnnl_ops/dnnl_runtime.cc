@@ -1,5 +1,10 @@
 #include "./dnnl_runtime.h"
 
+#include <cstdlib>
+#include <list>
+#include <mutex>
+#include <unordered_map>
+
 bool is_dnnl_stream_init = 0;
 engine eng;
 stream engine_stream;
@@ -35,3 +40,112 @@ void read_from_dnnl_memory(void *handle, dnnl::memory &mem) {
             ((uint8_t *)handle)[i] = src[i];
     }
 }
+
+namespace {
+
+class DnnlPrimitiveCache {
+public:
+    static DnnlPrimitiveCache &get() {
+        static DnnlPrimitiveCache cache;
+        return cache;
+    }
+
+    std::shared_ptr<void> find(const std::string &key) {
+        std::lock_guard<std::mutex> lock(mutex_);
+        auto it = index_.find(key);
+        if (it == index_.end()) {
+            misses_++;
+            return nullptr;
+        }
+        hits_++;
+        entries_.splice(entries_.begin(), entries_, it->second);
+        return it->second->second;
+    }
+
+    void insert(const std::string &key, std::shared_ptr<void> value) {
+        std::lock_guard<std::mutex> lock(mutex_);
+        if (capacity_ == 0)
+            return;
+        auto it = index_.find(key);
+        if (it != index_.end()) {
+            // made by another thread meanwhile
+            entries_.splice(entries_.begin(), entries_, it->second);
+            return;
+        }
+        entries_.emplace_front(key, std::move(value));
+        index_[key] = entries_.begin();
+        shrink();
+    }
+
+    void set_capacity(size_t capacity) {
+        std::lock_guard<std::mutex> lock(mutex_);
+        capacity_ = capacity;
+        shrink();
+    }
+
+    void clear() {
+        std::lock_guard<std::mutex> lock(mutex_);
+        entries_.clear();
+        index_.clear();
+        hits_ = misses_ = evictions_ = 0;
+    }
+
+    void stats(unsigned long long *out) {
+        std::lock_guard<std::mutex> lock(mutex_);
+        out[0] = hits_;
+        out[1] = misses_;
+        out[2] = evictions_;
+        out[3] = entries_.size();
+        out[4] = capacity_;
+    }
+
+private:
+    DnnlPrimitiveCache() {
+        const char *env = std::getenv("HETU_DNNL_CACHE_CAPACITY");
+        capacity_ = env ? std::strtoul(env, nullptr, 10) : 1024;
+    }
+
+    void shrink() {
+        while (entries_.size() > capacity_) {
+            index_.erase(entries_.back().first);
+            entries_.pop_back();
+            evictions_++;
+        }
+    }
+
+    typedef std::list<std::pair<std::string, std::shared_ptr<void>>> Entries;
+    std::mutex mutex_;
+    Entries entries_;
+    std::unordered_map<std::string, Entries::iterator> index_;
+    size_t capacity_;
+    unsigned long long hits_ = 0, misses_ = 0, evictions_ = 0;
+};
+
+} // namespace
+
+std::shared_ptr<void> dnnl_cache_find(const std::string &key) {
+    return DnnlPrimitiveCache::get().find(key);
+}
+
+void dnnl_cache_insert(const std::string &key, std::shared_ptr<void> value) {
+    DnnlPrimitiveCache::get().insert(key, std::move(value));
+}
+
+extern "C" {
+
+// hits, misses, evictions, size, capacity
+int DnnlCacheStats(unsigned long long *stats) {
+    DnnlPrimitiveCache::get().stats(stats);
+    return 0;
+}
+
+int DnnlCacheSetCapacity(int capacity) {
+    DnnlPrimitiveCache::get().set_capacity(capacity < 0 ? 0 : capacity);
+    return 0;
+}
+
+int DnnlCacheClear() {
+    DnnlPrimitiveCache::get().clear();
+    return 0;
+}
+}
@@ -6,6 +6,8 @@
 #include <random>
 #include <stdexcept>
 #include <vector>
+#include <memory>
+#include <string>
 #include <type_traits>
 #include <sys/time.h>
 
@@ -21,3 +23,77 @@ extern stream engine_stream;
 void dnnl_stream_init();
 void print_dlarray(DLArrayHandle mat);
 void read_from_dnnl_memory(void *handle, dnnl::memory &mem);
+
+// Process-wide cache of the dnnl primitives (and the primitive descriptors
+// they need), so an op called again with the same shapes and attributes
+// skips building them. Entries are evicted least recently used once the
+// capacity is reached; HETU_DNNL_CACHE_CAPACITY sets the capacity, 0 turns
+// the cache off.
+
+// the cache key: the op kind, then the shapes, layouts and attributes
+class DnnlKey {
+public:
+    explicit DnnlKey(const char *kind) : key_(kind) {
+        key_.push_back('\0');
+    }
+    // numbers and enums, as their bytes
+    template <typename T>
+    typename std::enable_if<
+        std::is_arithmetic<T>::value || std::is_enum<T>::value, DnnlKey &>::type
+    operator<<(const T &value) {
+        key_.append(reinterpret_cast<const char *>(&value), sizeof(T));
+        return *this;
+    }
+    DnnlKey &operator<<(const memory::dims &dims) {
+        *this << dims.size();
+        for (auto dim : dims)
+            *this << dim;
+        return *this;
+    }
+    DnnlKey &operator<<(const DLArray *arr) {
+        *this << arr->ndim;
+        for (int i = 0; i < arr->ndim; i++)
+            *this << arr->shape[i];
+        return *this;
+    }
+    const std::string &str() const {
+        return key_;
+    }
+
+private:
+    std::string key_;
+};
+
+// a primitive cached along with its descriptor, for the ops which look up the
+// memory formats it chose
+template <typename Primitive>
+struct DnnlPrimitiveWithDesc {
+    typename Primitive::primitive_desc pd;
+    Primitive primitive;
+};
+
+std::shared_ptr<void> dnnl_cache_find(const std::string &key);
+void dnnl_cache_insert(const std::string &key, std::shared_ptr<void> value);
+
+// the object cached under key, made by make() on a miss; the kind of the key
+// determines the type make() returns
+template <typename Make>
+auto dnnl_cached(const DnnlKey &key, Make make)
+    -> std::shared_ptr<decltype(make())> {
+    using T = decltype(make());
+    std::shared_ptr<void> found = dnnl_cache_find(key.str());
+    if (found)
+        return std::static_pointer_cast<T>(found);
+    auto made = std::make_shared<T>(make());
+    dnnl_cache_insert(key.str(), made);
+    return made;
+}
+
+// Groups the positions of ids by id, i.e. a stable sort of ids: the distinct
+// ids go to unique in ascending order, and the positions of unique[i] are
+// positions[lengths[i]], ..., positions[lengths[i + 1] - 1] in increasing
+// order. Returns the number of distinct ids. A parallel radix sort over the
+// range of the ids, whose scratch buffers are kept per thread across calls.
+template <typename T>
+size_t unique_indices(const T *ids, size_t n, T *unique, int *positions,
+                      int *lengths);
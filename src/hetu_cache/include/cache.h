@@ -12,6 +12,19 @@ namespace hetu {
 
 typedef std::shared_future<void> wait_t;
 
+/*
+  RawKeyType:
+    dtype of the key buffer given to the raw entry points, numbered the same
+    as DataType in src/common/dispatch.h so that NDArray dtype codes can be
+    passed through directly
+*/
+enum RawKeyType {
+    kFloat32Key = 0,
+    kInt32Key = 1,
+    kInt64Key = 7,
+    kUInt64Key = 8,
+};
+
 /*
   CacheBase:
     CacheBase is the Base class of all cache Policy
@@ -39,7 +52,7 @@ public:
       node_id: the server key
     */
     CacheBase(size_t limit, size_t len, size_t width, int node_id);
-    ~CacheBase() {
+    virtual ~CacheBase() {
     }
     size_t getLimit() {
         return limit_;
@@ -50,10 +63,17 @@ public:
     virtual int count(cache_key_t k) = 0;
     virtual void insert(EmbeddingPT e) = 0;
     virtual EmbeddingPT lookup(cache_key_t k) = 0;
+    virtual bool isFull() {
+        return size() == limit_;
+    }
     //------------------------- implement tools ---------------------
     // Used to lookup/insert many keys together
-    vector<EmbeddingPT> batchedLookup(const cache_key_t *, size_t len);
-    void batchedInsert(vector<EmbeddingPT> &ptrs);
+    virtual vector<EmbeddingPT> batchedLookup(const cache_key_t *, size_t len);
+    virtual void batchedInsert(vector<EmbeddingPT> &ptrs);
+    // Take out the evicted embeddings that still hold gradients
+    virtual vector<EmbeddingPT> takeEvicted();
+    // Append all the cached keys
+    virtual void collectKeys(vector<cache_key_t> &keys) = 0;
     //------------------------- implement main python API ---------------------
     version_t getPullBound() {
         return pull_bound_;
@@ -89,15 +109,18 @@ public:
     */
     wait_t embeddingLookup(py::array_t<cache_key_t> keys,
                            py::array_t<embed_t> dest);
-    wait_t embeddingLookupRaw(uint64_t _keys, uint64_t dest, size_t num_keys);
+    wait_t embeddingLookupRaw(uint64_t _keys, uint64_t dest, size_t num_keys,
+                              int key_type);
     void _embeddingLookup(SArray<cache_key_t> keys, embed_t *dest);
     wait_t embeddingUpdate(py::array_t<cache_key_t> keys,
                            py::array_t<embed_t> grads);
-    wait_t embeddingUpdateRaw(uint64_t _keys, uint64_t grads, size_t num_keys);
+    wait_t embeddingUpdateRaw(uint64_t _keys, uint64_t grads, size_t num_keys,
+                              int key_type);
     void _embeddingUpdate(SArray<cache_key_t> keys, const embed_t *grads);
     wait_t embeddingPushPullRaw(uint64_t _pullkeys, uint64_t _dest,
                                 size_t num_pull_keys, uint64_t _pushkeys,
-                                uint64_t _grads, size_t num_push_keys);
+                                uint64_t _grads, size_t num_push_keys,
+                                int key_type);
     void _embeddingPushPull(SArray<cache_key_t> keys, embed_t *dest,
                             SArray<cache_key_t> push_keys,
                             const embed_t *grads);
@@ -105,6 +128,8 @@ public:
     py::list getPerf() {
         return perf_;
     };
+    // python debug function
+    py::array_t<cache_key_t> PyAPI_keys();
 }; // class CacheBase
 
 } // namespace hetu
@@ -4,6 +4,7 @@
 #include <memory>
 #include <sstream>
 #include "binding.h"
+#include "slab_pool.h"
 
 using std::default_delete;
 using std::make_shared;
@@ -15,6 +16,11 @@ namespace hetu {
 typedef uint64_t cache_key_t;
 typedef int64_t version_t;
 
+/*
+  Line:
+    data and grad rows are taken from the SlabPool of the row length,
+    and their slots are returned to the pool when the line is destroyed
+*/
 template <typename T>
 class Line {
 private:
@@ -24,27 +30,33 @@ private:
     const cache_key_t key_;
     T *data_;
     T *grad_;
+    size_t data_slot_;
+    size_t grad_slot_;
+    SlabPool<T> *pool_;
 
 public:
     typedef T dtype;
-    Line(cache_key_t key, const T *in_vec, size_t len) : len_(len), key_(key) {
-        data_ = new T[len]();
+    Line(cache_key_t key, const T *in_vec, size_t len) :
+        len_(len), key_(key), pool_(SlabPool<T>::Get(len)) {
+        data_ = pool_->allocate(data_slot_);
         grad_ = nullptr;
         std::copy(in_vec, in_vec + len, data_);
         updates_ = 0;
         version_ = -1;
     }
     Line(cache_key_t key, size_t len, bool init_data = true) :
-        len_(len), key_(key) {
-        data_ = init_data ? new T[len]() : nullptr;
+        len_(len), key_(key), pool_(SlabPool<T>::Get(len)) {
+        data_ = init_data ? pool_->allocate(data_slot_) : nullptr;
         grad_ = nullptr;
         updates_ = 0;
         version_ = -1;
     }
     Line(const Line &other) = delete;
     ~Line() {
-        delete[] data_;
-        delete[] grad_;
+        if (data_)
+            pool_->release(data_slot_, data_);
+        if (grad_)
+            pool_->release(grad_slot_, grad_);
     }
     //-------------------------- setter getter ---------------------------------
     T &operator[](size_t i) {
@@ -119,7 +131,7 @@ public:
 
     void _maybeInitGrad() {
         if (grad_ == nullptr)
-            grad_ = new T[len_]();
+            grad_ = pool_->allocate(grad_slot_);
     }
 
     //------------------------ python api starts here ------------------------
@@ -157,4 +169,12 @@ typedef shared_ptr<Embedding> EmbeddingPT;
 // Factory function
 EmbeddingPT makeEmbedding(cache_key_t, version_t, py::array_t<embed_t>);
 
+// Bytes of a cached row of width floats: the block make_shared allocates for
+// the line (the line and its reference counts) and the slab slot of its data;
+// a row with pending gradients takes another slot
+size_t embeddingBlockBytes();
+size_t embeddingRowBytes(size_t width);
+// the same for lines holding their data in a heap array, as before the pools
+size_t embeddingHeapRowBytes(size_t width);
+
 } // namespace hetu
@@ -41,9 +41,7 @@ public:
     int count(cache_key_t k) final;
     void insert(EmbeddingPT e) final;
     EmbeddingPT lookup(cache_key_t k) final;
-
-    // python debug function
-    py::array_t<cache_key_t> PyAPI_keys();
+    void collectKeys(vector<cache_key_t> &keys) final;
 }; // class LFUCache
 
 } // namespace hetu
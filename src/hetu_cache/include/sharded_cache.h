@@ -0,0 +1,53 @@
+#pragma once
+
+#include "cache.h"
+
+#include <memory>
+#include <string>
+
+namespace hetu {
+
+/*
+  ShardedCache:
+    hash-partition the keys into N shards, each shard is a complete cache
+    (LRU, LFU or LFUOpt) with its own lock and eviction list
+    keys of a batch are processed in parallel per shard
+*/
+
+class ShardedCache : public CacheBase {
+private:
+    vector<std::unique_ptr<CacheBase>> shards_;
+
+    size_t _shardOf(cache_key_t k) const {
+        // mix the key bits so that sequential keys spread over the shards
+        k ^= k >> 33;
+        k *= 0xff51afd7ed558ccdULL;
+        k ^= k >> 33;
+        return k % shards_.size();
+    }
+
+public:
+    /*
+      policy: cache policy of each shard, LRU, LFU or LFUOpt
+      num_shards: number of shards, limit is split evenly among them
+    */
+    ShardedCache(const std::string &policy, size_t num_shards, size_t limit,
+                 size_t len, size_t width, int node_id);
+    size_t size() final;
+    bool isFull() final;
+    int count(cache_key_t k) final;
+    void insert(EmbeddingPT e) final;
+    EmbeddingPT lookup(cache_key_t k) final;
+    vector<EmbeddingPT> batchedLookup(const cache_key_t *, size_t len) final;
+    void batchedInsert(vector<EmbeddingPT> &ptrs) final;
+    vector<EmbeddingPT> takeEvicted() final;
+    void collectKeys(vector<cache_key_t> &keys) final;
+    size_t numShards() {
+        return shards_.size();
+    }
+
+    // python debug function
+    py::array_t<size_t> PyAPI_shardSizes();
+}; // class ShardedCache
+
+} // namespace hetu
@@ -0,0 +1,170 @@
+#pragma once
+
+#include <algorithm>
+#include <atomic>
+#include <memory>
+#include <mutex>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+namespace hetu {
+
+/*
+  SlabPool:
+    hands out fixed-length rows from large contiguous slabs
+    rows are addressed by slot index; released slots go to a free list and
+    are reused, memory is never returned to the system
+    one pool per row length is shared by all the caches in the process
+    every thread keeps a small free list of its own, refilled from and
+    spilled to the shared one in batches, so the shards of a cache do not
+    take the pool lock for every row
+*/
+template <typename T>
+class SlabPool {
+private:
+    // a free row: its slot index and address
+    typedef std::pair<size_t, T *> Row;
+
+    // the rows a thread holds back, returned to their pools at thread exit
+    struct LocalRows {
+        std::unordered_map<SlabPool *, std::vector<Row>> rows;
+        ~LocalRows() {
+            for (auto &it : rows)
+                it.first->_spill(it.second, 0);
+            _exited() = true;
+        }
+    };
+
+    // whether the rows of this thread are gone, for lines freed after them
+    static bool &_exited() {
+        static thread_local bool exited = false;
+        return exited;
+    }
+
+    const size_t len_;
+    const size_t slab_rows_;
+    std::vector<std::unique_ptr<T[]>> slabs_;
+    std::vector<Row> free_;
+    size_t capacity_ = 0;
+    size_t next_ = 0;
+    std::atomic<size_t> used_{0};
+    std::mutex mtx_;
+    static const size_t kSlabBytes = 1 << 20;
+    // rows moved between a thread and the shared free list at a time
+    static const size_t kBatchRows = 64;
+
+    explicit SlabPool(size_t len) :
+        len_(len),
+        slab_rows_(std::max<size_t>(1, kSlabBytes / (len * sizeof(T)))) {
+    }
+
+    // the free rows of this thread, nullptr after they are gone
+    std::vector<Row> *_localRows() {
+        if (_exited())
+            return nullptr;
+        static thread_local LocalRows local;
+        static thread_local SlabPool *last_pool = nullptr;
+        static thread_local std::vector<Row> *last_rows = nullptr;
+        if (last_pool != this) {
+            last_rows = &local.rows[this];
+            last_pool = this;
+        }
+        return last_rows;
+    }
+
+    // moves kBatchRows free rows (new ones if needed) into rows
+    void _refill(std::vector<Row> &rows) {
+        std::lock_guard<std::mutex> lock(mtx_);
+        for (size_t i = 0; i < kBatchRows; ++i) {
+            if (!free_.empty()) {
+                rows.push_back(free_.back());
+                free_.pop_back();
+                continue;
+            }
+            if (next_ == capacity_) {
+                slabs_.emplace_back(new T[slab_rows_ * len_]);
+                capacity_ += slab_rows_;
+            }
+            size_t slot = next_++;
+            rows.emplace_back(slot, slabs_[slot / slab_rows_].get()
+                                        + (slot % slab_rows_) * len_);
+        }
+    }
+
+    // returns the rows beyond keep to the shared free list
+    void _spill(std::vector<Row> &rows, size_t keep) {
+        std::lock_guard<std::mutex> lock(mtx_);
+        free_.insert(free_.end(), rows.begin() + keep, rows.end());
+        rows.resize(keep);
+    }
+
+public:
+    SlabPool(const SlabPool &other) = delete;
+
+    // lines keep the pointer, so the pools are only looked up at creation
+    static SlabPool *Get(size_t len) {
+        static thread_local size_t last_len = 0;
+        static thread_local SlabPool *last_pool = nullptr;
+        if (last_pool != nullptr && last_len == len)
+            return last_pool;
+        static std::mutex mtx;
+        static std::unordered_map<size_t, SlabPool *> pools;
+        std::lock_guard<std::mutex> lock(mtx);
+        auto &pool = pools[len];
+        if (pool == nullptr)
+            pool = new SlabPool(len);
+        last_len = len;
+        last_pool = pool;
+        return pool;
+    }
+
+    // returns a zeroed row, and its slot index in slot
+    T *allocate(size_t &slot) {
+        std::vector<Row> exiting;
+        auto rows = _localRows();
+        if (rows == nullptr)
+            rows = &exiting;
+        if (rows->empty())
+            _refill(*rows);
+        slot = rows->back().first;
+        T *row = rows->back().second;
+        rows->pop_back();
+        if (rows == &exiting)
+            _spill(exiting, 0);
+        used_.fetch_add(1, std::memory_order_relaxed);
+        std::fill(row, row + len_, T());
+        return row;
+    }
+
+    void release(size_t slot, T *row) {
+        used_.fetch_sub(1, std::memory_order_relaxed);
+        auto rows = _localRows();
+        if (rows == nullptr) {
+            std::lock_guard<std::mutex> lock(mtx_);
+            free_.emplace_back(slot, row);
+            return;
+        }
+        rows->emplace_back(slot, row);
+        if (rows->size() >= 2 * kBatchRows)
+            _spill(*rows, kBatchRows);
+    }
+
+    // rows in use
+    size_t used() {
+        return used_.load(std::memory_order_relaxed);
+    }
+
+    // rows in the slabs, in use or free
+    size_t capacity() {
+        std::lock_guard<std::mutex> lock(mtx_);
+        return capacity_;
+    }
+
+    // bytes held by the slabs
+    size_t bytes() {
+        return capacity() * len_ * sizeof(T);
+    }
+}; // class SlabPool
+
+} // namespace hetu
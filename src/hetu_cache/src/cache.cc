@@ -1,4 +1,6 @@
 #include <chrono>
+#include <stdexcept>
+#include <string>
 
 #include "cache.h"
 #include "hetu_client.h"
@@ -11,6 +13,45 @@ CacheBase::CacheBase(size_t limit, size_t len, size_t width, int node_id) :
     limit_(limit), width_(width), node_id_(node_id) {
 }
 
+/*
+  rawKeys:
+    copy a raw key buffer into cache keys owned by the task. The lookups run
+    later on the thread pool, while the source buffer (e.g. a slot of the
+    dataloader's prefetch ring) may already hold the next batch. Narrower
+    integer keys are widened, float keys are the legacy path and are only
+    exact below 2^24
+*/
+static SArray<cache_key_t> rawKeys(uint64_t ptr, size_t num_keys,
+                                   int key_type) {
+    SArray<cache_key_t> keys;
+    switch (key_type) {
+    case kInt64Key:
+    case kUInt64Key: {
+        auto src = reinterpret_cast<const cache_key_t *>(ptr);
+        keys.resize(num_keys);
+        std::copy(src, src + num_keys, keys.data());
+        break;
+    }
+    case kInt32Key: {
+        auto src = reinterpret_cast<const int32_t *>(ptr);
+        keys.resize(num_keys);
+        std::copy(src, src + num_keys, keys.data());
+        break;
+    }
+    case kFloat32Key: {
+        auto src = reinterpret_cast<const float *>(ptr);
+        keys.resize(num_keys);
+        for (size_t i = 0; i < num_keys; i++)
+            keys[i] = (cache_key_t)src[i];
+        break;
+    }
+    default:
+        throw std::invalid_argument("unsupported key type "
+                                    + std::to_string(key_type));
+    }
+    return keys;
+}
+
 vector<EmbeddingPT> CacheBase::batchedLookup(const cache_key_t *keys,
                                              size_t len) {
     std::lock_guard<std::mutex> lock(mtx);
@@ -33,6 +74,11 @@ void CacheBase::batchedInsert(vector<EmbeddingPT> &ptrs) {
     }
 }
 
+vector<EmbeddingPT> CacheBase::takeEvicted() {
+    std::lock_guard<std::mutex> lock(mtx);
+    return std::move(evict_);
+}
+
 wait_t CacheBase::embeddingLookup(py::array_t<cache_key_t> _keys,
                                   py::array_t<embed_t> _dest) {
     PYTHON_CHECK_ARRAY(_keys);
@@ -46,11 +92,8 @@ wait_t CacheBase::embeddingLookup(py::array_t<cache_key_t> _keys,
 }
 
 wait_t CacheBase::embeddingLookupRaw(uint64_t _keys, uint64_t dest,
-                                     size_t num_keys) {
-    float *keys = reinterpret_cast<float *>(_keys);
-    SArray<cache_key_t> intkeys(num_keys);
-    for (size_t i = 0; i < num_keys; i++)
-        intkeys[i] = (cache_key_t)keys[i];
+                                     size_t num_keys, int key_type) {
+    SArray<cache_key_t> intkeys = rawKeys(_keys, num_keys, key_type);
     return ThreadPool::Get()->Enqueue(&CacheBase::_embeddingLookup, this,
                                       intkeys,
                                       reinterpret_cast<embed_t *>(dest));
@@ -69,7 +112,7 @@ void CacheBase::_embeddingLookup(SArray<cache_key_t> keys, embed_t *dest) {
     vector<EmbeddingPT> should_insert;
     for (size_t i = 0; i < unique_keys.size(); i++) {
         if (!embeds[i]) {
-            embeds[i].reset(new Embedding(unique_keys[i], width_));
+            embeds[i] = make_shared<Embedding>(unique_keys[i], width_);
             should_insert.push_back(embeds[i]);
         }
     }
@@ -89,7 +132,7 @@ void CacheBase::_embeddingLookup(SArray<cache_key_t> keys, embed_t *dest) {
         py::gil_scoped_acquire acquire;
         py::dict performance;
         performance["type"] = "Pull";
-        performance["is_full"] = size() == limit_;
+        performance["is_full"] = isFull();
         performance["num_all"] = keys.size();
         performance["num_unique"] = unique_keys.size();
         performance["num_miss"] = should_insert.size();
@@ -118,11 +161,8 @@ wait_t CacheBase::embeddingUpdate(py::array_t<cache_key_t> _keys,
 }
 
 wait_t CacheBase::embeddingUpdateRaw(uint64_t _keys, uint64_t grads,
-                                     size_t num_keys) {
-    float *keys = reinterpret_cast<float *>(_keys);
-    SArray<cache_key_t> intkeys(num_keys);
-    for (size_t i = 0; i < num_keys; i++)
-        intkeys[i] = (cache_key_t)keys[i];
+                                     size_t num_keys, int key_type) {
+    SArray<cache_key_t> intkeys = rawKeys(_keys, num_keys, key_type);
     return ThreadPool::Get()->Enqueue(&CacheBase::_embeddingUpdate, this,
                                       intkeys,
                                       reinterpret_cast<embed_t *>(grads));
@@ -138,15 +178,15 @@ void CacheBase::_embeddingUpdate(SArray<cache_key_t> keys,
     auto embeds = batchedLookup(unique_keys.data(), unique_keys.size());
     auto lookup_time = std::chrono::system_clock::now();
     // Do local updates
-    size_t miss_cnt = 0, evict_cnt = evict_.size();
     vector<EmbeddingPT> should_push;
-    vector<EmbeddingPT> evict = std::move(evict_);
+    vector<EmbeddingPT> evict = takeEvicted();
+    size_t miss_cnt = 0, evict_cnt = evict.size();
     for (size_t _i = 0; _i < keys.size(); _i++) {
         auto i = unique_keys.map(_i);
         if (!embeds[i]) {
             // !! This is not likely to happen, newly pulled embedding should be
             // in cache
-            embeds[i].reset(new Embedding(unique_keys[i], width_, false));
+            embeds[i] = make_shared<Embedding>(unique_keys[i], width_, false);
             miss_cnt++;
         }
         embeds[i]->accumulate(grads + _i * width_);
@@ -179,7 +219,7 @@ void CacheBase::_embeddingUpdate(SArray<cache_key_t> keys,
         py::gil_scoped_acquire acquire;
         py::dict performance;
         performance["type"] = "Push";
-        performance["is_full"] = size() == limit_;
+        performance["is_full"] = isFull();
         performance["num_all"] = keys.size();
         performance["num_unique"] = unique_keys.size();
         performance["num_evict"] = evict_cnt;
@@ -197,14 +237,12 @@ void CacheBase::_embeddingUpdate(SArray<cache_key_t> keys,
 
 wait_t CacheBase::embeddingPushPullRaw(uint64_t _pullkeys, uint64_t _dest,
                                        size_t num_pull_keys, uint64_t _pushkeys,
-                                       uint64_t _grads, size_t num_push_keys) {
-    float *pullkeys = reinterpret_cast<float *>(_pullkeys);
-    float *pushkeys = reinterpret_cast<float *>(_pushkeys);
-    SArray<cache_key_t> intpullkeys(num_pull_keys), intpushkeys(num_push_keys);
-    for (size_t i = 0; i < num_pull_keys; i++)
-        intpullkeys[i] = (cache_key_t)pullkeys[i];
-    for (size_t i = 0; i < num_push_keys; i++)
-        intpushkeys[i] = (cache_key_t)pushkeys[i];
+                                       uint64_t _grads, size_t num_push_keys,
+                                       int key_type) {
+    SArray<cache_key_t> intpullkeys = rawKeys(_pullkeys, num_pull_keys,
+                                              key_type),
+                        intpushkeys = rawKeys(_pushkeys, num_push_keys,
+                                              key_type);
     return ThreadPool::Get()->Enqueue([this, intpullkeys, intpushkeys, _grads,
                                        _dest]() {
         // _embeddingUpdate(intpushkeys, reinterpret_cast<embed_t*>(_grads));
@@ -224,7 +262,7 @@ void CacheBase::_embeddingPushPull(SArray<cache_key_t> keys, embed_t *dest,
     vector<EmbeddingPT> should_insert;
     for (size_t i = 0; i < unique_keys.size(); i++) {
         if (!embeds[i]) {
-            embeds[i].reset(new Embedding(unique_keys[i], width_));
+            embeds[i] = make_shared<Embedding>(unique_keys[i], width_);
             should_insert.push_back(embeds[i]);
         }
     }
@@ -236,14 +274,14 @@ void CacheBase::_embeddingPushPull(SArray<cache_key_t> keys, embed_t *dest,
     size_t miss_cnt = 0;
     // size_t evict_cnt = evict_.size();
     vector<EmbeddingPT> should_push;
-    vector<EmbeddingPT> evict = std::move(evict_);
+    vector<EmbeddingPT> evict = takeEvicted();
     for (size_t _i = 0; _i < push_keys.size(); _i++) {
         auto i = push_unique_keys.map(_i);
         if (!push_embeds[i]) {
             // !! This is not likely to happen, newly pulled embedding should be
             // in cache
-            push_embeds[i].reset(
-                new Embedding(push_unique_keys[i], width_, false));
+            push_embeds[i] =
+                make_shared<Embedding>(push_unique_keys[i], width_, false);
             miss_cnt++;
         }
         push_embeds[i]->accumulate(grads + _i * width_);
@@ -282,6 +320,13 @@ void CacheBase::_embeddingPushPull(SArray<cache_key_t> keys, embed_t *dest,
     }
 }
 
+py::array_t<cache_key_t> CacheBase::PyAPI_keys() {
+    std::vector<cache_key_t> keys;
+    collectKeys(keys);
+    std::sort(keys.begin(), keys.end());
+    return bind::vec(keys);
+}
+
 std::string CacheBase::__repr__() {
     std::stringstream ss;
     ss << "<Cache : ";
@@ -289,6 +334,16 @@ std::string CacheBase::__repr__() {
     ss << " , id:" << node_id_;
     ss << " , width:" << width_;
     ss << " , bound:" << pull_bound_ << " " << push_bound_;
+    // the rows of this cache, against lines with heap arrays as before
+    size_t row_bytes = embeddingRowBytes(width_);
+    ss << " , row bytes:" << row_bytes << " (line " << embeddingBlockBytes()
+       << " + slot " << width_ * sizeof(embed_t) << ", was "
+       << embeddingHeapRowBytes(width_) << ")";
+    ss << " , bytes:" << size() * row_bytes;
+    // the pool of the row length is shared by the caches of that width
+    auto pool = SlabPool<embed_t>::Get(width_);
+    ss << " , pool rows:" << pool->used() << "/" << pool->capacity();
+    ss << " , pool bytes:" << pool->bytes();
     ss << ">";
     return ss.str();
 }
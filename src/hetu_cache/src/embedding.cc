@@ -1,4 +1,7 @@
 #include "embedding.h"
+
+#include <malloc.h>
+
 namespace hetu {
 
 EmbeddingPT makeEmbedding(cache_key_t k, version_t version,
@@ -10,4 +13,62 @@ EmbeddingPT makeEmbedding(cache_key_t k, version_t version,
     return res;
 }
 
+namespace {
+
+// counts the bytes allocated through it
+template <typename T>
+struct CountingAllocator {
+    typedef T value_type;
+    size_t *bytes;
+    explicit CountingAllocator(size_t *bytes) : bytes(bytes) {
+    }
+    template <typename U>
+    CountingAllocator(const CountingAllocator<U> &other) : bytes(other.bytes) {
+    }
+    T *allocate(size_t n) {
+        *bytes += n * sizeof(T);
+        return std::allocator<T>().allocate(n);
+    }
+    void deallocate(T *ptr, size_t n) {
+        std::allocator<T>().deallocate(ptr, n);
+    }
+};
+
+template <typename T, typename U>
+bool operator==(const CountingAllocator<T> &a, const CountingAllocator<U> &b) {
+    return a.bytes == b.bytes;
+}
+
+template <typename T, typename U>
+bool operator!=(const CountingAllocator<T> &a, const CountingAllocator<U> &b) {
+    return a.bytes != b.bytes;
+}
+
+} // namespace
+
+size_t embeddingBlockBytes() {
+    static const size_t bytes = [] {
+        size_t n = 0;
+        // a line without data, so that no slot is taken
+        std::allocate_shared<Embedding>(CountingAllocator<Embedding>(&n), 0, 1,
+                                        false);
+        return n;
+    }();
+    return bytes;
+}
+
+size_t embeddingRowBytes(size_t width) {
+    return embeddingBlockBytes() + width * sizeof(embed_t);
+}
+
+size_t embeddingHeapRowBytes(size_t width) {
+    // the line had no slots nor pool pointer, its data was a malloc chunk
+    // (with the size word of glibc in front)
+    embed_t *row = new embed_t[width]();
+    size_t chunk = malloc_usable_size(row) + sizeof(size_t);
+    delete[] row;
+    return embeddingBlockBytes() - 2 * sizeof(size_t)
+           - sizeof(SlabPool<embed_t> *) + chunk;
+}
+
 } // namespace hetu
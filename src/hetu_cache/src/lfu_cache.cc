@@ -69,13 +69,10 @@ LFUCache::_increase(std::list<Block>::iterator iter) {
     return result;
 }
 
-py::array_t<cache_key_t> LFUCache::PyAPI_keys() {
-    std::vector<cache_key_t> keys;
+void LFUCache::collectKeys(vector<cache_key_t> &keys) {
     for (auto &iter : hash_) {
         keys.push_back(iter.first);
     }
-    std::sort(keys.begin(), keys.end());
-    return bind::vec(keys);
 }
 
 } // namespace hetu
@@ -70,14 +70,11 @@ LFUOptCache::_increase(std::list<Block>::iterator iter) {
     return clist[use + 1].begin();
 }
 
-py::array_t<cache_key_t> LFUOptCache::PyAPI_keys() {
-    std::vector<cache_key_t> keys;
+void LFUOptCache::collectKeys(vector<cache_key_t> &keys) {
     for (auto &iter : store_)
         keys.push_back(iter.first);
     for (auto &iter : hash_)
         keys.push_back(iter.first);
-    std::sort(keys.begin(), keys.end());
-    return bind::vec(keys);
 }
 
 } // namespace hetu
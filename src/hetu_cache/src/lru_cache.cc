@@ -38,13 +38,10 @@ EmbeddingPT LRUCache::lookup(cache_key_t k) {
     return result;
 }
 
-py::array_t<cache_key_t> LRUCache::PyAPI_keys() {
-    std::vector<cache_key_t> keys;
+void LRUCache::collectKeys(vector<cache_key_t> &keys) {
     for (auto &iter : hash_) {
         keys.push_back(iter.first);
     }
-    std::sort(keys.begin(), keys.end());
-    return bind::vec(keys);
 }
 
 } // namespace hetu
@@ -3,6 +3,7 @@
 #include "lru_cache.h"
 #include "lfu_cache.h"
 #include "lfuopt_cache.h"
+#include "sharded_cache.h"
 #include "hetu_client.h"
 
 using namespace hetu;
@@ -43,9 +44,17 @@ PYBIND11_MODULE(hetu_cache, m) {
         .def("undo_bypass", &CacheBase::undoBypass)
         .def("embedding_lookup", &CacheBase::embeddingLookup)
         .def("embedding_update", &CacheBase::embeddingUpdate)
-        .def("embedding_lookup_raw", &CacheBase::embeddingLookupRaw)
-        .def("embedding_update_raw", &CacheBase::embeddingUpdateRaw)
-        .def("embedding_push_pull_raw", &CacheBase::embeddingPushPullRaw)
+        .def("embedding_lookup_raw", &CacheBase::embeddingLookupRaw,
+             py::arg("keys"), py::arg("dest"), py::arg("num_keys"),
+             py::arg("key_type") = int(kFloat32Key))
+        .def("embedding_update_raw", &CacheBase::embeddingUpdateRaw,
+             py::arg("keys"), py::arg("grads"), py::arg("num_keys"),
+             py::arg("key_type") = int(kFloat32Key))
+        .def("embedding_push_pull_raw", &CacheBase::embeddingPushPullRaw,
+             py::arg("pullkeys"), py::arg("dest"), py::arg("num_pull_keys"),
+             py::arg("pushkeys"), py::arg("grads"), py::arg("num_push_keys"),
+             py::arg("key_type") = int(kFloat32Key))
+        .def("keys", &CacheBase::PyAPI_keys)
         .def("__repr__", &CacheBase::__repr__);
 
     py::class_<LRUCache, CacheBase>(m, "LRUCache")
@@ -53,24 +62,31 @@ PYBIND11_MODULE(hetu_cache, m) {
         .def("count", &LRUCache::count)
         .def("lookup", &LRUCache::lookup)
         .def("insert", &LRUCache::insert)
-        .def("size", &LRUCache::size)
-        .def("keys", &LRUCache::PyAPI_keys);
+        .def("size", &LRUCache::size);
 
     py::class_<LFUCache, CacheBase>(m, "LFUCache")
         .def(py::init<size_t, size_t, size_t, int>())
         .def("count", &LFUCache::count)
         .def("lookup", &LFUCache::lookup)
         .def("insert", &LFUCache::insert)
-        .def("size", &LFUCache::size)
-        .def("keys", &LFUCache::PyAPI_keys);
+        .def("size", &LFUCache::size);
 
     py::class_<LFUOptCache, CacheBase>(m, "LFUOptCache")
         .def(py::init<size_t, size_t, size_t, int>())
         .def("count", &LFUOptCache::count)
         .def("lookup", &LFUOptCache::lookup)
         .def("insert", &LFUOptCache::insert)
-        .def("size", &LFUOptCache::size)
-        .def("keys", &LFUOptCache::PyAPI_keys);
+        .def("size", &LFUOptCache::size);
+
+    py::class_<ShardedCache, CacheBase>(m, "ShardedCache")
+        .def(py::init<const std::string &, size_t, size_t, size_t, size_t,
+                      int>())
+        .def("count", &ShardedCache::count)
+        .def("lookup", &ShardedCache::lookup)
+        .def("insert", &ShardedCache::insert)
+        .def("size", &ShardedCache::size)
+        .def("shard_sizes", &ShardedCache::PyAPI_shardSizes)
+        .def_property_readonly("num_shards", &ShardedCache::numShards);
 
     m.def("debug", ps::debug);
 } // PYBIND11_MODULE
@@ -0,0 +1,128 @@
+#include "sharded_cache.h"
+#include "lru_cache.h"
+#include "lfu_cache.h"
+#include "lfuopt_cache.h"
+
+#include <algorithm>
+#include <stdexcept>
+
+namespace hetu {
+
+ShardedCache::ShardedCache(const std::string &policy, size_t num_shards,
+                           size_t limit, size_t len, size_t width,
+                           int node_id) :
+    CacheBase(limit, len, width, node_id) {
+    if (num_shards == 0)
+        throw std::invalid_argument("num_shards should be positive");
+    std::string lower(policy);
+    std::transform(lower.begin(), lower.end(), lower.begin(), ::tolower);
+    // the first (limit % num_shards) shards hold one more line
+    for (size_t i = 0; i < num_shards; i++) {
+        size_t shard_limit = limit / num_shards + (i < limit % num_shards);
+        CacheBase *shard;
+        if (lower == "lru")
+            shard = new LRUCache(shard_limit, len, width, node_id);
+        else if (lower == "lfu")
+            shard = new LFUCache(shard_limit, len, width, node_id);
+        else if (lower == "lfuopt")
+            shard = new LFUOptCache(shard_limit, len, width, node_id);
+        else
+            throw std::invalid_argument("unknown cache policy " + policy);
+        shards_.emplace_back(shard);
+    }
+}
+
+size_t ShardedCache::size() {
+    size_t result = 0;
+    for (auto &shard : shards_)
+        result += shard->size();
+    return result;
+}
+
+bool ShardedCache::isFull() {
+    for (auto &shard : shards_)
+        if (!shard->isFull())
+            return false;
+    return true;
+}
+
+int ShardedCache::count(cache_key_t k) {
+    return shards_[_shardOf(k)]->count(k);
+}
+
+void ShardedCache::insert(EmbeddingPT e) {
+    vector<EmbeddingPT> ptrs = {e};
+    shards_[_shardOf(e->key())]->batchedInsert(ptrs);
+}
+
+EmbeddingPT ShardedCache::lookup(cache_key_t k) {
+    return shards_[_shardOf(k)]->batchedLookup(&k, 1)[0];
+}
+
+vector<EmbeddingPT> ShardedCache::batchedLookup(const cache_key_t *keys,
+                                                size_t len) {
+    if (bypass_cache_)
+        return vector<EmbeddingPT>(len, nullptr);
+    size_t num_shards = shards_.size();
+    // partition the keys, remembering their positions
+    vector<vector<cache_key_t>> shard_keys(num_shards);
+    vector<vector<size_t>> shard_pos(num_shards);
+    for (size_t i = 0; i < len; i++) {
+        size_t s = _shardOf(keys[i]);
+        shard_keys[s].push_back(keys[i]);
+        shard_pos[s].push_back(i);
+    }
+    vector<EmbeddingPT> result(len);
+#pragma omp parallel for schedule(dynamic, 1)
+    for (size_t s = 0; s < num_shards; s++) {
+        if (shard_keys[s].empty())
+            continue;
+        auto ptrs =
+            shards_[s]->batchedLookup(shard_keys[s].data(), shard_keys[s].size());
+        for (size_t j = 0; j < ptrs.size(); j++)
+            result[shard_pos[s][j]] = ptrs[j];
+    }
+    return result;
+}
+
+void ShardedCache::batchedInsert(vector<EmbeddingPT> &ptrs) {
+    if (bypass_cache_)
+        return;
+    size_t num_shards = shards_.size();
+    vector<vector<EmbeddingPT>> shard_ptrs(num_shards);
+    for (auto &ptr : ptrs)
+        shard_ptrs[_shardOf(ptr->key())].push_back(ptr);
+#pragma omp parallel for schedule(dynamic, 1)
+    for (size_t s = 0; s < num_shards; s++) {
+        if (!shard_ptrs[s].empty())
+            shards_[s]->batchedInsert(shard_ptrs[s]);
+    }
+}
+
+vector<EmbeddingPT> ShardedCache::takeEvicted() {
+    vector<EmbeddingPT> result;
+    for (auto &shard : shards_) {
+        auto evicted = shard->takeEvicted();
+        result.insert(result.end(), evicted.begin(), evicted.end());
+    }
+    // eviction pushes are merged with the sorted unique keys in updates
+    std::sort(result.begin(), result.end(),
+              [](const EmbeddingPT &a, const EmbeddingPT &b) {
+                  return a->key() < b->key();
+              });
+    return result;
+}
+
+void ShardedCache::collectKeys(vector<cache_key_t> &keys) {
+    for (auto &shard : shards_)
+        shard->collectKeys(keys);
+}
+
+py::array_t<size_t> ShardedCache::PyAPI_shardSizes() {
+    vector<size_t> sizes;
+    for (auto &shard : shards_)
+        sizes.push_back(shard->size());
+    return bind::vec(sizes);
+}
+
+} // namespace hetu
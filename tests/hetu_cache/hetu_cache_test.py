@@ -1,9 +1,12 @@
 from hetu import get_worker_communicate
 from hetu.launcher import launch
 from hetu.cstable import CacheSparseTable
+from hetu import ndarray
+from hetu.dataloader import Dataloader
 
 import ctypes
 import argparse
+import re
 import numpy as np
 from tqdm import tqdm
 
@@ -16,19 +19,125 @@ def test(args):
     width = 128
     comm.InitTensor(ctypes.c_int(node_id), ctypes.c_int(2), ctypes.c_int(length), ctypes.c_int(width), ctypes.c_int(2), ctypes.c_double(0), ctypes.c_double(0.1), ctypes.c_ulonglong(123),
                     ctypes.c_int(0), (ctypes.c_float * 1)(0.1), ctypes.c_int(1))
-    cache = CacheSparseTable(limit, length, width, node_id, "LFUOpt")
+    cache = CacheSparseTable(limit, length, width, node_id,
+                             "LFUOpt", num_shards=args.shards)
     for i in tqdm(range(10000)):
         key = np.random.randint(10000, size=1000).astype(np.uint64)
         value = np.empty((key.size, width), np.float32)
-        ts = cache.embedding_lookup(key, value)
-        ts.wait()
         grad = np.random.rand(key.size, width).astype(np.float32)
+        if args.key_dtype:
+            # raw path: NDArray keys handed to the cache in their own dtype
+            key = ndarray.array(key, ndarray.cpu(0),
+                                dtype=np.dtype(args.key_dtype).type,
+                                force32=False)
+            value = ndarray.array(value, ndarray.cpu(0))
+            grad = ndarray.array(grad, ndarray.cpu(0))
+        ts = cache.embedding_lookup(key, value)
+        if args.key_dtype:
+            # the keys are copied: the buffer is reused at once, as the
+            # dataloader's prefetch ring does, without changing the result
+            keys = key.asnumpy()
+            key[:] = np.random.randint(10000, size=keys.size)
+            ts.wait()
+            key[:] = keys
+            expected = ndarray.empty(value.shape, ndarray.cpu(0))
+            cache.embedding_lookup(key, expected, sync=True)
+            np.testing.assert_equal(value.asnumpy(), expected.asnumpy())
+        else:
+            ts.wait()
         ts = cache.embedding_update(key, grad)
         ts.wait()
 
 
+def test_dataloader(args):
+    # 64-bit ids fed from a dataloader to the raw path, as the executor does
+    comm = get_worker_communicate()
+    node_id = 0
+    limit = 10000
+    length = 10000
+    width = 128
+    comm.InitTensor(ctypes.c_int(node_id), ctypes.c_int(2), ctypes.c_int(length), ctypes.c_int(width), ctypes.c_int(2), ctypes.c_double(0), ctypes.c_double(0.1), ctypes.c_ulonglong(123),
+                    ctypes.c_int(0), (ctypes.c_float * 1)(0.1), ctypes.c_int(1))
+    cache = CacheSparseTable(limit, length, width, node_id,
+                             "LFUOpt", num_shards=args.shards)
+    # ids above 2**32 must not be narrowed on the way
+    wide = np.array([[2 ** 33, 2 ** 33 + 1]], dtype=np.int64)
+    dl = Dataloader(wide, 1, dtype=np.int64)
+    dl.init_states()
+    dl.all_batch_indices = dl.create_indices()
+    assert dl.get_arr().dtype == np.int64
+    np.testing.assert_equal(dl.get_arr().asnumpy(), wide)
+
+    ids = np.random.randint(length, size=(100, 1000)).astype(np.int64)
+    dl = Dataloader(ids, 1, dtype=np.int64, num_workers=2)
+    dl.init_states()
+    dl.all_batch_indices = dl.create_indices()
+    for i in tqdm(range(dl.batch_num)):
+        key = dl.get_arr()
+        assert key.dtype == np.int64
+        value = ndarray.empty(key.shape + (width,), ndarray.cpu(0))
+        cache.embedding_lookup(key, value, sync=True)
+        expected = np.empty((ids.shape[1], width), np.float32)
+        cache.embedding_lookup(ids[i].astype(np.uint64), expected, sync=True)
+        np.testing.assert_equal(value.asnumpy()[0], expected)
+        dl.get_next_arr()
+    dl.close()
+
+
+def pool_stats(cache):
+    # the accounting of __repr__
+    fields = re.search(r"(\d+)/\d+ ,.* row bytes:(\d+) .* bytes:(\d+) , pool rows:(\d+)/(\d+) , pool bytes:(\d+)",
+                       repr(cache)).groups()
+    return dict(zip(('size', 'row_bytes', 'bytes', 'pool_used', 'pool_capacity', 'pool_bytes'),
+                    map(int, fields)))
+
+
+def test_pool(args):
+    # evicted rows give their slab slots to the rows inserted after them
+    comm = get_worker_communicate()
+    node_id = 0
+    limit = 1000
+    length = 100000
+    width = 128
+    comm.InitTensor(ctypes.c_int(node_id), ctypes.c_int(2), ctypes.c_int(length), ctypes.c_int(width), ctypes.c_int(2), ctypes.c_double(0), ctypes.c_double(0.1), ctypes.c_ulonglong(123),
+                    ctypes.c_int(0), (ctypes.c_float * 1)(0.1), ctypes.c_int(1))
+    cache = CacheSparseTable(limit, length, width, node_id,
+                             "LRU", num_shards=args.shards)
+    batch = 500
+    capacities = []
+    for i in tqdm(range(length // batch)):
+        # new keys every time, each lookup evicts the rows of an older one
+        key = np.arange(i * batch, (i + 1) * batch, dtype=np.uint64)
+        value = np.empty((key.size, width), np.float32)
+        cache.embedding_lookup(key, value, sync=True)
+        stats = pool_stats(cache)
+        assert stats['size'] <= min((i + 1) * batch, limit), stats
+        if args.shards == 1:
+            assert stats['size'] == min((i + 1) * batch, limit), stats
+        assert stats['bytes'] == stats['size'] * stats['row_bytes'], stats
+        assert stats['row_bytes'] > width * 4, stats
+        # rows of the cache, and the evicted ones until they are pushed
+        assert stats['size'] <= stats['pool_used'] <= stats['size'] + batch, stats
+        assert stats['pool_bytes'] == stats['pool_capacity'] * width * 4, stats
+        capacities.append(stats['pool_capacity'])
+    # the slabs stop growing once the cache is full
+    assert len(set(capacities[len(capacities) // 2:])) == 1, capacities
+    print(repr(cache))
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("config")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--key-dtype", default=None,
+                        choices=["float32", "int32", "int64"],
+                        help="use NDArray keys of this dtype (raw path)")
+    parser.add_argument("--dataloader", action="store_true",
+                        help="feed 64-bit ids from a dataloader (raw path)")
+    parser.add_argument("--pool", action="store_true",
+                        help="check the slab pool accounting over evictions")
     args = parser.parse_args()
-    launch(test, args)
+    if args.pool:
+        launch(test_pool, args)
+    else:
+        launch(test_dataloader if args.dataloader else test, args)
@@ -0,0 +1,224 @@
+import hetu as ht
+from hetu.cstable import CacheSparseTable
+
+import os
+import re
+import shutil
+import tempfile
+import yaml
+import multiprocessing
+import argparse
+import signal
+import numpy as np
+import ctypes
+
+
+# checkpoints of parameters on PS: a base, rows pushed, two incremental saves,
+# then loaded into fresh parameters; the restored values and optimizer states
+# (Adam m/v and b1t/b2t, momentum) and cache row versions must equal those of
+# the trained parameters saved in full
+
+dense_len = 10000
+nitem = 2000
+item_len = 16
+ind_len = 500
+lr, beta1, beta2, eps = 0.01, 0.9, 0.999, 1e-7
+
+# node ids; the fresh parameters are offset by restored
+DENSE, SPARSE, CACHE = 0, 1, 2
+restored = 10
+# ptype, length, width, otype, optimizer arguments
+params = {
+    DENSE: (0, dense_len, 1, 4, [lr, beta1, beta2, eps]),
+    SPARSE: (1, nitem, item_len, 1, [lr, 0.9]),
+    CACHE: (2, nitem, item_len, 1, [lr, 0.9]),
+}
+header_len = 6  # uint64 fields of CkptHeader
+
+
+def init_param(comm, node_id, ptype, length, width, otype, opt_args):
+    comm.InitTensor(ctypes.c_int(node_id), ctypes.c_int(ptype), ctypes.c_int(length), ctypes.c_int(width), ctypes.c_int(2), ctypes.c_double(0), ctypes.c_double(0.1), ctypes.c_ulonglong(123),
+                    ctypes.c_int(otype), (ctypes.c_float * len(opt_args))(*opt_args), ctypes.c_int(len(opt_args)))
+
+
+def save(comm, node_id, path, incremental):
+    comm.SaveParam(ctypes.c_int(node_id), ctypes.c_char_p(
+        bytes(path, 'utf-8')), ctypes.c_bool(incremental))
+    comm.Wait(ctypes.c_int(node_id))
+
+
+def load(comm, node_id, path):
+    comm.LoadParam(ctypes.c_int(node_id), ctypes.c_char_p(
+        bytes(path, 'utf-8')))
+    comm.Wait(ctypes.c_int(node_id))
+
+
+def files(path, node_id):
+    # checkpoint files of a parameter, without the node id
+    pattern = re.compile(r'^%d_(.*)$' % node_id)
+    return sorted(m.group(1) for m in map(pattern.match, os.listdir(path)) if m)
+
+
+def read_opt(path, num_states, state_size, rows=None):
+    # scalars, states and row versions of a .opt file
+    buf = np.fromfile(path, dtype=np.uint8)
+    header = [int(x) for x in buf[:header_len * 8].view(np.uint64)]
+    assert header[3] == num_states
+    offset = header_len * 8
+    scalars = buf[offset:offset + header[4] * 4].view(np.float32)
+    offset += header[4] * 4
+    states = []
+    for _ in range(num_states):
+        states.append(buf[offset:offset + state_size * 4].view(np.float32))
+        offset += state_size * 4
+    versions = buf[offset:offset + rows * 8].view(np.int64) if header[5] else None
+    return scalars, states, versions
+
+
+def push(comm, cache, dense_grads, step):
+    ctx = ht.cpu(0)
+    rng = np.random.RandomState(step)
+    grad = rng.normal(scale=0.1, size=dense_len).astype(np.float32)
+    dense_grads.append(grad)
+    grad = ht.array(grad, ctx=ctx)
+    comm.Push(DENSE, grad.handle, None)
+    comm.Wait(DENSE)
+    # a few rows per step, so that the deltas hold part of the table
+    ind = rng.randint(nitem // 4 * (step % 4), nitem // 4 * (step % 4 + 1),
+                      size=ind_len)
+    grad = rng.normal(scale=0.1, size=(ind_len, item_len)).astype(np.float32)
+    comm.SparsePush(SPARSE, ht.array(ind.astype(np.float32), ctx=ctx).handle,
+                    ht.array(grad, ctx=ctx).handle, None)
+    comm.Wait(SPARSE)
+    cache.embedding_update(ind.astype(np.uint64), grad, sync=True)
+
+
+def test(steps=(3, 2, 2)):
+    comm = ht.get_worker_communicate()
+    for node_id, args in params.items():
+        init_param(comm, node_id, *args)
+    # a small cache evicts, and pushes the rows to the server
+    cache = CacheSparseTable(
+        nitem // 20, nitem, item_len, CACHE, "LRU", bound=1)
+    work_dir = tempfile.mkdtemp()
+    ckpt_dir, full_dir, restored_dir = [os.path.join(work_dir, d)
+                                        for d in ('ckpt', 'full', 'restored')]
+    for d in (ckpt_dir, full_dir, restored_dir):
+        os.mkdir(d)
+    try:
+        dense_grads = []
+        step = 0
+        for i, num in enumerate(steps):
+            for _ in range(num):
+                push(comm, cache, dense_grads, step)
+                step += 1
+            for node_id in params:
+                save(comm, node_id, ckpt_dir, incremental=i > 0)
+        for node_id in params:
+            save(comm, node_id, full_dir, incremental=False)
+            assert any(f.endswith('.delta.%d' % (len(steps) - 1))
+                       for f in files(ckpt_dir, node_id))
+            assert not any('.delta.' in f for f in files(full_dir, node_id))
+
+        # fresh parameters, loading the files renamed to their ids
+        for node_id, args in params.items():
+            init_param(comm, node_id + restored, *args)
+            for f in files(ckpt_dir, node_id):
+                shutil.copy(os.path.join(ckpt_dir, '%d_%s' % (node_id, f)),
+                            os.path.join(ckpt_dir, '%d_%s' % (node_id + restored, f)))
+            load(comm, node_id + restored, ckpt_dir)
+            save(comm, node_id + restored, restored_dir, incremental=False)
+            expected = files(full_dir, node_id)
+            assert files(restored_dir, node_id + restored) == expected
+            for f in expected:
+                with open(os.path.join(full_dir, '%d_%s' % (node_id, f)), 'rb') as fe, \
+                        open(os.path.join(restored_dir, '%d_%s' % (node_id + restored, f)), 'rb') as fa:
+                    assert fe.read() == fa.read(), 'node %d: %s differs' % (node_id, f)
+
+        # the values pulled from the restored parameters
+        ctx = ht.cpu(0)
+        for node_id, shape in ((DENSE, (dense_len,)), (SPARSE, (nitem, item_len))):
+            expected = ht.empty(shape, ctx=ctx)
+            actual = ht.empty(shape, ctx=ctx)
+            comm.Pull(node_id, expected.handle)
+            comm.Pull(node_id + restored, actual.handle)
+            comm.Wait(node_id)
+            comm.Wait(node_id + restored)
+            np.testing.assert_equal(actual.asnumpy(), expected.asnumpy())
+
+        # the files hold what Adam computes: m, v, b1t and b2t
+        m = np.zeros(dense_len, np.float32)
+        v = np.zeros(dense_len, np.float32)
+        for grad in dense_grads:
+            m = beta1 * m + (1 - beta1) * grad
+            v = beta2 * v + (1 - beta2) * grad * grad
+        states_m, states_v = [], []
+        for f in files(full_dir, DENSE):
+            if f.endswith('.opt'):
+                path = os.path.join(full_dir, '%d_%s' % (DENSE, f))
+                size = (os.path.getsize(path) - header_len * 8 - 8) // 8
+                scalars, (pm, pv), _ = read_opt(path, 2, size)
+                np.testing.assert_allclose(
+                    scalars, [beta1 ** step, beta2 ** step], rtol=1e-6)
+                states_m.append(pm)
+                states_v.append(pv)
+        np.testing.assert_allclose(np.concatenate(states_m), m, rtol=1e-4, atol=1e-7)
+        np.testing.assert_allclose(np.concatenate(states_v), v, rtol=1e-4, atol=1e-9)
+
+        # the cache rows pushed have versions
+        versions = []
+        for f in files(full_dir, CACHE):
+            if f.endswith('.opt'):
+                path = os.path.join(full_dir, '%d_%s' % (CACHE, f))
+                rows = (os.path.getsize(path) - header_len * 8) // (item_len * 4 + 8)
+                _, _, ver = read_opt(path, 1, rows * item_len, rows)
+                versions.append(ver)
+        assert np.concatenate(versions).any()
+        print('checkpoint with %d incremental saves restored.' % (len(steps) - 1))
+    finally:
+        shutil.rmtree(work_dir)
+        for node_id in params:
+            for k in (node_id, node_id + restored):
+                comm.ClearOnServer(k)
+                comm.Clear(k)
+
+
+def start_process(settings, args):
+    for key, value in settings.items():
+        os.environ[key] = str(value)
+    if os.environ['DMLC_ROLE'] == "server":
+        ht.server_init()
+        ht.server_finish()
+    elif os.environ['DMLC_ROLE'] == "worker":
+        ht.worker_init()
+        test()
+        ht.worker_finish()
+    elif os.environ['DMLC_ROLE'] == "scheduler":
+        ht.scheduler_init()
+        ht.scheduler_finish()
+    else:
+        raise ValueError("Unknown role", os.environ['DMLC_ROLE'])
+
+
+def signal_handler(signal, frame):
+    print("SIGINT signal caught, stop Training")
+    for proc in process_list:
+        proc.kill()
+    exit(0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default='./local_s2_w1.yml')
+    args = parser.parse_args()
+    settings = yaml.load(open(args.config).read(), Loader=yaml.FullLoader)
+    process_list = []
+    for key, value in settings.items():
+        if key != 'shared':
+            proc = multiprocessing.Process(
+                target=start_process, args=[value, args])
+            process_list.append(proc)
+            proc.start()
+    signal.signal(signal.SIGINT, signal_handler)
+    for proc in process_list:
+        proc.join()
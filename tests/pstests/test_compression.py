@@ -0,0 +1,95 @@
+import hetu as ht
+from hetu.gpu_ops.Variable import PS_COMPRESSION
+
+import os
+import yaml
+import multiprocessing
+import argparse
+import signal
+import numpy as np
+import ctypes
+
+
+# sparse push/pull of an encoded table against a raw one fed the same
+# gradients, and the bytes each sends (see the loads_<rank>.txt records)
+
+
+def test(codec, nitem=10000, item_len=64, ind_len=1000, steps=50):
+    ctx = ht.cpu(0)
+    comm = ht.get_worker_communicate()
+    raw_key, key = 0, 1
+    for k in (raw_key, key):
+        comm.InitTensor(k, ctypes.c_int(1), ctypes.c_int(nitem), ctypes.c_int(item_len), ctypes.c_int(0), ctypes.c_double(0), ctypes.c_double(1), ctypes.c_ulonglong(123),
+                        ctypes.c_int(0), (ctypes.c_float * 1)(0.1), ctypes.c_int(1))
+    comm.SetCompression(key, ctypes.c_int(
+        PS_COMPRESSION[codec]), ctypes.c_bool(True))
+    np.random.seed(0)
+    ind = ht.array(np.arange(ind_len).astype(np.float32), ctx=ctx)
+    raw_out = ht.empty((ind_len, item_len), ctx=ctx)
+    out = ht.empty((ind_len, item_len), ctx=ctx)
+    comm.getLoads()
+    for _ in range(steps):
+        grad = ht.array(np.random.normal(
+            scale=1e-2, size=(ind_len, item_len)).astype(np.float32), ctx=ctx)
+        comm.SparsePush(raw_key, ind.handle, grad.handle, None)
+        comm.SparsePush(key, ind.handle, grad.handle, None)
+        comm.Wait(raw_key)
+        comm.Wait(key)
+    comm.SparsePull(raw_key, ind.handle, raw_out.handle)
+    comm.SparsePull(key, ind.handle, out.handle)
+    comm.Wait(raw_key)
+    comm.Wait(key)
+    comm.getLoads()
+    expected, actual = raw_out.asnumpy(), out.asnumpy()
+    error = np.abs(actual - expected).max() / np.abs(expected).max()
+    print('codec {}: max relative error {:.2e}'.format(codec, error))
+    # error feedback keeps the drift at the precision of a single push
+    assert error < 1e-2
+    for k in (raw_key, key):
+        comm.ClearOnServer(k)
+        comm.Clear(k)
+
+
+def start_process(settings, args):
+    for key, value in settings.items():
+        os.environ[key] = str(value)
+    if os.environ['DMLC_ROLE'] == "server":
+        ht.server_init()
+        ht.server_finish()
+    elif os.environ['DMLC_ROLE'] == "worker":
+        ht.worker_init()
+        comm = ht.get_worker_communicate()
+        comm.startRecord(ctypes.c_char_p(bytes(args.log_dir, 'utf-8')))
+        for codec in ('fp16', 'bf16', 'int8'):
+            test(codec)
+        ht.worker_finish()
+    elif os.environ['DMLC_ROLE'] == "scheduler":
+        ht.scheduler_init()
+        ht.scheduler_finish()
+    else:
+        raise ValueError("Unknown role", os.environ['DMLC_ROLE'])
+
+
+def signal_handler(signal, frame):
+    print("SIGINT signal caught, stop Training")
+    for proc in process_list:
+        proc.kill()
+    exit(0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default='./local_s2_w1.yml')
+    parser.add_argument("--log-dir", default='.')
+    args = parser.parse_args()
+    settings = yaml.load(open(args.config).read(), Loader=yaml.FullLoader)
+    process_list = []
+    for key, value in settings.items():
+        if key != 'shared':
+            proc = multiprocessing.Process(
+                target=start_process, args=[value, args])
+            process_list.append(proc)
+            proc.start()
+    signal.signal(signal.SIGINT, signal_handler)
+    for proc in process_list:
+        proc.join()
@@ -0,0 +1,106 @@
+import hetu as ht
+
+import time
+import os
+import yaml
+import multiprocessing
+import argparse
+import signal
+import numpy as np
+import ctypes
+
+
+# push/pull throughput of all workers on one shared embedding table, against
+# the server lock mode (PS_LOCK_MODE) and thread counts
+# (PS_SERVER_OMP_THREADS, PS_RECV_THREADS)
+
+
+def test(func_name, queue, nitem=100000, item_len=128, ind_len=2000, duration=10):
+    ctx = ht.cpu(0)
+    rank = int(os.environ["WORKER_ID"])
+    comm = ht.get_worker_communicate()
+    key = 0
+    comm.InitTensor(key, ctypes.c_int(1), ctypes.c_int(nitem), ctypes.c_int(item_len), ctypes.c_int(0), ctypes.c_double(0), ctypes.c_double(1), ctypes.c_ulonglong(123),
+                    ctypes.c_int(0), (ctypes.c_float * 1)(0.1), ctypes.c_int(1))
+    inarr = ht.array(np.random.rand(ind_len, item_len), ctx=ctx)
+    outarr = ht.array(np.random.rand(ind_len, item_len), ctx=ctx)
+    np.random.seed(rank)
+    comm.BarrierWorker()
+    count = 0
+    start = time.time()
+    while time.time() - start < duration:
+        # rows of different workers are mostly disjoint
+        inind = ht.array(np.random.choice(
+            nitem, ind_len, replace=False).astype(np.float32), ctx=ctx)
+        if func_name in ('sparsepush', 'sparsepushnsparsepull'):
+            comm.SparsePush(key, inind.handle, inarr.handle, None)
+        if func_name in ('sparsepull', 'sparsepushnsparsepull'):
+            comm.SparsePull(key, inind.handle, outarr.handle)
+        comm.Wait(key)
+        count += 1
+    elapsed = time.time() - start
+    comm.BarrierWorker()
+    if rank == 0:
+        comm.ClearOnServer(key)
+    comm.Clear(key)
+    queue.put(count * ind_len * item_len * 4 / elapsed / 2 ** 20)
+
+
+def start_process(settings, args, queue):
+    for key, value in settings.items():
+        os.environ[key] = str(value)
+    if os.environ['DMLC_ROLE'] == "server":
+        ht.server_init()
+        ht.server_finish()
+    elif os.environ['DMLC_ROLE'] == "worker":
+        ht.worker_init()
+        test(args.func, queue, duration=args.duration)
+        ht.worker_finish()
+    elif os.environ['DMLC_ROLE'] == "scheduler":
+        ht.scheduler_init()
+        ht.scheduler_finish()
+    else:
+        raise ValueError("Unknown role", os.environ['DMLC_ROLE'])
+
+
+def run(settings, args, lock_mode, threads):
+    global process_list
+    queue = multiprocessing.Queue()
+    process_list = []
+    for key, value in settings.items():
+        if key != 'shared':
+            value = dict(value, PS_LOCK_MODE=lock_mode, PS_SERVER_OMP_THREADS=threads,
+                         PS_RECV_THREADS=threads)
+            proc = multiprocessing.Process(
+                target=start_process, args=[value, args, queue])
+            process_list.append(proc)
+            proc.start()
+    for proc in process_list:
+        proc.join()
+    speeds = [queue.get() for _ in range(int(settings['shared']['DMLC_NUM_WORKER']))]
+    return sum(speeds)
+
+
+def signal_handler(signal, frame):
+    print("SIGINT signal caught, stop Training")
+    for proc in process_list:
+        proc.kill()
+    exit(0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default='./local_s2_w2.yml')
+    parser.add_argument("--func", default='sparsepushnsparsepull')
+    parser.add_argument("--threads", type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+    assert args.func in ('sparsepush', 'sparsepull', 'sparsepushnsparsepull')
+    settings = yaml.load(open(args.config).read(), Loader=yaml.FullLoader)
+    process_list = []
+    signal.signal(signal.SIGINT, signal_handler)
+    for lock_mode in ('table', 'row'):
+        for threads in args.threads:
+            speed = run(settings, args, lock_mode, threads)
+            print('{}, lock mode {}, {} threads: {:.1f} MB/s'.format(
+                args.func, lock_mode, threads, speed))
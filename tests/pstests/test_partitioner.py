@@ -0,0 +1,88 @@
+import hetu as ht
+
+import os
+import yaml
+import multiprocessing
+import argparse
+import signal
+import numpy as np
+import ctypes
+
+
+# dense push/pull of a table striped over the servers by PS_PARTITIONER=hash
+# must see the rows in table order, as sparse pulls of the same rows do
+
+
+def test(nitem=1001, item_len=8):
+    ctx = ht.cpu(0)
+    comm = ht.get_worker_communicate()
+    key = 0
+    comm.InitTensor(key, ctypes.c_int(1), ctypes.c_int(nitem), ctypes.c_int(item_len), ctypes.c_int(0), ctypes.c_double(0), ctypes.c_double(1), ctypes.c_ulonglong(123),
+                    ctypes.c_int(0), (ctypes.c_float * 1)(0.1), ctypes.c_int(1))
+    table = np.arange(nitem * item_len, dtype=np.float32).reshape(
+        nitem, item_len)
+    comm.Push(key, ht.array(table, ctx=ctx).handle, None)
+    comm.Wait(key)
+    out = ht.empty((nitem, item_len), ctx=ctx)
+    comm.Pull(key, out.handle)
+    comm.Wait(key)
+    np.testing.assert_equal(out.asnumpy(), table)
+
+    rows = np.array([0, 1, 2, 57, nitem - 2, nitem - 1])
+    ind = ht.array(rows.astype(np.float32), ctx=ctx)
+    sparse_out = ht.empty((len(rows), item_len), ctx=ctx)
+    comm.SparsePull(key, ind.handle, sparse_out.handle)
+    comm.Wait(key)
+    np.testing.assert_equal(sparse_out.asnumpy(), table[rows])
+
+    comm.DDPushPull(key, ht.array(table, ctx=ctx).handle, out.handle, None)
+    comm.Wait(key)
+    np.testing.assert_equal(out.asnumpy(), 2 * table)
+    print('dense rows of a {} partitioned table in order'.format(
+        os.environ['PS_PARTITIONER']))
+    comm.ClearOnServer(key)
+    comm.Clear(key)
+
+
+def start_process(settings, args):
+    for key, value in settings.items():
+        os.environ[key] = str(value)
+    os.environ['PS_PARTITIONER'] = args.partitioner
+    if os.environ['DMLC_ROLE'] == "server":
+        ht.server_init()
+        ht.server_finish()
+    elif os.environ['DMLC_ROLE'] == "worker":
+        ht.worker_init()
+        test()
+        ht.worker_finish()
+    elif os.environ['DMLC_ROLE'] == "scheduler":
+        ht.scheduler_init()
+        ht.scheduler_finish()
+    else:
+        raise ValueError("Unknown role", os.environ['DMLC_ROLE'])
+
+
+def signal_handler(signal, frame):
+    print("SIGINT signal caught, stop Training")
+    for proc in process_list:
+        proc.kill()
+    exit(0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default='./local_s2_w1.yml')
+    parser.add_argument("--partitioner", default='hash',
+                        choices=['average', 'block', 'hash'])
+    args = parser.parse_args()
+    settings = yaml.load(open(args.config).read(), Loader=yaml.FullLoader)
+    process_list = []
+    for key, value in settings.items():
+        if key != 'shared':
+            proc = multiprocessing.Process(
+                target=start_process, args=[value, args])
+            process_list.append(proc)
+            proc.start()
+    signal.signal(signal.SIGINT, signal_handler)
+    for proc in process_list:
+        proc.join()
@@ -0,0 +1,76 @@
+import hetu as ht
+
+import time
+import os
+import yaml
+import multiprocessing
+import argparse
+import signal
+import ctypes
+
+
+# workers of different speeds pass the SSP barrier, none gets more than
+# tolerance versions ahead of the slowest; prints the wait statistics
+
+
+def test(versions, tolerance, steps):
+    comm = ht.get_worker_communicate()
+    rank = int(os.environ["WORKER_ID"])
+    key = ctypes.c_ulonglong(0)
+    comm.ssp_init(key, ctypes.c_size_t(len(versions)),
+                  ctypes.c_ulonglong(tolerance))
+    for i in range(steps):
+        versions[rank] = i
+        comm.ssp_sync(key, ctypes.c_ulonglong(i))
+        assert min(versions) + tolerance >= i, (rank, i, list(versions))
+        time.sleep(0.01 * (rank + 1))
+    versions[rank] = steps
+    stats = (ctypes.c_double * 4)()
+    comm.ssp_stats(key, stats)
+    print('rank {}: {:.0f} syncs, {:.1f} ms in total, at most {:.1f} ms, {:.0f} timeouts'.format(
+        rank, *stats))
+
+
+def start_process(settings, args, versions):
+    for key, value in settings.items():
+        os.environ[key] = str(value)
+    if os.environ['DMLC_ROLE'] == "server":
+        ht.server_init()
+        ht.server_finish()
+    elif os.environ['DMLC_ROLE'] == "worker":
+        ht.worker_init()
+        test(versions, args.tolerance, args.steps)
+        ht.worker_finish()
+    elif os.environ['DMLC_ROLE'] == "scheduler":
+        ht.scheduler_init()
+        ht.scheduler_finish()
+    else:
+        raise ValueError("Unknown role", os.environ['DMLC_ROLE'])
+
+
+def signal_handler(signal, frame):
+    print("SIGINT signal caught, stop Training")
+    for proc in process_list:
+        proc.kill()
+    exit(0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default='./local_s2_w2.yml')
+    parser.add_argument("--tolerance", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=50)
+    args = parser.parse_args()
+    settings = yaml.load(open(args.config).read(), Loader=yaml.FullLoader)
+    versions = multiprocessing.Array(
+        'i', int(settings['shared']['DMLC_NUM_WORKER']))
+    process_list = []
+    for key, value in settings.items():
+        if key != 'shared':
+            proc = multiprocessing.Process(
+                target=start_process, args=[value, args, versions])
+            process_list.append(proc)
+            proc.start()
+    signal.signal(signal.SIGINT, signal_handler)
+    for proc in process_list:
+        proc.join()
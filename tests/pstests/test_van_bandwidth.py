@@ -0,0 +1,96 @@
+import hetu as ht
+
+import time
+import os
+import yaml
+import multiprocessing
+import argparse
+import signal
+import numpy as np
+import ctypes
+
+
+# dense push+pull latency and bandwidth of the shared memory van against plain
+# ZMQ (PS_SHM_VAN=0), all nodes on this host
+
+
+def test(queue, sizes, repeat):
+    ctx = ht.cpu(0)
+    comm = ht.get_worker_communicate()
+    results = []
+    for key, size in enumerate(sizes):
+        comm.InitTensor(key, ctypes.c_int(0), ctypes.c_int(size), ctypes.c_int(1), ctypes.c_int(0), ctypes.c_double(0), ctypes.c_double(1), ctypes.c_ulonglong(123),
+                        ctypes.c_int(0), (ctypes.c_float * 1)(0.1), ctypes.c_int(1))
+        inarr = ht.array(np.random.rand(size).astype(np.float32), ctx=ctx)
+        outarr = ht.empty((size,), ctx=ctx)
+        for _ in range(10):
+            comm.DDPushPull(key, inarr.handle, outarr.handle, None)
+            comm.Wait(key)
+        start = time.time()
+        for _ in range(repeat):
+            comm.DDPushPull(key, inarr.handle, outarr.handle, None)
+            comm.Wait(key)
+        elapsed = (time.time() - start) / repeat
+        results.append((size, elapsed))
+        comm.ClearOnServer(key)
+        comm.Clear(key)
+    queue.put(results)
+
+
+def start_process(settings, args, queue):
+    for key, value in settings.items():
+        os.environ[key] = str(value)
+    if os.environ['DMLC_ROLE'] == "server":
+        ht.server_init()
+        ht.server_finish()
+    elif os.environ['DMLC_ROLE'] == "worker":
+        ht.worker_init()
+        test(queue, args.sizes, args.repeat)
+        ht.worker_finish()
+    elif os.environ['DMLC_ROLE'] == "scheduler":
+        ht.scheduler_init()
+        ht.scheduler_finish()
+    else:
+        raise ValueError("Unknown role", os.environ['DMLC_ROLE'])
+
+
+def run(settings, args, shm):
+    global process_list
+    queue = multiprocessing.Queue()
+    process_list = []
+    for key, value in settings.items():
+        if key != 'shared':
+            value = dict(value, PS_SHM_VAN=int(shm))
+            proc = multiprocessing.Process(
+                target=start_process, args=[value, args, queue])
+            process_list.append(proc)
+            proc.start()
+    results = [queue.get()
+               for _ in range(int(settings['shared']['DMLC_NUM_WORKER']))]
+    for proc in process_list:
+        proc.join()
+    return results[0]
+
+
+def signal_handler(signal, frame):
+    print("SIGINT signal caught, stop Training")
+    for proc in process_list:
+        proc.kill()
+    exit(0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default='./local_s2_w1.yml')
+    parser.add_argument("--sizes", type=int, nargs='+',
+                        default=[1 << 8, 1 << 12, 1 << 16, 1 << 20, 1 << 24])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+    settings = yaml.load(open(args.config).read(), Loader=yaml.FullLoader)
+    process_list = []
+    signal.signal(signal.SIGINT, signal_handler)
+    for shm in (False, True):
+        for size, elapsed in run(settings, args, shm):
+            # the values are pushed and pulled back
+            print('{}, {} floats: latency {:.1f} us, bandwidth {:.1f} MB/s'.format(
+                'shm' if shm else 'zmq', size, elapsed * 1e6, 2 * size * 4 / elapsed / 2 ** 20))
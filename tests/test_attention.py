@@ -0,0 +1,209 @@
+import hetu as ht
+from hetu import init
+from hetu import cpu_links
+from hetu.gpu_ops.Attention import FusedAttentionOp
+import numpy as np
+import argparse
+import time
+
+
+# The cpu layer norm, batch matmul, softmax gradient and attention kernels
+# against numpy, then MultiHeadAttention with and without fuse_ops.
+
+def softmax(x):
+    x = np.exp(x - x.max(axis=-1, keepdims=True))
+    return x / x.sum(axis=-1, keepdims=True)
+
+
+def test_layer_norm(shape=(6, 5, 48), eps=1e-5):
+    x = np.random.normal(size=shape).astype(np.float32)
+    scale = np.random.normal(size=shape[-1:]).astype(np.float32)
+    bias = np.random.normal(size=shape[-1:]).astype(np.float32)
+    dy = np.random.normal(size=shape).astype(np.float32)
+    local_shape = shape[:-1] + (1,)
+    arrs = [ht.array(v, ht.cpu(0)) for v in (x, scale, bias, dy)]
+    mean, var = ht.empty(local_shape, ht.cpu(0)), ht.empty(local_shape, ht.cpu(0))
+    y = ht.empty(shape, ht.cpu(0))
+    cpu_links.layer_normalization(*arrs[:3], mean, var, y, eps)
+    grads = [ht.empty(v.shape, ht.cpu(0)) for v in (x, scale, bias)]
+    cpu_links.layer_normalization_gradient(
+        arrs[3], arrs[0], arrs[1], *grads, mean, var, eps)
+
+    mu = x.mean(axis=-1, keepdims=True)
+    sigma2 = x.var(axis=-1, keepdims=True)
+    xhat = (x - mu) / np.sqrt(sigma2 + eps)
+    np.testing.assert_allclose(mean.asnumpy(), mu, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(var.asnumpy(), sigma2, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(
+        y.asnumpy(), xhat * scale + bias, rtol=1e-4, atol=1e-5)
+    dxhat = dy * scale
+    dx = (dxhat - dxhat.mean(axis=-1, keepdims=True) - xhat *
+          (dxhat * xhat).mean(axis=-1, keepdims=True)) / np.sqrt(sigma2 + eps)
+    axes = tuple(range(len(shape) - 1))
+    for grad, expected in zip(grads, (dx, (dy * xhat).sum(axes), dy.sum(axes))):
+        np.testing.assert_allclose(
+            grad.asnumpy(), expected, rtol=1e-4, atol=1e-4)
+
+
+def test_batch_matmul(batch=(3, 4), m=5, n=7, k=6):
+    for trans_A in (False, True):
+        for trans_B in (False, True):
+            a = np.random.normal(size=batch + ((k, m) if trans_A else (m, k)))
+            b = np.random.normal(size=batch + ((n, k) if trans_B else (k, n)))
+            c = ht.empty(batch + (m, n), ht.cpu(0))
+            cpu_links.batch_matrix_multiply(ht.array(a, ht.cpu(0)), trans_A,
+                                            ht.array(b, ht.cpu(0)), trans_B, c)
+            expected = np.matmul(np.swapaxes(a, -1, -2) if trans_A else a,
+                                 np.swapaxes(b, -1, -2) if trans_B else b)
+            np.testing.assert_allclose(
+                c.asnumpy(), expected, rtol=1e-4, atol=1e-5)
+
+
+def test_softmax_gradient(shape=(2, 3, 5, 17)):
+    y = softmax(np.random.normal(size=shape)).astype(np.float32)
+    dy = np.random.normal(size=shape).astype(np.float32)
+    dx = ht.empty(shape, ht.cpu(0))
+    cpu_links.softmax_gradient(ht.array(y, ht.cpu(0)),
+                               ht.array(dy, ht.cpu(0)), dx)
+    expected = y * (dy - (dy * y).sum(axis=-1, keepdims=True))
+    np.testing.assert_allclose(dx.asnumpy(), expected, rtol=1e-4, atol=1e-6)
+
+
+def run_attention(q, k, v, mask, seq_len, num_heads, causal, keep_prob, seed):
+    arrs = [ht.array(a, ht.cpu(0)) for a in (q, k, v)]
+    mask = None if mask is None else ht.array(mask, ht.cpu(0))
+    output = ht.empty(q.shape, ht.cpu(0))
+    lse = ht.empty((q.shape[0] // seq_len, num_heads, seq_len), ht.cpu(0))
+    scale = 1 / np.sqrt(q.shape[1] // num_heads)
+    cpu_links.attention(*arrs, mask, output, lse, seq_len,
+                        num_heads, scale, causal, keep_prob, seed, 0)
+    return arrs, mask, output, lse, scale
+
+
+def test_attention_dropout(batch=2, seq_len=70, hidden=32, num_heads=2, keep_prob=0.8):
+    # the backward pass drops the same probabilities as the forward pass:
+    # compare the gradient with central differences along random directions
+    q, k, v, dy = [np.random.normal(size=(batch * seq_len, hidden)).astype(np.float32)
+                   for _ in range(4)]
+    mask = np.zeros((batch, 1, 1, seq_len), dtype=np.float32)
+    mask[0, ..., -5:] = -10000.
+
+    def loss(q, k, v):
+        output = run_attention(q, k, v, mask, seq_len, num_heads,
+                               True, keep_prob, 1234)[2].asnumpy()
+        return (output.astype(np.float64) * dy).sum()
+
+    arrs, mask_arr, output, lse, scale = run_attention(
+        q, k, v, mask, seq_len, num_heads, True, keep_prob, 1234)
+    np.testing.assert_equal(output.asnumpy(), run_attention(
+        q, k, v, mask, seq_len, num_heads, True, keep_prob, 1234)[2].asnumpy())
+    grads = [ht.empty(q.shape, ht.cpu(0)) for _ in range(3)]
+    cpu_links.attention_gradient(*arrs, mask_arr, output, lse, ht.array(dy, ht.cpu(0)),
+                                 *grads, seq_len, num_heads, scale, True, keep_prob, 1234, 0)
+    inputs = [q, k, v]
+    for i, grad in enumerate(grads):
+        direction = np.random.normal(size=q.shape).astype(np.float32)
+        eps = 1e-2
+        plus, minus = list(inputs), list(inputs)
+        plus[i] = inputs[i] + eps * direction
+        minus[i] = inputs[i] - eps * direction
+        numeric = (loss(*plus) - loss(*minus)) / (2 * eps)
+        analytic = (grad.asnumpy().astype(np.float64) * direction).sum()
+        np.testing.assert_allclose(analytic, numeric, rtol=1e-2)
+
+
+def build(batch, seq_len, hidden, num_heads, causal, fuse_ops, self_attention=False):
+    np.random.seed(0)
+    ctx = ht.cpu(0)
+    with ht.context(ctx):
+        x = ht.placeholder_op(name='x')
+        mask = ht.placeholder_op(name='mask')
+        y_ = ht.placeholder_op(name='y_')
+        weights = [init.random_normal((hidden, hidden), stddev=0.1, name='weight_%s' % n)
+                   for n in ('q', 'k', 'v', 'out')]
+        query, key, value = [ht.matmul_op(x, w) for w in weights[:3]]
+        if self_attention:
+            key = query
+        attention = ht.layers.MultiHeadAttention(
+            hidden, num_heads, seq_len, causal_mask=causal)(query, key, value, mask)
+        logits = ht.matmul_op(attention, weights[3])
+        loss = ht.softmaxcrossentropy_op(logits, y_)
+        loss = ht.reduce_mean_op(loss, [0])
+        opt = ht.optim.SGDOptimizer(learning_rate=0.1)
+        train_op = opt.minimize(loss)
+    ht.random.reset_seed_seqnum()
+    executor = ht.Executor([loss, train_op], ctx=ctx, seed=0, fuse_ops=fuse_ops)
+    return executor, x, mask, y_
+
+
+def feeds(batch, seq_len, hidden, steps):
+    data = []
+    for _ in range(steps):
+        mask = np.zeros((batch, 1, 1, seq_len), dtype=np.float32)
+        # padding at the end of the first sequence
+        mask[0, ..., seq_len // 2:] = -10000.
+        data.append((np.random.normal(size=(batch * seq_len, hidden)).astype(np.float32), mask,
+                     np.eye(hidden)[np.random.randint(hidden, size=batch * seq_len)].astype(np.float32)))
+    return data
+
+
+def count(executor, op_type):
+    return sum(isinstance(node, op_type) for node in executor.subexecutor['default'].topo_order)
+
+
+def test_training(causal, self_attention=False, batch=2, seq_len=80, hidden=32, num_heads=4, steps=3):
+    data = feeds(batch, seq_len, hidden, steps)
+    results = []
+    for fuse_ops in (False, True):
+        executor, x, mask, y_ = build(batch, seq_len, hidden, num_heads, causal,
+                                      fuse_ops, self_attention)
+        # a layer reading one node twice is left as it is
+        assert count(executor, FusedAttentionOp) == int(
+            fuse_ops and not self_attention)
+        losses = [executor.run(feed_dict={x: xv, mask: mv, y_: yv}, convert_to_numpy_ret_vals=True)[0]
+                  for xv, mv, yv in data]
+        results.append((losses, executor.state_dict()))
+    np.testing.assert_allclose(results[0][0], results[1][0], rtol=1e-4)
+    for name, value in results[0][1].items():
+        np.testing.assert_allclose(
+            value, results[1][1][name], rtol=1e-3, atol=1e-5)
+    print('fused attention matches with causal=%s, self_attention=%s' %
+          (causal, self_attention))
+
+
+def benchmark(batch, seq_len, hidden, num_heads, steps):
+    xv, mv, yv = feeds(batch, seq_len, hidden, 1)[0]
+    for causal in (False, True):
+        for fuse_ops in (False, True):
+            executor, x, mask, y_ = build(batch, seq_len, hidden, num_heads,
+                                          causal, fuse_ops)
+            feed_dict = {x: xv, mask: mv, y_: yv}
+            for _ in range(3):
+                executor.run(feed_dict=feed_dict)
+            start = time.time()
+            for _ in range(steps):
+                executor.run(feed_dict=feed_dict)
+            elapsed = (time.time() - start) / steps * 1000
+            print('attention %d x %d, hidden %d, causal=%s, fuse_ops=%s: %.3f ms/step' %
+                  (batch, seq_len, hidden, causal, fuse_ops, elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--seq-len', type=int, default=256)
+    parser.add_argument('--hidden', type=int, default=256)
+    parser.add_argument('--num-heads', type=int, default=4)
+    parser.add_argument('--steps', type=int, default=10)
+    args = parser.parse_args()
+    np.random.seed(0)
+    test_layer_norm()
+    test_batch_matmul()
+    test_softmax_gradient()
+    test_attention_dropout()
+    print('cpu kernels passed')
+    test_training(False)
+    test_training(True)
+    test_training(True, self_attention=True)
+    benchmark(args.batch, args.seq_len, args.hidden,
+              args.num_heads, args.steps)
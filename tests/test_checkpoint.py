@@ -0,0 +1,87 @@
+import hetu as ht
+from hetu import init
+import numpy as np
+import argparse
+import os
+import tempfile
+
+
+def build(ctx, hidden=64):
+    with ht.context(ctx):
+        x = ht.placeholder_op(name='x')
+        y_ = ht.placeholder_op(name='y_')
+        weight1 = init.random_normal((32, hidden), stddev=0.1, name='weight1')
+        weight2 = init.random_normal((hidden, 10), stddev=0.1, name='weight2')
+        y = ht.matmul_op(ht.relu_op(ht.matmul_op(x, weight1)), weight2)
+        loss = ht.reduce_mean_op(ht.softmaxcrossentropy_op(y, y_), [0])
+        train_op = ht.optim.SGDOptimizer(learning_rate=0.1).minimize(loss)
+    executor = ht.Executor([loss, train_op], ctx=ctx)
+    return executor, x, y_
+
+
+def train(executor, x, y_, steps=5, batch=16):
+    np.random.seed(0)
+    for _ in range(steps):
+        executor.run(feed_dict={
+            x: np.random.normal(size=(batch, 32)).astype(np.float32),
+            y_: np.eye(10)[np.random.randint(10, size=batch)].astype(np.float32)})
+
+
+def test_checkpoint(ctx):
+    work_dir = tempfile.mkdtemp()
+    executor, x, y_ = build(ctx)
+    train(executor, x, y_)
+    expected = executor.state_dict()
+    executor.save(work_dir, 'pickle.bin')
+    executor.save(work_dir, 'stream.bin', stream=True)
+    executor.save(work_dir, 'background.bin', stream=True, background=True)
+    executor.wait_save()
+    for file_name in ('pickle.bin', 'stream.bin', 'background.bin'):
+        other, _, _ = build(ctx)
+        other.load(work_dir, file_name)
+        for name, value in other.state_dict().items():
+            np.testing.assert_array_equal(value, expected[name])
+    # partial load keeps the other parameters as initialized
+    other, _, _ = build(ctx)
+    initial = other.state_dict()
+    other.load(work_dir, 'stream.bin', names=['weight1'])
+    actual = other.state_dict()
+    np.testing.assert_array_equal(actual['weight1'], expected['weight1'])
+    np.testing.assert_array_equal(actual['weight2'], initial['weight2'])
+    print('checkpoint passed')
+
+
+def raises(func, *args, **kargs):
+    try:
+        func(*args, **kargs)
+    except FileNotFoundError:
+        return True
+    return False
+
+
+def test_background_error(ctx):
+    # a background save into a missing directory fails in its thread; the
+    # error is raised once, by wait_save or by the next save or load
+    work_dir = tempfile.mkdtemp()
+    executor, x, y_ = build(ctx)
+    missing = os.path.join('missing', 'background.bin')
+    executor.save(work_dir, missing, stream=True, background=True)
+    assert raises(executor.wait_save)
+    assert not raises(executor.wait_save)
+    executor.save(work_dir, missing, stream=True, background=True)
+    assert raises(executor.save, work_dir, 'stream.bin', stream=True)
+    executor.save(work_dir, 'stream.bin', stream=True)
+    executor.save(work_dir, missing, stream=True, background=True)
+    assert raises(executor.load, work_dir, 'stream.bin')
+    executor.load(work_dir, 'stream.bin')
+    assert os.listdir(work_dir) == ['stream.bin']
+    print('background save errors passed')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpu', type=int, default=-1)
+    args = parser.parse_args()
+    ctx = ht.cpu(0) if args.gpu < 0 else ht.gpu(args.gpu)
+    test_checkpoint(ctx)
+    test_background_error(ctx)
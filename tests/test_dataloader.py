@@ -0,0 +1,264 @@
+from hetu.dataloader import Dataloader, RawData, SampleIndices
+from hetu.random import set_random_seed, reset_seed_seqnum
+import numpy as np
+import argparse
+import os
+import tempfile
+import time
+
+
+# Sample shuffling, gathering from several files and data parallel shards;
+# prefetched batches of the dataloader against the synchronous path, over
+# several epochs, with shuffling, the last batch kept or dropped, jumps of
+# set_batch_index and data parallel shards; then the prefetch counters.
+
+class SlowDataloader(Dataloader):
+    # batches taking a while to load, as from disk
+    def __init__(self, *args, delay=0.01, **kargs):
+        super().__init__(*args, **kargs)
+        self.delay = delay
+
+    def _load_batch(self, batchind, out):
+        time.sleep(self.delay)
+        super()._load_batch(batchind, out)
+
+
+def make_data(num_samples=103, width=5):
+    return np.arange(num_samples * width, dtype=np.float32).reshape(num_samples, width)
+
+
+def make_dataloader(data, batch_size, seed=0, dp=None, cls=Dataloader, **kargs):
+    # a dataloader set up as DataloaderOp does, with its own shuffling seed
+    set_random_seed(seed)
+    reset_seed_seqnum()
+    dl = cls(data, batch_size, **kargs)
+    if dp is not None:
+        dl.set_dp_rank(*dp)
+    dl.init_states()
+    dl.all_batch_indices = dl.create_indices()
+    return dl
+
+
+def read_batches(dl, epochs, jumps=None):
+    # the batches of get_arr, peeking with get_next_arr every other step;
+    # jumps maps a step to the batch index set before it
+    if jumps is None:
+        jumps = {}
+    batches = []
+    for step in range(epochs * dl.batch_num):
+        if step in jumps:
+            dl.set_batch_index(jumps[step])
+        if step % 2:
+            peeked = dl.get_next_arr().asnumpy()
+        batches.append(dl.get_arr().asnumpy())
+        if step % 2:
+            np.testing.assert_equal(peeked, batches[-1])
+    return batches
+
+
+def epochs_of(indices, epochs):
+    # the sample order of each epoch
+    return [np.concatenate([indices[key] for key in range(indices.batch_num)])
+            for _ in range(epochs)]
+
+
+def test_sample_indices(epochs=3):
+    for samples_num, batch_size, batch_num in ((96, 8, 12), (103, 8, 13), (103, 8, 12)):
+        for chunk_size in (None, 16):
+            set_random_seed(123)
+            reset_seed_seqnum()
+            orders = epochs_of(SampleIndices(batch_num, batch_size, samples_num,
+                                             need_shuffle=True, chunk_size=chunk_size), epochs)
+            for order in orders:
+                # a permutation, of which drop_last leaves out the tail
+                assert len(order) == min(batch_num * batch_size, samples_num)
+                full = np.concatenate(
+                    [order, np.setdiff1d(np.arange(samples_num), order)])
+                np.testing.assert_equal(np.sort(full), np.arange(samples_num))
+                assert len(np.unique(order)) == len(order)
+            assert not np.array_equal(orders[0], orders[1])
+            # the same seed, the same epochs
+            set_random_seed(123)
+            reset_seed_seqnum()
+            again = epochs_of(SampleIndices(batch_num, batch_size, samples_num,
+                                            need_shuffle=True, chunk_size=chunk_size), epochs)
+            for a, b in zip(orders, again):
+                np.testing.assert_equal(a, b)
+            if chunk_size is None or batch_num * batch_size < samples_num:
+                continue
+            # chunk-local: every chunk is read in one run, in any order inside
+            for order in orders:
+                chunks = order // chunk_size
+                starts = np.flatnonzero(np.diff(chunks)) + 1
+                runs = np.split(chunks, starts)
+                assert len(runs) == len(np.unique(chunks))
+                for run in runs:
+                    assert len(run) == min(
+                        chunk_size, samples_num - run[0] * chunk_size)
+                assert not np.array_equal(order, np.arange(samples_num))
+    print('sample indices passed')
+
+
+def test_take(samples=(13, 1, 40, 7), width=3):
+    rng = np.random.RandomState(0)
+    arrays = [rng.rand(n, width).astype(np.float32) for n in samples]
+    whole = np.concatenate(arrays)
+    tmp = tempfile.mkdtemp()
+    # memory maps too, as the samples of large datasets are read from files
+    memmaps = []
+    for i, arr in enumerate(arrays):
+        mm = np.memmap(os.path.join(tmp, '%d.bin' % i), dtype=np.float32,
+                       mode='w+', shape=arr.shape)
+        mm[:] = arr
+        memmaps.append(mm)
+    for raw_data in (RawData(arrays, np.float32), RawData(memmaps, np.float32)):
+        assert len(raw_data) == len(whole)
+        for size in (1, 10, 200):
+            indices = rng.randint(len(whole), size=size)
+            np.testing.assert_equal(raw_data.take(indices), whole[indices])
+            out = np.empty((size, width), np.float32)
+            raw_data.take(indices, out)
+            np.testing.assert_equal(out, whole[indices])
+        # the contiguous reads of batches crossing files
+        for start, stop in ((0, 13), (10, 20), (12, 55), (0, len(whole)), (54, 61)):
+            out = np.empty((stop - start, width), np.float32)
+            raw_data.fill(start, stop, out)
+            np.testing.assert_equal(out, whole[start:stop])
+    for mm in memmaps:
+        os.remove(mm.filename)
+    os.rmdir(tmp)
+    print('take passed')
+
+
+def test_dp_shards(dp_nrank=3, epochs=2):
+    # the first column is the sample id
+    data = make_data(num_samples=103)
+    ids = data[:, 0] / data.shape[1]
+    for shuffle_mode in ('batch', 'sample'):
+        shards = []
+        for rank in range(dp_nrank):
+            dl = make_dataloader(data, 5, dp=(rank, dp_nrank), shuffle=True,
+                                 shuffle_mode=shuffle_mode, drop_last=False)
+            cur_size = len(data) // dp_nrank
+            assert dl.samples_num == cur_size
+            orders = []
+            for _ in range(epochs):
+                orders.append(np.concatenate(
+                    [dl.get_arr().asnumpy()[:, 0] / data.shape[1] for _ in range(dl.batch_num)]))
+            for order in orders:
+                # every sample of the shard once in an epoch
+                np.testing.assert_equal(
+                    np.sort(order), ids[cur_size * rank:cur_size * (rank + 1)])
+            shards.append(orders[0])
+        shards = np.concatenate(shards)
+        assert len(np.unique(shards)) == len(shards)
+    print('data parallel shards passed')
+
+
+def compare(data, batch_size, epochs=3, jumps=None, dp=None, **kargs):
+    dl = make_dataloader(data, batch_size, dp=dp, **kargs)
+    expected = read_batches(dl, epochs, jumps)
+    for num_workers in (1, 2):
+        for prefetch_depth in (1, 3):
+            dl = make_dataloader(data, batch_size, dp=dp, num_workers=num_workers,
+                                 prefetch_depth=prefetch_depth, **kargs)
+            actual = read_batches(dl, epochs, jumps)
+            dl.close()
+            assert len(actual) == len(expected)
+            for a, e in zip(actual, expected):
+                np.testing.assert_equal(a, e)
+    return expected
+
+
+def test_prefetch():
+    data = make_data()
+    for shuffle in (False, True):
+        for drop_last in (True, False):
+            for shuffle_mode, shuffle_chunk in (('batch', None), ('sample', None), ('sample', 16)):
+                kargs = dict(shuffle=shuffle, drop_last=drop_last,
+                             shuffle_mode=shuffle_mode, shuffle_chunk=shuffle_chunk)
+                batches = compare(data, 8, **kargs)
+                if shuffle:
+                    # the epochs are shuffled apart
+                    assert any(not np.array_equal(a, b) for a, b in zip(
+                        batches[:len(batches) // 3], batches[len(batches) // 3:]))
+                # jumps back and forth inside an epoch; the index may not
+                # go back to 0 before the epoch ends
+                compare(data, 8, jumps={3: 7, 5: 1, 20: 9}, **kargs)
+                for rank in range(3):
+                    compare(data, 8, dp=(rank, 3), **kargs)
+    print('prefetched batches match the synchronous path')
+
+
+def test_prefetch_stats(epochs=2, batch_size=8):
+    data = make_data(num_samples=96)
+    # loading slower than training: the first batch of an epoch is a miss,
+    # the others are prefetched but have to be waited for
+    dl = make_dataloader(data, batch_size, cls=SlowDataloader,
+                         num_workers=1, prefetch_depth=2)
+    read_batches(dl, epochs)
+    stats = dl.get_prefetch_stats()
+    assert stats['batches'] == epochs * dl.batch_num, stats
+    assert stats['misses'] == epochs, stats
+    assert stats['hits'] == epochs * (dl.batch_num - 1), stats
+    assert 0 < stats['stalls'] <= stats['hits'], stats
+    assert stats['stall_time'] > 0, stats
+    assert 0 <= stats['avg_queue_depth'] <= dl.prefetch_depth, stats
+    dl.close()
+
+    # training slower than loading: batches are ready in the queue
+    dl = make_dataloader(data, batch_size, cls=SlowDataloader, delay=0.001,
+                         num_workers=2, prefetch_depth=3)
+    for _ in range(dl.batch_num):
+        dl.get_arr()
+        time.sleep(0.02)
+    stats = dl.get_prefetch_stats()
+    assert stats['stalls'] < stats['hits'], stats
+    assert stats['avg_queue_depth'] > 1, stats
+    assert stats['queue_depth'] == 0, stats
+    dl.reset_prefetch_stats()
+    assert dl.get_prefetch_stats()['batches'] == 0
+    dl.close()
+    assert dl.workers is None
+
+    # the batch of the rest is loaded when asked for
+    dl = make_dataloader(make_data(), batch_size, drop_last=False,
+                         num_workers=1, prefetch_depth=2)
+    read_batches(dl, epochs)
+    stats = dl.get_prefetch_stats()
+    assert stats['misses'] == 2 * epochs, stats
+    dl.close()
+    print('prefetch counters passed')
+
+
+def benchmark(num_samples, width, batch_size, delay, steps):
+    data = make_data(num_samples, width)
+    for num_workers in (0, 1, 2):
+        dl = make_dataloader(data, batch_size, cls=SlowDataloader, delay=delay,
+                             num_workers=num_workers, shuffle=True, shuffle_mode='sample')
+        start = time.perf_counter()
+        for _ in range(steps):
+            dl.get_arr()
+            # the training step
+            time.sleep(delay)
+        elapsed = time.perf_counter() - start
+        print('num_workers=%d: %.3f ms/batch, %s' % (
+            num_workers, elapsed / steps * 1000, dl.get_prefetch_stats()))
+        dl.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-samples', type=int, default=100000)
+    parser.add_argument('--width', type=int, default=64)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--delay', type=float, default=0.005)
+    parser.add_argument('--steps', type=int, default=100)
+    args = parser.parse_args()
+    test_sample_indices()
+    test_take()
+    test_dp_shards()
+    test_prefetch()
+    test_prefetch_stats()
+    benchmark(args.num_samples, args.width, args.batch_size,
+              args.delay, args.steps)
@@ -0,0 +1,85 @@
+import hetu as ht
+from hetu import cpu_links
+from hetu.ndarray import NDArray
+import numpy as np
+import argparse
+import time
+
+
+# Per-call latency of the dnnl ops with the primitive cache off (every call
+# builds its primitive) and on (only the first call of a shape does).
+
+def arrays(*shapes):
+    return [ht.array(np.random.uniform(-1, 1, shape).astype(np.float32), ht.cpu(0))
+            for shape in shapes]
+
+
+def cases(batch):
+    x, y, out = arrays((batch, 256), (batch, 256), (batch, 256))
+    a, b, c = arrays((batch, 128), (128, 64), (batch, 64))
+    image, filt, conv = arrays((batch, 16, 16, 16), (16, 16, 3, 3),
+                               (batch, 16, 16, 16))
+    pooled, = arrays((batch, 16, 8, 8))
+    return [
+        ('matrix_multiply', cpu_links.matrix_multiply, (a, False, b, False, c)),
+        ('add_by_const', cpu_links.matrix_elementwise_add_by_const, (x, 2., out)),
+        ('add', cpu_links.matrix_elementwise_add, (x, y, out)),
+        ('multiply', cpu_links.matrix_elementwise_multiply, (x, y, out)),
+        ('relu', cpu_links.relu, (x, out)),
+        ('relu_gradient', cpu_links.relu_gradient, (x, y, out)),
+        ('sigmoid', cpu_links.sigmoid, (x, out)),
+        ('softmax', cpu_links.softmax, (x, out)),
+        ('conv2d', cpu_links.conv2d, (image, filt, conv, 1, 1)),
+        ('conv2d_gradient_of_data',
+         cpu_links.conv2d_gradient_of_data, (filt, conv, image, 1, 1)),
+        ('conv2d_gradient_of_filter',
+         cpu_links.conv2d_gradient_of_filter, (image, conv, filt, 1, 1)),
+        ('max_pool', cpu_links.max_pool, (image, 2, 2, pooled, 0, 2)),
+        ('avg_pool', cpu_links.avg_pool, (image, 2, 2, pooled, 0, 2)),
+    ]
+
+
+def latency(func, args, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def test_dnnl_cache(batch, repeat):
+    capacity = cpu_links.dnnl_cache_stats()['capacity']
+    for name, func, args in cases(batch):
+        # the output is the last array argument
+        output = [arg for arg in args if isinstance(arg, NDArray)][-1]
+        cpu_links.clear_dnnl_cache()
+        cpu_links.set_dnnl_cache_capacity(0)
+        func(*args)
+        expected = output.asnumpy()
+        before = latency(func, args, repeat)
+        cpu_links.set_dnnl_cache_capacity(capacity)
+        func(*args)
+        after = latency(func, args, repeat)
+        np.testing.assert_allclose(output.asnumpy(), expected, rtol=1e-6)
+        stats = cpu_links.dnnl_cache_stats()
+        assert stats['hits'] >= repeat, stats
+        print('{:<28}{:>10.1f} us{:>10.1f} us{:>8.2f}x'.format(
+            name, before, after, before / after))
+    cpu_links.clear_dnnl_cache()
+    # beyond the capacity the least recently used primitives are evicted
+    cpu_links.set_dnnl_cache_capacity(2)
+    for n in (8, 16, 24):
+        func, args = cpu_links.relu, arrays((n, 4), (n, 4))
+        func(*args)
+    stats = cpu_links.dnnl_cache_stats()
+    assert stats['size'] == 2 and stats['evictions'] == 1, stats
+    cpu_links.set_dnnl_cache_capacity(capacity)
+    print('dnnl cache passed')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    print('{:<28}{:>13}{:>13}'.format('op', 'uncached', 'cached'))
+    test_dnnl_cache(args.batch, args.repeat)
@@ -0,0 +1,210 @@
+import hetu as ht
+from hetu import init
+from hetu import cpu_links
+from hetu.gpu_ops.EmbeddingBag import EmbeddingBagOp
+import numpy as np
+import argparse
+import time
+
+
+# The cpu embedding bag kernels against numpy, then embedding_bag_op in
+# training against embedding_lookup_op followed by a reduction.
+
+def bags_of(ids, offsets):
+    # the entries of every bag in the flattened ids
+    if offsets is None:
+        return [list(range(b * ids.shape[-1], (b + 1) * ids.shape[-1]))
+                for b in range(ids.size // ids.shape[-1])]
+    ends = list(offsets[1:]) + [ids.size]
+    return [list(range(s, e)) for s, e in zip(offsets, ends)]
+
+
+def expected_bag(embed, ids, offsets, weights, mode, dy):
+    num_embed, width = embed.shape
+    flat = ids.reshape(-1)
+    bags = bags_of(ids, offsets)
+    out = np.zeros((len(bags), width))
+    grad = np.zeros(embed.shape)
+    for b, entries in enumerate(bags):
+        entries = [p for p in entries if 0 <= flat[p] < num_embed]
+        if not entries:
+            continue
+        rows = embed[flat[entries]]
+        if mode == 'max':
+            arg = rows.argmax(axis=0)
+            out[b] = rows[arg, np.arange(width)]
+            for k in range(width):
+                grad[flat[entries[arg[k]]], k] += dy[b, k]
+            continue
+        coeff = np.ones(len(entries))
+        if weights is not None:
+            coeff = weights.reshape(-1)[entries]
+        if mode == 'mean':
+            coeff = coeff / len(entries)
+        out[b] = (coeff[:, None] * rows).sum(axis=0)
+        for c, p in zip(coeff, entries):
+            grad[flat[p]] += c * dy[b]
+    return out, grad
+
+
+def make_bags(num_bags, num_embed, max_len, fixed, padding=True):
+    if fixed:
+        ids = np.random.randint(num_embed, size=(num_bags, max_len))
+        offsets = None
+    else:
+        lengths = np.random.randint(max_len + 1, size=num_bags)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        ids = np.random.randint(num_embed, size=lengths.sum())
+    if padding:
+        pad = np.random.uniform(size=ids.shape) < 0.2
+        ids[pad] = np.random.choice([-1, num_embed, num_embed + 7], pad.sum())
+    return ids.astype(np.int32), None if offsets is None else offsets.astype(np.int32)
+
+
+def test_kernel(mode, fixed, weighted, num_bags=50, num_embed=30, max_len=6, width=9):
+    ids, offsets = make_bags(num_bags, num_embed, max_len, fixed)
+    embed = np.random.normal(size=(num_embed, width)).astype(np.float32)
+    weights = np.random.uniform(size=ids.shape).astype(
+        np.float32) if weighted else None
+    dy = np.random.normal(size=(num_bags, width)).astype(np.float32)
+    out_np, grad_np = expected_bag(embed, ids, offsets, weights, mode, dy)
+
+    ctx = ht.cpu(0)
+    ids_arr = ht.array(ids, ctx, dtype=np.int32)
+    offsets_arr = None if offsets is None else ht.array(
+        offsets, ctx, dtype=np.int32)
+    weights_arr = None if weights is None else ht.array(weights, ctx)
+    argmax = ht.empty((num_bags, width), ctx,
+                      dtype=np.int32) if mode == 'max' else None
+    out = ht.empty((num_bags, width), ctx)
+    cpu_links.embedding_bag(ht.array(embed, ctx), ids_arr, offsets_arr,
+                            weights_arr, out, argmax, mode, num_embed)
+    np.testing.assert_allclose(out.asnumpy(), out_np, rtol=1e-5, atol=1e-5)
+    # the rows as pulled from the parameter server pool the same
+    gathered = embed[np.clip(ids, 0, num_embed - 1)]
+    cpu_links.embedding_bag(ht.array(gathered, ctx), ids_arr, offsets_arr,
+                            weights_arr, out, argmax, mode, num_embed, True)
+    np.testing.assert_allclose(out.asnumpy(), out_np, rtol=1e-5, atol=1e-5)
+
+    out_ind = ht.empty((ids.size,), ctx, dtype=np.int32)
+    out_val = ht.empty((ids.size, width), ctx)
+    cpu_links.embedding_bag_gradient(ht.array(dy, ctx), ids_arr, offsets_arr,
+                                     weights_arr, argmax, out_ind, out_val, mode, num_embed)
+    out_ind, out_val = out_ind.asnumpy(), out_val.asnumpy()
+    unique = np.unique(ids[(ids >= 0) & (ids < num_embed)])
+    np.testing.assert_equal(out_ind[:len(unique)], unique)
+    assert np.all(out_ind[len(unique):] == -1)
+    assert np.all(out_val[len(unique):] == 0)
+    np.testing.assert_allclose(
+        out_val[:len(unique)], grad_np[unique], rtol=1e-5, atol=1e-5)
+
+
+def build(mode, fixed, weighted, num_embed, width, bag, use_bag):
+    np.random.seed(0)
+    ctx = ht.cpu(0)
+    with ht.context(ctx):
+        ids = ht.placeholder_op(name='ids', dtype=np.int32)
+        weights = ht.placeholder_op(name='weights') if weighted else None
+        y_ = ht.placeholder_op(name='y_')
+        embedding = init.random_normal(
+            (num_embed, width), stddev=0.1, name='embedding')
+        dense = init.random_normal((width, 2), stddev=0.1, name='dense')
+        if use_bag:
+            pooled = ht.embedding_bag_op(
+                embedding, ids, per_sample_weights=weights, mode=mode)
+        else:
+            lookup = ht.embedding_lookup_op(embedding, ids)
+            if weighted:
+                lookup = ht.mul_op(lookup, ht.broadcastto_op(
+                    ht.array_reshape_op(weights, (-1, bag, 1)), lookup))
+            reduce = ht.reduce_mean_op if mode == 'mean' else ht.reduce_sum_op
+            pooled = ht.array_reshape_op(
+                reduce(lookup, [1], keepdims=True), (-1, width))
+        loss = ht.softmaxcrossentropy_op(ht.matmul_op(pooled, dense), y_)
+        loss = ht.reduce_mean_op(loss, [0])
+        train_op = ht.optim.AdamOptimizer(learning_rate=0.01).minimize(loss)
+    ht.random.reset_seed_seqnum()
+    executor = ht.Executor([loss, train_op], ctx=ctx, seed=0)
+    return executor, ids, weights, y_
+
+
+def test_training(mode, weighted, batch=64, bag=5, num_embed=40, width=8, steps=4):
+    data = [(np.random.randint(num_embed, size=(batch, bag)).astype(np.int32),
+             np.random.uniform(size=(batch, bag)).astype(np.float32),
+             np.eye(2)[np.random.randint(2, size=batch)].astype(np.float32))
+            for _ in range(steps)]
+    results = []
+    for use_bag in (False, True):
+        executor, ids, weights, y_ = build(mode, True, weighted, num_embed,
+                                           width, bag, use_bag)
+        assert any(isinstance(node, EmbeddingBagOp) for node in
+                   executor.subexecutor['default'].topo_order) == use_bag
+        losses = []
+        for iv, wv, yv in data:
+            feed_dict = {ids: iv, y_: yv}
+            if weighted:
+                feed_dict[weights] = wv
+            losses.append(executor.run(feed_dict=feed_dict,
+                                       convert_to_numpy_ret_vals=True)[0])
+        results.append((losses, executor.state_dict()))
+    np.testing.assert_allclose(results[0][0], results[1][0], rtol=1e-5)
+    for name, value in results[0][1].items():
+        np.testing.assert_allclose(
+            value, results[1][1][name], rtol=1e-4, atol=1e-6)
+    print('embedding bag matches lookup and reduce with mode=%s, weighted=%s' %
+          (mode, weighted))
+
+
+def benchmark(batch, bag, num_embed, width, steps):
+    ctx = ht.cpu(0)
+    ids = np.random.randint(num_embed, size=(batch, bag)).astype(np.int32)
+    embed = ht.array(np.random.normal(
+        size=(num_embed, width)).astype(np.float32), ctx)
+    ids_arr = ht.array(ids, ctx, dtype=np.int32)
+    lookup = ht.empty((batch, bag, width), ctx)
+    out = ht.empty((batch, width), ctx)
+    dy = ht.array(np.random.normal(size=(batch, width)), ctx)
+    dy_full = ht.array(np.random.normal(size=(batch, bag, width)), ctx)
+    out_ind = ht.empty((ids.size,), ctx, dtype=np.int32)
+    out_val = ht.empty((ids.size, width), ctx)
+
+    def latency(func, *args):
+        start = time.perf_counter()
+        for _ in range(steps):
+            func(*args)
+        return (time.perf_counter() - start) / steps * 1e3
+
+    def lookup_and_sum():
+        # as ReduceSumOp does on cpu
+        cpu_links.embedding_lookup(embed, ids_arr, lookup)
+        out.numpy_view()[:] = lookup.numpy_view().sum(axis=1)
+
+    print('%d bags of %d ids, width %d: lookup + reduce_sum %.3f ms, embedding_bag %.3f ms; '
+          'reduce_indexedslice %.3f ms, embedding_bag_gradient %.3f ms' % (
+              batch, bag, width, latency(lookup_and_sum),
+              latency(cpu_links.embedding_bag, embed, ids_arr, None,
+                      None, out, None, 'sum', num_embed),
+              latency(cpu_links.reduce_indexedslice,
+                      ids_arr, dy_full, out_ind, out_val),
+              latency(cpu_links.embedding_bag_gradient, dy, ids_arr, None,
+                      None, None, out_ind, out_val, 'sum', num_embed)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', type=int, default=8192)
+    parser.add_argument('--bag', type=int, default=26)
+    parser.add_argument('--num-embed', type=int, default=10 ** 6)
+    parser.add_argument('--width', type=int, default=16)
+    parser.add_argument('--steps', type=int, default=20)
+    args = parser.parse_args()
+    np.random.seed(0)
+    for mode in ('sum', 'mean', 'max'):
+        for fixed in (True, False):
+            for weighted in ((False, True) if mode == 'sum' else (False,)):
+                test_kernel(mode, fixed, weighted)
+    print('cpu kernels passed')
+    test_training('sum', False)
+    test_training('sum', True)
+    test_training('mean', False)
+    benchmark(args.batch, args.bag, args.num_embed, args.width, args.steps)
@@ -0,0 +1,187 @@
+import hetu as ht
+from hetu import init
+from hetu.context import DeviceGroup, GraphStatus
+from hetu.ndarray import rgpu
+from hetu.gpu_ops.Variable import PlaceholderOp
+from hetu.profiler import HetuSimulator
+from hetu.memory_pool import HetuMemoryPool
+from hetu.distributed_strategies.flexflow import FlexFlowSearching
+import numpy as np
+from collections import namedtuple
+from itertools import combinations
+from random import Random
+import argparse
+import random
+import socket
+import time
+import zlib
+
+
+# The incremental simulation of FlexFlowSearching against building the task
+# graph and simulating it from scratch, on the proposals of a markov chain.
+# Searching needs MPI and profiles on GPUs, so the strategy is set up by hand
+# for the local host with synthetic execution times.
+
+class SyntheticTimes(dict):
+    # a fixed time for every case, as if profiled before
+    def __contains__(self, key):
+        if not dict.__contains__(self, key):
+            self[key] = zlib.crc32(repr(key).encode()) % 1000 / 100. + 0.1
+        return True
+
+
+def build(num_layers, hidden, batch):
+    x = ht.placeholder_op(name='x')
+    y_ = ht.placeholder_op(name='y_')
+    h, width = x, hidden
+    for i in range(num_layers):
+        weight = init.random_normal(
+            (width, hidden), stddev=0.1, name='weight_%d' % i)
+        h = ht.relu_op(ht.matmul_op(h, weight))
+        width = hidden
+    weight = init.random_normal((width, 10), stddev=0.1, name='weight')
+    loss = ht.softmaxcrossentropy_op(ht.matmul_op(h, weight), y_)
+    loss = ht.reduce_mean_op(loss, [0])
+    optimizer = ht.optim.SGDOptimizer(learning_rate=0.01)
+    train_ops = optimizer.minimize(loss)
+    # flexflow simulates the updates as one node over all the gradients, as
+    # GraphStatus lays them out when completing the graph
+    optimizer.params = [op.inputs[0] for op in train_ops]
+    train_ops[0].inputs = [op.inputs[1] for op in train_ops]
+    return GraphStatus([loss, train_ops[0]]), {x: (batch, hidden), y_: (batch, 10)}
+
+
+def make_strategy(graph_status, feed_shapes, incremental, num_workers=4, round_budget=0):
+    # what BaseSearchingStrategy.__init__ and set_raw_ctxs_n_states do before
+    # searching, without MPI and profiling
+    host = socket.gethostname()
+    strategy = FlexFlowSearching.__new__(FlexFlowSearching)
+    strategy.debugging = False
+    strategy.overlap = True
+    strategy.use_dispatch = False
+    strategy.num_ctxs = num_workers
+    strategy.all_devices = [rgpu(host, i) for i in range(num_workers)]
+    strategy.feed_shapes = feed_shapes
+    strategy.batch_size = None
+    dev_num = strategy.try_get_initial_dp()
+    strategy.raw_ctx = DeviceGroup(tuple(strategy.all_devices[:dev_num]))
+    strategy.status_candidates = []
+    left = 1
+    while left <= num_workers:
+        right = 1
+        while right <= num_workers // left:
+            cand = {k: v for k, v in {0: left, 1: right}.items() if v != 1}
+            strategy.status_candidates.append((left * right, cand))
+            right *= 2
+        left *= 2
+    strategy.device_candidates = {
+        1: [DeviceGroup(dev) for dev in strategy.all_devices]}
+    cur_num = 2
+    while cur_num <= num_workers:
+        strategy.device_candidates[cur_num] = [DeviceGroup(
+            devs) for devs in combinations(strategy.all_devices, cur_num)]
+        cur_num *= 2
+
+    simulator = HetuSimulator.__new__(HetuSimulator)
+    simulator.pix = True
+    simulator.cache_path = None
+    simulator.cached_exetime = SyntheticTimes()
+    simulator.cached_placeholders = [PlaceholderOp('test_node')]
+    simulator.cached_optimizer = None
+    simulator.no_computing_nodes = (PlaceholderOp,)
+    simulator.nccl_profiler = namedtuple(
+        'NCCLProfiler', 'workers')(workers={host: num_workers})
+    strategy.simulator = simulator
+
+    strategy.time_budget = -1
+    strategy.round_budget = round_budget
+    strategy.unit_round_budget = -1
+    strategy.alpha = 0.05
+    strategy.num_chains = 1
+    strategy.incremental = incremental
+    strategy.task_memo = {}
+    strategy.memo_used = set()
+    strategy.memo_accepted = set()
+    strategy.simulate_scan = strategy.ScanCache()
+    strategy.memory_scan = strategy.ScanCache()
+
+    strategy.init_node_group(graph_status)
+    strategy.init_states(graph_status.node_cur_state_map)
+    graph_status.extend_oplayers()
+    strategy.node_to_shape_map = strategy.infer_global_shapes(
+        feed_shapes, graph_status)
+    graph_status.shrink_oplayers()
+    strategy.get_candidates(graph_status)
+    return strategy
+
+
+def simulate_full(strategy, graph_status, meta_cur_state_map, memory_pool):
+    # a fresh task graph simulated from scratch, leaving the memo alone
+    strategy.incremental = False
+    try:
+        return strategy.simulate_config(graph_status, meta_cur_state_map, memory_pool)
+    finally:
+        strategy.incremental = True
+
+
+def test_incremental(rounds=200, free_memory=20000, seed=0):
+    graph_status, feed_shapes = build(num_layers=3, hidden=64, batch=32)
+    strategy = make_strategy(graph_status, feed_shapes, incremental=True)
+    # little memory, so that the memory test matters too
+    memory_pool = HetuMemoryPool()
+    memory_pool.free_memory = free_memory
+    meta_cur_state_map = graph_status.copy_cur_state_to()
+    all_possible_nodes = [
+        k for k, v in strategy.search_space.items() if v[0]]
+    rng = Random(seed)
+    results = set()
+    for _ in range(rounds):
+        node = rng.choice(all_possible_nodes)
+        new_status = rng.choice(strategy.search_space[node][1])
+        new_raw_ctx = rng.choice(
+            strategy.device_candidates[new_status.dev_num])
+        ori_status, ori_raw_ctx = meta_cur_state_map[node], node.raw_ctx
+        strategy.set_group_raw_ctx(node, new_raw_ctx)
+        meta_cur_state_map[node] = new_status
+        incremental = strategy.simulate_config(
+            graph_status, meta_cur_state_map, memory_pool)
+        full = simulate_full(strategy, graph_status,
+                             meta_cur_state_map, memory_pool)
+        assert np.isclose(incremental[0], full[0]), (incremental, full)
+        assert incremental[1] == full[1], (incremental, full)
+        results.add(incremental)
+        if rng.random() < 0.5:
+            strategy.accept_simulation()
+        else:
+            meta_cur_state_map[node] = ori_status
+            strategy.set_group_raw_ctx(node, ori_raw_ctx)
+    # the proposals do change the simulation
+    assert len(results) > rounds // 4
+    print('incremental simulation matches full simulation in %d rounds' % rounds)
+
+
+def benchmark(num_layers, hidden, rounds):
+    rates = {}
+    for incremental in (False, True):
+        graph_status, feed_shapes = build(num_layers, hidden, batch=64)
+        strategy = make_strategy(
+            graph_status, feed_shapes, incremental, round_budget=rounds)
+        memory_pool = HetuMemoryPool()
+        memory_pool.free_memory = 1 << 30
+        # the same proposals in both
+        random.seed(0)
+        start = time.perf_counter()
+        strategy.searching(graph_status, memory_pool)
+        rates[incremental] = rounds / (time.perf_counter() - start)
+    print('%d layers, %d rounds: full simulation %.1f rounds/s, incremental simulation %.1f rounds/s' % (
+        num_layers, rounds, rates[False], rates[True]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-layers', type=int, default=16)
+    parser.add_argument('--hidden', type=int, default=256)
+    parser.add_argument('--rounds', type=int, default=500)
+    args = parser.parse_args()
+    test_incremental()
+    benchmark(args.num_layers, args.hidden, args.rounds)
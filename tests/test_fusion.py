@@ -0,0 +1,119 @@
+import hetu as ht
+from hetu import init
+from hetu.gpu_ops.FusedLinear import FusedLinearOp, ActivationGradientOp
+import numpy as np
+import argparse
+import time
+
+
+ACTIVATIONS = {'relu': ht.relu_op, 'sigmoid': ht.sigmoid_op,
+               'tanh': ht.tanh_op, 'gelu': ht.gelu_op}
+
+
+def mlp(x, y, num_layers, hidden, activation):
+    # the layers alternate between matmul + broadcast bias and linear_op
+    for i in range(num_layers):
+        weight = init.random_normal(
+            (hidden, hidden), stddev=0.1, name='weight_%d' % i)
+        bias = init.random_normal((hidden,), stddev=0.1, name='bias_%d' % i)
+        if i % 2 == 0:
+            x = ht.matmul_op(x, weight)
+            x = x + ht.broadcastto_op(bias, x)
+        else:
+            x = ht.linear_op(x, weight, bias)
+        x = ACTIVATIONS[activation](x)
+    weight = init.random_normal((hidden, 10), stddev=0.1, name='weight_out')
+    logits = ht.matmul_op(x, weight)
+    loss = ht.softmaxcrossentropy_op(logits, y)
+    loss = ht.reduce_mean_op(loss, [0])
+    return loss, logits
+
+
+def build(num_layers, hidden, activation, fuse_ops, training=True):
+    np.random.seed(0)
+    ctx = ht.cpu(0)
+    with ht.context(ctx):
+        x = ht.placeholder_op(name='x')
+        y_ = ht.placeholder_op(name='y_')
+        loss, logits = mlp(x, y_, num_layers, hidden, activation)
+        eval_nodes = [logits]
+        if training:
+            opt = ht.optim.SGDOptimizer(learning_rate=0.1)
+            eval_nodes = [loss, opt.minimize(loss)]
+    # same parameters in every build
+    ht.random.reset_seed_seqnum()
+    executor = ht.Executor(eval_nodes, ctx=ctx, seed=0, fuse_ops=fuse_ops)
+    return executor, x, y_
+
+
+def count(executor, op_type):
+    return sum(isinstance(node, op_type) for node in executor.subexecutor['default'].topo_order)
+
+
+def feeds(batch, hidden, steps):
+    return [(np.random.normal(size=(batch, hidden)).astype(np.float32),
+             np.eye(10)[np.random.randint(10, size=batch)].astype(np.float32))
+            for _ in range(steps)]
+
+
+def test_training(activation, num_layers=4, hidden=64, batch=16, steps=5):
+    data = feeds(batch, hidden, steps)
+    results = []
+    for fuse_ops in (False, True):
+        executor, x, y_ = build(num_layers, hidden, activation, fuse_ops)
+        losses = [executor.run(feed_dict={x: xv, y_: yv}, convert_to_numpy_ret_vals=True)[0]
+                  for xv, yv in data]
+        results.append((losses, executor.state_dict()))
+        if fuse_ops:
+            assert count(executor, FusedLinearOp) == num_layers
+            assert count(executor, ActivationGradientOp) == num_layers
+    np.testing.assert_allclose(results[0][0], results[1][0], rtol=1e-4)
+    for name, value in results[0][1].items():
+        np.testing.assert_allclose(
+            value, results[1][1][name], rtol=1e-4, atol=1e-6)
+    print('fused training matches with %s' % activation)
+
+
+def test_gelu_inference(num_layers=4, hidden=64, batch=16):
+    # the unfused CPU gelu is not available, compare with numpy instead
+    from scipy.special import erf
+    executor, x, y_ = build(num_layers, hidden, 'gelu', True, training=False)
+    assert count(executor, FusedLinearOp) == num_layers
+    xv, yv = feeds(batch, hidden, 1)[0]
+    logits, = executor.run(feed_dict={x: xv}, convert_to_numpy_ret_vals=True)
+    params = executor.state_dict()
+    value = xv
+    for i in range(num_layers):
+        value = value @ params['weight_%d' % i] + params['bias_%d' % i]
+        value = value * 0.5 * (1 + erf(value / np.sqrt(2)))
+    expected = value @ params['weight_out']
+    np.testing.assert_allclose(logits, expected, rtol=1e-4, atol=1e-5)
+    print('fused inference matches with gelu')
+
+
+def benchmark(num_layers, hidden, batch, steps):
+    xv, yv = feeds(batch, hidden, 1)[0]
+    for activation in ('relu', 'sigmoid'):
+        for fuse_ops in (False, True):
+            executor, x, y_ = build(num_layers, hidden, activation, fuse_ops)
+            for _ in range(10):
+                executor.run(feed_dict={x: xv, y_: yv})
+            start = time.time()
+            for _ in range(steps):
+                executor.run(feed_dict={x: xv, y_: yv})
+            elapsed = (time.time() - start) / steps * 1000
+            print('%s, %d layers of %d, fuse_ops=%s: %.3f ms/step' %
+                  (activation, num_layers, hidden, fuse_ops, elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--layers', type=int, default=8)
+    parser.add_argument('--hidden', type=int, default=256)
+    parser.add_argument('--batch', type=int, default=128)
+    parser.add_argument('--steps', type=int, default=100)
+    args = parser.parse_args()
+    for activation in ('relu', 'sigmoid', 'tanh'):
+        test_training(activation)
+    test_gelu_inference()
+    benchmark(args.layers, args.hidden, args.batch, args.steps)
@@ -0,0 +1,74 @@
+import subprocess
+import argparse
+import sys
+
+
+# `import hetu` stays light: the ops, the heavy subpackages and the C library
+# are loaded at the first use. Measured in fresh interpreters.
+
+HEAVY_MODULES = ['hetu.gpu_ops.executor', 'hetu.optimizer', 'hetu.initializers',
+                 'hetu.layers', 'hetu.distributed_strategies', 'hetu.profiler',
+                 'hetu.tokenizers', 'scipy.sparse', 'scipy.stats', 'pynvml']
+
+
+def run(code):
+    return subprocess.run([sys.executable, '-c', code], check=True,
+                          stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+
+def test_lazy():
+    loaded = run('''
+import sys
+import hetu
+print(hetu._base._LIB._lib is not None)
+print(' '.join(sys.modules))''').split('\n')
+    assert loaded[0] == 'False', 'The C library is loaded at import.'
+    loaded = set(loaded[1].split())
+    eager = [name for name in HEAVY_MODULES if name in loaded]
+    assert not eager, 'Imported along with hetu: {}.'.format(eager)
+    # the namespace resolves as before
+    run('''
+import sys
+import hetu as ht
+# the op modules too, before any op is loaded
+assert 'hetu.gpu_ops.Abs' not in sys.modules
+ht.gpu_ops.Abs.AbsOp, ht.gpu_ops.Dropout.dropout_np
+assert ht.gpu_ops.Dropout is sys.modules['hetu.gpu_ops.Dropout']
+try:
+    ht.gpu_ops.NoSuchOp
+except AttributeError:
+    pass
+else:
+    raise AssertionError('A missing attribute resolved.')
+for name in ht.gpu_ops.__all__:
+    getattr(ht, name)
+ht.optim.SGDOptimizer, ht.init.random_normal, ht.layers, ht.dist.DataParallel
+ht.HetuProfiler, ht.BertTokenizer''')
+    print('lazy import passed')
+
+
+def test_import_time(repeat, budget):
+    code = '''
+import time
+start = time.perf_counter()
+import hetu
+print(time.perf_counter() - start)'''
+    numpy_code = code.replace('import hetu', 'import numpy')
+    times = sorted(float(run(code)) for _ in range(repeat))
+    numpy_times = sorted(float(run(numpy_code)) for _ in range(repeat))
+    median = times[repeat // 2]
+    print('import hetu: median {:.3f}s, min {:.3f}s; numpy alone {:.3f}s'.format(
+        median, times[0], numpy_times[repeat // 2]))
+    if budget > 0:
+        assert median < budget, 'Import takes {:.3f}s, more than {:.3f}s.'.format(
+            median, budget)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=9)
+    parser.add_argument('--budget', type=float, default=-1,
+                        help='fail if the median import time (s) exceeds it')
+    args = parser.parse_args()
+    test_lazy()
+    test_import_time(args.repeat, args.budget)
@@ -0,0 +1,74 @@
+import hetu as ht
+from hetu import init
+import numpy as np
+import argparse
+
+
+def build(ctx, memory_planner, num_layers=4, hidden=64):
+    np.random.seed(0)
+    with ht.context(ctx):
+        x = ht.placeholder_op(name='x')
+        y_ = ht.placeholder_op(name='y_')
+        h, width = x, hidden
+        for i in range(num_layers):
+            # shrinking widths, so the exact planner can not reuse buffers
+            weight = init.random_normal(
+                (width, width // 2), stddev=0.1, name='weight_%d' % i)
+            h = ht.relu_op(ht.matmul_op(h, weight))
+            width //= 2
+        weight = init.random_normal((width, 10), stddev=0.1, name='weight')
+        loss = ht.softmaxcrossentropy_op(ht.matmul_op(h, weight), y_)
+        loss = ht.reduce_mean_op(loss, [0])
+        train_op = ht.optim.SGDOptimizer(learning_rate=0.01).minimize(loss)
+    # same parameters in every build
+    ht.random.reset_seed_seqnum()
+    executor = ht.Executor([loss, train_op], ctx=ctx, seed=0,
+                           memory_planner=memory_planner)
+    return executor, x, y_
+
+
+def test_arena_planner(ctx, batch=32, steps=5):
+    feeds = [(np.random.normal(size=(batch, 64)).astype(np.float32),
+              np.eye(10)[np.random.randint(10, size=batch)].astype(np.float32)) for _ in range(steps)]
+    losses = []
+    for planner in ('exact', 'arena'):
+        executor, x, y_ = build(ctx, planner)
+        losses.append([executor.run(feed_dict={x: xv, y_: yv}, convert_to_numpy_ret_vals=True)[0]
+                       for xv, yv in feeds])
+    np.testing.assert_allclose(losses[0], losses[1], rtol=1e-6)
+    for dev, stats in executor.memory_report().items():
+        assert stats['lower_bound'] <= stats['arena']
+        print(dev, stats)
+
+
+def test_ps_push_inputs(batch=32):
+    # ps-lite reads pushed cpu gradients in the background, the arena must not
+    # give their memory to the nodes after the push (or of the next step)
+    from hetu.gpu_ops.ParameterServerCommunicate import ParameterServerCommunicateOp
+    from hetu.memory_pool import HetuMemoryPool
+    with ht.context(ht.cpu(0)):
+        x = ht.placeholder_op(name='x')
+        weight = init.random_normal((64, 32), stddev=0.1, name='weight')
+        h = ht.matmul_op(x, weight)
+        grad = ht.matmul_op(x, h, trans_A=True)
+        push = ParameterServerCommunicateOp(
+            grad, weight, ht.optim.SGDOptimizer(learning_rate=0.01).get_config())
+        after = ht.relu_op(h)
+        later = ht.relu_op(after)
+    nodes = [h, grad, push, after, later]
+    for node in [x, weight] + nodes:
+        node.on_cpu, node.on_gpu = True, False
+    shapes = {h: (batch, 32), grad: (64, 32), push: None, after: (batch, 32),
+              later: (batch, 32)}
+    offsets, _ = HetuMemoryPool('arena').compute_arena_plan(
+        nodes, shapes, [later], {}, False)
+    assert grad not in offsets
+    assert h in offsets and after in offsets
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpu', type=int, default=-1)
+    args = parser.parse_args()
+    test_arena_planner(ht.cpu(0) if args.gpu < 0 else ht.gpu(args.gpu))
+    test_ps_push_inputs()
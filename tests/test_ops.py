@@ -491,6 +491,19 @@ def test_div_handle_zero():
     tester.test([(3, 4, 1), (3, 4, 1)])
 
 
+def test_numpy_view():
+    x = np.random.normal(size=(3, 5)).astype(np.float32)
+    arr = ht.array(x, ctx=ht.cpu(0))
+    view = arr.numpy_view()
+    np.testing.assert_allclose(view, x)
+    view[1] = 0
+    x[1] = 0
+    np.testing.assert_allclose(arr.asnumpy(), x)
+    bc = ht.empty((2, 3, 5), ctx=ht.cpu(0))
+    arr.broadcast_to((2, 3, 5), bc)
+    np.testing.assert_allclose(bc.numpy_view(), np.broadcast_to(x, (2, 3, 5)))
+
+
 def test_optimizers():
     test_shapes = [
         (1000, 8),
@@ -591,3 +604,4 @@ test_bce_with_logits()
 test_bce_with_logits_gradient()
 test_div_handle_zero()
 test_optimizers()
+test_numpy_view()
@@ -1,6 +1,8 @@
 import numpy as np
 import hetu as ht
 from hetu import gpu_links as gpu_op
+from hetu import cpu_links as cpu_op
+from time import time
 
 def test_sgd():
     ctx = ht.gpu(0)
@@ -318,8 +320,110 @@ def test_lamb_sparse():
     np.testing.assert_allclose(re_m, m, atol=1e-5)
     np.testing.assert_allclose(re_v, v, atol=1e-5)
 
+def test_lamb_foreach_cpu():
+    ctx = ht.cpu(0)
+    shapes = [(500, 400), (400,), (4, 5), (1,)]
+    params = [np.random.uniform(-10, 10, size=shape).astype(np.float32) for shape in shapes]
+    grads = [np.random.uniform(-10, 10, size=shape).astype(np.float32) for shape in shapes]
+    ms = [np.random.uniform(-10, 10, size=shape).astype(np.float32) for shape in shapes]
+    vs = [np.random.uniform(0, 10, size=shape).astype(np.float32) for shape in shapes]
+    lr = 1e-2
+    beta1 = 0.9
+    beta2 = 0.99
+    beta1t = beta1**10
+    beta2t = beta2**10
+    eps = 1e-7
+    weight_decay = 0.1
+
+    arr_params = [ht.array(param, ctx) for param in params]
+    arr_grads = [ht.array(grad, ctx) for grad in grads]
+    arr_ms = [ht.array(m, ctx) for m in ms]
+    arr_vs = [ht.array(v, ctx) for v in vs]
+    cpu_op.lamb_foreach_update(arr_params, arr_grads, arr_ms, arr_vs, lr, beta1, beta2, beta1t, beta2t, eps, weight_decay)
+
+    for param, grad, m, v, arr_param, arr_m, arr_v in zip(params, grads, ms, vs, arr_params, arr_ms, arr_vs):
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad * grad
+        mc = m / (1 - beta1t)
+        vc = v / (1 - beta2t)
+        update = mc / (np.sqrt(vc) + eps)
+        norm2_param = np.sqrt(np.sum(np.power(param, 2)))
+        norm2_update = np.sqrt(np.sum(np.power(update, 2)))
+        param = param - lr * norm2_param / norm2_update * (update + weight_decay * param)
+
+        np.testing.assert_allclose(arr_param.asnumpy(), param, atol=1e-5)
+        np.testing.assert_allclose(arr_m.asnumpy(), m, atol=1e-5)
+        np.testing.assert_allclose(arr_v.asnumpy(), v, atol=1e-5)
+
+
+def test_adam_foreach_timing(num_tensors=300, steps=50):
+    # per-step time of one adam update per parameter vs one foreach update,
+    # with the handle arrays built once as the optimizer keeps them; on many
+    # small tensors (biases, layernorm scales) the calls dominate, with a few
+    # larger ones as well the memory traffic does
+    ctx = ht.cpu(0)
+    for shapes in ([(256,)] * num_tensors, [(256,)] * num_tensors + [(1024, 1024)] * 4):
+        def make(low=-1):
+            return [ht.array(np.random.uniform(low, 1, size=shape).astype(np.float32), ctx) for shape in shapes]
+        params, grads, ms, vs = make(), make(), make(0), make(0)
+        params_ref = [ht.array(param.asnumpy(), ctx) for param in params]
+        ms_ref = [ht.array(m.asnumpy(), ctx) for m in ms]
+        vs_ref = [ht.array(v.asnumpy(), ctx) for v in vs]
+        betats = ht.array(np.array([0.9, 0.999], dtype=np.float32), ctx)
+        lr, beta1, beta2, eps = 1e-3, 0.9, 0.999, 1e-8
+
+        start = time()
+        for _ in range(steps):
+            for args in zip(params_ref, grads, ms_ref, vs_ref):
+                cpu_op.adam_update(*args, None, lr, beta1, beta2, betats, 0, eps)
+        per_tensor = (time() - start) / steps
+
+        handles = [cpu_op.handle_array(arrs) for arrs in (params, grads, ms, vs)]
+        start = time()
+        for _ in range(steps):
+            cpu_op.adam_foreach_update(*handles, None, lr, beta1, beta2, betats, 0, eps)
+        foreach = (time() - start) / steps
+
+        print("Adam step over %d tensors of %d elements: per-tensor %.3f ms, foreach %.3f ms" %
+              (len(shapes), sum(np.prod(shape) for shape in shapes), per_tensor * 1000, foreach * 1000))
+        for param, param_ref in zip(params, params_ref):
+            np.testing.assert_allclose(param.asnumpy(), param_ref.asnumpy(), atol=1e-5)
+
+def test_adam_foreach_training(layers=100, width=16, steps=30):
+    # training steps of a deep narrow mlp with adam, per-op updates vs foreach
+    from hetu import init
+    ctx = ht.cpu(0)
+    xv = np.random.normal(size=(8, width)).astype(np.float32)
+    results = []
+    for foreach in (False, True):
+        with ht.context(ctx):
+            x = ht.placeholder_op(name='x')
+            h = x
+            for i in range(layers):
+                w = init.random_normal((width, width), stddev=0.1, name='w%d' % i)
+                b = init.zeros((width,), name='b%d' % i)
+                h = ht.relu_op(ht.linear_op(h, w, b))
+            loss = ht.reduce_mean_op(h, [0, 1])
+            train_op = ht.optim.AdamOptimizer(
+                learning_rate=1e-3, foreach=foreach).minimize(loss)
+        ht.random.reset_seed_seqnum()
+        executor = ht.Executor([loss, train_op], ctx=ctx, seed=0)
+        for _ in range(3):
+            executor.run(feed_dict={x: xv})
+        start = time()
+        for _ in range(steps):
+            executor.run(feed_dict={x: xv})
+        results.append(((time() - start) / steps, executor.state_dict()))
+    print("Adam training step over %d parameters: per-op %.3f ms, foreach %.3f ms" %
+          (2 * layers, results[0][0] * 1000, results[1][0] * 1000))
+    for name, value in results[0][1].items():
+        np.testing.assert_allclose(value, results[1][1][name], rtol=1e-5, atol=1e-6)
+
 #test_adamw()
 #test_lamb()
 #test_adamw_sparse()
 #test_lamb_sparse()
 #test_sgd()
+#test_lamb_foreach_cpu()
+#test_adam_foreach_timing()
+#test_adam_foreach_training()
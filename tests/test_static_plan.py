@@ -0,0 +1,72 @@
+import hetu as ht
+from hetu import init
+import numpy as np
+import argparse
+import time
+
+
+def mlp(x, y, num_layers, hidden):
+    for i in range(num_layers):
+        weight = init.random_normal(
+            (hidden, hidden), stddev=0.1, name='weight_%d' % i)
+        bias = init.zeros((hidden,), name='bias_%d' % i)
+        x = ht.matmul_op(x, weight)
+        x = x + ht.broadcastto_op(bias, x)
+        x = ht.relu_op(x)
+    loss = ht.softmaxcrossentropy_op(x, y)
+    loss = ht.reduce_mean_op(loss, [0])
+    return loss
+
+
+def build(ctx, num_layers, hidden, compile_plan):
+    np.random.seed(0)
+    with ht.context(ctx):
+        x = ht.placeholder_op(name='x')
+        y_ = ht.placeholder_op(name='y_')
+        loss = mlp(x, y_, num_layers, hidden)
+        opt = ht.optim.SGDOptimizer(learning_rate=0.01)
+        train_op = opt.minimize(loss)
+    # same parameters in every build
+    ht.random.reset_seed_seqnum()
+    executor = ht.Executor([loss, train_op], ctx=ctx, seed=0,
+                           compile_plan=compile_plan)
+    return executor, x, y_
+
+
+def test_plan_matches(ctx, num_layers=4, hidden=64, batch=8, steps=5):
+    feeds = [(np.random.normal(size=(batch, hidden)).astype(np.float32),
+              np.eye(hidden)[np.random.randint(hidden, size=batch)].astype(np.float32)) for _ in range(steps)]
+    losses = []
+    for compile_plan in (False, True):
+        executor, x, y_ = build(ctx, num_layers, hidden, compile_plan)
+        losses.append([executor.run(feed_dict={x: xv, y_: yv}, convert_to_numpy_ret_vals=True)[0]
+                       for xv, yv in feeds])
+    np.testing.assert_allclose(losses[0], losses[1], rtol=1e-6)
+    print('plan matches interpreted path on %s' % ctx)
+
+
+def benchmark(ctx, num_layers=32, hidden=16, batch=4, steps=1000):
+    # tiny tensors, so per-step time is dominated by the executor overhead
+    xv = np.random.normal(size=(batch, hidden)).astype(np.float32)
+    yv = np.eye(hidden)[np.random.randint(hidden, size=batch)].astype(np.float32)
+    for compile_plan in (False, True):
+        executor, x, y_ = build(ctx, num_layers, hidden, compile_plan)
+        for _ in range(10):
+            executor.run(feed_dict={x: xv, y_: yv})
+        start = time.time()
+        for _ in range(steps):
+            executor.run(feed_dict={x: xv, y_: yv})
+        elapsed = (time.time() - start) / steps * 1000
+        print('%s, %d layers, compile_plan=%s: %.3f ms/step' %
+              (ctx, num_layers, compile_plan, elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpu', type=int, default=-1)
+    parser.add_argument('--layers', type=int, default=32)
+    parser.add_argument('--steps', type=int, default=1000)
+    args = parser.parse_args()
+    ctx = ht.cpu(0) if args.gpu < 0 else ht.gpu(args.gpu)
+    test_plan_matches(ctx)
+    benchmark(ctx, num_layers=args.layers, steps=args.steps)
@@ -0,0 +1,190 @@
+import hetu as ht
+from hetu.metrics import StreamingAUC, confusion_matrix_at_thresholds
+import numpy as np
+import argparse
+import threading
+import time
+
+
+# StreamingAUC against pairwise references, per batch and merged, and its
+# histogram against confusion_matrix_at_thresholds; all_reduce over threads
+# standing in for the workers, whose result must equal a single process.
+
+def reference_auc(labels, predictions):
+    # every positive against every negative, ties counted as half
+    pos = predictions[labels]
+    neg = predictions[~labels]
+    greater = (pos[:, None] > neg[None, :]).sum()
+    ties = (pos[:, None] == neg[None, :]).sum()
+    return (greater + 0.5 * ties) / (len(pos) * len(neg))
+
+
+def reference_pr_auc(labels, predictions):
+    # average precision, at the score of each positive with its ties
+    precisions = [np.sum(labels[predictions >= score]) / np.sum(predictions >= score)
+                  for score in predictions[labels]]
+    return np.mean(precisions)
+
+
+def make_data(rng, size, num_scores=None):
+    labels = rng.rand(size) < 0.3
+    # positives score higher on average
+    predictions = np.clip(rng.normal(0.4 + 0.2 * labels, 0.2), 0, 1)
+    if num_scores is not None:
+        # few distinct scores, so that there are ties
+        predictions = np.round(predictions * num_scores) / num_scores
+    return labels, predictions
+
+
+def feed(metric, labels, predictions, batch_size=100):
+    for i in range(0, len(labels), batch_size):
+        metric.update(labels[i:i + batch_size],
+                      predictions[i:i + batch_size])
+    return metric
+
+
+def test_exact(size=2000):
+    rng = np.random.RandomState(0)
+    for num_scores in (None, 20):
+        labels, predictions = make_data(rng, size, num_scores)
+        metric = feed(StreamingAUC(exact=True), labels, predictions)
+        np.testing.assert_allclose(
+            metric.auc(), reference_auc(labels, predictions), rtol=1e-12)
+        np.testing.assert_allclose(metric.auc(curve='PR'),
+                                   reference_pr_auc(labels, predictions), rtol=1e-12)
+        assert metric.count == size
+        assert metric.correct == np.sum((predictions > 0.5) == labels)
+        clipped = np.clip(predictions, 1e-7, 1 - 1e-7)
+        np.testing.assert_allclose(metric.logloss(), -np.mean(
+            np.where(labels, np.log(clipped), np.log(1 - clipped))), rtol=1e-12)
+    assert np.isnan(StreamingAUC(exact=True).auc())
+    print('exact auc matches the pairwise reference')
+
+
+def test_histogram(size=2000, num_bins=100):
+    rng = np.random.RandomState(1)
+    labels, predictions = make_data(rng, size)
+    metric = feed(StreamingAUC(num_bins), labels, predictions)
+    # the exact auc of the predictions quantized into the bins
+    bins = np.minimum(np.floor(predictions * num_bins), num_bins - 1)
+    np.testing.assert_allclose(
+        metric.auc(), reference_auc(labels, bins), rtol=1e-12)
+    np.testing.assert_allclose(
+        metric.auc(curve='PR'), reference_pr_auc(labels, bins), rtol=1e-12)
+    # close to the exact auc
+    assert abs(metric.auc() - reference_auc(labels, predictions)) < 1e-2
+
+    # the counts above each bin edge are the confusion matrix there;
+    # predictions are kept off the edges
+    predictions = (rng.randint(num_bins * 10, size=size) + 0.5) / \
+        (num_bins * 10)
+    metric = feed(StreamingAUC(num_bins), labels, predictions)
+    thresholds = np.arange(num_bins) / num_bins
+    values = confusion_matrix_at_thresholds(labels, predictions, thresholds)
+    np.testing.assert_equal(np.cumsum(metric.pos[::-1])[::-1], values['tp'])
+    np.testing.assert_equal(np.cumsum(metric.neg[::-1])[::-1], values['fp'])
+    np.testing.assert_equal(np.sum(metric.pos) - np.cumsum(metric.pos[::-1])[::-1],
+                            values['fn'])
+    np.testing.assert_equal(np.sum(metric.neg) - np.cumsum(metric.neg[::-1])[::-1],
+                            values['tn'])
+    print('histogram auc matches the reference and the confusion matrix')
+
+
+def test_merge(size=3000, parts=4):
+    rng = np.random.RandomState(2)
+    labels, predictions = make_data(rng, size, num_scores=50)
+    for kargs in ({'exact': True}, {'num_bins': 1000}):
+        whole = feed(StreamingAUC(**kargs), labels, predictions)
+        merged = StreamingAUC(**kargs)
+        for part in np.array_split(np.arange(size), parts):
+            merged.merge(feed(StreamingAUC(**kargs),
+                              labels[part], predictions[part]))
+        np.testing.assert_equal(merged.scores, whole.scores)
+        np.testing.assert_equal(merged.pos, whole.pos)
+        np.testing.assert_equal(merged.neg, whole.neg)
+        assert (merged.correct, merged.count) == (whole.correct, whole.count)
+        np.testing.assert_allclose(merged.result()['logloss'],
+                                   whole.result()['logloss'], rtol=1e-12)
+        assert merged.auc() == whole.auc()
+        assert merged.auc(curve='PR') == whole.auc(curve='PR')
+    print('merged accumulators match a single one')
+
+
+class ThreadGather(object):
+    # executor.gatherPredict of one of several workers run as threads:
+    # float32 rows gathered in rank order, as the allgather does
+    def __init__(self, rank, shared):
+        self.rank = rank
+        self.shared = shared
+
+    def gatherPredict(self, arr):
+        rows, barrier = self.shared
+        assert arr.dtype == np.float32
+        rows[self.rank] = np.array(arr, dtype=np.float32)
+        barrier.wait()
+        gathered = np.concatenate(rows)
+        barrier.wait()
+        return gathered
+
+
+def test_all_reduce(size=3000, nrank=3):
+    rng = np.random.RandomState(3)
+    labels, predictions = make_data(rng, size)
+    # scores that float32 cannot hold
+    predictions = predictions + 1e-12
+    for kargs in ({'exact': True}, {'num_bins': 1000}):
+        whole = feed(StreamingAUC(**kargs), labels, predictions)
+        # counts that float32 cannot hold either
+        whole.pos[0] += 2 ** 30 + 1
+        shared = ([None] * nrank, threading.Barrier(nrank))
+        metrics = []
+        for rank, part in enumerate(np.array_split(np.arange(size), nrank)):
+            metric = feed(StreamingAUC(**kargs),
+                          labels[part], predictions[part])
+            if rank == 0:
+                metric.pos[0] += 2 ** 30 + 1
+            metrics.append(metric)
+        threads = [threading.Thread(target=metric.all_reduce, args=(ThreadGather(rank, shared),))
+                   for rank, metric in enumerate(metrics)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for metric in metrics:
+            np.testing.assert_equal(metric.scores, whole.scores)
+            np.testing.assert_equal(metric.pos, whole.pos)
+            np.testing.assert_equal(metric.neg, whole.neg)
+            assert (metric.correct, metric.count) == (
+                whole.correct, whole.count)
+            np.testing.assert_allclose(
+                metric.loss_sum, whole.loss_sum, rtol=1e-12)
+            assert metric.auc() == whole.auc()
+    print('all_reduce matches a single process')
+
+
+def benchmark(size, batch_size, num_bins):
+    rng = np.random.RandomState(0)
+    labels, predictions = make_data(rng, size)
+    for kargs in ({'num_bins': num_bins}, {'exact': True}):
+        start = time.perf_counter()
+        metric = feed(StreamingAUC(**kargs), labels, predictions, batch_size)
+        result = metric.result()
+        elapsed = time.perf_counter() - start
+        print('%s: %.3f ms, %s' % (kargs, elapsed * 1000, result))
+    start = time.perf_counter()
+    value = ht.metrics.auc(labels, predictions)
+    print('metrics.auc: %.3f ms, auc %f' %
+          ((time.perf_counter() - start) * 1000, value))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=10 ** 6)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--num-bins', type=int, default=10000)
+    args = parser.parse_args()
+    test_exact()
+    test_histogram()
+    test_merge()
+    test_all_reduce()
+    benchmark(args.size, args.batch_size, args.num_bins)
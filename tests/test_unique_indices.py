@@ -0,0 +1,121 @@
+import hetu as ht
+from hetu import cpu_links
+import numpy as np
+import argparse
+import time
+
+
+# The cpu unique / reduce indexed slice kernels against numpy, then their
+# latency over Zipf distributed index batches, as embedding models see.
+
+def zipf_indices(shape, num_embed, a=1.05, dtype=np.int32):
+    ids = np.random.zipf(a, size=shape) - 1
+    return (ids % num_embed).astype(dtype)
+
+
+def expected_unique(indices):
+    flat = indices.reshape(-1)
+    unique, counts = np.unique(flat, return_counts=True)
+    offsets = np.argsort(flat, kind='stable')
+    lengths = np.concatenate([[0], np.cumsum(counts)])
+    return unique, offsets, lengths
+
+
+def run_unique(indices):
+    nele = indices.size
+    ind = ht.array(indices, ht.cpu(0), dtype=indices.dtype, force32=False)
+    output = ht.empty(indices.shape, ht.cpu(0),
+                      dtype=indices.dtype, force32=False)
+    idoffsets = ht.empty((2 * nele + 2,), ht.cpu(0), dtype=np.int32)
+    cpu_links.unique_indices(ind, output, idoffsets)
+    return ind, output, idoffsets
+
+
+def test_unique(indices):
+    unique, offsets, lengths = expected_unique(indices)
+    nele, nunique = indices.size, len(unique)
+    _, output, idoffsets = run_unique(indices)
+    output = output.asnumpy().reshape(-1)
+    idoffsets = idoffsets.asnumpy()
+    assert idoffsets[0] == nunique
+    np.testing.assert_equal(output[:nunique], unique)
+    assert np.all(output[nunique:] == -1)
+    np.testing.assert_equal(idoffsets[1:nele + 1], offsets)
+    np.testing.assert_equal(idoffsets[nele + 1:nele + nunique + 2], lengths)
+
+
+def test_reduce_indexedslice(indices, width=16):
+    unique, offsets, lengths = expected_unique(indices)
+    nele, nunique = indices.size, len(unique)
+    values = np.random.normal(size=(nele, width)).astype(np.float32)
+    params = np.random.normal(size=(nele, width)).astype(np.float32)
+    ind = ht.array(indices, ht.cpu(0), dtype=indices.dtype, force32=False)
+    out_ind = ht.empty((nele,), ht.cpu(0), dtype=indices.dtype, force32=False)
+    out_val = ht.empty((nele, width), ht.cpu(0))
+    out_par = ht.empty((nele, width), ht.cpu(0))
+    cpu_links.reduce_indexedslice_with_embedding(
+        ind, ht.array(values, ht.cpu(0)), ht.array(params, ht.cpu(0)),
+        out_ind, out_val, out_par)
+    expected_val = np.zeros((nele, width), dtype=np.float32)
+    expected_par = np.zeros((nele, width), dtype=np.float32)
+    for i in range(nunique):
+        rows = offsets[lengths[i]:lengths[i + 1]]
+        expected_val[i] = values[rows].sum(axis=0)
+        expected_par[i] = params[rows[0]]
+    out_ind = out_ind.asnumpy()
+    np.testing.assert_equal(out_ind[:nunique], unique)
+    assert np.all(out_ind[nunique:] == -1)
+    np.testing.assert_allclose(out_val.asnumpy(), expected_val,
+                               rtol=1e-5, atol=1e-5)
+    np.testing.assert_equal(out_par.asnumpy(), expected_par)
+
+
+def latency(func, args, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def benchmark(batch, fields, num_embed, width, repeat):
+    for dtype in (np.int32, np.int64):
+        indices = zipf_indices((batch, fields), num_embed, dtype=dtype)
+        ind, output, idoffsets = run_unique(indices)
+        values = ht.array(np.random.normal(
+            size=(indices.size, width)), ht.cpu(0))
+        out_val = ht.empty((indices.size, width), ht.cpu(0))
+        unique = latency(cpu_links.unique_indices,
+                         (ind, output, idoffsets), repeat)
+        reduce = latency(cpu_links.reduce_indexedslice,
+                         (ind, values, output, out_val), repeat)
+        reference = latency(expected_unique, (indices,), repeat)
+        print('%s, %d ids (%d distinct): unique %.3f ms, reduce %.3f ms, '
+              'numpy unique %.3f ms' % (dtype.__name__, indices.size,
+                                        idoffsets.asnumpy()[0], unique,
+                                        reduce, reference))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', type=int, default=8192)
+    parser.add_argument('--fields', type=int, default=26)
+    parser.add_argument('--num-embed', type=int, default=33762577)
+    parser.add_argument('--width', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    np.random.seed(0)
+    for dtype in (np.int32, np.int64):
+        for shape, num_embed in [((1,), 10), ((3, 4), 10), ((64, 26), 1000),
+                                 ((4096, 26), 10 ** 6), ((512, 100), 1 << 30)]:
+            indices = zipf_indices(shape, num_embed, dtype=dtype)
+            test_unique(indices)
+            test_reduce_indexedslice(indices)
+        # negative ids and ids far apart take the full width of the keys
+        info = np.iinfo(dtype)
+        indices = np.random.choice(
+            np.array([info.min, -7, -1, 0, 5, info.max], dtype=dtype), size=(50000,))
+        test_unique(indices)
+        test_reduce_indexedslice(indices, width=4)
+    print('unique indices passed')
+    benchmark(args.batch, args.fields, args.num_embed,
+              args.width, args.repeat)
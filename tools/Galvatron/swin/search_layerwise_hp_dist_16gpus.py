@@ -308,7 +308,8 @@ def parallelism_optimization(args):
                                     pp_stage_dict = pp_stage_dict,
                                     search_history=search_history,
                                     comm_coe_dict=comm_coe_dict,
-                                    gpu_num=gpu_num)
+                                    gpu_num=gpu_num,
+                                    processes=args.processes)
             print("****Testing with bsz=", bsz, "****")
             min_cost, min_res_list, min_pp_deg, mem_remain, mem_cost = dp_on_model.fit(bsz)
             throughput = bsz / min_cost
@@ -422,7 +423,7 @@ def parallelism_optimization(args):
                                         memcost_model_args, timecost_model_args,
                                         max_mem=max_mem, layer_num=layer_nums, 
                                         multi_layer_type = True, pp_stage_dict = pp_stage_dict,
-                                        comm_coe_dict=comm_coe_dict, gpu_num=gpu_num)
+                                        comm_coe_dict=comm_coe_dict, gpu_num=gpu_num, processes=args.processes)
                 min_cost, min_res_list, min_pp_deg, mem_remain, mem_cost = dp_on_model.fit(bsz, False)
                 if min_pp_deg == -1:
                     max_bsz = bsz - scale_
@@ -461,5 +462,8 @@ if __name__ == '__main__':
     parser.add_argument(
         "--search_from_min_bsz", type=int, default=0, help="If 0, start searching from a recommended bsz to accelerate optimization.",
     )
+    parser.add_argument(
+        "--processes", type=int, default=1, help="Number of processes searching the pipeline degrees of each batch size in parallel.",
+    )
     args = parser.parse_args()
     parallelism_optimization(args)
\ No newline at end of file
@@ -200,7 +200,8 @@ def parallelism_optimization(args):
                                     multi_layer_type = True,
                                     pp_stage_dict = pp_stage_dict,
                                     search_history=search_history,
-                                    comm_coe_dict=comm_coe_dict)
+                                    comm_coe_dict=comm_coe_dict,
+                                    processes=args.processes)
             print("****Testing with bsz=", bsz, "****")
             min_cost, min_res_list, min_pp_deg, mem_remain, mem_cost = dp_on_model.fit(bsz)
             throughput = bsz / min_cost
@@ -289,7 +290,7 @@ def parallelism_optimization(args):
                 dp_on_model = DpOnModel(s, MemoryCostModel, TimeCostModel_with_overlap, 
                                         memcost_model_args=memcost_model_args, timecost_model_args=timecost_model_args,
                                         max_mem=max_mem, layer_num =layer_num_list, multi_layer_type = True,
-                                        pp_stage_dict = pp_stage_dict, comm_coe_dict=comm_coe_dict)
+                                        pp_stage_dict = pp_stage_dict, comm_coe_dict=comm_coe_dict, processes=args.processes)
                 min_cost, min_res_list, min_pp_deg, mem_remain, mem_cost = dp_on_model.fit(bsz, False)
                 if min_pp_deg == -1:
                     max_bsz = bsz - scale
@@ -331,5 +332,8 @@ if __name__ == '__main__':
     parser.add_argument(
         "--search_from_min_bsz", type=int, default=0, help="If 0, start searching from a recommended bsz to accelerate optimization.",
     )
+    parser.add_argument(
+        "--processes", type=int, default=1, help="Number of processes searching the pipeline degrees of each batch size in parallel.",
+    )
     args = parser.parse_args()
     parallelism_optimization(args)
@@ -1,4 +1,5 @@
 import numpy as np
+import multiprocessing
 from tqdm import trange
 
 def form_strategy(strategy):
@@ -94,22 +95,22 @@ class DPAlg():
             else:
                 return np.inf, None, -1
 
+        # The whole memory axis of one (layer, strategy) is solved at once.
+        # f[v - v_data[i, s]] reads the previous layer, except when
+        # v_data[i, s] == 0: then the columns before s were already updated
+        # for this layer, as in the in-place element-wise recurrence.
         for i in range(self.layer_num):
-            for v in range(self.max_mem - 1, -1, -1):
-                for s in range(self.strategy_num):
-
-                    if v < self.v_data[i, s]:
-                        self._mark[i, v, s] = -1
-                        self._f[v, s] = np.inf
-                        continue
-
-                    candidates = [self._f[v - self.v_data[i, s], si] + self.inter_cost[i, si, s] for si in range(self.strategy_num)]
-                    candidates = np.array(candidates) + self.intra_cost[i, s]
-
-                    min_index = np.argmin(candidates)
-
-                    self._mark[i, v, s] = min_index
-                    self._f[v, s] = candidates[min_index]
+            f = np.empty_like(self._f)
+            for s in range(self.strategy_num):
+                w = min(int(self.v_data[i, s]), self.max_mem)
+                src = self._f if w > 0 else np.concatenate((f[:, :s], self._f[:, s:]), axis=1)
+                candidates = (src[:self.max_mem - w] + self.inter_cost[i, :, s]) + self.intra_cost[i, s]
+                min_index = np.argmin(candidates, axis=1)
+                self._mark[i, :w, s] = -1
+                self._mark[i, w:, s] = min_index
+                f[:w, s] = np.inf
+                f[w:, s] = candidates[np.arange(len(min_index)), min_index]
+            self._f = f
         
         next_index, next_v = np.argmin(self._f[-1, :]), self.max_mem - 1
         total_cost = self._f[-1, next_index]
@@ -126,6 +127,16 @@ class DPAlg():
 
         return total_cost, res_list, next_v - self.v_data[0, next_index]
 
+# model searched by the pool workers, inherited through fork
+_pool_model = None
+
+def _fit_candidate(candidate):
+    history = _pool_model.search_history
+    keys = set(history.keys()) if history is not None else set()
+    result = _pool_model._run_candidate(*candidate)
+    new_history = {key: history[key] for key in history.keys() - keys} if history is not None else {}
+    return result, new_history
+
 class DpOnModel:
     def __init__(   self, 
                     strategies_set, 
@@ -138,7 +149,8 @@ class DpOnModel:
                     multi_layer_type=False,
                     pp_stage_dict=None,
                     search_history=None,
-                    comm_coe_dict={}):
+                    comm_coe_dict={},
+                    processes=1):
         self.strategies_set = strategies_set
         self.memcost_model = memcost_model
         self.timecost_model = timecost_model
@@ -151,6 +163,8 @@ class DpOnModel:
         self.multi_layer_type = multi_layer_type
         self.search_history = search_history
         self.comm_coe_dict = comm_coe_dict
+        # number of worker processes used to evaluate (pp_deg, bsz) candidates
+        self.processes = processes
         if multi_layer_type:
             # If multi_layer_type == True, layer_num/memcost_model_args/timecost_model_args should be list.
             # e.g. for T5, layer_num = [12, 12], memcost_model_args = [memcost_model_args_enc, memcost_model_args_dec]
@@ -368,28 +382,60 @@ class DpOnModel:
             start_layer += pp_stage_list[i]
         return sum(comm_cost_list), res_list_list, mem_remain_list, mem_cost_list, best_strategy_flag, from_history
 
+    def _run_candidate(self, pp_deg, bsz):
+        if self.multi_layer_type:
+            return self._build_dp_and_run_multi_layer_type(pp_deg, bsz)
+        return self._build_dp_and_run(pp_deg, bsz)
+
+    def fit_candidates(self, candidates):
+        """Run the search of each (pp_deg, bsz) in candidates, in a process pool if processes > 1.
+
+        Results are the same as running them one by one; the search history
+        written by the workers is merged back.
+        """
+        if self.processes <= 1 or len(candidates) <= 1:
+            return [self._run_candidate(pp_deg, bsz) for pp_deg, bsz in candidates]
+        global _pool_model
+        _pool_model = self
+        try:
+            with multiprocessing.get_context('fork').Pool(min(self.processes, len(candidates))) as pool:
+                outputs = pool.map(_fit_candidate, candidates)
+        finally:
+            _pool_model = None
+        results = []
+        for result, new_history in outputs:
+            if self.search_history is not None:
+                self.search_history.update(new_history)
+            results.append(result)
+        return results
+
     def fit(self, bsz, print_=True):
-        min_comm_cost = np.inf
-        min_res_list = None
-        min_pp_deg = -1
-        min_mem_remain = -1
-        min_mem_cost = -1
-
-        for pp_deg in self.ppdeg_set:
-            if print_:
-                print(f'bsz={bsz}, pp_deg={pp_deg}:', flush=True)
-            if self.multi_layer_type:
-                comm_cost, res_list, mem_remain, mem_cost, best_strategy_flag, from_history = self._build_dp_and_run_multi_layer_type(pp_deg, bsz)
-            else:
-                comm_cost, res_list, mem_remain, mem_cost, best_strategy_flag, from_history = self._build_dp_and_run(pp_deg, bsz)
-            if print_:
-                print('Best strategy:', best_strategy_flag, '\nFrom history:', from_history)
-                print(f'time cost: {comm_cost}, memory remaining: {mem_remain}, memory cost: {mem_cost}')
-            if min_comm_cost > comm_cost:
-                min_res_list = res_list
-                min_comm_cost = comm_cost
-                min_pp_deg = pp_deg
-                min_mem_remain = mem_remain
-                min_mem_cost = mem_cost
-
-        return min_comm_cost, min_res_list, min_pp_deg, min_mem_remain, min_mem_cost
\ No newline at end of file
+        return self.fit_batch([bsz], print_)[0]
+
+    def fit_batch(self, bsz_list, print_=True):
+        """fit() for each batch size in bsz_list, with all (pp_deg, bsz) candidates searched together."""
+        candidates = [(pp_deg, bsz) for bsz in bsz_list for pp_deg in self.ppdeg_set]
+        results = iter(self.fit_candidates(candidates))
+        fit_results = []
+        for bsz in bsz_list:
+            min_comm_cost = np.inf
+            min_res_list = None
+            min_pp_deg = -1
+            min_mem_remain = -1
+            min_mem_cost = -1
+
+            for pp_deg in self.ppdeg_set:
+                comm_cost, res_list, mem_remain, mem_cost, best_strategy_flag, from_history = next(results)
+                if print_:
+                    print(f'bsz={bsz}, pp_deg={pp_deg}:', flush=True)
+                    print('Best strategy:', best_strategy_flag, '\nFrom history:', from_history)
+                    print(f'time cost: {comm_cost}, memory remaining: {mem_remain}, memory cost: {mem_cost}')
+                if min_comm_cost > comm_cost:
+                    min_res_list = res_list
+                    min_comm_cost = comm_cost
+                    min_pp_deg = pp_deg
+                    min_mem_remain = mem_remain
+                    min_mem_cost = mem_cost
+
+            fit_results.append((min_comm_cost, min_res_list, min_pp_deg, min_mem_remain, min_mem_cost))
+        return fit_results
@@ -0,0 +1,109 @@
+import numpy as np
+import argparse
+import time
+# the modules alone, without the torch utilities of the package
+import dp_utils
+import dp_utils_dist
+
+
+# DPAlg.fit of dp_utils and dp_utils_dist, solving a memory axis at once,
+# against the element-wise recurrence on random problems, with strategies
+# taking no memory in some layers: the costs, strategies, memory left and
+# the tables must be identical.
+
+class ReferenceDPAlg(dp_utils.DPAlg):
+    def fit(self):
+        if self.strategy_num == 1:
+            return super().fit()
+
+        for i in range(self.layer_num):
+            for v in range(self.max_mem - 1, -1, -1):
+                for s in range(self.strategy_num):
+
+                    if v < self.v_data[i, s]:
+                        self._mark[i, v, s] = -1
+                        self._f[v, s] = np.inf
+                        continue
+
+                    candidates = [self._f[v - self.v_data[i, s], si] + self.inter_cost[i, si, s] for si in range(self.strategy_num)]
+                    candidates = np.array(candidates) + self.intra_cost[i, s]
+
+                    min_index = np.argmin(candidates)
+
+                    self._mark[i, v, s] = min_index
+                    self._f[v, s] = candidates[min_index]
+
+        next_index, next_v = np.argmin(self._f[-1, :]), self.max_mem - 1
+        total_cost = self._f[-1, next_index]
+
+        if not total_cost < np.inf:
+            return np.inf, None, -1
+
+        res_list = [-1] * self.layer_num
+        res_list[-1] = next_index
+
+        for i in range(self.layer_num - 1, 0, -1):
+            next_index, next_v = self._mark[i, next_v, next_index], next_v - self.v_data[i, next_index]
+            res_list[i - 1] = next_index
+
+        return total_cost, res_list, next_v - self.v_data[0, next_index]
+
+
+def make_problem(rng, layer_num, strategy_num, zeros=0., decimals=None):
+    v = rng.randint(0, 60, size=(layer_num, strategy_num)).astype(np.int32)
+    # strategies taking no memory, read from the same layer
+    v[rng.rand(layer_num, strategy_num) < zeros] = 0
+    intra = rng.rand(layer_num, strategy_num) * 4
+    inter = rng.rand(layer_num, strategy_num, strategy_num) * 2
+    inter[0] = 0
+    if decimals is not None:
+        # equal candidates, so that the ties are broken alike
+        intra, inter = np.round(intra, decimals), np.round(inter, decimals)
+    return v, intra, inter
+
+
+def solve(cls, max_mem, problem):
+    v, intra, inter = problem
+    dp = cls(max_mem, *v.shape)
+    dp.set_v_and_cost(v, intra, inter)
+    return dp.fit(), dp
+
+
+def test_fit(trials=300):
+    rng = np.random.RandomState(0)
+    infeasible = 0
+    for trial in range(trials):
+        layer_num, strategy_num = rng.randint(1, 8), rng.randint(1, 6)
+        max_mem = rng.randint(0, 300)
+        problem = make_problem(rng, layer_num, strategy_num,
+                               zeros=(0., 0.4, 1.)[trial % 3],
+                               decimals=1 if trial % 2 else None)
+        expected, ref = solve(ReferenceDPAlg, max_mem, problem)
+        infeasible += expected[1] is None
+        for module in (dp_utils, dp_utils_dist):
+            actual, dp = solve(module.DPAlg, max_mem, problem)
+            assert repr(actual) == repr(expected), (trial, actual, expected)
+            np.testing.assert_equal(dp._mark, ref._mark)
+            np.testing.assert_equal(dp._f, ref._f)
+    # both kinds of problems were met
+    assert 0 < infeasible < trials
+    print('DPAlg.fit matches the element-wise recurrence in %d problems' % trials)
+
+
+def benchmark(max_mem, layer_num, strategy_num):
+    rng = np.random.RandomState(0)
+    problem = make_problem(rng, layer_num, strategy_num, zeros=0.1)
+    for name, cls in (('element-wise', ReferenceDPAlg), ('vectorized', dp_utils.DPAlg)):
+        start = time.perf_counter()
+        result, _ = solve(cls, max_mem, problem)
+        print('%s: %.3f s, cost %f' % (name, time.perf_counter() - start, result[0]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max-mem', type=int, default=8200)
+    parser.add_argument('--layer-num', type=int, default=24)
+    parser.add_argument('--strategy-num', type=int, default=8)
+    args = parser.parse_args()
+    test_fit()
+    benchmark(args.max_mem, args.layer_num, args.strategy_num)
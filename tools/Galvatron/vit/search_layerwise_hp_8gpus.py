@@ -131,7 +131,8 @@ def parallelism_optimization(args):
                                 max_mem=max_mem,
                                 search_history=search_history,
                                 layer_num=layer_num,
-                                comm_coe_dict=comm_coe_dict)
+                                comm_coe_dict=comm_coe_dict,
+                                processes=args.processes)
 
         results = dict()
         max_throughput, optimal_bsz, max_bsz = -1, -1, -1
@@ -187,7 +188,7 @@ def parallelism_optimization(args):
         def estimate_strategy_max_bsz(s):
             dp_on_model = DpOnModel(s, MemoryCostModel, TimeCostModel_with_overlap, 
                                     memcost_model_args, timecost_model_args_with_overlap,
-                                    max_mem=max_mem, layer_num=layer_num, comm_coe_dict=comm_coe_dict)
+                                    max_mem=max_mem, layer_num=layer_num, comm_coe_dict=comm_coe_dict, processes=args.processes)
             max_bsz = 0
             for bsz in range(scale, 1024, scale):
                 min_cost, min_res_list, min_pp_deg, mem_remain, mem_cost = dp_on_model.fit(bsz, False)
@@ -227,5 +228,8 @@ if __name__ == '__main__':
     parser.add_argument(
         "--search_from_min_bsz", type=int, default=0, help="If 0, start searching from a recommended bsz to accelerate optimization.",
     )
+    parser.add_argument(
+        "--processes", type=int, default=1, help="Number of processes searching the pipeline degrees of each batch size in parallel.",
+    )
     args = parser.parse_args()
     parallelism_optimization(args)
\ No newline at end of file
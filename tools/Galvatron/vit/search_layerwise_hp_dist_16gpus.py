@@ -166,7 +166,8 @@ def parallelism_optimization(args):
                                 search_history=search_history,
                                 layer_num=layer_num,
                                 comm_coe_dict=comm_coe_dict,
-                                gpu_num=gpu_num)
+                                gpu_num=gpu_num,
+                                processes=args.processes)
 
         results = dict()
         max_throughput, optimal_bsz, max_bsz = -1, -1, -1
@@ -223,7 +224,7 @@ def parallelism_optimization(args):
         def estimate_strategy_max_bsz(s):
             dp_on_model = DpOnModel_dist(s, MemoryCostModelDist, TimeCostModelDist_with_overlap, 
                                     memcost_model_args, timecost_model_args_with_overlap,
-                                    max_mem=max_mem, layer_num=layer_num, comm_coe_dict=comm_coe_dict, gpu_num=gpu_num)
+                                    max_mem=max_mem, layer_num=layer_num, comm_coe_dict=comm_coe_dict, gpu_num=gpu_num, processes=args.processes)
             max_bsz = 0
             scale_ = 16 if s[0][0] == 1 and scale < 16 else scale
             for bsz in range(scale_, 1024, scale_):
@@ -264,5 +265,8 @@ if __name__ == '__main__':
     parser.add_argument(
         "--search_from_min_bsz", type=int, default=0, help="If 0, start searching from a recommended bsz to accelerate optimization.",
     )
+    parser.add_argument(
+        "--processes", type=int, default=1, help="Number of processes searching the pipeline degrees of each batch size in parallel.",
+    )
     args = parser.parse_args()
     parallelism_optimization(args)